@@ -1,12 +1,15 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.models.user import Token, LoginRequest, User
-from app.services.auth_service import login, get_current_user
+from fastapi.security import HTTPAuthorizationCredentials
+from app.models.user import LoginRequest, User
+from app.core.security import get_password_hasher, get_revocation_list, get_token_cache
+from app.dependencies import bearer, current_user, manager_user
+from app.middleware.rate_limiting import get_rate_limiter
+from app.services.auth_service import LogoutRequest, RefreshRequest, TokenPair, login, logout, refresh
 
 router = APIRouter()
-security = HTTPBearer()
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=TokenPair)
 async def login_user(login_request: LoginRequest):
     """
     Login endpoint - authenticate user and return JWT token
@@ -15,18 +18,61 @@ async def login_user(login_request: LoginRequest):
     - username: admin, password: admin123
     - username: manager, password: manager123  
     - username: tech, password: tech123
+    
+    Passwords are checked off the event loop; when too many logins are
+    already waiting the request is refused with 503 and Retry-After.
+    
+    The access token is short-lived: renew it with the refresh token at
+    POST /refresh rather than logging in again.
+    """
+    return await login(login_request)
+
+@router.post("/refresh", response_model=TokenPair)
+async def refresh_tokens(refresh_request: RefreshRequest):
+    """
+    Exchange a refresh token for a new access token and refresh token
+    
+    Each refresh token works once; reusing one revokes its session.
     """
-    return login(login_request)
+    return refresh(refresh_request.refresh_token)
 
 @router.get("/me", response_model=User)
-async def get_current_user_info(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user_info(current_user: User = Depends(current_user)):
     """Get current user information from token"""
-    return get_current_user(credentials.credentials)
+    return current_user
 
 @router.post("/logout")
-async def logout_user():
-    """Logout endpoint (client should discard token)"""
-    return {"message": "Successfully logged out"}
+async def logout_user(
+    logout_request: Optional[LogoutRequest] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)
+):
+    """Logout endpoint: revokes the session of the bearer token and/or the
+    refresh token in the body, even if they have expired"""
+    revoked = logout(
+        credentials.credentials if credentials else None,
+        logout_request.refresh_token if logout_request else None
+    )
+    return {"message": "Successfully logged out", "sessions_revoked": revoked}
+
+@router.get("/hashing")
+async def get_hashing_stats(current_user: User = Depends(manager_user)):
+    """Password hashing pool: bcrypt cost, backlog, shed logins and latency percentiles"""
+    return get_password_hasher().stats()
+
+@router.get("/token-cache")
+async def get_token_cache_stats(current_user: User = Depends(manager_user)):
+    """Verified-token cache: size and hit, miss, expiry and invalidation counters"""
+    return get_token_cache().stats()
+
+@router.get("/revocations")
+async def get_revocation_stats(current_user: User = Depends(manager_user)):
+    """Revocation list: revoked ids held, checks answered and expired ids pruned"""
+    return get_revocation_list().stats()
+
+@router.get("/rate-limits")
+async def get_rate_limit_stats(current_user: User = Depends(manager_user)):
+    """Rate limiting rules with allowed and refused counts, and bucket store size"""
+    return get_rate_limiter().stats()
 
 @router.get("/demo-credentials")
 async def get_demo_credentials():
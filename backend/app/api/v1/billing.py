@@ -0,0 +1,45 @@
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.models.user import User
+from app.dependencies import admin_user, manager_user
+from app.services.customer_billing import get_billing_run, list_billing_runs, start_billing_run
+
+router = APIRouter()
+
+@router.post("/runs", status_code=202)
+async def start_billing_run_endpoint(
+    period: Optional[str] = Query(None, description="Month to bill as YYYY-MM (default: current month)"),
+    current_user: User = Depends(admin_user)
+) -> Dict[str, Any]:
+    """Start the billing run of a month in the background
+
+    Starting an interrupted or failed run resumes it from its checkpoint;
+    starting a completed one returns its result without billing again.
+    Poll GET /runs/{period} for progress and per-stage timings.
+    """
+    try:
+        return start_billing_run(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/runs")
+async def list_billing_runs_endpoint(
+    current_user: User = Depends(manager_user)
+) -> List[Dict[str, Any]]:
+    """Every billing run, most recent month first"""
+    return list_billing_runs()
+
+@router.get("/runs/{period}")
+async def get_billing_run_endpoint(
+    period: str,
+    current_user: User = Depends(manager_user)
+) -> Dict[str, Any]:
+    """Progress, totals and per-stage timings of a month's billing run"""
+    try:
+        state = get_billing_run(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"No billing run for {period}")
+    return state
@@ -1,53 +1,76 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 
 from app.models.customer import (
     Customer, CustomerCreate, CustomerUpdate, CustomerStats, 
     CustomerFilter, ServiceType, CustomerStatus, PaymentStatus
 )
 from app.models.user import User
-from app.services.auth_service import get_current_user
+from app.dependencies import current_user, manager_user
 from app.services.customer_service import (
-    get_all_customers, get_customer_by_id, create_customer, 
+    get_all_customers, get_customers_page, get_customer_by_id, create_customer, 
     update_customer, delete_customer, get_customer_stats,
-    search_customers, filter_customers, init_customer_service
+    search_customers, filter_customers, get_customers_in_bbox,
+    get_customers_within_radius, get_nearest_customers, get_customers_by_ip,
+    get_customers_by_mac, get_customers_in_network, resolve_network_addresses,
+    get_customer_changes
 )
+from app.services.customer_bulk import (
+    CustomerBulkUpdate, CustomerBulkUpdateReport, bulk_update_customers
+)
+from app.services.customer_changes import ChangeLogTruncated
+from app.services.customer_export import (
+    MEDIA_TYPES, export_customers, export_fields, export_format
+)
+from app.services.customer_geo import map_marker
+from app.services.customer_network import NetworkLookupRequest, noc_summary
+from app.services.customer_import import CustomerImportReport, import_customers, import_format
+from app.services.customer_suspension import get_suspension_scheduler
 
 router = APIRouter()
-security = HTTPBearer()
-
-# Initialize demo data
-init_customer_service()
 
 @router.get("/", response_model=List[Customer])
 async def get_customers(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials) if creds else None),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    sort: str = Query("id", description="Sort by id, created_at or name"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    current_user: User = Depends(current_user)
 ):
-    """Get all customers with pagination"""
-    customers = get_all_customers()
-    return customers[skip:skip + limit]
+    """Get all customers with pagination
+    
+    Pass the X-Next-Cursor response header back as ``cursor`` to fetch the
+    next page; skip/limit paging is still supported.
+    """
+    try:
+        customers, next_cursor = await get_customers_page(
+            limit=limit, cursor=cursor, sort=sort, descending=order == "desc", skip=skip
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return customers
 
 @router.get("/stats", response_model=CustomerStats)
 async def get_customers_stats(
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    current_user: User = Depends(current_user)
 ):
     """Get customer statistics for dashboard"""
-    return get_customer_stats()
+    return await get_customer_stats()
 
 @router.get("/search")
 async def search_customers_endpoint(
     q: str = Query(..., min_length=1, description="Search query"),
     limit: int = Query(50, ge=1, le=100),
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    current_user: User = Depends(current_user)
 ):
     """Search customers by name, email, phone, or address"""
-    results = search_customers(q, limit)
+    results = await search_customers(q, limit)
     return {
         "query": q,
         "total_results": len(results),
@@ -62,8 +85,7 @@ async def filter_customers_endpoint(
     city: Optional[str] = None,
     plan_name: Optional[str] = None,
     overdue_only: bool = False,
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    current_user: User = Depends(current_user)
 ):
     """Filter customers by various criteria"""
     filters = CustomerFilter(
@@ -75,30 +97,242 @@ async def filter_customers_endpoint(
         overdue_only=overdue_only
     )
     
-    results = filter_customers(filters)
+    results = await filter_customers(filters)
     return {
         "filters": filters.dict(exclude_none=True),
         "total_results": len(results),
         "customers": results
     }
 
+@router.get("/geo/bbox")
+async def customers_in_bbox_endpoint(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: User = Depends(current_user)
+):
+    """Map markers for the customers inside a viewport"""
+    try:
+        total, customers = await get_customers_in_bbox(min_lat, min_lon, max_lat, max_lon, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "total_results": total,
+        "truncated": total > len(customers),
+        "customers": [map_marker(customer) for customer in customers]
+    }
+
+@router.get("/geo/radius")
+async def customers_within_radius_endpoint(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0, le=500),
+    limit: int = Query(500, ge=1, le=5000),
+    current_user: User = Depends(current_user)
+):
+    """Customers within a radius of a point (e.g. a failed NAP), nearest first"""
+    total, found = await get_customers_within_radius(lat, lon, radius_km, limit)
+    return {
+        "total_results": total,
+        "truncated": total > len(found),
+        "customers": [
+            {"distance_km": round(distance, 3), "customer": customer} for distance, customer in found
+        ]
+    }
+
+@router.get("/geo/nearest")
+async def nearest_customers_endpoint(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=500),
+    max_km: Optional[float] = Query(None, gt=0),
+    current_user: User = Depends(current_user)
+):
+    """The k customers nearest to a point"""
+    found = await get_nearest_customers(lat, lon, k, max_km)
+    return {
+        "total_results": len(found),
+        "customers": [
+            {"distance_km": round(distance, 3), "customer": customer} for distance, customer in found
+        ]
+    }
+
+@router.get("/network/ip")
+async def customers_by_ip_endpoint(
+    address: str = Query(..., description="IPv4 or IPv6 address"),
+    current_user: User = Depends(current_user)
+):
+    """Customers assigned an IP address"""
+    try:
+        customers = await get_customers_by_ip(address)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"address": address, "total_results": len(customers), "customers": customers}
+
+@router.get("/network/mac")
+async def customers_by_mac_endpoint(
+    address: str = Query(..., description="MAC address, any separator style"),
+    current_user: User = Depends(current_user)
+):
+    """Customers with a MAC address"""
+    try:
+        customers = await get_customers_by_mac(address)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"address": address, "total_results": len(customers), "customers": customers}
+
+@router.get("/network/cidr")
+async def customers_in_network_endpoint(
+    block: str = Query(..., description="CIDR block, e.g. 192.168.2.0/24"),
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: User = Depends(current_user)
+):
+    """Customers whose IP is inside a CIDR block, in address order"""
+    try:
+        total, customers = await get_customers_in_network(block, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "block": block,
+        "total_results": total,
+        "truncated": total > len(customers),
+        "customers": [noc_summary(customer) for customer in customers]
+    }
+
+@router.post("/network/resolve")
+async def resolve_network_addresses_endpoint(
+    lookup: NetworkLookupRequest,
+    current_user: User = Depends(current_user)
+):
+    """Resolve a batch of IP and MAC addresses to the affected customers"""
+    result = await resolve_network_addresses(lookup.ip_addresses, lookup.mac_addresses)
+    for key in ("ip_addresses", "mac_addresses"):
+        result[key] = {
+            address: [noc_summary(customer) for customer in customers]
+            for address, customers in result[key].items()
+        }
+    return result
+
+@router.get("/changes")
+async def customer_changes_endpoint(
+    since: int = Query(0, ge=0, description="First offset to return (next_offset of the previous page)"),
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: User = Depends(manager_user)
+):
+    """Customer creates, updates and deletes since an offset, oldest first"""
+    try:
+        page = await get_customer_changes(since, limit)
+    except ChangeLogTruncated as e:
+        raise HTTPException(
+            status_code=410,
+            detail={"message": str(e), "earliest_offset": e.earliest_offset}
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    # The stored event lines are already JSON; send them without re-encoding
+    return Response(page.to_json(), media_type="application/json")
+
+@router.get("/suspensions")
+async def upcoming_suspensions_endpoint(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(manager_user)
+):
+    """Automatic suspension status and the next scheduled suspensions"""
+    scheduler = get_suspension_scheduler()
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail="Automatic suspension is disabled (AUTO_SUSPEND_ENABLED)")
+    return {**scheduler.status(), "upcoming": scheduler.upcoming(limit)}
+
+@router.get("/export")
+async def export_customers_endpoint(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to include (default: all)"),
+    gzip: bool = Query(False, description="Compress the body (Content-Encoding: gzip)"),
+    status: Optional[CustomerStatus] = None,
+    service_type: Optional[ServiceType] = None,
+    payment_status: Optional[PaymentStatus] = None,
+    city: Optional[str] = None,
+    plan_name: Optional[str] = None,
+    overdue_only: bool = False,
+    current_user: User = Depends(manager_user)
+):
+    """Stream every customer matching the filters as NDJSON or CSV
+    
+    Rows are sent in id order as they are read, so exports of any size
+    start immediately and use constant server memory.
+    """
+    try:
+        export_as = export_format(format)
+        columns = export_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filters = CustomerFilter(
+        status=status,
+        service_type=service_type,
+        payment_status=payment_status,
+        city=city,
+        plan_name=plan_name,
+        overdue_only=overdue_only
+    )
+    headers = {"Content-Disposition": f'attachment; filename="customers.{export_as}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_customers(filters, export_as, columns, gzip),
+        media_type=MEDIA_TYPES[export_as],
+        headers=headers
+    )
+
 @router.post("/", response_model=Customer)
 async def create_new_customer(
     customer: CustomerCreate,
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    current_user: User = Depends(current_user)
 ):
     """Create a new customer"""
-    return create_customer(customer)
+    return await create_customer(customer)
+
+@router.post("/import", response_model=CustomerImportReport)
+async def import_customers_endpoint(
+    request: Request,
+    format: Optional[str] = Query(None, description="csv or ndjson (default: from Content-Type)"),
+    current_user: User = Depends(manager_user)
+):
+    """Bulk import customers from a CSV or NDJSON request body
+    
+    The body is streamed, not buffered: send the file as the raw request
+    body (e.g. ``curl --data-binary @customers.csv -H "Content-Type: text/csv"``).
+    CSV needs a header row with CustomerCreate field names. Valid rows are
+    created as pending customers; invalid rows are listed by line number.
+    """
+    try:
+        upload_format = import_format(format, request.headers.get("content-type"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return await import_customers(request.stream(), upload_format)
+
+@router.post("/bulk-update", response_model=CustomerBulkUpdateReport)
+async def bulk_update_customers_endpoint(
+    bulk_update: CustomerBulkUpdate,
+    current_user: User = Depends(manager_user)
+):
+    """Apply one update (e.g. status=suspended, a new monthly_fee) to a list of
+    customer ids or to every customer matching a filter"""
+    try:
+        return await bulk_update_customers(bulk_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{customer_id}", response_model=Customer)
 async def get_customer(
     customer_id: str,
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    current_user: User = Depends(current_user)
 ):
     """Get customer by ID"""
-    customer = get_customer_by_id(customer_id)
+    customer = await get_customer_by_id(customer_id)
     if not customer:
         raise HTTPException(
             status_code=404, 
@@ -110,11 +344,10 @@ async def get_customer(
 async def update_customer_endpoint(
     customer_id: str,
     customer_update: CustomerUpdate,
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    current_user: User = Depends(current_user)
 ):
     """Update customer information"""
-    customer = update_customer(customer_id, customer_update)
+    customer = await update_customer(customer_id, customer_update)
     if not customer:
         raise HTTPException(
             status_code=404,
@@ -125,11 +358,10 @@ async def update_customer_endpoint(
 @router.delete("/{customer_id}")
 async def delete_customer_endpoint(
     customer_id: str,
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    current_user: User = Depends(manager_user)
 ):
     """Delete customer"""
-    success = delete_customer(customer_id)
+    success = await delete_customer(customer_id)
     if not success:
         raise HTTPException(
             status_code=404,
@@ -141,8 +373,8 @@ async def delete_customer_endpoint(
 @router.get("/demo/sample-data")
 async def get_sample_customer_data():
     """Get sample customer data structure (for frontend development)"""
-    customers = get_all_customers()
-    stats = get_customer_stats()
+    customers = await get_all_customers()
+    stats = await get_customer_stats()
     
     return {
         "message": "Sample customer data for N2P-CRM01",
@@ -1,16 +1,26 @@
-from typing import List, Dict, Any
-from fastapi import APIRouter, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timedelta
-import random
+import time
 
+import numpy as np
+
+from app.core.config import DASHBOARD_SECTION_TIMEOUT_MS, DASHBOARD_SECTION_TIMEOUTS_MS, STREAM_TICKET_SECONDS
+from app.core.security import get_ticket_store
 from app.models.user import User
 from app.models.customer import CustomerStats
-from app.services.auth_service import get_current_user
-from app.services.customer_service import get_customer_stats, get_all_customers
+from app.services.auth_service import TokenGrant, issue_stream_ticket
+from app.dependencies import current_user, manager_user, stream_grant, token_grant
+from app.services.customer_service import (
+    get_customer_stats, get_revenue_summary, get_revenue_breakdown
+)
+from app.services.customer_rollups import get_customer_rollups
+from app.services.dashboard_cache import get_dashboard_cache, if_none_match, make_etag, render_json
+from app.services.dashboard_stream import get_dashboard_stream
+from app.services.system_metrics import get_system_metrics
 
 router = APIRouter()
-security = HTTPBearer()
 
 def get_network_stats() -> Dict[str, Any]:
     """Generate mock network statistics"""
@@ -32,20 +42,17 @@ def get_network_stats() -> Dict[str, Any]:
         }
     }
 
-def get_revenue_stats() -> Dict[str, Any]:
-    """Generate mock revenue statistics"""
-    customers = get_all_customers()
-    active_customers = [c for c in customers if c.status.value == "active"]
-    
-    monthly_revenue = sum(c.monthly_fee for c in active_customers)
-    overdue_amount = sum(c.balance_due for c in customers if c.balance_due > 0)
+async def get_revenue_stats() -> Dict[str, Any]:
+    """Generate revenue statistics (payment mix is still mocked)"""
+    summary = await get_revenue_summary()
+    monthly_revenue = summary["monthly_revenue"]
     
     return {
         "monthly_revenue": monthly_revenue,
         "yearly_revenue": monthly_revenue * 12,
-        "overdue_amount": overdue_amount,
+        "overdue_amount": summary["overdue_amount"],
         "collection_rate": 94.2,
-        "average_revenue_per_user": monthly_revenue / len(active_customers) if active_customers else 0,
+        "average_revenue_per_user": summary["average_revenue_per_user"],
         "payment_methods": {
             "bank_transfer": 45.2,
             "cash": 28.7,
@@ -105,152 +112,325 @@ def get_recent_activities() -> List[Dict[str, Any]]:
     ]
     return activities
 
-def get_performance_metrics() -> Dict[str, Any]:
-    """Generate mock performance metrics"""
+async def get_performance_metrics() -> Dict[str, Any]:
+    """Latest system and request metrics sample plus growth figures.
+
+    Uptime counts from when the sampler was created (at startup). Churn is
+    this month's churned customers over the customers at the end of last
+    month, from the monthly rollups; null without that base. Quality and
+    growth figures we have no source for (satisfaction, resolution time,
+    upgrades, referrals) are left out.
+    """
+    metrics = get_system_metrics()
+    sample = metrics.latest()
+    stats = await get_customer_stats()
+    series = get_customer_rollups().monthly_series(2)
+    previous_total = int(series["total_customers"][0])
+    churned = int(series["churned_customers"][1])
+    requests = sample["requests"]
     return {
-        "system_health": {
-            "cpu_usage": 23.5,
-            "memory_usage": 67.2,
-            "disk_usage": 45.8,
-            "network_throughput": 847.3
-        },
+        "system_health": sample["system_health"],
+        "process": sample["process"],
+        "requests": requests,
         "service_quality": {
-            "uptime_percentage": 99.7,
-            "average_response_time": 12.3,
-            "customer_satisfaction": 4.6,
-            "resolution_time": 2.4
+            "up_since": datetime.fromtimestamp(metrics.started_at),
+            "uptime_seconds": round(time.time() - metrics.started_at),
+            "average_response_time": requests["mean_ms"],
+            "error_rate": round(100.0 * requests["errors"] / requests["count"], 2) if requests["count"] else None
         },
         "growth_metrics": {
-            "new_customers_this_month": 12,
-            "churn_rate": 2.1,
-            "upgrade_rate": 8.7,
-            "referral_rate": 15.3
-        }
+            "new_customers_this_month": stats.new_customers_this_month,
+            "churned_customers_this_month": churned,
+            "churn_rate": round(100.0 * churned / previous_total, 2) if previous_total > 0 else None
+        },
+        "sampled_at": sample["timestamp"],
+        "sampler": metrics.overhead()
     }
 
+# Cached sections (see app.services.dashboard_cache): name -> (compute,
+# whether customer changes outdate it)
+async def _network_section():
+    return get_network_stats()
+
+async def _activities_section():
+    return get_recent_activities()
+
+SECTIONS = {
+    "customers": (get_customer_stats, True),
+    "network": (_network_section, False),
+    "revenue": (get_revenue_stats, True),
+    "activities": (_activities_section, False),
+    "performance": (get_performance_metrics, True),
+}
+
+# Overview time budget per section, in seconds
+SECTION_TIMEOUTS = {
+    name: DASHBOARD_SECTION_TIMEOUTS_MS.get(name, DASHBOARD_SECTION_TIMEOUT_MS) / 1000 for name in SECTIONS
+}
+
+async def _section(name: str, user: User):
+    compute, customer_data = SECTIONS[name]
+    return await get_dashboard_cache().get(name, user.role.value, compute, customer_data)
+
+def _conditional_response(request: Request, body: bytes, etag: Optional[str] = None,
+                          headers: Optional[Dict[str, str]] = None) -> Response:
+    """200 with the body, or 304 without one when the client has this ETag"""
+    etag = etag or make_etag(body)
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/overview")
 async def get_dashboard_overview(
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    request: Request,
+    current_user: User = Depends(current_user)
 ):
-    """Get complete dashboard overview data"""
-    customer_stats = get_customer_stats()
-    network_stats = get_network_stats()
-    revenue_stats = get_revenue_stats()
-    recent_activities = get_recent_activities()
-    performance_metrics = get_performance_metrics()
+    """Get complete dashboard overview data
     
-    return {
-        "user": {
-            "name": current_user.full_name,
-            "role": current_user.role,
-            "last_login": current_user.last_login,
-            "department": current_user.department
-        },
-        "customers": customer_stats.dict(),
-        "network": network_stats,
-        "revenue": revenue_stats,
-        "activities": recent_activities[:10],  # Last 10 activities
-        "performance": performance_metrics,
-        "timestamp": datetime.now()
+    Sections come from the dashboard cache, computed concurrently, each
+    within its time budget (SECTION_TIMEOUTS). A section past its budget
+    is served from its previous value if it has one, else it is null,
+    listed in "missing_sections" and "partial" is true; it keeps
+    computing for the next request. "timestamp" is when the newest section
+    was computed. Server-Timing reports each section's time and status.
+    Send the ETag back in If-None-Match to get a 304 while nothing changed.
+    """
+    results = await get_dashboard_cache().gather(SECTIONS, current_user.role.value, SECTION_TIMEOUTS)
+    body_of = lambda name: results[name].entry.body if results[name].entry is not None else b"null"
+    activities = results["activities"].entry
+    missing = [name for name, result in results.items() if result.entry is None]
+    computed = [result.entry.computed_at for result in results.values() if result.entry is not None]
+    user = {
+        "name": current_user.full_name,
+        "role": current_user.role,
+        "last_login": current_user.last_login,
+        "department": current_user.department
     }
+    body = b"".join((
+        b'{"user":', render_json(user),
+        b',"customers":', body_of("customers"),
+        b',"network":', body_of("network"),
+        b',"revenue":', body_of("revenue"),
+        b',"activities":', render_json(activities.value[:10]) if activities is not None else b"null",  # Last 10
+        b',"performance":', body_of("performance"),
+        b',"timestamp":', render_json(max(computed) if computed else datetime.now()),
+        b',"partial":', render_json(bool(missing)),
+        b',"missing_sections":', render_json(missing),
+        b'}',
+    ))
+    timing = ", ".join(
+        f'{name};dur={result.seconds * 1000:.2f};desc="{result.status}"' for name, result in results.items()
+    )
+    return _conditional_response(request, body, headers={"Server-Timing": timing})
 
 @router.get("/stats/customers")
 async def get_dashboard_customer_stats(
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    request: Request,
+    current_user: User = Depends(current_user)
 ):
     """Get customer statistics"""
-    return get_customer_stats()
+    entry = await _section("customers", current_user)
+    return _conditional_response(request, entry.body, entry.etag)
 
 @router.get("/stats/network")
 async def get_dashboard_network_stats(
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    request: Request,
+    current_user: User = Depends(current_user)
 ):
     """Get network statistics"""
-    return get_network_stats()
+    entry = await _section("network", current_user)
+    return _conditional_response(request, entry.body, entry.etag)
 
 @router.get("/stats/revenue")
 async def get_dashboard_revenue_stats(
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    request: Request,
+    current_user: User = Depends(current_user)
 ):
     """Get revenue statistics"""
-    return get_revenue_stats()
+    entry = await _section("revenue", current_user)
+    return _conditional_response(request, entry.body, entry.etag)
+
+@router.get("/stats/revenue/breakdown")
+async def get_dashboard_revenue_breakdown(
+    request: Request,
+    by: str = Query("city", description="Group by city, plan_name or router_name"),
+    current_user: User = Depends(current_user)
+):
+    """Get active customers and revenue grouped by city, plan or router"""
+    async def compute():
+        return {
+            "group_by": by,
+            "groups": await get_revenue_breakdown(by),
+            "timestamp": datetime.now()
+        }
+    
+    try:
+        entry = await get_dashboard_cache().get(
+            f"revenue_breakdown:{by}", current_user.role.value, compute, customer_data=True
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _conditional_response(request, entry.body, entry.etag)
 
 @router.get("/activities")
 async def get_recent_activities_endpoint(
+    request: Request,
     limit: int = 20,
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    current_user: User = Depends(current_user)
 ):
     """Get recent system activities"""
-    activities = get_recent_activities()
-    return {
+    entry = await _section("activities", current_user)
+    activities = entry.value
+    return _conditional_response(request, render_json({
         "activities": activities[:limit],
         "total": len(activities),
-        "timestamp": datetime.now()
-    }
+        "timestamp": entry.computed_at
+    }))
 
 @router.get("/metrics")
 async def get_performance_metrics_endpoint(
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    request: Request,
+    current_user: User = Depends(current_user)
+):
+    """Get system performance metrics
+
+    The latest background sample plus "history", the samples still in the
+    sampler's ring (oldest first).
+    """
+    entry = await _section("performance", current_user)
+    body = entry.body[:-1] + b',"history":' + get_system_metrics().history_body + b"}"
+    return _conditional_response(request, body)
+
+@router.get("/cache")
+async def get_dashboard_cache_stats(
+    current_user: User = Depends(manager_user)
+):
+    """Dashboard cache: hit ratio and recompute latency per section"""
+    return get_dashboard_cache().stats()
+
+@router.post("/stream/ticket")
+async def create_stream_ticket(
+    grant: TokenGrant = Depends(token_grant)
+):
+    """A single-use ticket for opening one dashboard stream
+
+    Browsers' EventSource cannot send an Authorization header: get a ticket
+    with the bearer token here, then open ``/stream?ticket=...`` within
+    "expires_in" seconds. The stream then lasts as long as the bearer token.
+    """
+    return {"ticket": issue_stream_ticket(grant), "expires_in": STREAM_TICKET_SECONDS}
+
+@router.get("/stream")
+async def stream_dashboard(
+    sections: str = Query(",".join(SECTIONS), description="Comma-separated sections to follow"),
+    grant: TokenGrant = Depends(stream_grant)
 ):
-    """Get system performance metrics"""
-    return get_performance_metrics()
+    """Server-Sent Events: a snapshot of each section, then its changes
+
+    See app.services.dashboard_stream for the event format. Authenticate
+    with the Authorization header, or from a browser's EventSource with a
+    ticket from POST /stream/ticket as ``?ticket=``. The stream ends with an
+    "end" event once the access token expires or its session is revoked;
+    reconnect with a fresh token or ticket.
+    """
+    names = list(dict.fromkeys(name.strip() for name in sections.split(",") if name.strip()))
+    unknown = [name for name in names if name not in SECTIONS]
+    if not names or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown sections {unknown}; choose from {sorted(SECTIONS)}" if unknown else "No sections given"
+        )
+    stream = get_dashboard_stream()
+    if stream.full:
+        raise HTTPException(status_code=503, detail="Too many open dashboard streams", headers={"Retry-After": "30"})
+    return StreamingResponse(
+        stream.events({name: SECTIONS[name] for name in names}, grant.user.role.value, grant),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # no proxy buffering
+    )
+
+@router.get("/stream/stats")
+async def get_dashboard_stream_stats(
+    current_user: User = Depends(manager_user)
+):
+    """Dashboard stream: open streams, publishes, coalesced deltas and tickets"""
+    return {**get_dashboard_stream().stats(), "tickets": get_ticket_store().stats()}
 
 # Chart data endpoints
+def _nullable(values: np.ndarray) -> List[Optional[float]]:
+    """Rollup values as JSON numbers, null where unknown (NaN)"""
+    return [None if value != value else value for value in values.tolist()]
+
 @router.get("/charts/revenue-trend")
 async def get_revenue_trend(
+    request: Request,
     days: int = 30,
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    current_user: User = Depends(current_user)
 ):
-    """Get revenue trend data for charts"""
-    # Generate mock trend data
-    trend_data = []
-    base_revenue = 50000
-    
-    for i in range(days):
-        date = datetime.now() - timedelta(days=days-i-1)
-        revenue = base_revenue + random.randint(-5000, 8000)
-        trend_data.append({
-            "date": date.strftime("%Y-%m-%d"),
-            "revenue": revenue,
-            "customers": 120 + random.randint(-10, 15)
-        })
-    
-    return {
+    """Get revenue trend data for charts
+
+    Read from the daily rollups (app.services.customer_rollups): "revenue"
+    is what was collected that day, "billed" what billing runs added to
+    balances, "customers" the customers not cancelled at the end of the day.
+    Amounts are null for days before the rollups were first built, which
+    cannot be recovered from the customer records; "total_revenue" and
+    "average_daily" cover the days with data ("days_with_data").
+    """
+    try:
+        series = get_customer_rollups().daily_series(days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    known = ~np.isnan(series["collected"])
+    trend_data = [
+        {
+            "date": day,
+            "revenue": collected,
+            "billed": billed,
+            "collected": collected,
+            "customers": int(customers)
+        }
+        for day, billed, collected, customers in zip(
+            series["period"], _nullable(series["billed"]), _nullable(series["collected"]),
+            series["total_customers"].tolist()
+        )
+    ]
+    days_with_data = int(known.sum())
+    total_revenue = float(series["collected"][known].sum())
+    return _conditional_response(request, render_json({
         "data": trend_data,
         "period": f"Last {days} days",
-        "total_revenue": sum(d["revenue"] for d in trend_data),
-        "average_daily": sum(d["revenue"] for d in trend_data) / len(trend_data)
-    }
+        "total_revenue": total_revenue,
+        "average_daily": total_revenue / days_with_data if days_with_data else None,
+        "days_with_data": days_with_data
+    }))
 
 @router.get("/charts/customer-growth")
 async def get_customer_growth_chart(
+    request: Request,
     months: int = 12,
-    current_user: User = Depends(lambda creds: get_current_user(creds.credentials)),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    current_user: User = Depends(current_user)
 ):
-    """Get customer growth data for charts"""
-    growth_data = []
-    base_customers = 80
-    
-    for i in range(months):
-        month_date = datetime.now() - timedelta(days=30*(months-i-1))
-        customers = base_customers + (i * 8) + random.randint(-3, 7)
-        growth_data.append({
-            "month": month_date.strftime("%Y-%m"),
-            "total_customers": customers,
-            "new_customers": random.randint(5, 15),
-            "churned_customers": random.randint(1, 4)
-        })
-    
-    return {
+    """Get customer growth data for charts (from the monthly rollups)"""
+    try:
+        series = get_customer_rollups().monthly_series(months)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    growth_data = [
+        {
+            "month": month,
+            "total_customers": int(total),
+            "new_customers": int(new),
+            "churned_customers": int(churned)
+        }
+        for month, total, new, churned in zip(
+            series["period"], series["total_customers"].tolist(), series["new_customers"].tolist(),
+            series["churned_customers"].tolist()
+        )
+    ]
+    first, last = growth_data[0]["total_customers"], growth_data[-1]["total_customers"]
+    return _conditional_response(request, render_json({
         "data": growth_data,
         "period": f"Last {months} months",
-        "growth_rate": ((growth_data[-1]["total_customers"] - growth_data[0]["total_customers"]) / growth_data[0]["total_customers"] * 100) if growth_data else 0
-    }
\ No newline at end of file
+        "growth_rate": ((last - first) / first * 100) if first else 0
+    }))
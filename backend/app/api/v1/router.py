@@ -1,11 +1,12 @@
 from fastapi import APIRouter
-from app.api.v1 import customers, dashboard
+from app.api.v1 import billing, customers, dashboard
 
 router = APIRouter()
 
 # Include all v1 routes
 router.include_router(customers.router, prefix="/customers", tags=["Customers"])
 router.include_router(dashboard.router, prefix="/dashboard", tags=["Dashboard"])
+router.include_router(billing.router, prefix="/billing", tags=["Billing"])
 
 # Root endpoint for API v1
 @router.get("/")
@@ -18,6 +19,7 @@ async def api_v1_root():
             "authentication": "/auth/login",
             "customers": "/api/v1/customers",
             "dashboard": "/api/v1/dashboard", 
+            "billing": "/api/v1/billing/runs",
             "demo_credentials": "/auth/demo-credentials",
             "sample_data": "/api/v1/customers/demo/sample-data"
         },
@@ -42,14 +44,39 @@ async def api_info():
         ],
         "endpoints": {
             "POST /auth/login": "Authenticate user and get JWT token",
+            "POST /auth/refresh": "Exchange a refresh token for new tokens",
+            "POST /auth/logout": "Revoke the current session",
             "GET /auth/me": "Get current user info",
+            "GET /auth/hashing": "Password hashing pool latency and backlog",
+            "GET /auth/token-cache": "Verified-token cache hit/miss counters",
+            "GET /auth/revocations": "Revocation list counters",
+            "GET /auth/rate-limits": "Rate limiting rules and refused requests",
             "GET /auth/demo-credentials": "Get demo login credentials",
             "GET /api/v1/customers": "List all customers",
             "GET /api/v1/customers/stats": "Get customer statistics", 
             "POST /api/v1/customers": "Create new customer",
+            "POST /api/v1/customers/import": "Bulk import customers (CSV or NDJSON body)",
+            "GET /api/v1/customers/export": "Stream customers as NDJSON or CSV",
+            "GET /api/v1/customers/changes": "Customer change feed since an offset",
+            "GET /api/v1/customers/suspensions": "Upcoming automatic suspensions",
+            "GET /api/v1/customers/geo/bbox": "Map markers inside a viewport",
+            "GET /api/v1/customers/geo/radius": "Customers within a radius of a point",
+            "GET /api/v1/customers/geo/nearest": "k nearest customers to a point",
+            "GET /api/v1/customers/network/ip": "Customers by IP address",
+            "GET /api/v1/customers/network/mac": "Customers by MAC address",
+            "GET /api/v1/customers/network/cidr": "Customers inside a CIDR block",
+            "POST /api/v1/customers/network/resolve": "Batch IP/MAC to customer lookup",
+            "POST /api/v1/customers/bulk-update": "Apply one update to many customers",
             "GET /api/v1/customers/{id}": "Get customer by ID",
+            "POST /api/v1/billing/runs": "Start or resume a monthly billing run",
+            "GET /api/v1/billing/runs": "List billing runs",
+            "GET /api/v1/billing/runs/{period}": "Billing run progress, totals and stage timings",
             "GET /api/v1/dashboard/overview": "Get dashboard overview",
             "GET /api/v1/dashboard/activities": "Get recent activities",
+            "GET /api/v1/dashboard/cache": "Dashboard cache hit ratio and recompute latency",
+            "POST /api/v1/dashboard/stream/ticket": "Single-use ticket for opening a stream from EventSource",
+            "GET /api/v1/dashboard/stream": "Server-Sent Events of dashboard section changes",
+            "GET /api/v1/dashboard/stream/stats": "Open dashboard streams and events sent",
             "GET /api/v1/dashboard/charts/revenue-trend": "Revenue trend data"
         },
         "authentication": {
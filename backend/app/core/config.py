@@ -0,0 +1,158 @@
+import os
+from typing import Dict
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_map(name: str) -> Dict[str, str]:
+    """A "key=value,key=value" variable as a dict"""
+    pairs = (item.partition("=") for item in os.getenv(name, "").split(",") if item.strip())
+    return {key.strip(): value.strip() for key, _, value in pairs}
+
+
+# Application
+DEBUG = _env_bool("DEBUG")
+
+# Customer storage: "memory" (default) or "sql"
+CUSTOMER_STORE = os.getenv("CUSTOMER_STORE", "memory")
+
+# Database
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./n2p_crm.db")
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "20"))
+DATABASE_POOL_TIMEOUT = int(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+DATABASE_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", "3600"))
+
+# Customer change feed: append-only segment files, oldest segments dropped
+# once more than CHANGE_LOG_MAX_SEGMENTS exist
+CHANGE_LOG_ENABLED = _env_bool("CHANGE_LOG_ENABLED", True)
+CHANGE_LOG_DIR = os.getenv("CHANGE_LOG_DIR", "./data/customer_changes")
+CHANGE_LOG_SEGMENT_EVENTS = int(os.getenv("CHANGE_LOG_SEGMENT_EVENTS", "10000"))
+CHANGE_LOG_MAX_SEGMENTS = int(os.getenv("CHANGE_LOG_MAX_SEGMENTS", "64"))
+
+# In-memory store persistence: periodic snapshots plus a write-ahead log
+# replayed on startup. WAL_DURABILITY is "always" (fsync per write),
+# "group" (concurrent writes share an fsync) or "interval" (fsync every
+# WAL_FSYNC_INTERVAL_MS; a machine crash can lose that much)
+PERSISTENCE_ENABLED = _env_bool("PERSISTENCE_ENABLED", True)
+PERSISTENCE_DIR = os.getenv("PERSISTENCE_DIR", "./data/customer_store")
+WAL_DURABILITY = os.getenv("WAL_DURABILITY", "group")
+WAL_FSYNC_INTERVAL_MS = int(os.getenv("WAL_FSYNC_INTERVAL_MS", "1000"))
+SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300"))
+SNAPSHOT_WAL_BYTES = int(os.getenv("SNAPSHOT_WAL_BYTES", str(64 * 1024 * 1024)))
+
+# Automatic suspension: an active, overdue customer is suspended
+# AUTO_SUSPEND_DAYS after the end of the billing cycle their last payment
+# covered, with notices the given numbers of days before
+AUTO_SUSPEND_ENABLED = _env_bool("AUTO_SUSPEND_ENABLED")
+AUTO_SUSPEND_DAYS = int(os.getenv("AUTO_SUSPEND_DAYS", "5"))
+AUTO_SUSPEND_NOTIFICATION_DAYS = tuple(
+    int(days) for days in os.getenv("AUTO_SUSPEND_NOTIFICATION_DAYS", "3,1").split(",") if days.strip()
+)
+BILLING_CYCLE_DAYS = int(os.getenv("BILLING_CYCLE_DAYS", "30"))
+
+# Monthly billing runs: every active customer is charged their fee
+# (prorated from a mid-month installation_date) plus IVA at
+# BILLING_TAX_RATE, on top of the balance they carry. Invoice documents
+# are rendered by BILLING_RENDER_WORKERS processes, one chunk of
+# BILLING_CHUNK_SIZE customers at a time
+BILLING_CURRENCY = os.getenv("BILLING_CURRENCY", "MXN")
+BILLING_TAX_RATE = float(os.getenv("BILLING_TAX_RATE", "0.16"))
+BILLING_COMPANY_NAME = os.getenv("BILLING_COMPANY_NAME", "N2P ISP")
+BILLING_RFC = os.getenv("BILLING_RFC", "XAXX010101000")
+BILLING_RUN_DIR = os.getenv("BILLING_RUN_DIR", "./data/billing_runs")
+BILLING_CHUNK_SIZE = int(os.getenv("BILLING_CHUNK_SIZE", "5000"))
+BILLING_RENDER_WORKERS = int(os.getenv("BILLING_RENDER_WORKERS", str(os.cpu_count() or 1)))
+BILLING_INVOICE_FORMATS = tuple(
+    format.strip() for format in os.getenv("BILLING_INVOICE_FORMATS", "xml,pdf").split(",") if format.strip()
+)
+
+# Password hashing: bcrypt cost for new hashes (existing ones are rehashed
+# on their next login), run on LOGIN_HASH_WORKERS threads niced by
+# LOGIN_HASH_NICE so request handling keeps the CPU first. Logins beyond
+# LOGIN_MAX_PENDING waiting or running checks are shed with a 503
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+LOGIN_HASH_WORKERS = int(os.getenv("LOGIN_HASH_WORKERS", str(os.cpu_count() or 1)))
+LOGIN_MAX_PENDING = int(os.getenv("LOGIN_MAX_PENDING", str(2 * LOGIN_HASH_WORKERS)))
+LOGIN_HASH_NICE = int(os.getenv("LOGIN_HASH_NICE", "10"))
+
+# Verified-token cache: resolved users of recently seen bearer tokens, kept
+# until the token expires or TOKEN_CACHE_TTL_SECONDS pass (0 disables)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+
+# Token lifetimes: access tokens are short-lived and renewed with a refresh
+# token (POST /auth/refresh), which is rotated on every use
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+# Rate limiting: token buckets per client IP, or per user for requests
+# with a valid bearer token. Only the expensive routes are limited:
+# logins and refreshes per IP, search and filter scans per user, and
+# customer exports, imports and bulk updates per user. Everything else
+# (cached dashboard sections, streams, lookups) is not. Buckets idle
+# for RATE_LIMIT_IDLE_SECONDS are dropped. RATE_LIMIT_BACKEND is "memory"
+# (each worker counts alone) or "redis" (workers share REDIS_URL)
+RATE_LIMIT_ENABLED = _env_bool("RATE_LIMIT_ENABLED", True)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_LOGIN_PER_MINUTE = int(os.getenv("RATE_LIMIT_LOGIN_PER_MINUTE", "10"))
+RATE_LIMIT_LOGIN_BURST = int(os.getenv("RATE_LIMIT_LOGIN_BURST", "5"))
+RATE_LIMIT_SEARCH_PER_MINUTE = int(os.getenv("RATE_LIMIT_SEARCH_PER_MINUTE", "30"))
+RATE_LIMIT_SEARCH_BURST = int(os.getenv("RATE_LIMIT_SEARCH_BURST", "10"))
+RATE_LIMIT_BULK_PER_MINUTE = int(os.getenv("RATE_LIMIT_BULK_PER_MINUTE", "6"))
+RATE_LIMIT_BULK_BURST = int(os.getenv("RATE_LIMIT_BULK_BURST", "3"))
+RATE_LIMIT_IDLE_SECONDS = int(os.getenv("RATE_LIMIT_IDLE_SECONDS", "600"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Dashboard response cache, per section and role: a section is recomputed
+# DASHBOARD_CACHE_TTL_SECONDS after it was computed, or after a customer
+# change, in the background while the previous value is still served for
+# up to DASHBOARD_CACHE_STALE_SECONDS (TTL 0 disables the cache)
+DASHBOARD_CACHE_TTL_SECONDS = int(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "15"))
+DASHBOARD_CACHE_STALE_SECONDS = int(os.getenv("DASHBOARD_CACHE_STALE_SECONDS", "300"))
+
+# Dashboard overview: sections are computed concurrently, each within its
+# time budget (DASHBOARD_SECTION_TIMEOUT_MS, or a per-section override in
+# DASHBOARD_SECTION_TIMEOUTS_MS, e.g. "revenue=500,network=100"); a late
+# section is served from its last cached value, or left out with the
+# overview marked partial, and finishes in the background
+DASHBOARD_SECTION_TIMEOUT_MS = int(os.getenv("DASHBOARD_SECTION_TIMEOUT_MS", "250"))
+DASHBOARD_SECTION_TIMEOUTS_MS = {
+    section: int(ms) for section, ms in _env_map("DASHBOARD_SECTION_TIMEOUTS_MS").items()
+}
+
+# Column-store aggregations (revenue summary and breakdowns) run on
+# ANALYTICS_WORKERS threads so the event loop keeps serving (0: on the loop)
+ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS", "2"))
+
+# Chart rollups: daily and monthly buckets of revenue and customer counts
+# in fixed-size rings of ROLLUP_DAYS days and ROLLUP_MONTHS months, saved
+# to ROLLUP_PATH on shutdown (empty: not saved, rebuilt on every start)
+ROLLUP_DAYS = int(os.getenv("ROLLUP_DAYS", "400"))
+ROLLUP_MONTHS = int(os.getenv("ROLLUP_MONTHS", "60"))
+ROLLUP_PATH = os.getenv("ROLLUP_PATH", "./data/customer_rollups.npz")
+
+# Dashboard stream (GET /dashboard/stream): subscribed sections are checked
+# every DASHBOARD_STREAM_INTERVAL_SECONDS and their changes pushed; idle
+# connections get a keep-alive comment every DASHBOARD_STREAM_KEEPALIVE_SECONDS.
+# Streams end when the token they were opened with expires or is revoked
+DASHBOARD_STREAM_INTERVAL_SECONDS = float(os.getenv("DASHBOARD_STREAM_INTERVAL_SECONDS", "1"))
+DASHBOARD_STREAM_KEEPALIVE_SECONDS = float(os.getenv("DASHBOARD_STREAM_KEEPALIVE_SECONDS", "15"))
+DASHBOARD_STREAM_MAX_SUBSCRIBERS = int(os.getenv("DASHBOARD_STREAM_MAX_SUBSCRIBERS", "2000"))
+# Browsers open the stream with a ticket (POST /dashboard/stream/ticket)
+# instead of a token in the URL: single-use, good for STREAM_TICKET_SECONDS,
+# at most STREAM_TICKET_MAX outstanding
+STREAM_TICKET_SECONDS = int(os.getenv("STREAM_TICKET_SECONDS", "30"))
+STREAM_TICKET_MAX = int(os.getenv("STREAM_TICKET_MAX", "10000"))
+
+# System metrics (GET /dashboard/metrics): /proc is read every
+# METRICS_SAMPLE_SECONDS into a ring of METRICS_HISTORY samples, with request
+# latency percentiles over up to METRICS_LATENCY_SAMPLES requests per sample;
+# disk usage is that of the filesystem holding METRICS_DISK_PATH
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+METRICS_SAMPLE_SECONDS = float(os.getenv("METRICS_SAMPLE_SECONDS", "5"))
+METRICS_HISTORY = int(os.getenv("METRICS_HISTORY", "60"))
+METRICS_LATENCY_SAMPLES = int(os.getenv("METRICS_LATENCY_SAMPLES", "10000"))
+METRICS_DISK_PATH = os.getenv("METRICS_DISK_PATH", ".")
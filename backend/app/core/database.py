@@ -0,0 +1,108 @@
+"""
+Async SQL connection management (SQLAlchemy async engine + connection pool).
+
+DATABASE_URL may use the plain driver-less schemes from .env.example; they
+are mapped to the async drivers: sqlite -> aiosqlite, postgresql -> asyncpg.
+"""
+
+import logging
+from typing import Optional
+
+from app.core.config import (
+    DATABASE_URL, DATABASE_POOL_SIZE, DATABASE_POOL_TIMEOUT, DATABASE_POOL_RECYCLE
+)
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Rewrite a database URL to use its async driver"""
+    scheme, sep, rest = url.partition("://")
+    if "+" in scheme or not sep:
+        return url
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+class Database:
+    """Lazily created async engine with a pooled set of connections"""
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        pool_size: int = DATABASE_POOL_SIZE,
+        pool_timeout: int = DATABASE_POOL_TIMEOUT,
+        pool_recycle: int = DATABASE_POOL_RECYCLE,
+        echo: bool = False
+    ):
+        self.url = async_database_url(url or DATABASE_URL)
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.pool_recycle = pool_recycle
+        self.echo = echo
+        self.engine = None
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.url.startswith("sqlite")
+
+    async def connect(self):
+        """Create the engine and its connection pool"""
+        if self.engine is not None:
+            return self.engine
+
+        from sqlalchemy import event
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+        options = {"echo": self.echo, "pool_pre_ping": True}
+        if self.is_sqlite:
+            if ":memory:" not in self.url:
+                # aiosqlite defaults to NullPool (a new connection per checkout)
+                options.update(
+                    poolclass=AsyncAdaptedQueuePool,
+                    pool_size=self.pool_size,
+                    pool_timeout=self.pool_timeout,
+                )
+        else:
+            options.update(
+                pool_size=self.pool_size,
+                max_overflow=self.pool_size,
+                pool_timeout=self.pool_timeout,
+                pool_recycle=self.pool_recycle,
+                # Prepared statements are cached per pooled asyncpg connection
+                connect_args={"prepared_statement_cache_size": 512},
+            )
+        self.engine = create_async_engine(self.url, **options)
+
+        if self.is_sqlite:
+            @event.listens_for(self.engine.sync_engine, "connect")
+            def _sqlite_pragmas(dbapi_connection, _):
+                cursor = dbapi_connection.cursor()
+                # WAL lets readers proceed while a writer commits
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute("PRAGMA busy_timeout=5000")
+                cursor.close()
+
+        logger.info(f"Database pool ready ({self.url.split('://')[0]}, size {self.pool_size})")
+        return self.engine
+
+    def begin(self):
+        """Transactional connection from the pool (async context manager)"""
+        return self.engine.begin()
+
+    def connection(self):
+        """Non-transactional connection from the pool (async context manager)"""
+        return self.engine.connect()
+
+    async def dispose(self):
+        """Close every pooled connection"""
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
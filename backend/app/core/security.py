@@ -0,0 +1,423 @@
+"""
+Password hashing off the event loop, and the verified-token cache.
+
+A bcrypt check is a quarter of a second of CPU at cost 12; run inline in
+an async handler it stalls every other request on the worker. The
+PasswordHasher runs checks on a small thread pool (bcrypt releases the
+GIL while hashing) and admits at most ``max_pending`` checks at a time,
+waiting or running: beyond that, callers get HashingOverloaded straight
+away, to be turned into a 503, instead of queueing for seconds. The pool
+threads run at a lower scheduling priority (``nice``), so on a busy CPU
+the event loop thread still gets it first when a request comes in.
+
+The TokenCache remembers the user a bearer token resolved to, so repeat
+requests skip the signature check, the user lookup and the model builds.
+
+The RevocationList holds the ids of tokens that must no longer be
+accepted before they expire.
+
+The TicketStore hands out single-use, short-lived tickets standing in for
+a bearer token where a client cannot send headers (browser EventSource),
+so the token itself never ends up in a URL or an access log.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import math
+import os
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from passlib.context import CryptContext
+
+from app.core.config import (
+    BCRYPT_ROUNDS, LOGIN_HASH_NICE, LOGIN_HASH_WORKERS, LOGIN_MAX_PENDING, STREAM_TICKET_SECONDS,
+    STREAM_TICKET_MAX, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS
+)
+
+# Recent durations kept for the latency percentiles
+LATENCY_WINDOW = 1024
+
+
+class HashingOverloaded(Exception):
+    """Too many password checks are already waiting"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many login attempts in progress; retry shortly")
+        self.retry_after = retry_after
+
+
+def _percentiles(samples) -> Dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 1)
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1] * 1000, 1)}
+
+
+def _lower_priority(nice: int):
+    """Pool thread initializer: raise the calling thread's nice value (Linux
+    schedules threads separately; elsewhere this is a no-op)"""
+    if nice <= 0 or not hasattr(os, "setpriority"):
+        return
+    try:
+        thread = threading.get_native_id()
+        os.setpriority(os.PRIO_PROCESS, thread, os.getpriority(os.PRIO_PROCESS, thread) + nice)
+    except OSError:
+        pass
+
+
+class PasswordHasher:
+    """bcrypt on a bounded, low-priority thread pool with admission control"""
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = LOGIN_HASH_WORKERS,
+                 max_pending: int = LOGIN_MAX_PENDING, nice: int = LOGIN_HASH_NICE):
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self.rounds = rounds
+        self.workers = max(workers, 1)
+        self.max_pending = max(max_pending, 1)
+        self.nice = nice
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="bcrypt",
+                                            initializer=_lower_priority, initargs=(nice,))
+        self.pending = 0
+        self.completed = 0
+        self.shed = 0
+        self._hash_times = deque(maxlen=LATENCY_WINDOW)  # bcrypt alone
+        self._total_times = deque(maxlen=LATENCY_WINDOW)  # queueing + bcrypt
+
+    def _timed(self, function: Callable, *args) -> Any:
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self._hash_times.append(time.perf_counter() - start)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained, stretched by
+        up to as much again at random so refused clients do not all come
+        back in the same instant"""
+        typical = _percentiles(self._hash_times)["p50"] / 1000 or 0.25
+        drain = max(1, math.ceil(self.pending * typical / self.workers))
+        return drain + random.randrange(drain + 1)
+
+    async def _run(self, function: Callable, *args) -> Any:
+        if self.pending >= self.max_pending:
+            self.shed += 1
+            raise HashingOverloaded(self.retry_after())
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._timed, function, *args
+            )
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self._total_times.append(time.perf_counter() - start)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(matches, new hash when the stored one uses outdated settings)"""
+        return await self._run(self.context.verify_and_update, password, hashed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bcrypt_rounds": self.rounds,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "nice": self.nice,
+            "completed": self.completed,
+            "shed": self.shed,
+            "hash_ms": _percentiles(self._hash_times),
+            "total_ms": _percentiles(self._total_times),
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class TokenCache:
+    """LRU of verified tokens -> resolved user, keyed by the token's SHA-256
+    digest (raw tokens are never kept).
+
+    An entry lives until the token's ``exp`` or for ``ttl`` seconds,
+    whichever comes first, and invalidate_user drops every entry of a user
+    whose record changed. Cached users are shared between requests and
+    must not be modified.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[bytes, Tuple[Any, float, str]]" = OrderedDict()
+        self._by_user: Dict[str, Set[bytes]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidated = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Any]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at, username = entry
+        if expires_at <= self.clock():
+            self._discard(key, username)
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return user
+
+    def put(self, token: str, user: Any, username: str, expires_at: float):
+        """Remember a verified token until ``expires_at`` (epoch seconds) at most"""
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        key = self._key(token)
+        self._entries[key] = (user, min(expires_at, self.clock() + self.ttl), username)
+        self._entries.move_to_end(key)
+        self._by_user.setdefault(username, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            oldest, (_, _, owner) = self._entries.popitem(last=False)
+            self._forget(oldest, owner)
+            self.evicted += 1
+
+    def invalidate_user(self, username: str):
+        """Drop every cached token of a user (deactivated, role changed, ...)"""
+        for key in self._by_user.pop(username, ()):
+            if self._entries.pop(key, None) is not None:
+                self.invalidated += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._by_user.clear()
+
+    def _discard(self, key: bytes, username: str):
+        del self._entries[key]
+        self._forget(key, username)
+
+    def _forget(self, key: bytes, username: str):
+        keys = self._by_user.get(username)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[username]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "invalidated": self.invalidated,
+        }
+
+
+class RevocationList:
+    """Revoked token ids, each kept until the token would have expired.
+
+    A dict answers is_revoked; a min-heap of expiry times lets revoke prune
+    the ids whose tokens have expired since, so the dict only ever holds
+    ids that could still be presented.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._revoked: Dict[str, float] = {}
+        self._expiries: List[Tuple[float, str]] = []  # min-heap of (expires_at, id)
+        self.checks = 0
+        self.hits = 0
+        self.pruned = 0
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def revoke(self, token_id: str, expires_at: float):
+        """Refuse ``token_id`` until ``expires_at`` (epoch seconds)"""
+        now = self.clock()
+        if expires_at <= now:
+            return
+        if expires_at <= self._revoked.get(token_id, 0.0):
+            return
+        self._revoked[token_id] = expires_at
+        heapq.heappush(self._expiries, (expires_at, token_id))
+        self.prune(now)
+
+    def is_revoked(self, token_id: str) -> bool:
+        self.checks += 1
+        expires_at = self._revoked.get(token_id)
+        if expires_at is None or expires_at <= self.clock():
+            return False
+        self.hits += 1
+        return True
+
+    def prune(self, now: Optional[float] = None):
+        """Forget ids whose tokens have expired"""
+        now = self.clock() if now is None else now
+        expiries = self._expiries
+        while expiries and expiries[0][0] <= now:
+            expires_at, token_id = heapq.heappop(expiries)
+            # Ids revoked again with a later expiry keep their newer entry
+            if self._revoked.get(token_id) == expires_at:
+                del self._revoked[token_id]
+                self.pruned += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "revoked": len(self._revoked),
+            "heap_entries": len(self._expiries),
+            "checks": self.checks,
+            "hits": self.hits,
+            "pruned": self.pruned,
+        }
+
+
+class TicketStore:
+    """Single-use tickets, each redeemable once within ``ttl`` seconds for
+    the value it was issued with. Only the tickets' SHA-256 digests are
+    kept; past ``maxsize`` outstanding tickets the oldest are dropped."""
+
+    def __init__(self, ttl: float = STREAM_TICKET_SECONDS, maxsize: int = STREAM_TICKET_MAX,
+                 clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        # Issue order is expiry order: expired tickets are at the front
+        self._tickets: "OrderedDict[bytes, Tuple[Any, float]]" = OrderedDict()
+        self.issued = 0
+        self.redeemed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._tickets)
+
+    @staticmethod
+    def _key(ticket: str) -> bytes:
+        return hashlib.sha256(ticket.encode()).digest()
+
+    def issue(self, value: Any) -> str:
+        now = self.clock()
+        self.prune(now)
+        ticket = secrets.token_urlsafe(24)
+        self._tickets[self._key(ticket)] = (value, now + self.ttl)
+        while len(self._tickets) > self.maxsize:
+            self._tickets.popitem(last=False)
+            self.expired += 1
+        self.issued += 1
+        return ticket
+
+    def redeem(self, ticket: str) -> Optional[Any]:
+        """The ticket's value, once; None for unknown, used or expired tickets"""
+        entry = self._tickets.pop(self._key(ticket), None)
+        if entry is None or entry[1] <= self.clock():
+            self.rejected += 1
+            return None
+        self.redeemed += 1
+        return entry[0]
+
+    def prune(self, now: Optional[float] = None):
+        """Forget expired tickets"""
+        now = self.clock() if now is None else now
+        tickets = self._tickets
+        while tickets:
+            key, (_, expires_at) = next(iter(tickets.items()))
+            if expires_at > now:
+                break
+            del tickets[key]
+            self.expired += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "outstanding": len(self._tickets),
+            "ttl_seconds": self.ttl,
+            "issued": self.issued,
+            "redeemed": self.redeemed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
+
+
+_hasher: Optional[PasswordHasher] = None
+_token_cache: Optional[TokenCache] = None
+_revocations: Optional[RevocationList] = None
+_tickets: Optional[TicketStore] = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    """The process-wide hasher, created on first use"""
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher()
+    return _hasher
+
+
+def set_password_hasher(hasher: Optional[PasswordHasher]):
+    global _hasher
+    _hasher = hasher
+
+
+def get_token_cache() -> TokenCache:
+    """The process-wide verified-token cache, created on first use"""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCache()
+    return _token_cache
+
+
+def set_token_cache(cache: Optional[TokenCache]):
+    global _token_cache
+    _token_cache = cache
+
+
+def get_revocation_list() -> RevocationList:
+    """The process-wide revocation list, created on first use"""
+    global _revocations
+    if _revocations is None:
+        _revocations = RevocationList()
+    return _revocations
+
+
+def set_revocation_list(revocations: Optional[RevocationList]):
+    global _revocations
+    _revocations = revocations
+
+
+def get_ticket_store() -> TicketStore:
+    """The process-wide stream ticket store, created on first use"""
+    global _tickets
+    if _tickets is None:
+        _tickets = TicketStore()
+    return _tickets
+
+
+def set_ticket_store(tickets: Optional[TicketStore]):
+    global _tickets
+    _tickets = tickets
@@ -0,0 +1,104 @@
+"""
+Shared FastAPI dependencies.
+
+Routes take the authenticated user from ``current_user`` (any role) or
+from a role requirement such as ``manager_user``:
+
+    @router.delete("/{customer_id}")
+    async def delete_customer_endpoint(customer_id: str, current_user: User = Depends(manager_user)):
+
+The bearer header is parsed and the token resolved once per request:
+FastAPI reuses a dependency's result within a request, and the user is
+also left on ``request.state.user`` for code outside the dependency graph.
+
+Streams need more than the user: ``token_grant`` also keeps the token's
+expiry and ids, so a long-lived response can end once the token would no
+longer be accepted. ``stream_grant`` also accepts a single-use ``ticket``
+query parameter (see POST /dashboard/stream/ticket), for browser
+EventSource streams, which cannot set headers; bearer tokens are never
+taken from the URL, where access logs would keep them.
+"""
+
+from typing import Callable, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.models.user import User, UserRole
+from app.services.auth_service import TokenGrant, get_current_user, get_token_grant, redeem_stream_ticket
+
+# Missing credentials are answered with 401 here rather than HTTPBearer's 403
+bearer = HTTPBearer(auto_error=False)
+
+# A role is granted everything the roles below it are
+ROLE_RANK = {UserRole.TECHNICIAN: 0, UserRole.MANAGER: 1, UserRole.ADMIN: 2}
+
+
+async def current_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)
+) -> User:
+    """The user the request's bearer token belongs to (401 otherwise)"""
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user = get_current_user(credentials.credentials)
+    request.state.user = user
+    return user
+
+
+async def token_grant(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)
+) -> TokenGrant:
+    """The request's bearer token with its user, expiry and ids (401 otherwise)"""
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    grant = get_token_grant(credentials.credentials)
+    request.state.user = grant.user
+    return grant
+
+
+async def stream_grant(
+    request: Request,
+    ticket: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)
+) -> TokenGrant:
+    """token_grant, or the grant behind a single-use stream ``ticket``"""
+    if credentials is None and ticket:
+        grant = redeem_stream_ticket(ticket)
+        request.state.user = grant.user
+        return grant
+    return await token_grant(request, credentials)
+
+
+def require_role(role: UserRole) -> Callable:
+    """Dependency admitting users with ``role`` or a higher one (403 otherwise)"""
+    minimum = ROLE_RANK[role]
+
+    async def dependency(user: User = Depends(current_user)) -> User:
+        if ROLE_RANK.get(user.role, -1) < minimum:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Requires the {role.value} role or higher",
+            )
+        return user
+
+    dependency.__name__ = f"require_{role.value}"
+    return dependency
+
+
+# Module-level instances, so every route shares (and FastAPI caches) one per role
+technician_user = current_user
+manager_user = require_role(UserRole.MANAGER)
+admin_user = require_role(UserRole.ADMIN)
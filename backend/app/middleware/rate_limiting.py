@@ -0,0 +1,329 @@
+"""
+Token-bucket rate limiting for the CPU-heavy parts of the API.
+
+Each rule covers some routes and gives every client key a bucket of
+``burst`` tokens, refilled at ``per_minute`` tokens a minute; a request
+takes one token or is refused with 429 and Retry-After. Keys are the
+client IP, or for per-user rules the user of a valid bearer token (the
+user is resolved through the token cache and left on request.state, so
+the route's current_user dependency does not resolve it again).
+
+Buckets live in a BucketStore:
+
+- InMemoryBucketStore keeps them in the worker, in an LRU ordered by last
+  use: idle buckets are dropped from its cold end as requests come in,
+  so memory stays proportional to the clients seen recently.
+- RedisBucketStore keeps them in Redis (or anything speaking its
+  protocol with Lua scripting), so all workers share the same limits.
+  Each bucket is a small hash updated by one script call and expires
+  once it would have refilled. If Redis is unreachable, requests are let
+  through rather than refused.
+
+The middleware is plain ASGI so unmatched requests pay only the rule scan.
+"""
+
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import (
+    RATE_LIMIT_BACKEND, RATE_LIMIT_BULK_BURST, RATE_LIMIT_BULK_PER_MINUTE, RATE_LIMIT_IDLE_SECONDS,
+    RATE_LIMIT_LOGIN_BURST, RATE_LIMIT_LOGIN_PER_MINUTE, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SEARCH_BURST,
+    RATE_LIMIT_SEARCH_PER_MINUTE, REDIS_URL
+)
+from app.services.auth_service import get_current_user
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """Limit for the requests matching ``path`` (a trailing ``*`` matches a
+    prefix) and one of ``methods``; ``per`` is "ip" or "user"."""
+    name: str
+    path: str
+    per_minute: int
+    burst: int
+    methods: Tuple[str, ...] = ("GET", "POST", "PUT", "PATCH", "DELETE")
+    per: str = "ip"
+
+    @property
+    def rate(self) -> float:
+        """Tokens refilled per second"""
+        return self.per_minute / 60.0
+
+    def matches(self, method: str, path: str) -> bool:
+        if method not in self.methods:
+            return False
+        if self.path.endswith("*"):
+            return path.startswith(self.path[:-1])
+        return path == self.path or path == self.path + "/"
+
+
+# First matching rule applies. Only routes that cost real CPU are listed:
+# cached dashboard sections and event streams must not eat into a budget
+# meant for scans and bulk work
+DEFAULT_RULES = (
+    RateLimitRule("login", "/auth/login", RATE_LIMIT_LOGIN_PER_MINUTE, RATE_LIMIT_LOGIN_BURST, methods=("POST",)),
+    RateLimitRule("refresh", "/auth/refresh", RATE_LIMIT_LOGIN_PER_MINUTE, RATE_LIMIT_LOGIN_BURST, methods=("POST",)),
+    RateLimitRule("search", "/api/v1/customers/search", RATE_LIMIT_SEARCH_PER_MINUTE, RATE_LIMIT_SEARCH_BURST,
+                  methods=("GET",), per="user"),
+    RateLimitRule("filter", "/api/v1/customers/filter", RATE_LIMIT_SEARCH_PER_MINUTE, RATE_LIMIT_SEARCH_BURST,
+                  methods=("GET",), per="user"),
+    RateLimitRule("export", "/api/v1/customers/export", RATE_LIMIT_BULK_PER_MINUTE, RATE_LIMIT_BULK_BURST,
+                  methods=("GET",), per="user"),
+    RateLimitRule("import", "/api/v1/customers/import", RATE_LIMIT_BULK_PER_MINUTE, RATE_LIMIT_BULK_BURST,
+                  methods=("POST",), per="user"),
+    RateLimitRule("bulk-update", "/api/v1/customers/bulk-update", RATE_LIMIT_BULK_PER_MINUTE,
+                  RATE_LIMIT_BULK_BURST, methods=("POST",), per="user"),
+)
+
+
+class BucketStore(ABC):
+    """Where token buckets are kept"""
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, capacity: int) -> Tuple[bool, float]:
+        """Take a token from ``key``'s bucket: (allowed, seconds until one is available)"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        pass
+
+    async def close(self):
+        pass
+
+
+class InMemoryBucketStore(BucketStore):
+    """Buckets in this worker: key -> [tokens, last update], in LRU order.
+
+    A bucket unused for ``idle_seconds`` is dropped; it would be full by
+    then as long as ``idle_seconds`` covers the slowest refill (burst /
+    rate), so dropping it changes nothing. Past ``max_keys`` the least
+    recently used buckets are dropped early.
+    """
+
+    def __init__(self, idle_seconds: float = RATE_LIMIT_IDLE_SECONDS, max_keys: int = RATE_LIMIT_MAX_KEYS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.idle_seconds = idle_seconds
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # key -> [tokens, updated at]
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def take(self, key: str, rate: float, capacity: int) -> Tuple[bool, float]:
+        now = self.clock()
+        buckets = self._buckets
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [float(capacity), now]
+            self._evict(now)
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            buckets.move_to_end(key)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True, 0.0
+        return False, (1 - bucket[0]) / rate
+
+    def _evict(self, now: float):
+        # The coldest buckets are at the front; stop at the first live one
+        buckets = self._buckets
+        cutoff = now - self.idle_seconds
+        while buckets:
+            key, (_, updated) = next(iter(buckets.items()))
+            if updated > cutoff and len(buckets) <= self.max_keys:
+                break
+            del buckets[key]
+            self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "keys": len(self._buckets), "max_keys": self.max_keys,
+                "idle_seconds": self.idle_seconds, "evicted": self.evicted}
+
+
+# KEYS[1] = bucket; ARGV = rate per second, capacity. Uses the server clock
+# so every worker sees the same time; returns {allowed, retry_after}
+TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBucketStore(BucketStore):
+    """Buckets shared by every worker through Redis (redis-py's asyncio client)"""
+
+    def __init__(self, client: Any = None, url: str = REDIS_URL, prefix: str = "ratelimit:"):
+        if client is None:
+            import redis.asyncio as redis  # only needed with RATE_LIMIT_BACKEND=redis
+            client = redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(TAKE_TOKEN_SCRIPT)
+        self.errors = 0
+
+    async def take(self, key: str, rate: float, capacity: int) -> Tuple[bool, float]:
+        try:
+            allowed, retry_after = await self._take(keys=[self.prefix + key], args=[rate, capacity])
+        except Exception as e:
+            # Fail open: an unreachable Redis must not take the API down with it
+            self.errors += 1
+            if self.errors == 1 or self.errors % 1000 == 0:
+                logger.warning(f"Rate limiting skipped, Redis unavailable ({self.errors} errors): {e}")
+            return True, 0.0
+        return bool(int(allowed)), float(retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "errors": self.errors}
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def _bearer_token(headers: Iterable[Tuple[bytes, bytes]]) -> Optional[str]:
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token.strip() if scheme.lower() == "bearer" and token else None
+    return None
+
+
+class RateLimiter:
+    """Rules plus the store their buckets live in"""
+
+    def __init__(self, store: Optional[BucketStore] = None, rules: Iterable[RateLimitRule] = DEFAULT_RULES):
+        self.store = store or create_bucket_store()
+        self.rules = tuple(rules)
+        self.allowed: Dict[str, int] = {rule.name: 0 for rule in self.rules}
+        self.limited: Dict[str, int] = {rule.name: 0 for rule in self.rules}
+
+    def rule_for(self, method: str, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return None
+
+    def client_key(self, rule: RateLimitRule, scope: Dict[str, Any]) -> str:
+        if rule.per == "user":
+            token = _bearer_token(scope["headers"])
+            if token:
+                try:
+                    user = get_current_user(token)
+                except HTTPException:
+                    pass  # invalid token: limited by IP, refused later by the route
+                else:
+                    scope.setdefault("state", {})["user"] = user
+                    return f"{rule.name}:user:{user.username}"
+        client = scope.get("client")
+        return f"{rule.name}:ip:{client[0] if client else 'unknown'}"
+
+    async def check(self, scope: Dict[str, Any]) -> Optional[Tuple[RateLimitRule, float]]:
+        """None when the request may proceed, else (rule, retry after seconds)"""
+        rule = self.rule_for(scope["method"], scope["path"])
+        if rule is None:
+            return None
+        allowed, retry_after = await self.store.take(self.client_key(rule, scope), rule.rate, rule.burst)
+        if allowed:
+            self.allowed[rule.name] += 1
+            return None
+        self.limited[rule.name] += 1
+        return rule, retry_after
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "store": self.store.stats(),
+            "rules": {
+                rule.name: {"path": rule.path, "per": rule.per, "per_minute": rule.per_minute, "burst": rule.burst,
+                            "allowed": self.allowed[rule.name], "limited": self.limited[rule.name]}
+                for rule in self.rules
+            },
+        }
+
+
+class RateLimitMiddleware:
+    """ASGI middleware refusing requests over their rule's limit with 429"""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limiter = self.limiter or get_rate_limiter()
+        refused = await limiter.check(scope)
+        if refused is None:
+            return await self.app(scope, receive, send)
+
+        rule, retry_after = refused
+        body = b'{"detail":"Too many requests; retry later"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+                (b"x-ratelimit-limit", f"{rule.per_minute}/minute; burst={rule.burst}".encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_bucket_store() -> BucketStore:
+    """The bucket store selected by RATE_LIMIT_BACKEND"""
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisBucketStore()
+    if RATE_LIMIT_BACKEND != "memory":
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND {RATE_LIMIT_BACKEND!r} (use 'memory' or 'redis')")
+    return InMemoryBucketStore()
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """The process-wide rate limiter, created on first use"""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]):
+    global _limiter
+    _limiter = limiter
+
+
+async def close_rate_limiter():
+    global _limiter
+    if _limiter is not None:
+        await _limiter.store.close()
+        _limiter = None
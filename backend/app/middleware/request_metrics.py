@@ -0,0 +1,31 @@
+"""
+Request latency recording for the system metrics (app.services.system_metrics).
+
+Plain ASGI: the duration is taken when the response starts, so streamed
+responses (exports, dashboard streams) count their time to first byte,
+not how long they stay open.
+"""
+
+import time
+
+from app.services.system_metrics import get_system_metrics
+
+
+class RequestMetricsMiddleware:
+    """Record every HTTP request's duration and status"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        recorder = get_system_metrics().requests
+        started = time.perf_counter()
+
+        async def send_recorded(message):
+            if message["type"] == "http.response.start":
+                recorder.record(time.perf_counter() - started, message["status"])
+            await send(message)
+
+        await self.app(scope, receive, send_recorded)
@@ -1,18 +1,52 @@
 import os
+import secrets
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import NamedTuple, Optional, Tuple
 import jwt
 from passlib.context import CryptContext
+from pydantic import BaseModel
 from fastapi import HTTPException, status
+from app.core.config import ACCESS_TOKEN_EXPIRE_MINUTES, BCRYPT_ROUNDS, REFRESH_TOKEN_EXPIRE_DAYS
+from app.core.security import (
+    HashingOverloaded, get_password_hasher, get_revocation_list, get_ticket_store, get_token_cache
+)
 from app.models.user import User, UserInDB, Token, LoginRequest, UserRole
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing (logins check passwords on the hasher's thread pool,
+# see app.core.security)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # JWT settings
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
+
+# Every login starts a session: its access and refresh tokens carry the
+# session id ("sid") and their own id ("jti"). Logging out revokes the
+# session, and a refresh token is revoked once it has been exchanged
+REFRESH_TOKEN_LIFETIME = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+
+class TokenGrant(NamedTuple):
+    """A verified access token: its user, when it expires (epoch seconds),
+    and the ids whose revocation ends it (its own and its session's)"""
+    user: User
+    expires_at: float
+    token_ids: Tuple[str, ...]
+
+
+class TokenPair(Token):
+    """Login and refresh response: an access token plus its refresh token"""
+    refresh_token: str
+    refresh_expires_in: int
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
 
 # In-memory user storage (later replace with database)
 fake_users_db = {
@@ -78,17 +112,51 @@ def get_user(username: str) -> Optional[UserInDB]:
         return UserInDB(**user_dict)
     return None
 
-def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
-    """Authenticate user credentials"""
+def update_user(username: str, changes: dict) -> Optional[UserInDB]:
+    """Change fields of a user (role, is_active, ...); their cached tokens are
+    dropped so the change applies to the next request"""
+    if username not in fake_users_db:
+        return None
+    fake_users_db[username].update(changes, updated_at=datetime.now())
+    get_token_cache().invalidate_user(username)
+    return get_user(username)
+
+def _public_user(user: UserInDB) -> User:
+    """Public user model (without hashed_password)"""
+    return User(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        full_name=user.full_name,
+        role=user.role,
+        is_active=user.is_active,
+        phone=user.phone,
+        department=user.department,
+        created_at=user.created_at,
+        updated_at=user.updated_at,
+        last_login=user.last_login,
+        login_count=user.login_count
+    )
+
+async def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
+    """Authenticate user credentials without blocking the event loop.
+    
+    Raises HashingOverloaded when too many checks are already waiting.
+    """
     user = get_user(username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    matches, new_hash = await get_password_hasher().verify(password, user.hashed_password)
+    if not matches:
         return None
+    if new_hash:
+        # Stored with other settings than BCRYPT_ROUNDS: upgrade it
+        fake_users_db[username]["hashed_password"] = new_hash
     
     # Update login stats
     fake_users_db[username]["last_login"] = datetime.now()
     fake_users_db[username]["login_count"] += 1
+    get_token_cache().invalidate_user(username)
     
     return user
 
@@ -104,20 +172,66 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def decode_access_token(token: str) -> Optional[str]:
-    """Decode JWT token and return username"""
+def _new_id() -> str:
+    return secrets.token_urlsafe(16)
+
+def _decode_token(token: str, verify_exp: bool = True) -> Optional[dict]:
+    """Verified JWT payload with a subject, None for any invalid token"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        return username
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": verify_exp})
     except jwt.PyJWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+def decode_access_token(token: str) -> Optional[str]:
+    """Decode JWT token and return username"""
+    payload = _decode_token(token)
+    return payload["sub"] if payload else None
+
+def _is_revoked(payload: dict) -> bool:
+    """Whether the token or its session has been revoked"""
+    revocations = get_revocation_list()
+    jti, sid = payload.get("jti"), payload.get("sid")
+    return (jti is not None and revocations.is_revoked(jti)) or (sid is not None and revocations.is_revoked(sid))
+
+def _issue_tokens(user: UserInDB, session_id: str) -> TokenPair:
+    """A fresh access token and refresh token for a session"""
+    access_token = create_access_token(
+        data={"sub": user.username, "typ": "access", "sid": session_id, "jti": _new_id()},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token = create_access_token(
+        data={"sub": user.username, "typ": "refresh", "sid": session_id, "jti": _new_id()},
+        expires_delta=REFRESH_TOKEN_LIFETIME
+    )
+    return TokenPair(
+        access_token=access_token,
+        token_type="bearer",
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60,  # Convert to seconds
+        refresh_token=refresh_token,
+        refresh_expires_in=int(REFRESH_TOKEN_LIFETIME.total_seconds()),
+        user=_public_user(user)
+    )
+
+def revoke_session(session_id: str, username: str):
+    """Refuse every token of a session from now on"""
+    # No token of the session outlives the last refresh token it could
+    # have been issued
+    get_revocation_list().revoke(session_id, time.time() + REFRESH_TOKEN_LIFETIME.total_seconds())
+    get_token_cache().invalidate_user(username)
 
-def login(login_request: LoginRequest) -> Token:
-    """Login user and return token"""
-    user = authenticate_user(login_request.username, login_request.password)
+async def login(login_request: LoginRequest) -> TokenPair:
+    """Login user and return an access token and a refresh token"""
+    try:
+        user = await authenticate_user(login_request.username, login_request.password)
+    except HashingOverloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -131,44 +245,91 @@ def login(login_request: LoginRequest) -> Token:
             detail="Inactive user"
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
+    return _issue_tokens(user, _new_id())
+
+def refresh(refresh_token: str) -> TokenPair:
+    """Exchange a refresh token for a new access token and refresh token
     
-    # Convert to public user model (without hashed_password)
-    public_user = User(
-        id=user.id,
-        username=user.username,
-        email=user.email,
-        full_name=user.full_name,
-        role=user.role,
-        is_active=user.is_active,
-        phone=user.phone,
-        department=user.department,
-        created_at=user.created_at,
-        updated_at=user.updated_at,
-        last_login=user.last_login,
-        login_count=user.login_count
-    )
+    No password check is involved. The presented refresh token is revoked;
+    presenting it again means it was copied, and revokes the whole session.
+    """
+    payload = _decode_token(refresh_token)
+    if payload is None or payload.get("typ") != "refresh" or "jti" not in payload or "sid" not in payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    return Token(
-        access_token=access_token,
-        token_type="bearer",
-        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60,  # Convert to seconds
-        user=public_user
-    )
+    username = payload["sub"]
+    revocations = get_revocation_list()
+    if revocations.is_revoked(payload["sid"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Session has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if revocations.is_revoked(payload["jti"]):
+        revoke_session(payload["sid"], username)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token was already used; the session has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user = get_user(username)
+    if user is None or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Inactive user" if user else "User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    revocations.revoke(payload["jti"], payload["exp"])
+    return _issue_tokens(user, payload["sid"])
+
+def logout(access_token: Optional[str] = None, refresh_token: Optional[str] = None) -> int:
+    """Revoke the sessions the given tokens belong to; number revoked
+    
+    Expired tokens are accepted as long as their signature is valid.
+    """
+    sessions = {}
+    for token in (access_token, refresh_token):
+        payload = _decode_token(token, verify_exp=False) if token else None
+        if payload is not None and "sid" in payload:
+            sessions[payload["sid"]] = payload["sub"]
+    for session_id, username in sessions.items():
+        revoke_session(session_id, username)
+    return len(sessions)
 
 def get_current_user(token: str) -> User:
-    """Get current user from token"""
-    username = decode_access_token(token)
-    if username is None:
+    """Get current user from token
+    
+    Verified tokens are cached (see TokenCache) until they expire or the
+    user's record changes; the returned user must not be modified. Revoking
+    a session drops its user's cached tokens, so only cache misses need to
+    consult the revocation list.
+    """
+    cache = get_token_cache()
+    cached = cache.get(token)
+    if cached is not None:
+        return cached
+    
+    payload = _decode_token(token)
+    if payload is None or payload.get("typ") == "refresh":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if _is_revoked(payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
+    username = payload["sub"]
     user = get_user(username)
     if user is None:
         raise HTTPException(
@@ -176,22 +337,55 @@ def get_current_user(token: str) -> User:
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Inactive user",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    # Convert to public user model
-    return User(
-        id=user.id,
-        username=user.username,
-        email=user.email,
-        full_name=user.full_name,
-        role=user.role,
-        is_active=user.is_active,
-        phone=user.phone,
-        department=user.department,
-        created_at=user.created_at,
-        updated_at=user.updated_at,
-        last_login=user.last_login,
-        login_count=user.login_count
-    )
+    public_user = _public_user(user)
+    cache.put(token, public_user, username, payload.get("exp", float("inf")))
+    return public_user
+
+def get_token_grant(token: str) -> TokenGrant:
+    """get_current_user, keeping what is needed to re-check the token later"""
+    user = get_current_user(token)
+    payload = _decode_token(token)
+    if payload is None:  # expired since the line above
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    token_ids = tuple(payload[claim] for claim in ("jti", "sid") if payload.get(claim))
+    return TokenGrant(user, float(payload["exp"]), token_ids)
+
+def grant_end_reason(grant: TokenGrant, now: Optional[float] = None) -> Optional[str]:
+    """Why a grant no longer holds ("expired" or "revoked"), None while it does"""
+    if (time.time() if now is None else now) >= grant.expires_at:
+        return "expired"
+    revocations = get_revocation_list()
+    if any(revocations.is_revoked(token_id) for token_id in grant.token_ids):
+        return "revoked"
+    return None
+
+def issue_stream_ticket(grant: TokenGrant) -> str:
+    """A single-use ticket opening one stream on behalf of ``grant``'s token"""
+    return get_ticket_store().issue(grant)
+
+def redeem_stream_ticket(ticket: str) -> TokenGrant:
+    """The grant a ticket was issued for (401 for unknown, used or expired
+    tickets, or when the token behind it no longer holds)"""
+    grant = get_ticket_store().redeem(ticket)
+    reason = grant_end_reason(grant) if grant is not None else "invalid"
+    if reason is not None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Stream ticket is {reason}; request a new one",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return grant
 
 # Demo function to create test users
 def create_demo_users():
@@ -0,0 +1,357 @@
+"""
+Monthly billing runs.
+
+A run bills one calendar month ("2026-10") in three stages, checkpointed
+to <BILLING_RUN_DIR>/<period>/run.json after every chunk, so a run that is
+interrupted (crash, restart, cancellation) continues where it stopped
+when it is started again:
+
+compute  Charges of every active customer in one vectorized NumPy pass over
+         the store's columnar mirror (monthly_fee, balance_due and
+         installation_date arrays, see customer_columns):
+             subtotal   = monthly_fee * share of the month from installation_date on
+             tax        = subtotal * BILLING_TAX_RATE (IVA)
+             total      = subtotal + tax
+             amount_due = balance_due carried over + total
+         Only the billed customers are then read, for their invoice
+         fields, BILLING_CHUNK_SIZE at a time; each chunk is saved as
+         charges-<n>.pkl. The stage has no side effects, so an interrupted
+         one is redone from scratch.
+post     balance_due := amount_due for the customers whose balance changes,
+         one repository pass per chunk. The absolute amount is posted, so
+         re-posting the chunk a crash cut short charges nobody twice.
+render   Invoice documents (see customer_invoices), one zip archive per
+         chunk, rendered by a pool of BILLING_RENDER_WORKERS processes.
+
+Amounts are rounded half up to cents. The tax rate, chunk size, formats
+and issue date are fixed when a run is created; starting a completed
+period again returns its result instead of billing twice.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import (
+    BILLING_CHUNK_SIZE, BILLING_COMPANY_NAME, BILLING_CURRENCY, BILLING_INVOICE_FORMATS,
+    BILLING_RENDER_WORKERS, BILLING_RFC, BILLING_RUN_DIR, BILLING_TAX_RATE
+)
+from app.services.customer_columns import MISSING
+from app.services.customer_invoices import (
+    DOCUMENT_FIELDS, invoice_formats, read_chunk, render_chunk, write_chunk
+)
+from app.services.customer_service import (
+    get_active_columns, get_customers_by_ids, update_customers_each
+)
+
+logger = logging.getLogger(__name__)
+
+RUN_FILE = "run.json"
+STAGES = ("compute", "post", "render")
+TOTALS = ("subtotal", "tax", "total", "previous_balance", "amount_due")
+# CustomerColumns arrays the charges are computed from
+CHARGE_COLUMNS = ("monthly_fee", "balance_due", "installation_date")
+
+# Chunks handed to the pool per worker; bounds the chunks being rendered
+# (and held in memory) at once
+RENDER_QUEUE_PER_WORKER = 2
+
+
+def billing_period(period: Optional[str] = None) -> Tuple[str, datetime, datetime]:
+    """("YYYY-MM", first instant of the month, first instant of the next)"""
+    if period is None:
+        start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    else:
+        try:
+            start = datetime.strptime(period, "%Y-%m")
+        except ValueError:
+            raise ValueError(f"Invalid billing period {period!r}; expected YYYY-MM")
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start.strftime("%Y-%m"), start, end
+
+
+def round_cents(values: np.ndarray) -> np.ndarray:
+    """Round half up to cents (the epsilon absorbs binary error, e.g. 1.005)"""
+    return np.floor(values * 100 + 0.5 + 1e-6) / 100
+
+
+def compute_charges(columns: Dict[str, np.ndarray], start: datetime, end: datetime,
+                    tax_rate: float) -> Dict[str, np.ndarray]:
+    """Charges of active customers in one vectorized pass over their
+    CHARGE_COLUMNS arrays.
+
+    Returns the positions (``rows``) of the customers billed for the
+    period, those installed before its end, and their charge columns.
+    """
+    days = (end - start).days
+    installed = columns["installation_date"].astype(np.int64)
+    # Day of the month service started (0 when installed before the month)
+    first_day = np.where(installed == MISSING, 0, installed - start.toordinal())
+    fraction = (days - np.clip(first_day, 0, days)) / days
+    subtotal = round_cents(columns["monthly_fee"] * fraction)
+    rows = np.flatnonzero(subtotal > 0)
+
+    subtotal = subtotal[rows]
+    tax = round_cents(subtotal * tax_rate)
+    total = round_cents(subtotal + tax)
+    previous_balance = columns["balance_due"][rows]
+    return {
+        "rows": rows,
+        "fraction": fraction[rows],
+        "subtotal": subtotal,
+        "tax": tax,
+        "total": total,
+        "previous_balance": previous_balance,
+        "amount_due": round_cents(previous_balance + total),
+    }
+
+
+class BillingRun:
+    """One month's billing run and its checkpoint"""
+
+    def __init__(self, period: Optional[str] = None, directory: str = BILLING_RUN_DIR,
+                 tax_rate: float = BILLING_TAX_RATE, chunk_size: int = BILLING_CHUNK_SIZE,
+                 formats: Sequence[str] = BILLING_INVOICE_FORMATS,
+                 workers: int = BILLING_RENDER_WORKERS):
+        self.period, self.start, self.end = billing_period(period)
+        self.directory = os.path.join(directory, self.period)
+        self.workers = max(workers, 1)
+        self.state = self._load() or {
+            "period": self.period,
+            "status": "created",
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "tax_rate": tax_rate,
+            "currency": BILLING_CURRENCY,
+            "chunk_size": chunk_size,
+            "formats": invoice_formats(formats),
+            "computed": False,
+            "chunks": 0,
+            "invoices": 0,
+            "totals": {},
+            "posted": 0,  # chunks, in order
+            "not_found": 0,  # billed customers deleted before posting
+            "rendered": [],  # chunks, in completion order
+            "documents": 0,
+            "timings_ms": {stage: 0.0 for stage in STAGES},
+            "error": None,
+        }
+
+    # -- checkpoint ------------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _chunk_path(self, index: int) -> str:
+        return self._path(f"charges-{index:05d}.pkl")
+
+    def _archive_path(self, index: int) -> str:
+        return self._path(f"invoices-{index:05d}.zip")
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(RUN_FILE)) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _save(self):
+        """Write the checkpoint atomically (temp file + rename)"""
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self._path(f"{RUN_FILE}.tmp")
+        with open(temporary, "w") as file:
+            json.dump(self.state, file)
+        os.replace(temporary, self._path(RUN_FILE))
+
+    @contextmanager
+    def _stage(self, stage: str):
+        """Mark a stage as running and add its wall time to the run's timings"""
+        self.state["status"] = stage
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.state["timings_ms"][stage] = round(
+                self.state["timings_ms"][stage] + (time.perf_counter() - start) * 1000, 1
+            )
+            self._save()
+
+    # -- stages ----------------------------------------------------------
+
+    async def run(self) -> Dict[str, Any]:
+        """Run (or resume) the remaining stages; returns the final state"""
+        if self.state["status"] == "completed":
+            return self.state
+        self.state["error"] = None
+        try:
+            if not self.state["computed"]:
+                with self._stage("compute"):
+                    await self._compute()
+            with self._stage("post"):
+                await self._post()
+            with self._stage("render"):
+                await self._render()
+        except asyncio.CancelledError:
+            self.state["status"] = "interrupted"
+            self._save()
+            raise
+        except Exception as e:
+            self.state["status"] = "failed"
+            self.state["error"] = str(e)
+            self._save()
+            raise
+        self.state["status"] = "completed"
+        self._save()
+        return self.state
+
+    async def _compute(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if name != RUN_FILE:
+                os.remove(self._path(name))  # left by an interrupted compute stage
+        ids, columns = await get_active_columns(CHARGE_COLUMNS)
+        charges = compute_charges(columns, self.start, self.end, self.state["tax_rate"])
+        rows = charges.pop("rows").tolist()
+        totals = dict.fromkeys(TOTALS, 0.0)
+        chunks = invoices = 0
+        for offset in range(0, len(rows), self.state["chunk_size"]):
+            part = slice(offset, offset + self.state["chunk_size"])
+            chunk_ids = [ids[row] for row in rows[part]]
+            customers = await get_customers_by_ids(chunk_ids)
+            # Customers deleted since the columns were read drop out
+            found = {customer.id for customer in customers}
+            kept = np.fromiter((customer_id in found for customer_id in chunk_ids), bool, len(chunk_ids))
+            chunk: Dict[str, Any] = {
+                field: [getattr(customer, field) for customer in customers] for field in DOCUMENT_FIELDS
+            }
+            chunk.update((name, values[part][kept]) for name, values in charges.items())
+            if chunk["id"]:
+                write_chunk(self._chunk_path(chunks), chunk)
+                for name in TOTALS:
+                    totals[name] += float(chunk[name].sum())
+                chunks += 1
+                invoices += len(chunk["id"])
+            await asyncio.sleep(0)  # let requests through between chunks
+        self.state.update(
+            computed=True, chunks=chunks, invoices=invoices,
+            totals={name: round(value, 2) for name, value in totals.items()},
+        )
+
+    async def _post(self):
+        for index in range(self.state["posted"], self.state["chunks"]):
+            chunk = read_chunk(self._chunk_path(index))
+            changed = (chunk["amount_due"] != chunk["previous_balance"]).tolist()
+            now = datetime.now()
+            _, missing = await update_customers_each({
+                customer_id: {"balance_due": amount_due, "updated_at": now}
+                for customer_id, amount_due, write in zip(chunk["id"], chunk["amount_due"].tolist(), changed)
+                if write
+            })
+            self.state["posted"] = index + 1
+            self.state["not_found"] += len(missing)
+            self._save()
+
+    async def _render(self):
+        rendered = set(self.state["rendered"])
+        pending = [index for index in range(self.state["chunks"]) if index not in rendered]
+        if not pending or not self.state["formats"]:
+            return
+        issuer = {
+            "period": self.period,
+            "issued_at": self.state["created_at"],
+            "currency": self.state["currency"],
+            "tax_rate": self.state["tax_rate"],
+            "company": BILLING_COMPANY_NAME,
+            "rfc": BILLING_RFC,
+        }
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.workers * RENDER_QUEUE_PER_WORKER)
+        # Spawned (not forked) workers: the server process has threads running
+        pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+        async def render(index: int):
+            async with slots:
+                count = await loop.run_in_executor(
+                    pool, render_chunk, self._chunk_path(index), self._archive_path(index),
+                    self.state["formats"], issuer,
+                )
+            self.state["rendered"].append(index)
+            self.state["documents"] += count
+            self._save()
+
+        try:
+            await asyncio.gather(*(render(index) for index in pending))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Runs in progress, by period
+_runs: Dict[str, Tuple[BillingRun, asyncio.Task]] = {}
+
+
+async def _run_in_background(run: BillingRun):
+    try:
+        state = await run.run()
+        logger.info(
+            f"Billing run {run.period} completed: {state['invoices']} invoices, "
+            f"timings {state['timings_ms']}"
+        )
+    except asyncio.CancelledError:
+        logger.info(f"Billing run {run.period} interrupted; start it again to resume")
+    except Exception:
+        logger.exception(f"Billing run {run.period} failed; start it again to resume")
+    finally:
+        _runs.pop(run.period, None)
+
+
+def start_billing_run(period: Optional[str] = None, **options) -> Dict[str, Any]:
+    """Start or resume the run of a period in the background; returns its
+    state (a completed run is returned as is). Raises ValueError for a
+    malformed period or unknown invoice format."""
+    run = BillingRun(period, **options)
+    if run.period in _runs:
+        return _runs[run.period][0].state
+    if run.state["status"] != "completed":
+        _runs[run.period] = (run, asyncio.ensure_future(_run_in_background(run)))
+    return run.state
+
+
+def get_billing_run(period: str, directory: str = BILLING_RUN_DIR) -> Optional[Dict[str, Any]]:
+    """State of a period's run (None when it was never started)"""
+    period, _, _ = billing_period(period)
+    if period in _runs:
+        return _runs[period][0].state
+    return BillingRun(period, directory)._load()
+
+
+def list_billing_runs(directory: str = BILLING_RUN_DIR) -> List[Dict[str, Any]]:
+    """Every run, most recent period first, without the per-chunk details"""
+    if not os.path.isdir(directory):
+        return []
+    runs = []
+    for period in sorted(os.listdir(directory), reverse=True):
+        try:
+            state = get_billing_run(period, directory)
+        except ValueError:
+            continue  # not a run directory
+        if state is not None:
+            runs.append({key: value for key, value in state.items() if key != "rendered"})
+    return runs
+
+
+async def cancel_billing_runs():
+    """Interrupt the runs in progress (they resume when started again)"""
+    for _, task in list(_runs.values()):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
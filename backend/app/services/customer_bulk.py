@@ -0,0 +1,77 @@
+"""
+Bulk customer updates (mass suspension, plan migrations, fee changes).
+
+One CustomerUpdate payload is validated once and applied to every target
+customer in a single repository pass: the in-memory store refreshes only
+the indexes that read the changed fields, the SQL store rewrites the rows
+in one transaction.
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.models.customer import CustomerFilter, CustomerUpdate
+from app.services.customer_service import update_customers, update_matching_customers
+
+MAX_BULK_IDS = 100_000
+MAX_REPORTED_FAILURES = 1000
+
+
+class CustomerBulkUpdate(BaseModel):
+    """Target customers by ``customer_ids`` or by ``filter`` (exactly one)"""
+    customer_ids: Optional[List[str]] = Field(None, max_length=MAX_BULK_IDS)
+    filter: Optional[CustomerFilter] = None
+    changes: CustomerUpdate
+
+
+class CustomerBulkUpdateFailure(BaseModel):
+    id: str
+    error: str
+
+
+class CustomerBulkUpdateReport(BaseModel):
+    matched: int = 0
+    updated: int = 0
+    failed: int = 0
+    failures: List[CustomerBulkUpdateFailure] = []
+    failures_truncated: bool = False
+    changed_fields: List[str] = []
+    elapsed_ms: float = 0.0
+
+
+def _changes(customer_data: CustomerUpdate) -> Dict:
+    changes = customer_data.dict(exclude_unset=True)
+    if not changes:
+        raise ValueError("No fields to update")
+    return changes
+
+
+async def bulk_update_customers(request: CustomerBulkUpdate) -> CustomerBulkUpdateReport:
+    """Apply one update to many customers; raises ValueError for a bad request"""
+    if (request.customer_ids is None) == (request.filter is None):
+        raise ValueError("Give either customer_ids or filter")
+    if request.filter is not None and not request.filter.dict(exclude_defaults=True):
+        raise ValueError("An empty filter would update every customer")
+
+    start = time.perf_counter()
+    changes = _changes(request.changes)
+    report = CustomerBulkUpdateReport(changed_fields=list(changes))
+    changes["updated_at"] = datetime.now()
+
+    if request.customer_ids is not None:
+        updated, missing = await update_customers(request.customer_ids, changes)
+        report.matched = report.updated = updated
+        report.failed = len(missing)
+        report.failures = [
+            CustomerBulkUpdateFailure(id=customer_id, error="Customer not found")
+            for customer_id in missing[:MAX_REPORTED_FAILURES]
+        ]
+        report.failures_truncated = len(missing) > MAX_REPORTED_FAILURES
+    else:
+        report.matched = report.updated = await update_matching_customers(request.filter, changes)
+
+    report.elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+    return report
@@ -0,0 +1,273 @@
+"""
+Append-only customer change feed.
+
+Every write to the customer repository is appended as one compact JSON
+line to a log made of fixed-size segment files:
+
+    {"offset": 7, "ts": "...", "op": "update", "id": "42",
+     "changes": {"status": ["active", "suspended"], ...}}   [old, new] per field
+    {"offset": 8, "ts": "...", "op": "create", "id": "43", "customer": {...}}
+    {"offset": 9, "ts": "...", "op": "delete", "id": "42"}
+
+Segments are named by their first offset:
+
+    <CHANGE_LOG_DIR>/00000000000000000000.log
+    <CHANGE_LOG_DIR>/00000000000000010000.log
+
+Offsets increase by one per event and are never reused. Consumers keep
+the ``next_offset`` of the last page they read and ask for the changes
+since it, so staying in sync costs O(changes) instead of re-reading every
+customer. Reads hand back the stored lines untouched (ChangePage), so a
+page is served without parsing or re-encoding its events. The log is bounded: once more than ``max_segments`` segments
+exist the oldest is deleted, and a consumer that fell behind past the
+retained history gets ChangeLogTruncated and has to resynchronize in full
+(e.g. from the export endpoint).
+"""
+
+import json
+import os
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from pydantic_core import to_jsonable_python
+
+from app.core.config import (
+    CHANGE_LOG_DIR, CHANGE_LOG_MAX_SEGMENTS, CHANGE_LOG_SEGMENT_EVENTS
+)
+from app.services.customer_repository import CustomerChange
+
+SEGMENT_SUFFIX = ".log"
+MAX_READ_EVENTS = 10_000
+
+# A byte position is remembered every INDEX_INTERVAL events of a segment,
+# so a read seeks close to its offset and skips at most that many lines
+INDEX_INTERVAL = 128
+
+
+def _json_default(value: Any) -> Any:
+    # Strings, numbers and str-based enums are encoded natively; this is
+    # only reached for datetimes and the odd other type
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return to_jsonable_python(value)
+
+
+_dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=_json_default).encode
+
+
+class ChangeLogTruncated(Exception):
+    """The requested offset is older than the retained history"""
+
+    def __init__(self, offset: int, earliest_offset: int):
+        super().__init__(
+            f"Changes before offset {earliest_offset} are no longer retained "
+            f"(requested {offset}); resynchronize from a full export"
+        )
+        self.earliest_offset = earliest_offset
+
+
+class ChangePage(NamedTuple):
+    """One read of the feed; ``lines`` are the stored JSON events, one per line"""
+    lines: List[bytes]
+    next_offset: int  # ``since`` for the next read
+    earliest_offset: int
+    end_offset: int  # offset of the next event to be written
+
+    def events(self) -> List[Dict[str, Any]]:
+        """The events parsed (for in-process consumers)"""
+        return [json.loads(line) for line in self.lines]
+
+    def to_json(self) -> bytes:
+        """The page as a JSON object, splicing the stored lines in as they are"""
+        return b"".join((
+            b'{"events":[', b",".join(line.rstrip(b"\n") for line in self.lines),
+            b'],"next_offset":%d,"earliest_offset":%d,"end_offset":%d}'
+            % (self.next_offset, self.earliest_offset, self.end_offset),
+        ))
+
+
+class _Segment:
+    def __init__(self, path: str, base_offset: int):
+        self.path = path
+        self.base_offset = base_offset
+        self.events = 0
+        self.size = 0
+        self.positions: List[int] = []  # byte position of every INDEX_INTERVAL-th event
+
+    def record(self, length: int):
+        """Account for one appended line of ``length`` bytes"""
+        if self.events % INDEX_INTERVAL == 0:
+            self.positions.append(self.size)
+        self.events += 1
+        self.size += length
+
+
+class CustomerChangeLog:
+    """Segment-file-backed, bounded log of customer changes (single writer)"""
+
+    def __init__(self, directory: str = CHANGE_LOG_DIR,
+                 segment_events: int = CHANGE_LOG_SEGMENT_EVENTS,
+                 max_segments: int = CHANGE_LOG_MAX_SEGMENTS):
+        self.directory = directory
+        self.segment_events = segment_events
+        self.max_segments = max_segments
+        self._segments: List[_Segment] = []
+        self._file = None
+
+    # -- lifecycle -----------------------------------------------------
+
+    def open(self):
+        """Load the existing segments, dropping a torn last line if any"""
+        os.makedirs(self.directory, exist_ok=True)
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        self._segments = []
+        for name in names:
+            segment = _Segment(os.path.join(self.directory, name), int(name[:-len(SEGMENT_SUFFIX)]))
+            self._scan(segment)
+            self._segments.append(segment)
+        if not self._segments:
+            self._segments.append(self._new_segment(0))
+        self._file = open(self._segments[-1].path, "ab")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _scan(self, segment: _Segment):
+        with open(segment.path, "rb+") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    # Interrupted append: cut the partial event off
+                    file.truncate(segment.size)
+                    break
+                segment.record(len(line))
+
+    def _new_segment(self, base_offset: int) -> _Segment:
+        path = os.path.join(self.directory, f"{base_offset:020d}{SEGMENT_SUFFIX}")
+        open(path, "ab").close()
+        return _Segment(path, base_offset)
+
+    # -- writing -------------------------------------------------------
+
+    @property
+    def earliest_offset(self) -> int:
+        return self._segments[0].base_offset
+
+    @property
+    def next_offset(self) -> int:
+        """Offset the next appended event will get"""
+        last = self._segments[-1]
+        return last.base_offset + last.events
+
+    def append(self, changes: List[CustomerChange]):
+        """Append a batch of changes (one write call per touched segment)"""
+        timestamp = datetime.now().isoformat()
+        pending: List[bytes] = []
+        # A bulk update repeats the same new values (and many old ones) on
+        # every row, so each distinct value is encoded once per batch
+        encoded: Dict[Any, str] = {}
+
+        def encode(value: Any) -> str:
+            try:
+                key = (type(value), value)
+                text = encoded.get(key)
+            except TypeError:  # unhashable
+                return _dumps(value)
+            if text is None:
+                text = encoded[key] = _dumps(value)
+            return text
+
+        for operation, customer_id, details in changes:
+            segment = self._segments[-1]
+            if segment.events >= self.segment_events:
+                self._write(pending)
+                pending = []
+                self._roll()
+                segment = self._segments[-1]
+            line = (f'{{"offset":{segment.base_offset + segment.events},"ts":"{timestamp}",'
+                    f'"op":"{operation}","id":{_dumps(customer_id)}')
+            if operation == "update":
+                fields = ",".join(
+                    f'"{field}":[{encode(old)},{encode(new)}]' for field, (old, new) in details.items()
+                )
+                line = f'{line},"changes":{{{fields}}}}}'
+            elif operation == "create":
+                # pydantic's serializer is several times faster than json on a full record
+                line = f'{line},"customer":{details.model_dump_json(exclude_none=True)}}}'
+            else:
+                line += "}"
+            data = line.encode() + b"\n"
+            segment.record(len(data))
+            pending.append(data)
+        self._write(pending)
+
+    def _write(self, lines: List[bytes]):
+        if lines:
+            self._file.write(b"".join(lines))
+            self._file.flush()
+
+    def _roll(self):
+        """Start a new segment and drop the oldest ones beyond the bound"""
+        self._file.close()
+        self._segments.append(self._new_segment(self.next_offset))
+        self._file = open(self._segments[-1].path, "ab")
+        while len(self._segments) > self.max_segments:
+            os.remove(self._segments.pop(0).path)
+
+    # -- reading -------------------------------------------------------
+
+    def read(self, since: int = 0, limit: int = 1000) -> ChangePage:
+        """Events with offset >= ``since``, oldest first, at most ``limit``"""
+        if since < self.earliest_offset:
+            raise ChangeLogTruncated(since, self.earliest_offset)
+        limit = min(limit, MAX_READ_EVENTS)
+        lines: List[bytes] = []
+        bases = [segment.base_offset for segment in self._segments]
+        index = max(bisect_right(bases, since) - 1, 0)
+        for segment in self._segments[index:]:
+            if len(lines) >= limit:
+                break
+            start = max(since - segment.base_offset, 0)
+            if start >= segment.events:
+                continue
+            lines.extend(self._read_segment(segment, start, limit - len(lines)))
+        # Offsets are contiguous, so the page ends ``len(lines)`` after ``since``
+        return ChangePage(
+            lines=lines,
+            next_offset=since + len(lines) if lines else min(since, self.next_offset),
+            earliest_offset=self.earliest_offset,
+            end_offset=self.next_offset,
+        )
+
+    def _read_segment(self, segment: _Segment, start: int, limit: int) -> List[bytes]:
+        """Up to ``limit`` event lines of a segment from its ``start``-th one"""
+        checkpoint, skip = divmod(start, INDEX_INTERVAL)
+        position = segment.positions[checkpoint]
+        # Only read what the writer has accounted for (never a half-written line)
+        end = segment.size
+        lines = []
+        with open(segment.path, "rb") as file:
+            file.seek(position)
+            while len(lines) < limit and position < end:
+                line = file.readline()
+                position += len(line)
+                if skip:
+                    skip -= 1
+                    continue
+                lines.append(line)
+        return lines
+
+
+_change_log: Optional[CustomerChangeLog] = None
+
+
+def get_change_log() -> Optional[CustomerChangeLog]:
+    """The process-wide change log (None when the feed is disabled)"""
+    return _change_log
+
+
+def set_change_log(change_log: Optional[CustomerChangeLog]):
+    global _change_log
+    _change_log = change_log
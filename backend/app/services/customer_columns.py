@@ -0,0 +1,308 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.models.customer import Customer, CustomerStatus, ServiceType, PaymentStatus
+
+STATUS_CODES = {status: code for code, status in enumerate(CustomerStatus)}
+SERVICE_CODES = {service: code for code, service in enumerate(ServiceType)}
+PAYMENT_CODES = {payment: code for code, payment in enumerate(PaymentStatus)}
+
+MISSING = -1
+INITIAL_CAPACITY = 1024
+
+INT32 = np.iinfo(np.int32)
+
+
+class Dictionary:
+    """Dictionary encoding for low-cardinality strings (city, plan, router)"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: Optional[str]) -> int:
+        if value is None:
+            return MISSING
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def code_of(self, value: str) -> int:
+        return self._codes.get(value, MISSING)
+
+    def clear(self):
+        self.values.clear()
+        self._codes.clear()
+
+
+class CustomerColumns:
+    """Columnar NumPy mirror of the customer store for vectorized analytics.
+
+    Every customer owns a row ("slot"); deleted slots are masked out and
+    reused. customer_service keeps the mirror in sync on every mutation.
+    """
+
+    COLUMNS = {
+        "monthly_fee": (np.float64, 0.0),
+        "balance_due": (np.float64, 0.0),
+        "status": (np.int8, MISSING),
+        "service_type": (np.int8, MISSING),
+        "payment_status": (np.int8, MISSING),
+        "latitude": (np.float64, np.nan),
+        "longitude": (np.float64, np.nan),
+        "signal_strength": (np.int32, MISSING),  # clamped to the int32 range
+        "created_at": (np.int64, 0),  # epoch seconds
+        "installation_date": (np.int32, MISSING),  # day number (date.toordinal())
+        "city": (np.int32, MISSING),
+        "plan_name": (np.int32, MISSING),
+        "router_name": (np.int32, MISSING),
+    }
+
+    # Dictionary-encoded columns, usable as group-by keys
+    GROUP_KEYS = ("city", "plan_name", "router_name")
+    SOURCE_FIELDS = frozenset(COLUMNS)
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.dictionaries = {key: Dictionary() for key in self.GROUP_KEYS}
+        self._extract = self._extractors()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self.capacity = capacity
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.full(capacity, fill, dtype=dtype)
+            for name, (dtype, fill) in self.COLUMNS.items()
+        }
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._high_water = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    # Pickled into store snapshots; the extractors are closures and are
+    # rebuilt instead
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_extract"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._extract = self._extractors()
+
+    def _extractors(self) -> Dict[str, Callable[[Customer], Any]]:
+        """Column name -> encoded value of a customer"""
+        extractors = {
+            "monthly_fee": lambda c: c.monthly_fee or 0.0,
+            "balance_due": lambda c: c.balance_due or 0.0,
+            "status": lambda c: STATUS_CODES.get(c.status, MISSING),
+            "service_type": lambda c: SERVICE_CODES.get(c.service_type, MISSING),
+            "payment_status": lambda c: PAYMENT_CODES.get(c.payment_status, MISSING),
+            "latitude": lambda c: np.nan if c.latitude is None else c.latitude,
+            "longitude": lambda c: np.nan if c.longitude is None else c.longitude,
+            # The model does not bound it; out-of-range values must not wrap
+            "signal_strength": lambda c: MISSING if c.signal_strength is None
+            else min(max(c.signal_strength, INT32.min), INT32.max),
+            "created_at": lambda c: int(c.created_at.timestamp()),
+            "installation_date": lambda c: MISSING if c.installation_date is None else c.installation_date.toordinal(),
+        }
+        for key in self.GROUP_KEYS:
+            encode = self.dictionaries[key].encode
+            extractors[key] = lambda c, key=key, encode=encode: encode(getattr(c, key))
+        return extractors
+
+    def _slot_of(self, customer_id: str) -> int:
+        slot = self._slots.get(customer_id)
+        if slot is None:
+            slot = self._take_slot()
+            self._slots[customer_id] = slot
+        return slot
+
+    def add(self, customer: Customer):
+        """Write (or overwrite) the row of a customer"""
+        slot = self._slot_of(customer.id)
+        for name, extract in self._extract.items():
+            self.columns[name][slot] = extract(customer)
+        self.alive[slot] = True
+
+    def add_many(self, customers: List[Customer], fields: Optional[Iterable[str]] = None):
+        """Write many rows with one vectorized assignment per column.
+
+        With ``fields``, rows that already exist only get those columns
+        rewritten (new rows are always written in full).
+        """
+        if not customers:
+            return
+        known = len(self._slots)
+        # Take every slot first: growing the arrays replaces them
+        slots = np.fromiter((self._slot_of(customer.id) for customer in customers),
+                            dtype=np.int64, count=len(customers))
+        names = self.COLUMNS if fields is None or len(self._slots) > known else set(fields) & set(self.COLUMNS)
+        for name in names:
+            extract = self._extract[name]
+            self.columns[name][slots] = [extract(customer) for customer in customers]
+        self.alive[slots] = True
+
+    def remove(self, customer_id: str):
+        """Mask out the row of a deleted customer"""
+        slot = self._slots.pop(customer_id, None)
+        if slot is None:
+            return
+        self.alive[slot] = False
+        for name, (_, fill) in self.COLUMNS.items():
+            self.columns[name][slot] = fill
+        self._free.append(slot)
+
+    def clear(self):
+        """Drop every row (capacity is kept)"""
+        for dictionary in self.dictionaries.values():
+            dictionary.clear()
+        self._allocate(self.capacity)
+
+    def _take_slot(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._high_water == self.capacity:
+            self._grow()
+        slot = self._high_water
+        self._high_water += 1
+        return slot
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        self.alive = np.concatenate([self.alive, np.zeros(self.capacity, dtype=bool)])
+        for name, (dtype, fill) in self.COLUMNS.items():
+            self.columns[name] = np.concatenate(
+                [self.columns[name], np.full(self.capacity, fill, dtype=dtype)]
+            )
+        self.capacity = capacity
+
+    def detached(self, names: Iterable[str]) -> "CustomerColumns":
+        """A copy of the ``names`` columns (and the live mask) up to the high
+        water mark, for analytics on another thread while writes go on"""
+        rows = self._rows()
+        copy = CustomerColumns.__new__(CustomerColumns)
+        copy.capacity = copy._high_water = self._high_water
+        copy.alive = self.alive[rows].copy()
+        copy.columns = {name: self.columns[name][rows].copy() for name in names}
+        copy.dictionaries = {}
+        for key, dictionary in self.dictionaries.items():
+            copy.dictionaries[key] = Dictionary()
+            copy.dictionaries[key].values = list(dictionary.values)
+            copy.dictionaries[key]._codes = dict(dictionary._codes)
+        return copy
+
+    def to_arrays(self) -> Tuple[List[str], Dict[str, List[str]], Dict[str, np.ndarray]]:
+        """(customer id of every row, dictionary values, copies of the arrays
+        plus "alive") up to the high water mark: what from_arrays needs, in
+        a form that can be stored as raw buffers"""
+        rows = self._rows()
+        ids = [""] * self._high_water
+        for customer_id, slot in self._slots.items():
+            ids[slot] = customer_id
+        arrays = {name: column[rows].copy() for name, column in self.columns.items()}
+        arrays["alive"] = self.alive[rows].copy()
+        dictionaries = {key: list(dictionary.values) for key, dictionary in self.dictionaries.items()}
+        return ids, dictionaries, arrays
+
+    @classmethod
+    def from_arrays(cls, ids: List[str], dictionaries: Dict[str, List[str]],
+                    arrays: Dict[str, np.ndarray]) -> "CustomerColumns":
+        """Rebuild a mirror from to_arrays output (the arrays are copied, so
+        they may be read-only views of a mapped file)"""
+        rows = len(ids)
+        columns = cls(max(rows, INITIAL_CAPACITY))
+        for name in cls.COLUMNS:
+            columns.columns[name][:rows] = arrays[name]
+        columns.alive[:rows] = arrays["alive"]
+        alive = arrays["alive"].tolist()
+        columns._slots = {customer_id: slot for slot, customer_id in enumerate(ids) if alive[slot]}
+        columns._free = [slot for slot in range(rows) if not alive[slot]]
+        columns._high_water = rows
+        for key, values in dictionaries.items():
+            dictionary = columns.dictionaries[key]
+            dictionary.values = list(values)
+            dictionary._codes = {value: code for code, value in enumerate(values)}
+        return columns
+
+    # ------------------------------------------------------------------
+    # Vectorized analytics
+    # ------------------------------------------------------------------
+
+    def _rows(self) -> slice:
+        return slice(0, self._high_water)
+
+    def status_mask(self, status: CustomerStatus) -> np.ndarray:
+        """Boolean mask of live rows with the given status"""
+        rows = self._rows()
+        return self.alive[rows] & (self.columns["status"][rows] == STATUS_CODES[status])
+
+    def active_rows(self, names: Iterable[str]) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """Ids and copies of the ``names`` columns of the active customers, in row order"""
+        slots = np.flatnonzero(self.status_mask(CustomerStatus.ACTIVE))
+        ids = [""] * self._high_water
+        for customer_id, slot in self._slots.items():
+            ids[slot] = customer_id
+        return [ids[slot] for slot in slots.tolist()], {name: self.columns[name][slots] for name in names}
+
+    def revenue_summary(self) -> Dict[str, Any]:
+        """Monthly revenue, ARPU and overdue totals in one vectorized pass"""
+        rows = self._rows()
+        alive = self.alive[rows]
+        active = self.status_mask(CustomerStatus.ACTIVE)
+        active_customers = int(np.count_nonzero(active))
+        monthly_revenue = float(self.columns["monthly_fee"][rows][active].sum())
+
+        balance = self.columns["balance_due"][rows]
+        owing = alive & (balance > 0)
+        overdue = alive & (self.columns["payment_status"][rows] == PAYMENT_CODES[PaymentStatus.OVERDUE])
+        return {
+            "active_customers": active_customers,
+            "monthly_revenue": monthly_revenue,
+            "average_revenue_per_user": monthly_revenue / active_customers if active_customers else 0,
+            "overdue_amount": float(balance[owing].sum()),
+            "overdue_accounts": int(np.count_nonzero(overdue)),
+        }
+
+    def group_by(self, key: str, status: Optional[CustomerStatus] = CustomerStatus.ACTIVE) -> List[Dict[str, Any]]:
+        """Customers, revenue, ARPU and balance due per city, plan or router.
+
+        Only customers with ``status`` are counted (every live customer when
+        status is None). Groups are sorted by revenue, highest first.
+        """
+        if key not in self.GROUP_KEYS:
+            raise ValueError(f"Cannot group by {key!r}; expected one of {', '.join(self.GROUP_KEYS)}")
+
+        rows = self._rows()
+        mask = self.alive[rows] if status is None else self.status_mask(status)
+        codes = self.columns[key][rows][mask]
+        present = codes != MISSING
+        codes = codes[present]
+        size = len(self.dictionaries[key])
+
+        counts = np.bincount(codes, minlength=size)
+        revenue = np.bincount(codes, weights=self.columns["monthly_fee"][rows][mask][present], minlength=size)
+        balance = np.bincount(codes, weights=self.columns["balance_due"][rows][mask][present], minlength=size)
+
+        values = self.dictionaries[key].values
+        groups = [
+            {
+                key: values[code],
+                "customers": int(counts[code]),
+                "monthly_revenue": float(revenue[code]),
+                "average_revenue_per_user": float(revenue[code] / counts[code]),
+                "balance_due": float(balance[code]),
+            }
+            for code in np.flatnonzero(counts)
+        ]
+        groups.sort(key=lambda group: -group["monthly_revenue"])
+        return groups
@@ -0,0 +1,128 @@
+"""
+Streaming customer export (NDJSON or CSV, optionally gzip-compressed).
+
+Customers are read from the repository one batch at a time and each batch
+is serialized and handed to the response before the next one is read, so
+memory stays flat however large the store and the first bytes go out
+right away.
+"""
+
+import csv
+import io
+import zlib
+from datetime import datetime
+from enum import Enum
+from operator import attrgetter
+from typing import Any, AsyncIterator, List, Optional
+
+from app.models.customer import Customer, CustomerFilter
+from app.services.customer_service import iter_customer_batches
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_BATCH_SIZE = 1000
+GZIP_LEVEL = 6
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Default column order: identifiers first, then the model's field order
+CUSTOMER_FIELDS = ("id", "customer_number") + tuple(
+    name for name in Customer.model_fields if name not in ("id", "customer_number")
+)
+
+
+def export_format(format: str) -> str:
+    format = format.lower()
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {format!r}; expected one of {', '.join(EXPORT_FORMATS)}")
+    return format
+
+
+def export_fields(fields: Optional[str]) -> List[str]:
+    """Parse a comma-separated field projection (every field when empty)"""
+    if not fields:
+        return list(CUSTOMER_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in Customer.model_fields]
+    if unknown:
+        raise ValueError(f"Unknown customer fields: {', '.join(unknown)}")
+    # Keep the requested order, drop repeats
+    return list(dict.fromkeys(names))
+
+
+def _ndjson(batch: List[Customer], fields: List[str]) -> bytes:
+    include = set(fields) if len(fields) < len(CUSTOMER_FIELDS) else None
+    return "".join(customer.model_dump_json(include=include) + "\n" for customer in batch).encode()
+
+
+def _csv_value(value: Any) -> Any:
+    # Same text as the JSON export: enum values and ISO 8601 datetimes
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class _CSVWriter:
+    def __init__(self, fields: List[str]):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._writer.writerow(fields)
+        # Reading attributes directly is about twice as fast as a JSON-mode
+        # model dump restricted to the projected fields
+        if len(fields) == 1:
+            get = attrgetter(fields[0])
+            self._values = lambda customer: (get(customer),)
+        else:
+            self._values = attrgetter(*fields)
+
+    def write(self, batch: List[Customer]) -> bytes:
+        values = self._values
+        self._writer.writerows([_csv_value(value) for value in values(customer)] for customer in batch)
+        return self.flush()
+
+    def flush(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+async def _serialize(
+    filters: Optional[CustomerFilter],
+    format: str,
+    fields: List[str],
+    batch_size: int
+) -> AsyncIterator[bytes]:
+    writer = _CSVWriter(fields) if format == "csv" else None
+    if writer is not None:
+        yield writer.flush()  # header row
+    async for batch in iter_customer_batches(filters, batch_size):
+        yield writer.write(batch) if writer is not None else _ndjson(batch, fields)
+
+
+async def export_customers(
+    filters: Optional[CustomerFilter] = None,
+    format: str = "ndjson",
+    fields: Optional[List[str]] = None,
+    gzip: bool = False,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[bytes]:
+    """Yield the export body chunk by chunk.
+
+    With gzip, each batch is compressed with a sync flush so clients can
+    decompress and process rows as they arrive.
+    """
+    chunks = _serialize(filters, format, fields or list(CUSTOMER_FIELDS), batch_size)
+    if not gzip:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -0,0 +1,230 @@
+import heapq
+import math
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.models.customer import Customer
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# ~1.1 km cells: a city-sized viewport touches a few hundred cells
+CELL_DEGREES = 0.01
+
+Cell = Tuple[int, int]
+Point = Tuple[float, float]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points, in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a circle"""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+    dlon = min(180.0, radius_km / (KM_PER_DEGREE * cos_lat))
+    return (max(-90.0, lat - dlat), max(-180.0, lon - dlon),
+            min(90.0, lat + dlat), min(180.0, lon + dlon))
+
+
+def validate_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError("Bounding box minimums must not exceed its maximums")
+
+
+# Fields sent per customer to map views (full records are fetched on click)
+MARKER_FIELDS = (
+    "id", "customer_number", "name", "status", "service_type", "payment_status",
+    "router_name", "signal_strength", "latitude", "longitude",
+)
+
+
+def map_marker(customer: Customer) -> Dict[str, object]:
+    """Compact map representation of a customer"""
+    return {field: getattr(customer, field) for field in MARKER_FIELDS}
+
+
+def _has_location(customer: Customer) -> bool:
+    return customer.latitude is not None and customer.longitude is not None
+
+
+class GeoGridIndex:
+    """Uniform lat/lon grid over geocoded customers.
+
+    Each cell keeps the coordinates of its customers, so box and radius
+    queries only look at the cells they overlap and check exact positions
+    on the partially covered ones. Customers without coordinates are not
+    indexed.
+    """
+
+    SOURCE_FIELDS = frozenset({"latitude", "longitude"})
+
+    def __init__(self, cell_degrees: float = CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Cell, Dict[str, Point]] = {}
+        self._cell_of: Dict[str, Cell] = {}
+        # [min_y, max_y, min_x, max_x] of cells ever occupied (never shrinks),
+        # bounding how far a nearest-neighbour search has to go
+        self._extent: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return len(self._cell_of)
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def add(self, customer: Customer):
+        """Index (or move) a customer; customers without coordinates are dropped"""
+        if not _has_location(customer):
+            self.remove(customer.id)
+            return
+        cell = self._cell(customer.latitude, customer.longitude)
+        previous = self._cell_of.get(customer.id)
+        if previous is not None and previous != cell:
+            self.remove(customer.id)
+        self._cells.setdefault(cell, {})[customer.id] = (customer.latitude, customer.longitude)
+        self._cell_of[customer.id] = cell
+        y, x = cell
+        extent = self._extent
+        if extent is None:
+            self._extent = [y, y, x, x]
+        else:
+            extent[:] = [min(extent[0], y), max(extent[1], y), min(extent[2], x), max(extent[3], x)]
+
+    def remove(self, customer_id: str):
+        cell = self._cell_of.pop(customer_id, None)
+        if cell is None:
+            return
+        members = self._cells[cell]
+        del members[customer_id]
+        if not members:
+            del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._cell_of.clear()
+        self._extent = None
+
+    def _cells_in(self, min_cell: Cell, max_cell: Cell) -> Iterator[Tuple[Cell, Dict[str, Point]]]:
+        """Non-empty cells inside an inclusive cell range"""
+        (min_y, min_x), (max_y, max_x) = min_cell, max_cell
+        cells = self._cells
+        if (max_y - min_y + 1) * (max_x - min_x + 1) > len(cells):
+            # Large ranges (zoomed-out maps): walk the occupied cells instead
+            for cell, members in cells.items():
+                if min_y <= cell[0] <= max_y and min_x <= cell[1] <= max_x:
+                    yield cell, members
+            return
+        for y in range(min_y, max_y + 1):
+            for x in range(min_x, max_x + 1):
+                members = cells.get((y, x))
+                if members:
+                    yield (y, x), members
+
+    def bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[str]:
+        """Ids of customers inside a bounding box (edges included), in grid order"""
+        min_cell = self._cell(min_lat, min_lon)
+        max_cell = self._cell(max_lat, max_lon)
+        ids: List[str] = []
+        for (y, x), members in self._cells_in(min_cell, max_cell):
+            if min_cell[0] < y < max_cell[0] and min_cell[1] < x < max_cell[1]:
+                ids.extend(members)  # cell fully inside the box
+            else:
+                ids.extend(
+                    customer_id for customer_id, (lat, lon) in members.items()
+                    if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+                )
+        return ids
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, str]]:
+        """(distance_km, id) of customers within ``radius_km``, nearest first"""
+        min_lat, min_lon, max_lat, max_lon = radius_bbox(lat, lon, radius_km)
+        found = []
+        for _, members in self._cells_in(self._cell(min_lat, min_lon), self._cell(max_lat, max_lon)):
+            for customer_id, (point_lat, point_lon) in members.items():
+                distance = haversine_km(lat, lon, point_lat, point_lon)
+                if distance <= radius_km:
+                    found.append((distance, customer_id))
+        found.sort()
+        return found
+
+    def nearest(self, lat: float, lon: float, k: int,
+                max_km: Optional[float] = None) -> List[Tuple[float, str]]:
+        """(distance_km, id) of the ``k`` nearest customers, nearest first.
+
+        Rings of cells around the query point are scanned outwards until no
+        unvisited cell can hold anything closer than the current k-th best.
+        """
+        if k <= 0 or not self._cells:
+            return []
+        center_y, center_x = self._cell(lat, lon)
+        extent = min_y, max_y, min_x, max_x = self._extent
+        # Rings closer than the occupied extent are empty; rings beyond its
+        # far edge do not exist
+        first_ring = max(min_y - center_y, center_y - max_y, min_x - center_x, center_x - max_x, 0)
+        last_ring = max(abs(center_y - min_y), abs(center_y - max_y),
+                        abs(center_x - min_x), abs(center_x - max_x))
+
+        best: List[Tuple[float, str]] = []  # max-heap via negated distances
+        for ring in range(first_ring, last_ring + 1):
+            if ring > 0:
+                # Any cell in this ring is at least (ring - 1) whole cells away;
+                # longitude degrees shrink with latitude, so use the narrowest
+                # one the ring reaches
+                reach = (ring - 1) * self.cell_degrees
+                cos_lat = math.cos(math.radians(min(89.9, abs(lat) + (ring + 1) * self.cell_degrees)))
+                lower_bound = reach * KM_PER_DEGREE * cos_lat
+                if max_km is not None and lower_bound > max_km:
+                    break
+                if len(best) == k and lower_bound > -best[0][0]:
+                    break
+            if 8 * ring > len(self._cells):
+                # Sparse surroundings (e.g. a few far-off customers): visiting
+                # the occupied cells left is cheaper than walking the rings
+                cells = [
+                    cell for cell in self._cells
+                    if max(abs(cell[0] - center_y), abs(cell[1] - center_x)) >= ring
+                ]
+                for cell in cells:
+                    self._nearest_in(self._cells[cell], lat, lon, k, max_km, best)
+                break
+            for cell in self._ring(center_y, center_x, ring, extent):
+                members = self._cells.get(cell)
+                if members:
+                    self._nearest_in(members, lat, lon, k, max_km, best)
+        return sorted((-negated, customer_id) for negated, customer_id in best)
+
+    @staticmethod
+    def _nearest_in(members: Dict[str, Point], lat: float, lon: float, k: int,
+                    max_km: Optional[float], best: List[Tuple[float, str]]):
+        """Offer the customers of one cell to the k-nearest max-heap"""
+        for customer_id, (point_lat, point_lon) in members.items():
+            distance = haversine_km(lat, lon, point_lat, point_lon)
+            if max_km is not None and distance > max_km:
+                continue
+            if len(best) < k:
+                heapq.heappush(best, (-distance, customer_id))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, customer_id))
+
+    @staticmethod
+    def _ring(center_y: int, center_x: int, ring: int, extent: List[int]) -> Iterator[Cell]:
+        """Cells on the square ring ``ring`` cells out, clipped to the extent"""
+        min_y, max_y, min_x, max_x = extent
+        if ring == 0:
+            yield center_y, center_x
+            return
+        xs = range(max(center_x - ring, min_x), min(center_x + ring, max_x) + 1)
+        for y in (center_y - ring, center_y + ring):
+            if min_y <= y <= max_y:
+                for x in xs:
+                    yield y, x
+        ys = range(max(center_y - ring + 1, min_y), min(center_y + ring - 1, max_y) + 1)
+        for x in (center_x - ring, center_x + ring):
+            if min_x <= x <= max_x:
+                for y in ys:
+                    yield y, x
@@ -0,0 +1,241 @@
+"""
+Streaming bulk customer import (CSV or NDJSON).
+
+The upload is consumed chunk by chunk: rows are parsed as they arrive and
+handled in batches of IMPORT_BATCH_SIZE. Each batch gets its ids and
+customer numbers from one reserved block, is validated with a single
+validator call and written with a single insert_many, so memory stays
+bounded by the batch size rather than the file size.
+"""
+
+import codecs
+import csv
+import gc
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from app.models.customer import Customer, CustomerCreate
+from app.services.customer_service import add_customers, finish_bulk_load, new_customer_fields
+
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json-lines": "ndjson",
+}
+
+# Columns an upload may set; everything else is assigned by the system
+CUSTOMER_FIELDS = frozenset(CustomerCreate.model_fields)
+
+_validate_batch = TypeAdapter(List[Customer]).validate_python
+
+# (line number the row starts on, raw field values or a parse error message)
+RawRow = Tuple[int, Any]
+
+
+class CustomerImportRowError(BaseModel):
+    row: int  # line number in the upload
+    errors: List[Dict[str, str]]  # [{"field": ..., "message": ...}]
+
+
+class CustomerImportReport(BaseModel):
+    format: str
+    total_rows: int = 0
+    imported: int = 0
+    failed: int = 0
+    errors: List[CustomerImportRowError] = []
+    errors_truncated: bool = False
+    ignored_columns: List[str] = []
+    aborted: Optional[str] = None
+    elapsed_ms: float = 0.0
+
+
+def import_format(format: Optional[str], content_type: Optional[str]) -> str:
+    """Resolve the upload format from an explicit name or the Content-Type"""
+    if format:
+        format = format.lower()
+        if format not in IMPORT_FORMATS:
+            raise ValueError(f"Unknown import format {format!r}; expected one of {', '.join(IMPORT_FORMATS)}")
+        return format
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in CONTENT_TYPES:
+        return CONTENT_TYPES[media_type]
+    raise ValueError("Cannot tell the import format; pass format=csv or format=ndjson")
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines (without line endings)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in chunks:
+        text = tail + decoder.decode(chunk)
+        lines = text.split("\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail.rstrip("\r")
+
+
+async def _ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[RawRow]:
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, "Expected a JSON object"
+            continue
+        yield line_number, {name: value for name, value in row.items() if name in CUSTOMER_FIELDS}
+
+
+async def _csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, str]]:
+    """Group physical lines into CSV records (quoted fields may span lines)"""
+    line_number = 0
+    start, parts, quotes = 0, [], 0
+    async for line in lines:
+        line_number += 1
+        if not parts:
+            start = line_number
+        parts.append(line)
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            yield start, "\n".join(parts)
+            parts, quotes = [], 0
+    if parts:
+        yield start, "\n".join(parts)
+
+
+async def _csv_rows(lines: AsyncIterator[str], report: CustomerImportReport) -> AsyncIterator[RawRow]:
+    columns = None
+    async for line_number, record in _csv_records(lines):
+        if not record.strip():
+            continue
+        values = next(csv.reader((record,)))
+        if columns is None:
+            columns = [name.strip().lower() for name in values]
+            report.ignored_columns = [name for name in columns if name not in CUSTOMER_FIELDS]
+            continue
+        if len(values) > len(columns):
+            yield line_number, f"Expected {len(columns)} columns, got {len(values)}"
+            continue
+        # Empty cells are treated as missing so optional fields keep their defaults
+        yield line_number, {
+            name: value for name, value in zip(columns, values)
+            if value != "" and name in CUSTOMER_FIELDS
+        }
+
+
+def _field_errors(errors: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    return [
+        {"field": ".".join(str(part) for part in error["loc"]) or "row", "message": error["msg"]}
+        for error in errors
+    ]
+
+
+async def _build_batch(batch: List[RawRow]) -> Tuple[List[Customer], Dict[int, List[Dict[str, str]]]]:
+    """Turn a batch into new customers; returns them and errors by batch position.
+
+    System fields are added before validation so each row is validated
+    once, straight into a Customer. Rows that fail leave unused ids and
+    customer numbers behind, which is harmless.
+    """
+    errors: Dict[int, List[Dict[str, str]]] = {}
+    rows = []
+    for position, (_, row) in enumerate(batch):
+        if isinstance(row, str):
+            errors[position] = [{"field": "row", "message": row}]
+        else:
+            rows.append((position, row))
+
+    for (_, row), fields in zip(rows, await new_customer_fields(len(rows))):
+        row.update(fields)
+
+    try:
+        return _validate_batch([row for _, row in rows]), errors
+    except ValidationError as e:
+        failed: Dict[int, List[Dict[str, Any]]] = {}
+        for error in e.errors(include_url=False):
+            index, *loc = error["loc"]
+            failed.setdefault(index, []).append(dict(error, loc=loc))
+
+    for index, row_errors in failed.items():
+        errors[rows[index][0]] = _field_errors(row_errors)
+    # Only the failing rows are dropped; the rest validate cleanly in one more call
+    valid = _validate_batch([row for index, (_, row) in enumerate(rows) if index not in failed])
+    return valid, errors
+
+
+async def _import_batch(batch: List[RawRow], report: CustomerImportReport):
+    # The new customers are long-lived: collecting while a batch of them
+    # is allocated only rescans the whole store over and over
+    gc.disable()
+    try:
+        customers, errors = await _build_batch(batch)
+        if customers:
+            await add_customers(customers)
+            report.imported += len(customers)
+    finally:
+        gc.enable()
+
+    report.failed += len(errors)
+    for position in sorted(errors):
+        if len(report.errors) >= MAX_REPORTED_ERRORS:
+            report.errors_truncated = True
+            break
+        report.errors.append(CustomerImportRowError(row=batch[position][0], errors=errors[position]))
+
+
+async def import_customers(
+    chunks: AsyncIterator[bytes],
+    format: str,
+    batch_size: int = IMPORT_BATCH_SIZE
+) -> CustomerImportReport:
+    """Import customers from a CSV or NDJSON byte stream.
+
+    Rows are imported as new pending customers. Invalid rows are skipped
+    and listed in the report by line number; valid rows are committed
+    batch by batch, so an aborted upload keeps the batches already written.
+    """
+    started = time.perf_counter()
+    report = CustomerImportReport(format=format)
+    lines = _lines(chunks)
+    rows = _csv_rows(lines, report) if format == "csv" else _ndjson_rows(lines)
+
+    batch: List[RawRow] = []
+    try:
+        async for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                report.total_rows += len(batch)
+                await _import_batch(batch, report)
+                batch = []
+    except UnicodeDecodeError as e:
+        report.aborted = f"Upload is not valid UTF-8 ({e.reason}); the rest of the upload was not read"
+    if batch:
+        report.total_rows += len(batch)
+        await _import_batch(batch, report)
+    if report.imported:
+        gc.disable()
+        try:
+            await finish_bulk_load()
+        finally:
+            gc.enable()
+
+    report.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    return report
@@ -0,0 +1,214 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.models.customer import Customer
+from app.services.customer_search import fold_text
+
+_EMPTY: Set[str] = frozenset()
+
+
+def normalize_key(value: Optional[str]) -> Optional[str]:
+    """Normalize free-text keys (city, router) for case-insensitive lookups"""
+    if value is None:
+        return None
+    return value.strip().casefold()
+
+
+def city_key(value: Optional[str]) -> Optional[str]:
+    """Normalize a city for lookups, ignoring case and accents ("cancun"
+    matches "Cancún")"""
+    if value is None:
+        return None
+    return fold_text(value.strip())
+
+
+class CustomerIndex:
+    """Hash indexes over the customer store, kept in sync by customer_service"""
+
+    # Indexed field -> key extractor
+    FIELDS = {
+        "status": lambda c: c.status,
+        "service_type": lambda c: c.service_type,
+        "payment_status": lambda c: c.payment_status,
+        "city": lambda c: city_key(c.city),
+        "router_name": lambda c: normalize_key(c.router_name),
+    }
+    # Customer fields the index reads (updates touching none of them skip it)
+    SOURCE_FIELDS = frozenset(FIELDS)
+
+    def __init__(self):
+        self._buckets: Dict[str, Dict[object, Set[str]]] = {
+            field: defaultdict(set) for field in self.FIELDS
+        }
+        # customer_id -> keys it is currently indexed under, so removal
+        # never needs the (possibly already mutated) customer object
+        self._keys: Dict[str, Tuple] = {}
+        # customer_id -> insertion sequence, to return results in store order
+        self._order: Dict[str, int] = {}
+        self._next_seq = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, customer: Customer):
+        """Index a customer (replaces any previous entry for the same id)"""
+        customer_id = customer.id
+        if customer_id in self._keys:
+            self.remove(customer_id, keep_order=True)
+        else:
+            self._order[customer_id] = self._next_seq
+            self._next_seq += 1
+
+        keys = tuple(extract(customer) for extract in self.FIELDS.values())
+        for field, key in zip(self.FIELDS, keys):
+            if key is not None:
+                self._buckets[field][key].add(customer_id)
+        self._keys[customer_id] = keys
+
+    def remove(self, customer_id: str, keep_order: bool = False):
+        """Drop a customer from every index"""
+        keys = self._keys.pop(customer_id, None)
+        if keys is None:
+            return
+        for field, key in zip(self.FIELDS, keys):
+            if key is None:
+                continue
+            bucket = self._buckets[field]
+            ids = bucket.get(key)
+            if ids is not None:
+                ids.discard(customer_id)
+                if not ids:
+                    del bucket[key]
+        if not keep_order:
+            self._order.pop(customer_id, None)
+
+    def clear(self):
+        """Drop every entry"""
+        for bucket in self._buckets.values():
+            bucket.clear()
+        self._keys.clear()
+        self._order.clear()
+        self._next_seq = 0
+
+    def lookup(self, field: str, key) -> Set[str]:
+        """Return the ids indexed under ``key`` (do not mutate the result)"""
+        return self._buckets[field].get(key, _EMPTY)
+
+    def counts(self, field: str) -> Dict[object, int]:
+        """Return the number of customers per key of an indexed field"""
+        return {key: len(ids) for key, ids in self._buckets[field].items()}
+
+    def intersect(self, criteria: Iterable[Tuple[str, object]]) -> Optional[Set[str]]:
+        """Intersect the id sets for (field, key) pairs, smallest set first.
+
+        Returns None when no criteria were given (i.e. "every customer").
+        """
+        sets = [self.lookup(field, key) for field, key in criteria]
+        if not sets:
+            return None
+        sets.sort(key=len)
+        result = set(sets[0])
+        for ids in sets[1:]:
+            if not result:
+                break
+            result.intersection_update(ids)
+        return result
+
+    def in_store_order(self, ids: Iterable[str]) -> List[str]:
+        """Sort ids by the order their customers entered the store"""
+        order = self._order
+        return sorted(ids, key=order.__getitem__)
+
+
+def _id_key(customer: Customer):
+    # Numeric ids sort numerically ("2" < "10"), others after them by text
+    return (len(customer.id), customer.id)
+
+
+class SortedKeyIndex:
+    """Ordered (key, id) lists per sort field, for keyset pagination"""
+
+    SORT_KEYS = {
+        "id": _id_key,
+        "created_at": lambda c: c.created_at.timestamp(),
+        "name": lambda c: normalize_key(c.name) or "",
+    }
+    SOURCE_FIELDS = frozenset(SORT_KEYS)
+
+    def __init__(self):
+        self._entries: Dict[str, List[Tuple]] = {sort: [] for sort in self.SORT_KEYS}
+        self._keys: Dict[str, Tuple] = {}
+        # Bulk inserts are appended unsorted and ordered once, on next use
+        self._unsorted = False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, customer: Customer):
+        """Insert or re-position a customer in every ordering"""
+        keys = tuple(extract(customer) for extract in self.SORT_KEYS.values())
+        if self._keys.get(customer.id) == keys:
+            return
+        self._sort()
+        self.remove(customer.id)
+        for sort, key in zip(self.SORT_KEYS, keys):
+            insort(self._entries[sort], (key, customer.id))
+        self._keys[customer.id] = keys
+
+    def add_many(self, customers: Iterable[Customer]):
+        """Insert a batch of customers.
+
+        New entries are appended and the orderings re-sorted once before the
+        next read, so a bulk load costs one O(n log n) sort instead of an
+        O(n) list shift per customer.
+        """
+        for customer in customers:
+            if customer.id in self._keys:
+                self.add(customer)
+                continue
+            keys = tuple(extract(customer) for extract in self.SORT_KEYS.values())
+            self._keys[customer.id] = keys
+            for sort, key in zip(self.SORT_KEYS, keys):
+                self._entries[sort].append((key, customer.id))
+            self._unsorted = True
+
+    def _sort(self):
+        if self._unsorted:
+            for entries in self._entries.values():
+                entries.sort()
+            self._unsorted = False
+
+    def remove(self, customer_id: str):
+        """Drop a customer from every ordering"""
+        keys = self._keys.pop(customer_id, None)
+        if keys is None:
+            return
+        self._sort()
+        for sort, key in zip(self.SORT_KEYS, keys):
+            entries = self._entries[sort]
+            del entries[bisect_left(entries, (key, customer_id))]
+
+    def clear(self):
+        """Drop every entry"""
+        for entries in self._entries.values():
+            entries.clear()
+        self._keys.clear()
+        self._unsorted = False
+
+    def page(self, sort: str, limit: int, after: Optional[Tuple] = None,
+             descending: bool = False, skip: int = 0) -> List[Tuple]:
+        """Return up to ``limit`` (key, id) entries following ``after``.
+
+        Costs O(log n + limit): the position after the last seen entry is
+        found by bisection, so deleting rows never shifts later pages.
+        """
+        self._sort()
+        entries = self._entries[sort]
+        if descending:
+            end = len(entries) if after is None else bisect_left(entries, after)
+            end = max(end - skip, 0)
+            return entries[max(end - limit, 0):end][::-1]
+        start = 0 if after is None else bisect_right(entries, after)
+        start += skip
+        return entries[start:start + limit]
@@ -0,0 +1,153 @@
+"""
+Invoice documents of a billing run (see customer_billing).
+
+Rendering runs in worker processes: a worker is handed the path of one
+charge chunk, renders an XML and/or PDF document per invoice and writes
+them into one zip archive next to the chunk, so only a path and a count
+cross the process boundary and a worker holds a single chunk in memory.
+This module is kept free of the app's heavier imports because every
+worker process imports it.
+
+The XML follows the CFDI 4.0 layout but is neither sealed nor stamped:
+that needs the CFDI certificate and a PAC, and happens downstream.
+"""
+
+import os
+import pickle
+import zipfile
+from typing import Any, Dict, List, Sequence
+from xml.sax.saxutils import quoteattr
+
+INVOICE_FORMATS = ("xml", "pdf")
+
+# Text columns a charge chunk carries for its documents
+DOCUMENT_FIELDS = ("id", "customer_number", "name", "email", "address", "zip_code", "plan_name")
+
+# SAT catalog codes: telecommunication services, service unit, generic
+# public RFC, "no tax effects" use
+PRODUCT_CODE = "81161700"
+UNIT_CODE = "E48"
+PUBLIC_RFC = "XAXX010101000"
+
+
+def invoice_formats(formats: Sequence[str]) -> List[str]:
+    unknown = [format for format in formats if format not in INVOICE_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown invoice formats: {', '.join(unknown)}; expected {', '.join(INVOICE_FORMATS)}")
+    return list(dict.fromkeys(formats))
+
+
+def write_chunk(path: str, chunk: Dict[str, Any]):
+    """Write a charge chunk atomically (temp file + rename)"""
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        pickle.dump(chunk, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+def read_chunk(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as file:
+        return pickle.load(file)
+
+
+def _money(value: float) -> str:
+    return f"{value:.2f}"
+
+
+def render_xml(invoice: Dict[str, Any], issuer: Dict[str, Any]) -> bytes:
+    description = f"{invoice['plan_name']} ({issuer['period']})"
+    if invoice["fraction"] < 1:
+        description += f", prorated {invoice['fraction']:.4f}"
+    tax = (
+        f'<cfdi:Traslado Base="{_money(invoice["subtotal"])}" Impuesto="002" TipoFactor="Tasa" '
+        f'TasaOCuota="{issuer["tax_rate"]:.6f}" Importe="{_money(invoice["tax"])}"/>'
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4" Version="4.0" '
+        f'Serie="{issuer["period"].replace("-", "")}" Folio={quoteattr(invoice["customer_number"])} '
+        f'Fecha="{issuer["issued_at"]}" Moneda="{issuer["currency"]}" '
+        f'SubTotal="{_money(invoice["subtotal"])}" Total="{_money(invoice["total"])}" '
+        'TipoDeComprobante="I" Exportacion="01" MetodoPago="PUE" FormaPago="99">\n'
+        f'  <cfdi:Emisor Rfc={quoteattr(issuer["rfc"])} Nombre={quoteattr(issuer["company"])}/>\n'
+        f'  <cfdi:Receptor Rfc="{PUBLIC_RFC}" Nombre={quoteattr(invoice["name"])} '
+        f'DomicilioFiscalReceptor={quoteattr(invoice["zip_code"] or "")} UsoCFDI="S01"/>\n'
+        '  <cfdi:Conceptos>\n'
+        f'    <cfdi:Concepto ClaveProdServ="{PRODUCT_CODE}" Cantidad="1" ClaveUnidad="{UNIT_CODE}" '
+        f'Descripcion={quoteattr(description)} ValorUnitario="{_money(invoice["subtotal"])}" '
+        f'Importe="{_money(invoice["subtotal"])}" ObjetoImp="02">\n'
+        f'      <cfdi:Impuestos><cfdi:Traslados>{tax}</cfdi:Traslados></cfdi:Impuestos>\n'
+        '    </cfdi:Concepto>\n'
+        '  </cfdi:Conceptos>\n'
+        f'  <cfdi:Impuestos TotalImpuestosTrasladados="{_money(invoice["tax"])}">'
+        f'<cfdi:Traslados>{tax}</cfdi:Traslados></cfdi:Impuestos>\n'
+        '</cfdi:Comprobante>\n'
+    ).encode()
+
+
+def _pdf_text(value: str) -> bytes:
+    value = value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return value.encode("cp1252", "replace")
+
+
+def render_pdf(invoice: Dict[str, Any], issuer: Dict[str, Any]) -> bytes:
+    """Single-page text PDF (built by hand; no PDF library needed)"""
+    currency = issuer["currency"]
+    lines = [
+        f"{issuer['company']}  RFC {issuer['rfc']}",
+        f"Invoice {invoice['customer_number']}  {issuer['period']}  issued {issuer['issued_at'][:10]}",
+        "",
+        invoice["name"],
+        invoice["address"] or "",
+        f"CP {invoice['zip_code'] or ''}",
+        "",
+        f"{invoice['plan_name']}" + (f" (prorated {invoice['fraction']:.2%})" if invoice["fraction"] < 1 else ""),
+        f"Subtotal          {_money(invoice['subtotal']):>12} {currency}",
+        f"IVA {issuer['tax_rate']:.0%}          {_money(invoice['tax']):>12} {currency}",
+        f"Total             {_money(invoice['total']):>12} {currency}",
+        f"Previous balance  {_money(invoice['previous_balance']):>12} {currency}",
+        f"Amount due        {_money(invoice['amount_due']):>12} {currency}",
+    ]
+    stream = b"BT /F1 11 Tf 14 TL 50 780 Td\n" + b"".join(b"(" + _pdf_text(line) + b") '\n" for line in lines) + b"ET"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+    ]
+    document = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(document))
+        document += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(document)
+    document += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    document += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    document += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(document)
+
+
+RENDERERS = {"xml": render_xml, "pdf": render_pdf}
+
+
+def render_chunk(chunk_path: str, archive_path: str, formats: Sequence[str], issuer: Dict[str, Any]) -> int:
+    """Render every invoice of a chunk into a zip archive; returns the count.
+
+    Runs in a worker process. The archive is written under a temporary name
+    and renamed when complete, so an interrupted chunk is simply redone.
+    """
+    chunk = read_chunk(chunk_path)
+    columns = [*DOCUMENT_FIELDS, "fraction", "subtotal", "tax", "total", "previous_balance", "amount_due"]
+    values = [chunk[name] if name in DOCUMENT_FIELDS else chunk[name].tolist() for name in columns]
+    temporary = f"{archive_path}.tmp"
+    count = 0
+    with zipfile.ZipFile(temporary, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for row in zip(*values):
+            invoice = dict(zip(columns, row))
+            for format in formats:
+                archive.writestr(f"{invoice['customer_number']}.{format}", RENDERERS[format](invoice, issuer))
+            count += 1
+    os.replace(temporary, archive_path)
+    return count
@@ -0,0 +1,248 @@
+"""
+IP and MAC address lookups for NOC alarm correlation.
+
+IP addresses live in a byte-stride prefix trie (one per IP version), which
+answers exact lookups and CIDR containment ("every customer in
+192.168.2.0/24") by walking at most one node per address byte. MAC
+addresses are normalized and kept in a plain hash index.
+"""
+
+import ipaddress
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel, Field
+
+from app.models.customer import Customer
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# Addresses a single batch lookup may resolve
+MAX_BATCH_ADDRESSES = 10_000
+
+_MAC_SEPARATORS = re.compile(r"[\s:.\-]")
+_MAC_DIGITS = re.compile(r"[0-9a-f]{12}")
+
+# Fields returned per matched customer by lookups meant for the NOC console
+NOC_FIELDS = (
+    "id", "customer_number", "name", "status", "service_type", "payment_status",
+    "router_name", "ip_address", "mac_address", "phone", "city",
+)
+
+
+def parse_ip(value: Optional[str]) -> Optional[IPAddress]:
+    """Parsed IP address, or None when the value is not one"""
+    if not value:
+        return None
+    try:
+        return ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+
+
+def parse_network(value: str) -> IPNetwork:
+    """Parse a CIDR block (host bits are ignored); raises ValueError"""
+    try:
+        return ipaddress.ip_network(value.strip(), strict=False)
+    except ValueError:
+        raise ValueError(f"Invalid CIDR block: {value!r}")
+
+
+def normalize_ip(value: Optional[str]) -> Optional[str]:
+    """Canonical text form of an IP address (None when invalid)"""
+    address = parse_ip(value)
+    return str(address) if address is not None else None
+
+
+def normalize_mac(value: Optional[str]) -> Optional[str]:
+    """MAC address as 12 lowercase hex digits, whatever the separators
+    (AA:BB:CC:DD:EE:01, aa-bb-cc-dd-ee-01, aabb.ccdd.ee01); None when invalid"""
+    if not value:
+        return None
+    digits = _MAC_SEPARATORS.sub("", value).lower()
+    return digits if _MAC_DIGITS.fullmatch(digits) else None
+
+
+def ip_key(address: IPAddress) -> str:
+    """Fixed-width sortable text key: version digit + zero-padded hex.
+
+    Keys of one version compare like the addresses, so a CIDR block is a
+    contiguous key range (used by the SQL store).
+    """
+    return f"{address.version}{address.packed.hex()}"
+
+
+def network_key_range(network: IPNetwork) -> Tuple[str, str]:
+    """Inclusive (low, high) ip_key range covered by a CIDR block"""
+    return ip_key(network.network_address), ip_key(network.broadcast_address)
+
+
+def noc_summary(customer: Customer) -> Dict[str, object]:
+    """Compact customer representation for alarm correlation"""
+    return {field: getattr(customer, field) for field in NOC_FIELDS}
+
+
+class NetworkLookupRequest(BaseModel):
+    """Batch IP/MAC resolution request"""
+    ip_addresses: List[str] = Field(default_factory=list, max_length=MAX_BATCH_ADDRESSES)
+    mac_addresses: List[str] = Field(default_factory=list, max_length=MAX_BATCH_ADDRESSES)
+
+
+class _Node:
+    __slots__ = ("children", "count", "ids")
+
+    def __init__(self):
+        self.children: Dict[int, "_Node"] = {}
+        self.count = 0  # customers stored under this node
+        self.ids: Optional[Set[str]] = None  # set on full-length (leaf) nodes
+
+
+class IPPrefixTrie:
+    """Prefix trie over IP addresses with one level per address byte.
+
+    Every node counts the customers below it, so the size of a CIDR block
+    is known without walking it, and results come out in address order.
+    """
+
+    def __init__(self):
+        self._roots = {4: _Node(), 6: _Node()}
+
+    def add(self, address: IPAddress, customer_id: str):
+        node = self._roots[address.version]
+        node.count += 1
+        for byte in address.packed:
+            child = node.children.get(byte)
+            if child is None:
+                child = node.children[byte] = _Node()
+            node = child
+            node.count += 1
+        if node.ids is None:
+            node.ids = set()
+        node.ids.add(customer_id)
+
+    def remove(self, address: IPAddress, customer_id: str):
+        path = [self._roots[address.version]]
+        for byte in address.packed:
+            child = path[-1].children.get(byte)
+            if child is None:
+                return
+            path.append(child)
+        if customer_id not in (path[-1].ids or ()):
+            return
+        path[-1].ids.discard(customer_id)
+        for node in path:
+            node.count -= 1
+        # Prune the branch that became empty
+        for depth, byte in enumerate(address.packed):
+            if path[depth + 1].count == 0:
+                del path[depth].children[byte]
+                break
+
+    def clear(self):
+        self._roots = {4: _Node(), 6: _Node()}
+
+    def lookup(self, address: IPAddress) -> Set[str]:
+        node = self._roots[address.version]
+        for byte in address.packed:
+            node = node.children.get(byte)
+            if node is None:
+                return set()
+        return set(node.ids or ())
+
+    def _network_nodes(self, network: IPNetwork) -> List[_Node]:
+        """Subtrees that together hold exactly the addresses in a block"""
+        node = self._roots[network.version]
+        packed = network.network_address.packed
+        whole_bytes, extra_bits = divmod(network.prefixlen, 8)
+        for byte in packed[:whole_bytes]:
+            node = node.children.get(byte)
+            if node is None:
+                return []
+        if not extra_bits:
+            return [node]
+        low = packed[whole_bytes]
+        high = low | (0xFF >> extra_bits)
+        return [node.children[byte] for byte in sorted(node.children) if low <= byte <= high]
+
+    def in_network(self, network: IPNetwork, limit: Optional[int] = None) -> Tuple[int, List[str]]:
+        """(customers in the block, up to ``limit`` of their ids in address order)"""
+        nodes = self._network_nodes(network)
+        total = sum(node.count for node in nodes)
+        ids: List[str] = []
+        limit = total if limit is None else limit
+        stack = list(reversed(nodes))
+        while stack and len(ids) < limit:
+            node = stack.pop()
+            if node.ids:
+                ids.extend(sorted(node.ids, key=int))
+            stack.extend(node.children[byte] for byte in sorted(node.children, reverse=True))
+        return total, ids[:limit]
+
+
+class CustomerNetworkIndex:
+    """IP trie plus MAC hash index over the customer store"""
+
+    SOURCE_FIELDS = frozenset({"ip_address", "mac_address"})
+
+    def __init__(self):
+        self.ip_trie = IPPrefixTrie()
+        self._by_mac: Dict[str, Set[str]] = defaultdict(set)
+        # customer_id -> (address, mac) it is indexed under
+        self._keys: Dict[str, Tuple[Optional[IPAddress], Optional[str]]] = {}
+        # customer_id -> the raw (ip_address, mac_address) values, so
+        # unrelated updates skip re-parsing
+        self._raw: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, customer: Customer):
+        """Index a customer (replaces any previous entry for the same id)"""
+        raw = (customer.ip_address, customer.mac_address)
+        if self._raw.get(customer.id) == raw:
+            return
+        self.remove(customer.id)
+        keys = address, mac = parse_ip(raw[0]), normalize_mac(raw[1])
+        if address is not None:
+            self.ip_trie.add(address, customer.id)
+        if mac is not None:
+            self._by_mac[mac].add(customer.id)
+        self._keys[customer.id] = keys
+        self._raw[customer.id] = raw
+
+    def remove(self, customer_id: str):
+        self._raw.pop(customer_id, None)
+        keys = self._keys.pop(customer_id, None)
+        if keys is None:
+            return
+        address, mac = keys
+        if address is not None:
+            self.ip_trie.remove(address, customer_id)
+        if mac is not None:
+            ids = self._by_mac.get(mac)
+            if ids is not None:
+                ids.discard(customer_id)
+                if not ids:
+                    del self._by_mac[mac]
+
+    def clear(self):
+        self.ip_trie.clear()
+        self._by_mac.clear()
+        self._keys.clear()
+        self._raw.clear()
+
+    def by_ip(self, address: IPAddress) -> Set[str]:
+        return self.ip_trie.lookup(address)
+
+    def by_mac(self, mac: str) -> Set[str]:
+        return set(self._by_mac.get(mac, ()))
+
+    def in_network(self, network: IPNetwork, limit: Optional[int] = None) -> Tuple[int, List[str]]:
+        return self.ip_trie.in_network(network, limit)
+
+
+def distinct(values: Iterable[Optional[str]]) -> List[str]:
+    """Drop Nones and repeats, keeping the first-seen order"""
+    return list(dict.fromkeys(value for value in values if value is not None))
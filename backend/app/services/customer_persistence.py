@@ -0,0 +1,592 @@
+"""
+Snapshot + write-ahead log persistence for the in-memory customer store.
+
+    <PERSISTENCE_DIR>/snapshot.bin               latest snapshot
+    <PERSISTENCE_DIR>/00000000000000000003.wal   write-ahead log segments
+
+Every write is appended to the current WAL segment as one framed record
+(``<u32 length><u32 crc32><pickled list of mutations>``) before the
+service call returns. The mutations are redo records:
+
+    ("create", (field values...))
+    ("update", id, {field: new value})
+    ("delete", id)
+
+A snapshot first switches the WAL to a new segment, then writes the store
+out in the background and finally deletes the older segments. Customers
+may change while the snapshot is written, so it can already contain some
+of the new segment's writes; redo records are idempotent, so replaying
+the new segment on top of it still ends at the right state.
+
+Snapshot layout: ``MAGIC``, pickled chunks of CHUNK_SIZE customers (tuples
+of field values), the CustomerColumns arrays as raw little-endian buffers,
+optionally the other secondary indexes pickled, a JSON footer (field
+names, id counters, first WAL segment to replay, section offsets, dtypes
+and checksums), the footer length as a u64 and ``MAGIC`` again. It is
+memory-mapped on load: the column arrays are read straight from the
+mapping with numpy and the other sections are unpickled from it.
+Snapshots and WAL segments are only ever read back by this process's own
+code, so pickle is safe here.
+
+The customer records themselves stay pickled: they have to become
+Customer objects either way, and a columnar decode measured slower than
+pickle's C loop for that. What a restart spends its time on is rebuilding
+the secondary indexes (the trigram search index above all), so:
+
+- every snapshot stores the column arrays, which copy out in a few
+  milliseconds on the event loop;
+- the snapshot taken on shutdown also stores the other indexes. Periodic
+  snapshots leave those out, since pickling them has to block the event
+  loop.
+
+On startup the stored indexes are reused and only the customers the WAL
+touched since the snapshot are re-indexed; missing indexes are rebuilt.
+
+Durability (WAL_DURABILITY) trades write latency for what a machine crash
+can lose; a crash of the process alone never loses acknowledged writes:
+
+    always    fsync after every write, before the request returns
+    group     the write waits for an fsync shared by every write made
+              meanwhile (group commit): one fsync covers a burst of
+              concurrent requests
+    interval  the write returns at once; the log is fsynced every
+              WAL_FSYNC_INTERVAL_MS, so up to that much can be lost
+"""
+
+import asyncio
+import gc
+import json
+import logging
+import mmap
+import operator
+import os
+import pickle
+import struct
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.core.config import (
+    PERSISTENCE_DIR, SNAPSHOT_INTERVAL_SECONDS, SNAPSHOT_WAL_BYTES,
+    WAL_DURABILITY, WAL_FSYNC_INTERVAL_MS
+)
+from app.models.customer import Customer
+from app.services.customer_columns import CustomerColumns
+from app.services.customer_repository import (
+    CustomerChange, InMemoryCustomerRepository, customer_number_sequence
+)
+from app.services.customer_search import FIELD_WEIGHTS, GRAM_SIZE
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("always", "group", "interval")
+SNAPSHOT_NAME = "snapshot.bin"
+WAL_SUFFIX = ".wal"
+MAGIC = b"N2PSNAP1"
+CHUNK_SIZE = 10_000
+
+_RECORD_HEADER = struct.Struct("<II")  # payload length, crc32
+_FOOTER_LENGTH = struct.Struct("<Q")
+_PICKLE_PROTOCOL = 5
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+
+FIELDS = tuple(Customer.model_fields)
+_customer_values = operator.attrgetter(*FIELDS)
+
+# Stored indexes are only reused when built by the same code: bump the
+# version whenever an index class changes what it keeps
+INDEX_FORMAT = [4, GRAM_SIZE, list(FIELD_WEIGHTS), list(FIELDS)]
+COLUMNS_FORMAT = [[name, np.dtype(dtype).str] for name, (dtype, _) in CustomerColumns.COLUMNS.items()]
+
+# Separator of the strings stored alongside the column arrays (customer
+# ids, dictionary values); columns are not stored when a value contains it
+_TEXT_SEPARATOR = "\0"
+_SECTION_ALIGNMENT = 8
+
+
+def _customer_factory(fields: Sequence[str]) -> Callable[[tuple], Customer]:
+    """Build customers from stored field values without re-validating them.
+
+    The stored values were validated when first written. With the current
+    field layout the instance is assembled directly, which is several
+    times faster than model_construct; after a model change model_construct
+    fills in new fields' defaults and drops removed ones.
+    """
+    fields = tuple(fields)
+    if fields != FIELDS:
+        return lambda values: Customer.model_construct(**dict(zip(fields, values)))
+    new, set_attribute, field_set = object.__new__, object.__setattr__, frozenset(FIELDS)
+
+    def build(values: tuple) -> Customer:
+        customer = new(Customer)
+        set_attribute(customer, "__dict__", dict(zip(FIELDS, values)))
+        set_attribute(customer, "__pydantic_fields_set__", set(field_set))
+        set_attribute(customer, "__pydantic_extra__", None)
+        set_attribute(customer, "__pydantic_private__", None)
+        return customer
+
+    return build
+
+
+def _fsync_directory(directory: str):
+    """Make a rename or file creation in ``directory`` durable (POSIX only)"""
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# -- snapshots ----------------------------------------------------------
+
+
+ColumnArrays = Tuple[List[str], Dict[str, List[str]], Dict[str, np.ndarray]]
+
+
+def _write_section(file, data) -> List[int]:
+    """Write one section 8-byte aligned; returns [offset, length, crc32]"""
+    file.write(b"\0" * (-file.tell() % _SECTION_ALIGNMENT))
+    section = [file.tell(), len(data), zlib.crc32(data)]
+    file.write(data)
+    return section
+
+
+def _write_columns(file, columns: ColumnArrays) -> Optional[Dict[str, Any]]:
+    """Store CustomerColumns.to_arrays output as raw buffers; returns its
+    footer entry (None when a string cannot be stored)"""
+    ids, dictionaries, arrays = columns
+    texts = {"ids": ids, **{f"dictionary:{key}": values for key, values in dictionaries.items()}}
+    if any(_TEXT_SEPARATOR in value for values in texts.values() for value in values):
+        return None
+    entry = {"format": COLUMNS_FORMAT, "rows": len(ids), "arrays": {}, "texts": {}}
+    for name, array in arrays.items():
+        array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+        entry["arrays"][name] = [*_write_section(file, array.tobytes()), array.dtype.str]
+    for name, values in texts.items():
+        entry["texts"][name] = [*_write_section(file, _TEXT_SEPARATOR.join(values).encode()), len(values)]
+    return entry
+
+
+def write_snapshot(path: str, customers: List[Customer], last_allocated: Tuple[int, int],
+                   wal_segment: int, indexes: Optional[bytes] = None,
+                   columns: Optional[ColumnArrays] = None) -> int:
+    """Write a snapshot atomically (temp file + rename); returns its size.
+    ``indexes`` are the pickled secondary indexes and ``columns`` the
+    CustomerColumns.to_arrays output, both matching ``customers``."""
+    temporary = f"{path}.tmp"
+    chunks = []
+    with open(temporary, "wb") as file:
+        file.write(MAGIC)
+        for start in range(0, len(customers), CHUNK_SIZE):
+            rows = [_customer_values(customer) for customer in customers[start:start + CHUNK_SIZE]]
+            chunks.append(_write_section(file, pickle.dumps(rows, protocol=_PICKLE_PROTOCOL)))
+        footer = {
+            "fields": FIELDS,
+            "customers": len(customers),
+            "last_id": last_allocated[0],
+            "last_number": last_allocated[1],
+            "wal_segment": wal_segment,
+            "created_at": time.time(),
+            "chunks": chunks,
+        }
+        if columns is not None:
+            entry = _write_columns(file, columns)
+            if entry is not None:
+                footer["columns"] = entry
+        if indexes is not None:
+            footer["indexes"] = _write_section(file, indexes)
+            footer["index_format"] = INDEX_FORMAT
+        footer = json.dumps(footer).encode()
+        file.write(footer)
+        file.write(_FOOTER_LENGTH.pack(len(footer)))
+        file.write(MAGIC)
+        file.flush()
+        os.fsync(file.fileno())
+        size = file.tell()
+    os.replace(temporary, path)
+    _fsync_directory(os.path.dirname(path) or ".")
+    return size
+
+
+def _section(view: memoryview, path: str, section: List[int]) -> memoryview:
+    """A checksum-verified slice of the mapping (the caller releases it)"""
+    offset, length, checksum = section[:3]
+    data = view[offset:offset + length]
+    if zlib.crc32(data) != checksum:
+        data.release()
+        raise ValueError(f"{path}: checksum mismatch in the section at byte {offset}")
+    return data
+
+
+def _load_section(view: memoryview, path: str, section: List[int]) -> Any:
+    with _section(view, path, section) as data:
+        return pickle.loads(data)
+
+
+def _load_columns(view: memoryview, path: str, entry: Dict[str, Any]) -> CustomerColumns:
+    """CustomerColumns from its raw buffers: the arrays are read in place
+    from the mapping and copied once into the live mirror"""
+    texts = {}
+    for name, section in entry["texts"].items():
+        with _section(view, path, section) as data:
+            text = str(data, "utf-8")
+        texts[name] = text.split(_TEXT_SEPARATOR) if section[3] else []
+    arrays, sections = {}, []
+    try:
+        for name, section in entry["arrays"].items():
+            sections.append(_section(view, path, section))
+            arrays[name] = np.frombuffer(sections[-1], dtype=np.dtype(section[3]))
+        dictionaries = {key: texts[f"dictionary:{key}"] for key in CustomerColumns.GROUP_KEYS}
+        return CustomerColumns.from_arrays(texts["ids"], dictionaries, arrays)
+    finally:
+        arrays.clear()
+        for data in sections:
+            data.release()
+
+
+def read_snapshot(path: str) -> Tuple[Dict[str, Any], Dict[str, Customer], Optional[Dict[str, Any]]]:
+    """(footer, customers by id, stored indexes if usable) of a snapshot;
+    raises ValueError when it is corrupt. The stored indexes may be a
+    subset of the repository's (restore rebuilds the others)."""
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+        size = len(mapping)
+        tail = len(MAGIC) + _FOOTER_LENGTH.size
+        if size < len(MAGIC) + tail or mapping[:len(MAGIC)] != MAGIC or mapping[-len(MAGIC):] != MAGIC:
+            raise ValueError(f"{path} is not a complete customer snapshot")
+        footer_length, = _FOOTER_LENGTH.unpack_from(mapping, size - tail)
+        footer = json.loads(mapping[size - tail - footer_length:size - tail])
+        build = _customer_factory(footer["fields"])
+        customers: Dict[str, Customer] = {}
+        indexes: Dict[str, Any] = {}
+        with memoryview(mapping) as view:
+            for chunk in footer["chunks"]:
+                for values in _load_section(view, path, chunk):
+                    customer = build(values)
+                    customers[customer.id] = customer
+            if "indexes" in footer and footer.get("index_format") == INDEX_FORMAT:
+                indexes.update(_load_section(view, path, footer["indexes"]))
+            if footer.get("columns", {}).get("format") == COLUMNS_FORMAT:
+                indexes["columns"] = _load_columns(view, path, footer["columns"])
+    return footer, customers, indexes or None
+
+
+# -- write-ahead log ----------------------------------------------------
+
+
+def _redo_records(changes: List[CustomerChange]) -> List[tuple]:
+    records = []
+    for operation, customer_id, details in changes:
+        if operation == "create":
+            records.append(("create", _customer_values(details)))
+        elif operation == "update":
+            if details:
+                records.append(("update", customer_id, {field: new for field, (_, new) in details.items()}))
+        else:
+            records.append(("delete", customer_id))
+    return records
+
+
+def _last_allocated(customers: List[Customer], last_id: int, last_number: int) -> Tuple[int, int]:
+    """Id and customer number counters raised past ``customers``"""
+    for customer in customers:
+        if customer.id.isdigit():
+            last_id = max(last_id, int(customer.id))
+        sequence = customer_number_sequence(customer.customer_number)
+        if sequence is not None:
+            last_number = max(last_number, sequence)
+    return last_id, last_number
+
+
+def replay_segment(path: str, customers: Dict[str, Customer],
+                   touched: Set[str]) -> Tuple[int, List[Customer]]:
+    """Apply one WAL segment's records to ``customers``, adding the ids they
+    change to ``touched``: (records applied, customers it created, including
+    since-deleted ones). A torn or corrupt tail (interrupted write) ends the
+    replay and is cut off the file."""
+    build = _customer_factory(FIELDS)
+    applied = 0
+    created = []
+    with open(path, "rb+") as file:
+        data = file.read()
+        position = 0
+        while position + _RECORD_HEADER.size <= len(data):
+            length, checksum = _RECORD_HEADER.unpack_from(data, position)
+            start = position + _RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            for record in pickle.loads(payload):
+                operation = record[0]
+                if operation == "create":
+                    customer = build(record[1])
+                    customers[customer.id] = customer
+                    created.append(customer)
+                    touched.add(customer.id)
+                elif operation == "update":
+                    customer = customers.get(record[1])
+                    if customer is not None:
+                        customer.__dict__.update(record[2])
+                    touched.add(record[1])
+                else:
+                    customers.pop(record[1], None)
+                    touched.add(record[1])
+                applied += 1
+            position = start + length
+        if position < len(data):
+            logger.warning(f"Dropping {len(data) - position} bytes of torn WAL tail in {path}")
+            file.truncate(position)
+    return applied, created
+
+
+class WriteAheadLog:
+    """Segmented, framed log of store mutations (single writer: the event loop)"""
+
+    def __init__(self, directory: str, durability: str = WAL_DURABILITY,
+                 fsync_interval_ms: int = WAL_FSYNC_INTERVAL_MS):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown WAL_DURABILITY {durability!r}; expected one of {', '.join(DURABILITY_MODES)}")
+        self.directory = directory
+        self.durability = durability
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.segment = 0
+        self.bytes_since_rotation = 0
+        self._fd: Optional[int] = None
+        self._written = 0  # records written to the OS so far
+        self._synced = 0  # records known to be on disk
+        self._sync_task: Optional[asyncio.Future] = None
+        self._interval_task: Optional[asyncio.Task] = None
+        self.fsyncs = 0
+
+    def segments(self) -> List[int]:
+        return sorted(int(name[:-len(WAL_SUFFIX)]) for name in os.listdir(self.directory)
+                      if name.endswith(WAL_SUFFIX))
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:020d}{WAL_SUFFIX}")
+
+    def open(self, segment: int):
+        """Start writing to a new segment numbered ``segment``"""
+        self._fd = os.open(self.segment_path(segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        _fsync_directory(self.directory)
+        self.segment = segment
+        self.bytes_since_rotation = 0
+        if self.durability == "interval" and self._interval_task is None:
+            self._interval_task = asyncio.ensure_future(self._sync_periodically())
+
+    async def close(self):
+        if self._interval_task is not None:
+            self._interval_task.cancel()
+            self._interval_task = None
+        if self._fd is not None:
+            await self._close_segment()
+
+    async def _close_segment(self):
+        # A waiter woken by one fsync may already have started the next
+        while self._sync_task is not None:
+            await asyncio.shield(self._sync_task)
+        _fdatasync(self._fd)
+        self.fsyncs += 1
+        self._synced = self._written
+        os.close(self._fd)
+        self._fd = None
+
+    def append(self, changes: List[CustomerChange]):
+        """Change listener: log a batch of mutations as one record"""
+        records = _redo_records(changes)
+        if not records:
+            return
+        payload = pickle.dumps(records, protocol=_PICKLE_PROTOCOL)
+        frame = _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        os.write(self._fd, frame)
+        self.bytes_since_rotation += len(frame)
+        self._written += 1
+        if self.durability == "always":
+            _fdatasync(self._fd)
+            self.fsyncs += 1
+            self._synced = self._written
+
+    async def commit(self):
+        """Return once the writes made so far are as durable as the mode promises"""
+        if self.durability == "group":
+            await self.sync()
+
+    async def sync(self):
+        """fsync everything written so far. Concurrent callers share the
+        fsync in flight and the next one, so a burst of writes costs two
+        fsyncs instead of one each."""
+        target = self._written
+        while self._synced < target:
+            if self._sync_task is None:
+                self._sync_task = asyncio.ensure_future(self._fsync())
+            await asyncio.shield(self._sync_task)
+
+    async def _fsync(self):
+        try:
+            target = self._written
+            await asyncio.get_running_loop().run_in_executor(None, _fdatasync, self._fd)
+            self.fsyncs += 1
+            self._synced = max(self._synced, target)
+        finally:
+            self._sync_task = None
+
+    async def _sync_periodically(self):
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            try:
+                await self.sync()
+            except OSError:
+                logger.exception("WAL fsync failed")
+
+    async def rotate(self) -> int:
+        """Make the current segment durable and continue in a new one;
+        returns the new segment number"""
+        await self._close_segment()
+        self.open(self.segment + 1)
+        return self.segment
+
+    def remove_before(self, segment: int):
+        for old in self.segments():
+            if old < segment:
+                os.remove(self.segment_path(old))
+
+
+# -- store persistence ---------------------------------------------------
+
+
+class CustomerStorePersistence:
+    """Loads the in-memory store on startup, logs its writes and snapshots it"""
+
+    def __init__(self, repository: InMemoryCustomerRepository, directory: str = PERSISTENCE_DIR,
+                 durability: str = WAL_DURABILITY, fsync_interval_ms: int = WAL_FSYNC_INTERVAL_MS,
+                 snapshot_interval_seconds: int = SNAPSHOT_INTERVAL_SECONDS,
+                 snapshot_wal_bytes: int = SNAPSHOT_WAL_BYTES):
+        self.repository = repository
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.wal = WriteAheadLog(directory, durability, fsync_interval_ms)
+        self.snapshot_interval = snapshot_interval_seconds
+        self.snapshot_wal_bytes = snapshot_wal_bytes
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self._snapshot_lock = asyncio.Lock()
+        self.last_snapshot: Dict[str, Any] = {}
+
+    async def open(self) -> int:
+        """Restore the store from disk, then log its writes; returns the number
+        of customers restored"""
+        os.makedirs(self.directory, exist_ok=True)
+        start = time.perf_counter()
+        # The restored customers are long-lived: collecting while millions
+        # of them are allocated only rescans them over and over
+        gc.disable()
+        try:
+            footer, customers, indexes = self._load_snapshot()
+            first_segment = footer.get("wal_segment", 0)
+            last_id, last_number = footer.get("last_id", 0), footer.get("last_number", 0)
+            segments = [segment for segment in self.wal.segments() if segment >= first_segment]
+            replayed = 0
+            touched: Set[str] = set()
+            for segment in segments:
+                applied, created = replay_segment(self.wal.segment_path(segment), customers, touched)
+                replayed += applied
+                last_id, last_number = _last_allocated(created, last_id, last_number)
+            self.repository.restore(
+                list(customers.values()), last_id, last_number,
+                indexes=indexes, changed_ids=touched
+            )
+        finally:
+            gc.enable()
+        if customers:
+            logger.info(
+                f"Restored {len(customers)} customers ({replayed} WAL records) "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+        self.wal.open(max(segments, default=first_segment - 1) + 1)
+        self.repository.add_change_listener(self.wal.append)
+        self._snapshot_task = asyncio.ensure_future(self._snapshot_periodically())
+        return len(customers)
+
+    def _load_snapshot(self) -> Tuple[Dict[str, Any], Dict[str, Customer], Optional[Dict[str, Any]]]:
+        if not os.path.exists(self.snapshot_path):
+            return {}, {}, None
+        footer, customers, indexes = read_snapshot(self.snapshot_path)
+        self.last_snapshot = {key: footer[key] for key in ("customers", "wal_segment", "created_at")}
+        self.last_snapshot["indexes"] = set(indexes or ()) == set(self.repository.INDEXES)
+        return footer, customers, indexes
+
+    async def close(self):
+        """Snapshot unsaved writes (so the next start has no log to replay) and stop"""
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            self._snapshot_task = None
+        if self.wal.bytes_since_rotation or not self.last_snapshot.get("indexes"):
+            await self.snapshot(with_indexes=True)
+        await self.wal.close()
+
+    async def commit(self):
+        await self.wal.commit()
+
+    async def snapshot(self, with_indexes: bool = False) -> Dict[str, Any]:
+        """Write a snapshot of the current store and drop the WAL it replaces.
+
+        The column arrays are always stored; ``with_indexes`` also stores
+        the other secondary indexes, pickled on the event loop so no write
+        can change them halfway (used on shutdown).
+        """
+        async with self._snapshot_lock:
+            start = time.perf_counter()
+            segment = await self.wal.rotate()
+            # Taken in one go on the event loop: the snapshot writer thread
+            # only reads these customers, never the live dict
+            customers = list(self.repository.customers.values())
+            columns = self.repository.columns.to_arrays()
+            indexes = None
+            if with_indexes:
+                state = self.repository.index_state()
+                del state["columns"]
+                indexes = pickle.dumps(state, protocol=_PICKLE_PROTOCOL)
+            size = await asyncio.get_running_loop().run_in_executor(
+                None, write_snapshot, self.snapshot_path, customers,
+                self.repository.last_allocated, segment, indexes, columns
+            )
+            self.wal.remove_before(segment)
+            self.last_snapshot = {
+                "customers": len(customers),
+                "wal_segment": segment,
+                "created_at": time.time(),
+                "bytes": size,
+                "indexes": with_indexes,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+            return self.last_snapshot
+
+    async def _snapshot_periodically(self):
+        # Check often enough that a fast-growing log is compacted long
+        # before the full interval runs out
+        tick = min(self.snapshot_interval, 5)
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(tick)
+            due = time.monotonic() - last >= self.snapshot_interval
+            if self.wal.bytes_since_rotation >= self.snapshot_wal_bytes or (due and self.wal.bytes_since_rotation):
+                try:
+                    await self.snapshot()
+                except OSError:
+                    logger.exception("Customer store snapshot failed")
+                last = time.monotonic()
+
+
+_persistence: Optional[CustomerStorePersistence] = None
+
+
+def get_store_persistence() -> Optional[CustomerStorePersistence]:
+    """The process-wide store persistence (None when disabled or using SQL)"""
+    return _persistence
+
+
+def set_store_persistence(persistence: Optional[CustomerStorePersistence]):
+    global _persistence
+    _persistence = persistence
@@ -0,0 +1,659 @@
+"""
+Customer storage backends.
+
+customer_service talks to a CustomerRepository; the backend is chosen with
+CUSTOMER_STORE ("memory", the default, or "sql" using DATABASE_URL).
+"""
+
+import asyncio
+import logging
+import re
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import ANALYTICS_WORKERS, CUSTOMER_STORE, DEBUG
+from app.models.customer import (
+    Customer, CustomerStats, CustomerFilter, CustomerStatus, PaymentStatus
+)
+from app.services.customer_columns import CustomerColumns
+from app.services.customer_geo import GeoGridIndex
+from app.services.customer_index import CustomerIndex, SortedKeyIndex, city_key, normalize_key
+from app.services.customer_network import CustomerNetworkIndex, IPNetwork, parse_ip
+from app.services.customer_search import CustomerSearchIndex
+from app.services.customer_stats import CustomerStatsAccumulator, compute_customer_stats
+
+logger = logging.getLogger(__name__)
+
+SORT_FIELDS = ("id", "created_at", "name")
+GROUP_FIELDS = ("city", "plan_name", "router_name")
+
+# Stores smaller than this aggregate on the event loop (a few hundred
+# microseconds at most)
+ANALYTICS_OFFLOAD_ROWS = 20_000
+
+# Customer numbers are "N2P" + registration year + a store-wide sequence, so
+# they never collide regardless of the year they were issued in
+CUSTOMER_NUMBER_PATTERN = re.compile(r"N2P\d{4}(\d+)")
+
+# A page entry: (sort key, customer); the key is JSON-serializable so it can
+# be embedded in a pagination cursor
+PageEntry = Tuple[Any, Customer]
+
+# A change made to the store: (operation, customer id, details). Details
+# are the new Customer for "create", {field: (old, new)} for the fields an
+# "update" changed and None for "delete"
+CustomerChange = Tuple[str, str, Any]
+ChangeListener = Callable[[List[CustomerChange]], None]
+
+
+def format_customer_number(sequence: int, year: int) -> str:
+    return f"N2P{year}{sequence:04d}"
+
+
+def customer_number_sequence(customer_number: Optional[str]) -> Optional[int]:
+    """Sequence part of a customer number, None for foreign formats"""
+    match = CUSTOMER_NUMBER_PATTERN.fullmatch(customer_number or "")
+    return int(match.group(1)) if match else None
+
+
+def apply_changes(customer: Customer, changes: Dict[str, Any]) -> CustomerChange:
+    """Set field values on a customer; returns the update with the old values"""
+    diff = {}
+    for field, value in changes.items():
+        old = getattr(customer, field)
+        if old != value:
+            diff[field] = (old, value)
+        setattr(customer, field, value)
+    return "update", customer.id, diff
+
+
+def customer_matches(customer: Customer, filters: CustomerFilter) -> bool:
+    """Whether a customer meets every given CustomerFilter criterion"""
+    if filters.status and customer.status != filters.status:
+        return False
+    if filters.service_type and customer.service_type != filters.service_type:
+        return False
+    if filters.payment_status and customer.payment_status != filters.payment_status:
+        return False
+    if filters.overdue_only and customer.payment_status != PaymentStatus.OVERDUE:
+        return False
+    if filters.city and city_key(customer.city) != city_key(filters.city):
+        return False
+    if filters.plan_name and filters.plan_name.lower() not in customer.plan_name.lower():
+        return False
+    return True
+
+
+class CustomerRepository(ABC):
+    """Storage interface used by customer_service"""
+
+    # Called in order with the changes of every successful write (write-ahead
+    # log, change feed)
+    change_listeners: Tuple[ChangeListener, ...] = ()
+
+    def add_change_listener(self, listener: ChangeListener):
+        self.change_listeners = (*self.change_listeners, listener)
+
+    def _notify(self, changes: List[CustomerChange]):
+        if changes:
+            for listener in self.change_listeners:
+                listener(changes)
+
+    async def initialize(self):
+        """Prepare the backend (open pools, create tables)"""
+
+    async def close(self):
+        """Release backend resources"""
+
+    async def finish_bulk_load(self):
+        """Complete index work that bulk inserts defer (e.g. after an import)"""
+
+    @abstractmethod
+    async def count(self) -> int:
+        """Number of stored customers"""
+
+    @abstractmethod
+    async def allocate_ids(self, count: int) -> List[str]:
+        """Reserve ``count`` unused customer ids"""
+
+    @abstractmethod
+    async def allocate_customer_numbers(self, count: int) -> List[int]:
+        """Reserve ``count`` unused customer number sequence values"""
+
+    @abstractmethod
+    async def get(self, customer_id: str) -> Optional[Customer]:
+        """Customer by id"""
+
+    @abstractmethod
+    async def get_many(self, customer_ids: List[str]) -> List[Customer]:
+        """Customers by id, in the given order; ids that do not exist are skipped"""
+
+    @abstractmethod
+    async def list_all(self) -> List[Customer]:
+        """Every customer, in id order"""
+
+    @abstractmethod
+    async def page(self, sort: str, limit: int, after: Optional[Any] = None,
+                   descending: bool = False, skip: int = 0) -> List[PageEntry]:
+        """Keyset page of customers ordered by ``sort``, after the ``after`` key"""
+
+    @abstractmethod
+    async def insert(self, customer: Customer):
+        """Store a new customer"""
+
+    @abstractmethod
+    async def insert_many(self, customers: List[Customer]):
+        """Store a batch of new customers in one write"""
+
+    @abstractmethod
+    async def update(self, customer_id: str, changes: Dict[str, Any]) -> Optional[Customer]:
+        """Apply field changes to a customer; None when it does not exist"""
+
+    @abstractmethod
+    async def update_many(self, customer_ids: List[str], changes: Dict[str, Any]) -> Tuple[int, List[str]]:
+        """Apply the same changes to many customers in one pass: (updated count,
+        ids that do not exist)"""
+
+    @abstractmethod
+    async def update_each(self, changes: Dict[str, Dict[str, Any]]) -> Tuple[int, List[str]]:
+        """Apply different changes to many customers in one pass ({customer id:
+        changes}): (updated count, ids that do not exist)"""
+
+    @abstractmethod
+    async def update_matching(self, filters: CustomerFilter, changes: Dict[str, Any]) -> int:
+        """Apply the same changes to every customer matching a filter; returns the count"""
+
+    @abstractmethod
+    async def delete(self, customer_id: str) -> bool:
+        """Delete a customer; False when it does not exist"""
+
+    @abstractmethod
+    async def filter(self, filters: CustomerFilter) -> List[Customer]:
+        """Customers matching every given CustomerFilter criterion"""
+
+    @abstractmethod
+    def iter_batches(self, filters: Optional[CustomerFilter] = None,
+                     batch_size: int = 1000) -> AsyncIterator[List[Customer]]:
+        """Async iterator over customers in id order, ``batch_size`` at a time,
+        optionally restricted to a CustomerFilter. Only one batch is held at
+        a time, so it suits full-store exports."""
+
+    @abstractmethod
+    async def search(self, query: str, limit: int) -> List[Customer]:
+        """Customers matching a free-text query, best matches first"""
+
+    @abstractmethod
+    async def by_router(self, router_name: str) -> List[Customer]:
+        """Customers attached to a router (case-insensitive)"""
+
+    @abstractmethod
+    async def in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                      limit: int) -> Tuple[int, List[Customer]]:
+        """Geocoded customers inside a bounding box: (total matches, up to ``limit`` of them)"""
+
+    @abstractmethod
+    async def within_radius(self, lat: float, lon: float, radius_km: float,
+                            limit: int) -> Tuple[int, List[Tuple[float, Customer]]]:
+        """Customers within ``radius_km``: (total matches, up to ``limit`` (distance_km, customer)
+        pairs, nearest first)"""
+
+    @abstractmethod
+    async def nearest(self, lat: float, lon: float, k: int,
+                      max_km: Optional[float] = None) -> List[Tuple[float, Customer]]:
+        """The ``k`` nearest customers as (distance_km, customer), nearest first"""
+
+    @abstractmethod
+    async def by_ip_addresses(self, addresses: List[str]) -> Dict[str, List[Customer]]:
+        """Customers per IP address (canonical text form); unmatched addresses are left out"""
+
+    @abstractmethod
+    async def by_mac_addresses(self, macs: List[str]) -> Dict[str, List[Customer]]:
+        """Customers per normalized MAC address; unmatched addresses are left out"""
+
+    @abstractmethod
+    async def in_network(self, network: IPNetwork, limit: int) -> Tuple[int, List[Customer]]:
+        """Customers whose IP is inside a CIDR block: (total matches, up to ``limit``
+        of them in address order)"""
+
+    @abstractmethod
+    async def stats(self) -> CustomerStats:
+        """Dashboard customer statistics"""
+
+    @abstractmethod
+    async def revenue_summary(self) -> Dict[str, Any]:
+        """Monthly revenue, ARPU and overdue totals"""
+
+    @abstractmethod
+    async def revenue_breakdown(self, group_by: str) -> List[Dict[str, Any]]:
+        """Active customers and revenue per city, plan_name or router_name"""
+
+    async def active_columns(self, names: Iterable[str]) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """Ids and CustomerColumns arrays (``names``) of the active customers.
+
+        This default encodes them batch by batch into a throwaway mirror;
+        the in-memory store reads its live one.
+        """
+        columns = CustomerColumns()
+        async for batch in self.iter_batches(CustomerFilter(status=CustomerStatus.ACTIVE)):
+            columns.add_many(batch)
+        return columns.active_rows(names)
+
+
+class InMemoryCustomerRepository(CustomerRepository):
+    """Dict-backed store with incrementally maintained secondary indexes"""
+
+    INDEXES = (
+        "customer_index", "search_index", "stats_accumulator", "columns",
+        "sorted_index", "geo_index", "network_index",
+    )
+
+    def __init__(self):
+        self.customers: Dict[str, Customer] = {}
+        self.customer_index = CustomerIndex()
+        self.search_index = CustomerSearchIndex()
+        self.stats_accumulator = CustomerStatsAccumulator()
+        self.columns = CustomerColumns()
+        self.sorted_index = SortedKeyIndex()
+        self.geo_index = GeoGridIndex()
+        self.network_index = CustomerNetworkIndex()
+        self._last_id = 0
+        self._last_number = 0
+        self._analytics_pool: Optional[ThreadPoolExecutor] = None
+
+    async def close(self):
+        if self._analytics_pool is not None:
+            self._analytics_pool.shutdown(wait=False)
+            self._analytics_pool = None
+
+    async def finish_bulk_load(self):
+        self.search_index.build_pending()
+
+    async def _analytics(self, names: Iterable[str], aggregate: Callable[..., Any], *args) -> Any:
+        """Run a CustomerColumns aggregation on the analytics threads.
+
+        It runs over a copy of the columns it reads, taken here on the event
+        loop so no write can change them halfway. Small stores (and
+        ANALYTICS_WORKERS=0) aggregate on the loop, where the thread hop
+        would cost more than it saves.
+        """
+        if ANALYTICS_WORKERS <= 0 or len(self.columns) < ANALYTICS_OFFLOAD_ROWS:
+            return aggregate(self.columns, *args)
+        if self._analytics_pool is None:
+            self._analytics_pool = ThreadPoolExecutor(ANALYTICS_WORKERS, thread_name_prefix="analytics")
+        columns = self.columns.detached(names)
+        return await asyncio.get_running_loop().run_in_executor(self._analytics_pool, aggregate, columns, *args)
+
+    # -- index maintenance ---------------------------------------------
+
+    def _index(self, customer: Customer):
+        """Add or refresh a customer in the secondary indexes"""
+        self.customer_index.add(customer)
+        self.search_index.add(customer)
+        self.stats_accumulator.add(customer)
+        self.columns.add(customer)
+        self.sorted_index.add(customer)
+        self.geo_index.add(customer)
+        self.network_index.add(customer)
+
+    def _reindex(self, customers: List[Customer], fields: Iterable[str]):
+        """Refresh changed customers, skipping indexes that read none of ``fields``"""
+        indexes = [
+            index for index in (
+                self.customer_index, self.search_index, self.stats_accumulator, self.columns,
+                self.sorted_index, self.geo_index, self.network_index,
+            )
+            if not index.SOURCE_FIELDS.isdisjoint(fields)
+        ]
+        for index in indexes:
+            if index is self.columns:
+                self.columns.add_many(customers, fields)
+                continue
+            for customer in customers:
+                index.add(customer)
+
+    def _unindex(self, customer_id: str):
+        """Remove a customer from the secondary indexes"""
+        self.customer_index.remove(customer_id)
+        self.search_index.remove(customer_id)
+        self.stats_accumulator.remove(customer_id)
+        self.columns.remove(customer_id)
+        self.sorted_index.remove(customer_id)
+        self.geo_index.remove(customer_id)
+        self.network_index.remove(customer_id)
+
+    def clear(self):
+        """Drop every customer and index entry"""
+        self.customers.clear()
+        self.customer_index.clear()
+        self.search_index.clear()
+        self.stats_accumulator.clear()
+        self.columns.clear()
+        self.sorted_index.clear()
+        self.geo_index.clear()
+        self.network_index.clear()
+        self._last_id = 0
+        self._last_number = 0
+
+    def _in_store_order(self, ids: Iterable[str]) -> List[Customer]:
+        return [self.customers[i] for i in self.customer_index.in_store_order(ids)]
+
+    # -- CustomerRepository --------------------------------------------
+
+    async def count(self) -> int:
+        return len(self.customers)
+
+    async def allocate_ids(self, count: int) -> List[str]:
+        first = self._last_id + 1
+        self._last_id += count
+        return [str(i) for i in range(first, first + count)]
+
+    async def allocate_customer_numbers(self, count: int) -> List[int]:
+        first = self._last_number + 1
+        self._last_number += count
+        return list(range(first, first + count))
+
+    async def get(self, customer_id: str) -> Optional[Customer]:
+        return self.customers.get(customer_id)
+
+    async def get_many(self, customer_ids: List[str]) -> List[Customer]:
+        customers = self.customers
+        return [customers[customer_id] for customer_id in customer_ids if customer_id in customers]
+
+    async def list_all(self) -> List[Customer]:
+        return list(self.customers.values())
+
+    async def page(self, sort: str, limit: int, after: Optional[Any] = None,
+                   descending: bool = False, skip: int = 0) -> List[PageEntry]:
+        if after is not None:
+            try:
+                key, customer_id = after
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+            after = (tuple(key) if isinstance(key, list) else key, customer_id)
+        entries = self.sorted_index.page(sort, limit, after=after, descending=descending, skip=skip)
+        return [((key, customer_id), self.customers[customer_id]) for key, customer_id in entries]
+
+    async def insert(self, customer: Customer):
+        self.insert_sync(customer)
+        if self.change_listeners:
+            self._notify([("create", customer.id, customer)])
+
+    async def insert_many(self, customers: List[Customer]):
+        self._insert_batch(customers)
+        if self.change_listeners:
+            self._notify([("create", customer.id, customer) for customer in customers])
+
+    def restore(self, customers: List[Customer], last_id: int = 0, last_number: int = 0,
+                indexes: Optional[Dict[str, Any]] = None, changed_ids: Iterable[str] = ()):
+        """Replace the contents with persisted state, without notifying the
+        change listeners.
+
+        ``last_id``/``last_number`` keep ids and customer numbers of
+        since-deleted customers from being reissued. ``indexes`` are stored
+        secondary indexes by attribute name (see index_state), possibly only
+        some of them, that are current except for ``changed_ids``; the
+        indexes not given are rebuilt.
+        """
+        self.clear()
+        indexes = indexes or {}
+        for customer in customers:
+            self._store(customer)
+        for name, index in indexes.items():
+            setattr(self, name, index)
+        for name in self.INDEXES:
+            if name not in indexes:
+                self._build(getattr(self, name), customers)
+        stored = [getattr(self, name) for name in indexes]
+        for customer_id in changed_ids:
+            customer = self.customers.get(customer_id)
+            for index in stored:
+                if customer is None:
+                    index.remove(customer_id)
+                else:
+                    index.add(customer)
+        self._last_id = max(self._last_id, last_id)
+        self._last_number = max(self._last_number, last_number)
+
+    @staticmethod
+    def _build(index: Any, customers: List[Customer]):
+        """Fill an empty index, in one batch where it supports that"""
+        add_many = getattr(index, "add_many", None)
+        if add_many is not None:
+            add_many(customers)
+            return
+        for customer in customers:
+            index.add(customer)
+
+    def index_state(self) -> Dict[str, Any]:
+        """The secondary indexes by attribute name, for restore()"""
+        return {name: getattr(self, name) for name in self.INDEXES}
+
+    @property
+    def last_allocated(self) -> Tuple[int, int]:
+        """(last id, last customer number sequence) handed out so far"""
+        return self._last_id, self._last_number
+
+    def _insert_batch(self, customers: List[Customer]):
+        for customer in customers:
+            self._store(customer)
+            self.customer_index.add(customer)
+            self.stats_accumulator.add(customer)
+            self.geo_index.add(customer)
+            self.network_index.add(customer)
+        self.search_index.add_many(customers)
+        self.columns.add_many(customers)
+        self.sorted_index.add_many(customers)
+
+    def insert_sync(self, customer: Customer):
+        """Store a customer without going through the event loop"""
+        self._store(customer)
+        self._index(customer)
+
+    def _store(self, customer: Customer):
+        self.customers[customer.id] = customer
+        if customer.id.isdigit():
+            self._last_id = max(self._last_id, int(customer.id))
+        sequence = customer_number_sequence(customer.customer_number)
+        if sequence is not None:
+            self._last_number = max(self._last_number, sequence)
+
+    async def update(self, customer_id: str, changes: Dict[str, Any]) -> Optional[Customer]:
+        customer = self.customers.get(customer_id)
+        if customer is None:
+            return None
+        self._apply_changes([customer], changes)
+        return customer
+
+    async def update_many(self, customer_ids: List[str], changes: Dict[str, Any]) -> Tuple[int, List[str]]:
+        customers, missing = [], []
+        for customer_id in dict.fromkeys(customer_ids):
+            customer = self.customers.get(customer_id)
+            if customer is None:
+                missing.append(customer_id)
+            else:
+                customers.append(customer)
+        self._apply_changes(customers, changes)
+        return len(customers), missing
+
+    async def update_each(self, changes: Dict[str, Dict[str, Any]]) -> Tuple[int, List[str]]:
+        customers, updates, missing, fields = [], [], [], set()
+        for customer_id, values in changes.items():
+            customer = self.customers.get(customer_id)
+            if customer is None:
+                missing.append(customer_id)
+                continue
+            updates.append(apply_changes(customer, values))
+            customers.append(customer)
+            fields.update(values)
+        self._reindex(customers, fields)
+        self._notify(updates)
+        return len(customers), missing
+
+    async def update_matching(self, filters: CustomerFilter, changes: Dict[str, Any]) -> int:
+        customers = self.filter_sync(filters)
+        self._apply_changes(customers, changes)
+        return len(customers)
+
+    def _apply_changes(self, customers: List[Customer], changes: Dict[str, Any]):
+        updates = [apply_changes(customer, changes) for customer in customers]
+        self._reindex(customers, changes)
+        self._notify(updates)
+
+    async def delete(self, customer_id: str) -> bool:
+        if customer_id not in self.customers:
+            return False
+        del self.customers[customer_id]
+        self._unindex(customer_id)
+        self._notify([("delete", customer_id, None)])
+        return True
+
+    async def filter(self, filters: CustomerFilter) -> List[Customer]:
+        return self.filter_sync(filters)
+
+    def filter_sync(self, filters: CustomerFilter) -> List[Customer]:
+        """Filter without going through the event loop"""
+        criteria = []
+        if filters.status:
+            criteria.append(("status", filters.status))
+        if filters.service_type:
+            criteria.append(("service_type", filters.service_type))
+        if filters.payment_status:
+            criteria.append(("payment_status", filters.payment_status))
+        if filters.overdue_only:
+            criteria.append(("payment_status", PaymentStatus.OVERDUE))
+        if filters.city:
+            criteria.append(("city", city_key(filters.city)))
+
+        # Equality filters are answered from the hash indexes; None means no
+        # equality filter was given and every customer is a candidate
+        ids = self.customer_index.intersect(criteria)
+        if ids is None:
+            customers = list(self.customers.values())
+        else:
+            customers = self._in_store_order(ids)
+
+        # Substring match on plan name cannot be hashed; apply it to the candidates
+        if filters.plan_name:
+            plan_name = filters.plan_name.lower()
+            customers = [c for c in customers if plan_name in c.plan_name.lower()]
+
+        return customers
+
+    async def iter_batches(self, filters: Optional[CustomerFilter] = None,
+                           batch_size: int = 1000) -> AsyncIterator[List[Customer]]:
+        # Keyset walk over the id ordering: customers created or deleted
+        # while the caller consumes batches never shift the position
+        after = None
+        while True:
+            entries = self.sorted_index.page("id", batch_size, after=after)
+            if not entries:
+                return
+            after = entries[-1]
+            batch = [self.customers[customer_id] for _, customer_id in entries]
+            if filters is not None:
+                batch = [customer for customer in batch if customer_matches(customer, filters)]
+            if batch:
+                yield batch
+            if len(entries) < batch_size:
+                return
+
+    async def search(self, query: str, limit: int) -> List[Customer]:
+        return [self.customers[i] for i in self.search_index.search(query, limit)]
+
+    async def by_router(self, router_name: str) -> List[Customer]:
+        return self._in_store_order(self.customer_index.lookup("router_name", normalize_key(router_name)))
+
+    async def in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                      limit: int) -> Tuple[int, List[Customer]]:
+        ids = self.geo_index.bbox(min_lat, min_lon, max_lat, max_lon)
+        return len(ids), [self.customers[i] for i in ids[:limit]]
+
+    async def within_radius(self, lat: float, lon: float, radius_km: float,
+                            limit: int) -> Tuple[int, List[Tuple[float, Customer]]]:
+        found = self.geo_index.within(lat, lon, radius_km)
+        return len(found), [(distance, self.customers[i]) for distance, i in found[:limit]]
+
+    async def nearest(self, lat: float, lon: float, k: int,
+                      max_km: Optional[float] = None) -> List[Tuple[float, Customer]]:
+        return [(distance, self.customers[i]) for distance, i in self.geo_index.nearest(lat, lon, k, max_km)]
+
+    async def by_ip_addresses(self, addresses: List[str]) -> Dict[str, List[Customer]]:
+        found = {}
+        for address in addresses:
+            parsed = parse_ip(address)
+            ids = self.network_index.by_ip(parsed) if parsed is not None else None
+            if ids:
+                found[address] = self._in_store_order(ids)
+        return found
+
+    async def by_mac_addresses(self, macs: List[str]) -> Dict[str, List[Customer]]:
+        found = {}
+        for mac in macs:
+            ids = self.network_index.by_mac(mac)
+            if ids:
+                found[mac] = self._in_store_order(ids)
+        return found
+
+    async def in_network(self, network: IPNetwork, limit: int) -> Tuple[int, List[Customer]]:
+        total, ids = self.network_index.in_network(network, limit)
+        return total, [self.customers[i] for i in ids]
+
+    async def stats(self) -> CustomerStats:
+        stats = self.stats_accumulator.snapshot()
+
+        # In debug mode, verify the running aggregates against a full recompute
+        if DEBUG:
+            expected = compute_customer_stats(self.customers.values())
+            if stats != expected:
+                logger.error(f"Customer stats drifted: running={stats.dict()} recomputed={expected.dict()}")
+                self.stats_accumulator.rebuild(self.customers.values())
+                stats = expected
+
+        return stats
+
+    async def revenue_summary(self) -> Dict[str, Any]:
+        return await self._analytics(
+            ("monthly_fee", "balance_due", "status", "payment_status"), CustomerColumns.revenue_summary
+        )
+
+    async def revenue_breakdown(self, group_by: str) -> List[Dict[str, Any]]:
+        if group_by not in CustomerColumns.GROUP_KEYS:
+            return self.columns.group_by(group_by)  # raises the ValueError on the loop
+        return await self._analytics(
+            ("monthly_fee", "balance_due", "status", group_by), CustomerColumns.group_by, group_by
+        )
+
+    async def active_columns(self, names: Iterable[str]) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        return self.columns.active_rows(names)
+
+
+_repository: Optional[CustomerRepository] = None
+
+
+def create_customer_repository(store: Optional[str] = None, **options) -> CustomerRepository:
+    """Build a repository for ``store`` ("memory" or "sql")"""
+    store = (store or CUSTOMER_STORE).lower()
+    if store == "memory":
+        return InMemoryCustomerRepository()
+    if store == "sql":
+        # Imported lazily so the in-memory store works without SQLAlchemy
+        from app.services.customer_sql_repository import SQLCustomerRepository
+        return SQLCustomerRepository(**options)
+    raise ValueError(f"Unknown CUSTOMER_STORE {store!r}; expected 'memory' or 'sql'")
+
+
+def get_customer_repository() -> CustomerRepository:
+    """The process-wide customer repository"""
+    global _repository
+    if _repository is None:
+        _repository = create_customer_repository()
+    return _repository
+
+
+def set_customer_repository(repository: CustomerRepository):
+    """Swap the process-wide repository (benchmarks, tests)"""
+    global _repository
+    _repository = repository
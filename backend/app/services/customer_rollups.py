@@ -0,0 +1,316 @@
+"""
+Daily and monthly rollups behind the dashboard charts.
+
+Each RollupRing is a fixed number of consecutive buckets (days or months)
+held in numpy arrays and indexed by period number modulo its size, so old
+buckets are overwritten as time moves on and memory never grows. Buckets
+hold, per period:
+
+- flows, summed from the mutations of that period: revenue billed
+  (increases of balance_due, i.e. billing runs) and collected (increases
+  of total_paid), new customers (by creation date) and churned customers
+  (cancelled or deleted);
+- gauges, the value at the period's last mutation: customers not
+  cancelled, and active customers. A period without mutations reads the
+  previous period's value.
+
+CustomerRollups follows the repository's changes, so a chart query only
+reads ``days`` or ``months`` buckets. The rings are saved to ROLLUP_PATH
+on shutdown and loaded on startup, and mutations since the last save are
+lost if the process dies. Without a saved file, past periods are rebuilt
+from what the customer records still tell: new customers from creation
+dates, churn and totals from when cancelled customers were last updated
+(taken as their cancellation). Past revenue and active counts cannot be
+recovered (a customer keeps only its running total paid and its current
+balance and status), so those read NaN, served as null, for every period
+before the rebuild.
+"""
+
+import logging
+import os
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import ROLLUP_DAYS, ROLLUP_MONTHS, ROLLUP_PATH
+from app.models.customer import Customer, CustomerStatus
+from app.services.customer_repository import CustomerChange, CustomerRepository, get_customer_repository
+
+logger = logging.getLogger(__name__)
+
+FLOWS = ("billed", "collected", "new_customers", "churned_customers")
+GAUGES = ("total_customers", "active_customers")
+METRICS = FLOWS + GAUGES
+
+
+def day_number(moment: date) -> int:
+    return moment.toordinal()
+
+
+def month_number(moment: date) -> int:
+    return moment.year * 12 + moment.month - 1
+
+
+def month_label(number: int) -> str:
+    return f"{number // 12:04d}-{number % 12 + 1:02d}"
+
+
+class RollupRing:
+    """``size`` consecutive period buckets of every metric"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.periods = np.full(size, -1, dtype=np.int64)  # period held by each slot
+        self.values = np.zeros((len(METRICS), size), dtype=np.float64)
+        self.gauged = np.zeros(size, dtype=bool)  # whether the slot's gauges were recorded
+        self.latest = -1
+        self._rows = {metric: row for row, metric in enumerate(METRICS)}
+
+    def _slot(self, period: int) -> Optional[int]:
+        """Slot of a period, emptied when it held an older one; None when the
+        period is older than the ring reaches"""
+        if period <= self.latest - self.size:
+            return None
+        slot = period % self.size
+        if self.periods[slot] != period:
+            self.periods[slot] = period
+            self.values[:, slot] = 0.0
+            self.gauged[slot] = False
+        if period > self.latest:
+            self.latest = period
+        return slot
+
+    def add(self, period: int, metric: str, amount: float):
+        slot = self._slot(period)
+        if slot is not None:
+            self.values[self._rows[metric], slot] += amount
+
+    def set(self, period: int, metric: str, value: float):
+        slot = self._slot(period)
+        if slot is not None:
+            self.values[self._rows[metric], slot] = value
+            if metric in GAUGES:
+                self.gauged[slot] = True
+
+    def read(self, first: int, last: int) -> Dict[str, np.ndarray]:
+        """Every metric for periods first..last; flows are 0 and gauges carry
+        the previous value where a period has no bucket, and NaN marks
+        values that are unknown (see CustomerRollups.backfill)"""
+        wanted = np.arange(first, last + 1, dtype=np.int64)
+        slots = wanted % self.size
+        present = self.periods[slots] == wanted
+        series = {}
+        for metric in FLOWS:
+            series[metric] = np.where(present, self.values[self._rows[metric], slots], 0.0)
+        # Index of the latest period at or before each one whose gauges
+        # were recorded (-1: none in the range)
+        filled = np.where(present & self.gauged[slots], np.arange(len(wanted)), -1)
+        np.maximum.accumulate(filled, out=filled)
+        earlier = self.gauged & (self.periods >= 0) & (self.periods < first)
+        before_slot = int(np.argmax(np.where(earlier, self.periods, -1))) if earlier.any() else None
+        for metric in GAUGES:
+            row = self.values[self._rows[metric]]
+            before = row[before_slot] if before_slot is not None else 0.0
+            series[metric] = np.where(filled >= 0, row[slots][np.maximum(filled, 0)], before)
+        return series
+
+    def fill(self, metric: str, first: int, values: np.ndarray):
+        """Write consecutive periods from ``first`` (backfill)"""
+        for offset, value in enumerate(values):
+            self.set(first + offset, metric, float(value))
+
+
+class CustomerRollups:
+    """Daily and monthly rollups kept up to date from customer changes"""
+
+    def __init__(self, days: int = ROLLUP_DAYS, months: int = ROLLUP_MONTHS,
+                 clock: Callable[[], datetime] = datetime.now):
+        self.daily = RollupRing(days)
+        self.monthly = RollupRing(months)
+        self.clock = clock
+        self._status: Dict[str, CustomerStatus] = {}  # status of every live customer
+        self.total = 0  # customers not cancelled
+        self.active = 0
+
+    # -- updates -----------------------------------------------------------
+
+    def _add(self, moment: date, metric: str, amount: float):
+        self.daily.add(day_number(moment), metric, amount)
+        self.monthly.add(month_number(moment), metric, amount)
+
+    def _record_gauges(self, moment: date):
+        for ring, period in ((self.daily, day_number(moment)), (self.monthly, month_number(moment))):
+            ring.set(period, "total_customers", self.total)
+            ring.set(period, "active_customers", self.active)
+
+    def _count(self, status: Optional[CustomerStatus], sign: int):
+        if status is not None and status != CustomerStatus.CANCELLED:
+            self.total += sign
+        if status == CustomerStatus.ACTIVE:
+            self.active += sign
+
+    def on_changes(self, changes: List[CustomerChange]):
+        """Change listener: fold a batch of mutations into today's buckets"""
+        now = self.clock()
+        for operation, customer_id, details in changes:
+            if operation == "create":
+                self._count(self._status.pop(customer_id, None), -1)
+                self._status[customer_id] = details.status
+                self._count(details.status, 1)
+                if details.status != CustomerStatus.CANCELLED:
+                    self._add(details.created_at, "new_customers", 1)
+            elif operation == "delete":
+                status = self._status.pop(customer_id, None)
+                self._count(status, -1)
+                if status is not None and status != CustomerStatus.CANCELLED:
+                    self._add(now, "churned_customers", 1)
+            else:
+                balance = details.get("balance_due")
+                if balance is not None and (balance[1] or 0.0) > (balance[0] or 0.0):
+                    self._add(now, "billed", (balance[1] or 0.0) - (balance[0] or 0.0))
+                paid = details.get("total_paid")
+                if paid is not None and (paid[1] or 0.0) > (paid[0] or 0.0):
+                    self._add(now, "collected", (paid[1] or 0.0) - (paid[0] or 0.0))
+                status = details.get("status")
+                if status is not None and customer_id in self._status:
+                    old, new = status
+                    self._count(old, -1)
+                    self._count(new, 1)
+                    self._status[customer_id] = new
+                    if new == CustomerStatus.CANCELLED:
+                        self._add(now, "churned_customers", 1)
+                    elif old == CustomerStatus.CANCELLED:
+                        self._add(now, "new_customers", 1)  # reactivated
+        self._record_gauges(now)
+
+    # -- loading -----------------------------------------------------------
+
+    def sync(self, customers: Iterable[Customer]):
+        """Take the current status of every customer, without touching history"""
+        self._status = {customer.id: customer.status for customer in customers}
+        self.total = sum(1 for status in self._status.values() if status != CustomerStatus.CANCELLED)
+        self.active = sum(1 for status in self._status.values() if status == CustomerStatus.ACTIVE)
+        self._record_gauges(self.clock())
+
+    def backfill(self, customers: Sequence[Customer]):
+        """Rebuild history from the customer records: new customers per period
+        by creation date, churned customers by the last update of cancelled
+        ones, and totals from both. Revenue and active counts of past periods
+        are unknown (NaN); the current period starts counting from now."""
+        today = self.clock()
+        # Cancelled customers count from creation until their last update;
+        # those never live (cancelled when created) do not count at all
+        counted = [c for c in customers if c.status != CustomerStatus.CANCELLED or c.updated_at > c.created_at]
+        cancelled = [c for c in counted if c.status == CustomerStatus.CANCELLED]
+        for ring, number in ((self.daily, day_number), (self.monthly, month_number)):
+            last = number(today)
+            first = last - ring.size + 1
+            periods = np.arange(first, last + 1)
+            created = np.sort(np.fromiter((number(c.created_at) for c in counted), np.int64, len(counted)))
+            churned = np.sort(np.fromiter((number(c.updated_at) for c in cancelled), np.int64, len(cancelled)))
+            created_by = np.searchsorted(created, periods, side="right")
+            churned_by = np.searchsorted(churned, periods, side="right")
+            ring.fill("new_customers", first, np.diff(created_by, prepend=np.searchsorted(created, first - 1, side="right")))
+            ring.fill("churned_customers", first, np.diff(churned_by, prepend=np.searchsorted(churned, first - 1, side="right")))
+            ring.fill("total_customers", first, created_by - churned_by)
+            unknown = np.full(len(periods) - 1, np.nan)
+            for metric in ("billed", "collected", "active_customers"):
+                ring.fill(metric, first, unknown)
+        self.sync(customers)
+
+    async def start(self, repository: CustomerRepository, path: Optional[str] = ROLLUP_PATH):
+        """Load saved rollups (or backfill), then follow the repository's changes"""
+        customers: List[Customer] = []
+        async for batch in repository.iter_batches():
+            customers.extend(batch)
+        if path and self.load(path):
+            self.sync(customers)
+        else:
+            self.backfill(customers)
+        repository.add_change_listener(self.on_changes)
+
+    def save(self, path: str = ROLLUP_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as file:
+            np.savez(
+                file, metrics=np.array(METRICS),
+                daily_periods=self.daily.periods, daily_values=self.daily.values, daily_gauged=self.daily.gauged,
+                monthly_periods=self.monthly.periods, monthly_values=self.monthly.values,
+                monthly_gauged=self.monthly.gauged,
+            )
+        os.replace(temporary, path)
+
+    def load(self, path: str = ROLLUP_PATH) -> bool:
+        """Restore saved rings; False when there is no usable file (missing,
+        or saved with other sizes or metrics)"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as saved:
+                if tuple(saved["metrics"]) != METRICS:
+                    return False
+                rings = ((self.daily, "daily"), (self.monthly, "monthly"))
+                if any(saved[f"{name}_periods"].shape != (ring.size,) for ring, name in rings):
+                    return False
+                for ring, name in rings:
+                    ring.periods = saved[f"{name}_periods"].copy()
+                    ring.values = saved[f"{name}_values"].copy()
+                    ring.gauged = saved[f"{name}_gauged"].copy()
+                    ring.latest = int(ring.periods.max())
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable rollups at {path}: {e}")
+            return False
+        return True
+
+    # -- queries -----------------------------------------------------------
+
+    def daily_series(self, days: int) -> Dict[str, Any]:
+        """The last ``days`` days, today included"""
+        if not 1 <= days <= self.daily.size:
+            raise ValueError(f"days must be between 1 and {self.daily.size}")
+        last = day_number(self.clock())
+        series = self.daily.read(last - days + 1, last)
+        series["period"] = [date.fromordinal(number).isoformat() for number in range(last - days + 1, last + 1)]
+        return series
+
+    def monthly_series(self, months: int) -> Dict[str, Any]:
+        """The last ``months`` months, the current one included"""
+        if not 1 <= months <= self.monthly.size:
+            raise ValueError(f"months must be between 1 and {self.monthly.size}")
+        last = month_number(self.clock())
+        series = self.monthly.read(last - months + 1, last)
+        series["period"] = [month_label(number) for number in range(last - months + 1, last + 1)]
+        return series
+
+
+_rollups: Optional[CustomerRollups] = None
+
+
+def get_customer_rollups() -> CustomerRollups:
+    """The process-wide rollups, created (empty) on first use"""
+    global _rollups
+    if _rollups is None:
+        _rollups = CustomerRollups()
+    return _rollups
+
+
+def set_customer_rollups(rollups: Optional[CustomerRollups]):
+    global _rollups
+    _rollups = rollups
+
+
+async def start_customer_rollups() -> CustomerRollups:
+    """Load or rebuild the rollups and follow customer changes from now on"""
+    rollups = get_customer_rollups()
+    await rollups.start(get_customer_repository())
+    return rollups
+
+
+def stop_customer_rollups():
+    """Save the rollups for the next start"""
+    if _rollups is not None and ROLLUP_PATH:
+        _rollups.save(ROLLUP_PATH)
@@ -0,0 +1,432 @@
+import heapq
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.models.customer import Customer
+
+# Searchable fields and their ranking weight
+FIELD_WEIGHTS = {
+    "customer_number": 5.0,
+    "phone": 4.0,
+    "email": 4.0,
+    "name": 3.0,
+    "city": 1.5,
+    "address": 1.0,
+}
+WEIGHTS = tuple(FIELD_WEIGHTS.values())
+
+# Match quality multipliers: whole word, start of a word, anywhere
+WORD, PREFIX, SUBSTRING = 3.0, 2.0, 1.0
+
+GRAM_SIZE = 3
+
+_EMPTY: Set[int] = frozenset()
+
+_PHONE_LIKE = re.compile(r"[\d+\-(). ]+")
+_NON_DIGIT = re.compile(r"\D")
+
+
+def fold_text(value: Optional[str]) -> str:
+    """Lowercase and strip accents so "López" and "lopez" compare equal"""
+    if not value:
+        return ""
+    if value.isascii():
+        return value.lower()
+    return _fold_accented(value)
+
+
+# Accented values repeat a lot (cities, first and last names), and
+# decomposing them character by character is the slow path
+@lru_cache(maxsize=16384)
+def _fold_accented(value: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def phone_digits(value: Optional[str]) -> str:
+    """Keep only the digits of a phone number"""
+    return _NON_DIGIT.sub("", value or "")
+
+
+def _pad(text: str) -> str:
+    """Collapse whitespace and mark word boundaries with single spaces"""
+    words = text.split()
+    return f" {' '.join(words)} " if words else ""
+
+
+def search_document(customer: Customer) -> Tuple[str, ...]:
+    """Padded, normalized searchable text in FIELD_WEIGHTS order"""
+    return (
+        _pad(fold_text(customer.customer_number)),
+        _pad(phone_digits(customer.phone)),
+        _pad(fold_text(customer.email)),
+        _pad(fold_text(customer.name)),
+        _pad(fold_text(customer.city)),
+        _pad(fold_text(customer.address)),
+    )
+
+
+def _grams(text: str) -> Set[str]:
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def _field_keys(text: str) -> Set[str]:
+    """Posting keys of one field's padded text.
+
+    Besides the trigrams, the two-character word starts (" x") are indexed
+    so one-character queries still work.
+    """
+    if not text:
+        return _EMPTY
+    keys = _grams(text)
+    keys.update([" " + word[0] for word in text.split()])
+    return keys
+
+
+def _pattern_keys(pattern: str) -> Set[str]:
+    if len(pattern) < GRAM_SIZE:
+        return {pattern}
+    return _grams(pattern)
+
+
+def query_terms(query: str) -> List[str]:
+    terms = []
+    for raw in query.split():
+        if _PHONE_LIKE.fullmatch(raw):
+            digits = phone_digits(raw)
+            if digits:
+                terms.append(digits)
+                continue
+        term = fold_text(raw)
+        if term:
+            terms.append(term)
+    return terms
+
+
+def tier_patterns(term: str) -> List[Tuple[float, str]]:
+    """Patterns that identify each match quality of a term within padded text"""
+    tiers = [(WORD, f" {term} "), (PREFIX, f" {term}")]
+    if len(term) >= GRAM_SIZE:
+        tiers.append((SUBSTRING, term))
+    return tiers
+
+
+def score_document(doc: Tuple[str, ...], terms: List[str]) -> float:
+    """Exact relevance of a document, 0.0 when some term does not match"""
+    total = 0.0
+    for term in terms:
+        tiers = tier_patterns(term)
+        best = 0.0
+        for text, weight in zip(doc, WEIGHTS):
+            if not text:
+                continue
+            for quality, pattern in tiers:
+                if pattern in text:
+                    best = max(best, quality * weight)
+                    break
+        if not best:
+            return 0.0
+        total += best
+    return total
+
+
+class CustomerSearchIndex:
+    """Field-aware trigram inverted index over the searchable customer fields.
+
+    Text is accent-folded and padded with spaces at word boundaries, so the
+    same postings answer "whole word", "word prefix" and "substring" matches
+    and ranking classes can be built with set operations instead of scanning.
+    """
+
+    SOURCE_FIELDS = frozenset(FIELD_WEIGHTS)
+
+    def __init__(self):
+        # One gram -> docnos dict per field, in FIELD_WEIGHTS order
+        self._postings: List[Dict[str, Set[int]]] = [defaultdict(set) for _ in WEIGHTS]
+        # customer_id <-> internal document number (keeps store order)
+        self._docnos: Dict[str, int] = {}
+        self._ids: Dict[int, str] = {}
+        self._docs: Dict[int, Tuple[str, ...]] = {}
+        self._next_docno = 0
+        # Documents added by add_many whose postings are built on next use
+        self._pending: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, customer: Customer):
+        """Index a customer, replacing any previous version"""
+        self.build_pending()
+        doc = search_document(customer)
+        docno = self._docnos.get(customer.id)
+        if docno is None:
+            docno = self._next_docno
+            self._next_docno += 1
+            self._docnos[customer.id] = docno
+            self._ids[docno] = customer.id
+        elif self._docs[docno] == doc:
+            return  # no searchable field changed (status, fees, ...)
+        else:
+            self._drop_postings(docno)
+
+        self._docs[docno] = doc
+        for postings, text in zip(self._postings, doc):
+            for key in _field_keys(text):
+                postings[key].add(docno)
+
+    def add_many(self, customers: Iterable[Customer]):
+        """Index a batch of new customers.
+
+        Their documents are stored right away and their postings built once
+        before the next read, grouped by field text: repeated values (cities,
+        common names, street names) get their grams computed and posted
+        once for every document sharing them instead of once per document.
+        """
+        for customer in customers:
+            if customer.id in self._docnos:
+                self.add(customer)
+                continue
+            docno = self._next_docno
+            self._next_docno += 1
+            self._docnos[customer.id] = docno
+            self._ids[docno] = customer.id
+            self._docs[docno] = search_document(customer)
+            self._pending.append(docno)
+
+    def build_pending(self):
+        """Build the postings of documents queued by add_many"""
+        if not self._pending:
+            return
+        docs = self._docs
+        for field, postings in enumerate(self._postings):
+            by_text: Dict[str, List[int]] = defaultdict(list)
+            for docno in self._pending:
+                text = docs[docno][field]
+                if text:
+                    by_text[text].append(docno)
+            # Collected as lists and merged into the posting sets once per key
+            new: Dict[str, List[int]] = defaultdict(list)
+            for text, docnos in by_text.items():
+                if len(docnos) == 1:
+                    docno, = docnos
+                    for key in _field_keys(text):
+                        new[key].append(docno)
+                else:
+                    for key in _field_keys(text):
+                        new[key].extend(docnos)
+            for key, docnos in new.items():
+                postings[key].update(docnos)
+        self._pending = []
+
+    def remove(self, customer_id: str):
+        """Remove a customer from the index"""
+        self.build_pending()
+        docno = self._docnos.pop(customer_id, None)
+        if docno is None:
+            return
+        self._drop_postings(docno)
+        del self._docs[docno]
+        del self._ids[docno]
+
+    def clear(self):
+        """Drop every entry"""
+        for postings in self._postings:
+            postings.clear()
+        self._docnos.clear()
+        self._ids.clear()
+        self._docs.clear()
+        self._next_docno = 0
+        self._pending = []
+
+    def search(self, query: str, limit: int = 50) -> List[str]:
+        """Return up to ``limit`` customer ids ranked by relevance.
+
+        Every query term must match at least one field. Terms of three or
+        more characters match anywhere inside a field; shorter terms match
+        the start of a word. Equal scores keep store order.
+        """
+        terms = query_terms(query)
+        if not terms or limit <= 0:
+            return []
+        self.build_pending()
+        if len(terms) == 1:
+            results = self._single_term_search(terms[0], limit)
+        else:
+            results = []
+            self._take_verified(self._multi_term_heap(terms), terms, results, limit)
+        return [self._ids[docno] for docno in results]
+
+    def _take_verified(self, heap: List[Tuple[float, int]], terms: List[str], results: List[int], limit: int,
+                       bound: float = float("-inf"), docno: float = float("inf")) -> bool:
+        """Move candidates that rank ahead of (``bound``, ``docno``) from the
+        heap to ``results``; whether ``limit`` results were reached.
+
+        Gram postings can produce false positives (" n2p2025 " seems to
+        match a number ending in "25 "), so heap scores are upper bounds:
+        each candidate is confirmed against its text, and put back with its
+        exact score when that is lower, before it takes a result slot.
+        """
+        docs = self._docs
+        while heap and len(results) < limit:
+            score, candidate = heap[0]
+            if -score < bound or (-score == bound and candidate > docno):
+                break
+            heapq.heappop(heap)
+            exact = score_document(docs[candidate], terms)
+            if exact and -exact > score:
+                heapq.heappush(heap, (-exact, candidate))
+            elif exact:
+                results.append(candidate)
+        return len(results) >= limit
+
+    def _field_tiers(self, field: int, term: str, within: Optional[Set[int]] = None):
+        """[(quality, docnos)] for one field, loosest tier first.
+
+        Each tier is a subset of the previous one, so only the keys it adds
+        (the word-boundary grams) have to be intersected.
+        """
+        tiers = []
+        previous_keys: Set[str] = set()
+        docnos = within
+        for quality, pattern in reversed(tier_patterns(term)):
+            keys = _pattern_keys(pattern)
+            docnos = self._lookup(field, keys - previous_keys, docnos)
+            if not docnos:
+                break
+            tiers.append((quality, docnos))
+            previous_keys = keys
+        return tiers
+
+    def _classes(self, term: str, within: Optional[Set[int]] = None) -> List[Tuple[float, Set[int]]]:
+        """(score, docnos) classes for one term, best score first"""
+        classes = []
+        for field, weight in enumerate(WEIGHTS):
+            for quality, docnos in self._field_tiers(field, term, within):
+                classes.append((quality * weight, docnos))
+        classes.sort(key=lambda c: -c[0])
+        return classes
+
+    def _lookup(self, field: int, keys: Set[str], within: Optional[Set[int]] = None) -> Set[int]:
+        postings = self._postings[field]
+        sets = sorted((postings.get(key, _EMPTY) for key in keys), key=len)
+        if within is not None:
+            if not sets:
+                return within
+            result = within.intersection(sets[0])
+        else:
+            result = set(sets[0])
+        for docnos in sets[1:]:
+            if not result:
+                break
+            result.intersection_update(docnos)
+        return result
+
+    def _estimate(self, term: str) -> int:
+        """Upper bound on the documents a term can match, from posting sizes"""
+        keys = _pattern_keys(tier_patterns(term)[-1][1])
+        return sum(
+            min(len(postings.get(key, _EMPTY)) for key in keys)
+            for postings in self._postings
+        )
+
+    def _single_term_search(self, term: str, limit: int) -> List[int]:
+        """Document numbers of the best ``limit`` matches of a single term.
+
+        Classes are evaluated lazily in score order, each queued in store
+        order in chunks (doubling when verification drops candidates).
+        A queued candidate is only verified and taken once nothing still
+        unqueued could rank ahead of it, so false positives in a better
+        class never hide a true match in a worse one.
+        """
+        order = sorted(
+            ((quality * weight, field, quality)
+             for field, weight in enumerate(WEIGHTS)
+             for quality, _ in tier_patterns(term)),
+            reverse=True,
+        )
+        terms = [term]
+        tiers_by_field: Dict[int, Dict[float, Set[int]]] = {}
+        heap: List[Tuple[float, int]] = []
+        results: List[int] = []
+        seen: Set[int] = set()
+        for score, field, quality in order:
+            # Whatever is queued above this class's score ranks ahead of all of it
+            if self._take_verified(heap, terms, results, limit, bound=score, docno=-1):
+                return results
+            if field not in tiers_by_field:
+                tiers_by_field[field] = dict(self._field_tiers(field, term))
+            docnos = tiers_by_field[field].get(quality)
+            if not docnos:
+                continue
+            fresh = docnos - seen if seen else docnos
+            seen.update(fresh)
+            chunk_size = limit - len(results)
+            while fresh:
+                chunk = self._first_docnos(fresh, chunk_size + 1)
+                queued, rest = chunk[:chunk_size], chunk[chunk_size:]
+                for docno in queued:
+                    heapq.heappush(heap, (-score, docno))
+                fresh = fresh.difference(queued) if rest else _EMPTY
+                if self._take_verified(heap, terms, results, limit, bound=score,
+                                       docno=rest[0] if rest else float("inf")):
+                    return results
+                chunk_size *= 2
+        self._take_verified(heap, terms, results, limit)
+        return results
+
+    def _first_docnos(self, docnos: Set[int], count: int) -> List[int]:
+        """The ``count`` lowest document numbers of a large set.
+
+        Dense sets are cheaper to probe in document order than to sort.
+        """
+        if count * self._next_docno < len(docnos) ** 2:
+            found = []
+            for docno in range(self._next_docno):
+                if docno in docnos:
+                    found.append(docno)
+                    if len(found) == count:
+                        break
+            return found
+        return heapq.nsmallest(count, docnos)
+
+    def _multi_term_heap(self, terms: List[str]) -> List[Tuple[float, int]]:
+        """Heap of (-score, docno) for documents that match every term.
+
+        The most selective term is resolved first; the remaining terms are
+        only evaluated against its candidates.
+        """
+        candidates = None
+        term_classes = []
+        for term in sorted(terms, key=self._estimate):
+            classes = self._classes(term, candidates)
+            if not classes:
+                return []
+            matched = set().union(*(docnos for _, docnos in classes))
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return []
+            term_classes.append(classes)
+
+        heap = []
+        for docno in candidates:
+            score = 0.0
+            for classes in term_classes:
+                for class_score, docnos in classes:
+                    if docno in docnos:
+                        score += class_score
+                        break
+            heap.append((-score, docno))
+        heapq.heapify(heap)
+        return heap
+
+    def _drop_postings(self, docno: int):
+        for postings, text in zip(self._postings, self._docs[docno]):
+            for key in _field_keys(text):
+                docnos = postings.get(key)
+                if docnos is not None:
+                    docnos.discard(docno)
+                    if not docnos:
+                        del postings[key]
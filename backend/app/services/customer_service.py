@@ -1,20 +1,63 @@
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, timedelta
+import base64
+import json
 import random
-import string
+
+import numpy as np
+
 from app.models.customer import (
     Customer, CustomerCreate, CustomerUpdate, CustomerStats,
     CustomerStatus, ServiceType, PaymentStatus, CustomerFilter
 )
+from app.core.config import CHANGE_LOG_ENABLED, PERSISTENCE_ENABLED
+from app.services.customer_changes import ChangePage, CustomerChangeLog, get_change_log, set_change_log
+from app.services.customer_geo import validate_bbox
+from app.services.customer_network import distinct, normalize_ip, normalize_mac, parse_network
+from app.services.customer_persistence import (
+    CustomerStorePersistence, get_store_persistence, set_store_persistence
+)
+from app.services.customer_repository import (
+    CustomerRepository, InMemoryCustomerRepository, get_customer_repository,
+    format_customer_number, SORT_FIELDS
+)
 
-# In-memory customer storage (later replace with database)
-fake_customers_db = {}
+def _repository() -> CustomerRepository:
+    return get_customer_repository()
 
-def generate_customer_number() -> str:
-    """Generate unique customer number"""
-    return f"N2P{datetime.now().year}{random.randint(1000, 9999)}"
+async def _committed():
+    """Wait until the writes made so far are durable (see WAL_DURABILITY)"""
+    persistence = get_store_persistence()
+    if persistence is not None:
+        await persistence.commit()
 
-def create_demo_customers():
+async def generate_customer_numbers(count: int) -> List[str]:
+    """Reserve ``count`` unique customer numbers"""
+    year = datetime.now().year
+    sequences = await _repository().allocate_customer_numbers(count)
+    return [format_customer_number(sequence, year) for sequence in sequences]
+
+async def new_customer_fields(count: int) -> List[dict]:
+    """System-assigned fields of ``count`` new customers: ids and customer
+    numbers reserved as one block, pending status and creation timestamps"""
+    if count <= 0:
+        return []
+    customer_ids = await _repository().allocate_ids(count)
+    customer_numbers = await generate_customer_numbers(count)
+    now = datetime.now()
+    return [
+        {
+            "id": customer_id,
+            "customer_number": customer_number,
+            "status": CustomerStatus.PENDING,
+            "payment_status": PaymentStatus.CURRENT,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for customer_id, customer_number in zip(customer_ids, customer_numbers)
+    ]
+
+async def create_demo_customers():
     """Create demo customers for testing"""
     demo_customers = [
         {
@@ -120,11 +163,16 @@ def create_demo_customers():
     ]
     
     # Create customers with proper IDs and status
-    for i, customer_data in enumerate(demo_customers, 1):
-        customer_id = str(i)
+    repository = _repository()
+    customer_ids = await repository.allocate_ids(len(demo_customers))
+    customer_numbers = await generate_customer_numbers(len(demo_customers))
+    customers = []
+    for i, (customer_id, customer_number, customer_data) in enumerate(
+        zip(customer_ids, customer_numbers, demo_customers), 1
+    ):
         customer = Customer(
             id=customer_id,
-            customer_number=generate_customer_number(),
+            customer_number=customer_number,
             status=CustomerStatus.ACTIVE if i <= 4 else CustomerStatus.PENDING,
             payment_status=PaymentStatus.CURRENT if i <= 3 else PaymentStatus.OVERDUE,
             created_at=customer_data["installation_date"],
@@ -134,131 +182,253 @@ def create_demo_customers():
             balance_due=customer_data["monthly_fee"] if i > 3 else 0.0,
             **customer_data
         )
-        fake_customers_db[customer_id] = customer
+        customers.append(customer)
     
-    return len(fake_customers_db)
+    await repository.insert_many(customers)
+    await _committed()
+    return await repository.count()
 
-def get_all_customers() -> List[Customer]:
+async def get_all_customers() -> List[Customer]:
     """Get all customers"""
-    return list(fake_customers_db.values())
+    return await _repository().list_all()
 
-def get_customer_by_id(customer_id: str) -> Optional[Customer]:
-    """Get customer by ID"""
-    return fake_customers_db.get(customer_id)
+def _encode_cursor(sort: str, descending: bool, key) -> str:
+    payload = json.dumps([sort, descending, key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
 
-def create_customer(customer_data: CustomerCreate) -> Customer:
-    """Create new customer"""
-    customer_id = str(len(fake_customers_db) + 1)
+def _decode_cursor(cursor: str, sort: str, descending: bool) -> Tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, cursor_descending, key = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort or cursor_descending != descending:
+        raise ValueError("Cursor does not match the requested sort order")
+    return key
+
+async def get_customers_page(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    descending: bool = False,
+    skip: int = 0
+) -> Tuple[List[Customer], Optional[str]]:
+    """Get one page of customers ordered by id, created_at or name.
     
-    customer = Customer(
-        id=customer_id,
-        customer_number=generate_customer_number(),
-        status=CustomerStatus.PENDING,
-        payment_status=PaymentStatus.CURRENT,
-        created_at=datetime.now(),
-        updated_at=datetime.now(),
-        **customer_data.dict()
-    )
+    Returns the page and an opaque cursor for the next one (None on the
+    last page). ``skip`` is applied after the cursor position, so plain
+    skip/limit paging keeps working.
+    """
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"Cannot sort by {sort!r}; expected one of {', '.join(SORT_FIELDS)}")
     
-    fake_customers_db[customer_id] = customer
+    after = _decode_cursor(cursor, sort, descending) if cursor else None
+    entries = await _repository().page(sort, limit + 1, after=after, descending=descending, skip=skip)
+    
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = _encode_cursor(sort, descending, entries[-1][0])
+    
+    return [customer for _, customer in entries], next_cursor
+
+async def get_customer_by_id(customer_id: str) -> Optional[Customer]:
+    """Get customer by ID"""
+    return await _repository().get(customer_id)
+
+async def get_customers_by_ids(customer_ids: List[str]) -> List[Customer]:
+    """Customers by id, in the given order (missing ids are skipped)"""
+    return await _repository().get_many(customer_ids)
+
+async def create_customer(customer_data: CustomerCreate) -> Customer:
+    """Create new customer"""
+    fields, = await new_customer_fields(1)
+    customer = Customer(**fields, **customer_data.dict())
+    await _repository().insert(customer)
+    await _committed()
     return customer
 
-def update_customer(customer_id: str, customer_data: CustomerUpdate) -> Optional[Customer]:
+async def add_customers(customers: List[Customer]):
+    """Store a batch of new customers with a single repository write"""
+    await _repository().insert_many(customers)
+    await _committed()
+
+async def finish_bulk_load():
+    """Complete index work deferred by add_customers batches"""
+    await _repository().finish_bulk_load()
+
+async def update_customer(customer_id: str, customer_data: CustomerUpdate) -> Optional[Customer]:
     """Update existing customer"""
-    if customer_id not in fake_customers_db:
-        return None
-    
-    customer = fake_customers_db[customer_id]
     update_data = customer_data.dict(exclude_unset=True)
-    
-    for field, value in update_data.items():
-        setattr(customer, field, value)
-    
-    customer.updated_at = datetime.now()
-    fake_customers_db[customer_id] = customer
-    
+    update_data["updated_at"] = datetime.now()
+    customer = await _repository().update(customer_id, update_data)
+    await _committed()
     return customer
 
-def delete_customer(customer_id: str) -> bool:
+async def update_customers(customer_ids: List[str], changes: Dict[str, Any]) -> Tuple[int, List[str]]:
+    """Apply validated field changes to many customers: (updated, missing ids)"""
+    result = await _repository().update_many(customer_ids, changes)
+    await _committed()
+    return result
+
+async def update_customers_each(changes: Dict[str, Dict[str, Any]]) -> Tuple[int, List[str]]:
+    """Apply per-customer field changes ({id: changes}) in one pass: (updated, missing ids)"""
+    result = await _repository().update_each(changes)
+    await _committed()
+    return result
+
+async def update_matching_customers(filters: CustomerFilter, changes: Dict[str, Any]) -> int:
+    """Apply validated field changes to every customer matching a filter"""
+    count = await _repository().update_matching(filters, changes)
+    await _committed()
+    return count
+
+async def delete_customer(customer_id: str) -> bool:
     """Delete customer"""
-    if customer_id in fake_customers_db:
-        del fake_customers_db[customer_id]
-        return True
-    return False
+    deleted = await _repository().delete(customer_id)
+    await _committed()
+    return deleted
 
-def get_customer_stats() -> CustomerStats:
+async def get_customer_stats() -> CustomerStats:
     """Get customer statistics"""
-    customers = list(fake_customers_db.values())
-    
-    total_customers = len(customers)
-    active_customers = len([c for c in customers if c.status == CustomerStatus.ACTIVE])
-    suspended_customers = len([c for c in customers if c.status == CustomerStatus.SUSPENDED])
-    pending_customers = len([c for c in customers if c.status == CustomerStatus.PENDING])
-    
-    monthly_revenue = sum(c.monthly_fee for c in customers if c.status == CustomerStatus.ACTIVE)
-    overdue_payments = len([c for c in customers if c.payment_status == PaymentStatus.OVERDUE])
-    
-    # New customers this month
-    current_month = datetime.now().replace(day=1)
-    new_customers_this_month = len([
-        c for c in customers 
-        if c.created_at >= current_month
-    ])
-    
-    return CustomerStats(
-        total_customers=total_customers,
-        active_customers=active_customers,
-        suspended_customers=suspended_customers,
-        pending_customers=pending_customers,
-        monthly_revenue=monthly_revenue,
-        overdue_payments=overdue_payments,
-        new_customers_this_month=new_customers_this_month
-    )
-
-def search_customers(query: str, limit: int = 50) -> List[Customer]:
-    """Search customers by name, email, phone, or address"""
-    query = query.lower()
-    customers = list(fake_customers_db.values())
-    
-    results = []
-    for customer in customers:
-        if (query in customer.name.lower() or
-            query in customer.email.lower() if customer.email else False or
-            query in customer.phone.lower() or
-            query in customer.address.lower() or
-            query in customer.city.lower() or
-            query in customer.customer_number.lower()):
-            results.append(customer)
+    return await _repository().stats()
+
+async def get_revenue_summary() -> dict:
+    """Get revenue, ARPU and overdue totals"""
+    return await _repository().revenue_summary()
+
+async def get_revenue_breakdown(group_by: str) -> List[dict]:
+    """Get active customers and revenue grouped by city, plan_name or router_name"""
+    return await _repository().revenue_breakdown(group_by)
+
+async def get_active_columns(names: Iterable[str]) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """Ids and CustomerColumns arrays (``names``) of the active customers"""
+    return await _repository().active_columns(names)
+
+async def search_customers(query: str, limit: int = 50) -> List[Customer]:
+    """Search customers by name, email, phone, address, city or customer number.
     
-    return results[:limit]
+    Results are ranked by relevance and matching ignores case and accents.
+    """
+    return await _repository().search(query, limit)
 
-def filter_customers(filters: CustomerFilter) -> List[Customer]:
+async def filter_customers(filters: CustomerFilter) -> List[Customer]:
     """Filter customers by various criteria"""
-    customers = list(fake_customers_db.values())
-    
-    if filters.status:
-        customers = [c for c in customers if c.status == filters.status]
-    
-    if filters.service_type:
-        customers = [c for c in customers if c.service_type == filters.service_type]
-    
-    if filters.payment_status:
-        customers = [c for c in customers if c.payment_status == filters.payment_status]
-    
-    if filters.city:
-        customers = [c for c in customers if c.city.lower() == filters.city.lower()]
-    
-    if filters.plan_name:
-        customers = [c for c in customers if filters.plan_name.lower() in c.plan_name.lower()]
-    
-    if filters.overdue_only:
-        customers = [c for c in customers if c.payment_status == PaymentStatus.OVERDUE]
-    
-    return customers
+    return await _repository().filter(filters)
+
+async def get_customers_in_bbox(
+    min_lat: float, min_lon: float, max_lat: float, max_lon: float, limit: int = 1000
+) -> Tuple[int, List[Customer]]:
+    """Geocoded customers inside a map viewport: (total, up to ``limit`` customers)"""
+    validate_bbox(min_lat, min_lon, max_lat, max_lon)
+    return await _repository().in_bbox(min_lat, min_lon, max_lat, max_lon, limit)
+
+async def get_customers_within_radius(
+    lat: float, lon: float, radius_km: float, limit: int = 500
+) -> Tuple[int, List[Tuple[float, Customer]]]:
+    """Customers within ``radius_km`` of a point, nearest first, with distances"""
+    return await _repository().within_radius(lat, lon, radius_km, limit)
+
+async def get_nearest_customers(
+    lat: float, lon: float, k: int = 10, max_km: Optional[float] = None
+) -> List[Tuple[float, Customer]]:
+    """The ``k`` customers nearest to a point, with distances"""
+    return await _repository().nearest(lat, lon, k, max_km)
+
+async def get_customers_by_ip(address: str) -> List[Customer]:
+    """Customers assigned an IP address"""
+    normalized = normalize_ip(address)
+    if normalized is None:
+        raise ValueError(f"Invalid IP address: {address!r}")
+    return (await _repository().by_ip_addresses([normalized])).get(normalized, [])
+
+async def get_customers_by_mac(mac_address: str) -> List[Customer]:
+    """Customers with a MAC address (any separator style, case-insensitive)"""
+    normalized = normalize_mac(mac_address)
+    if normalized is None:
+        raise ValueError(f"Invalid MAC address: {mac_address!r}")
+    return (await _repository().by_mac_addresses([normalized])).get(normalized, [])
+
+async def get_customers_in_network(cidr: str, limit: int = 1000) -> Tuple[int, List[Customer]]:
+    """Customers whose IP is inside a CIDR block, in address order: (total, up to ``limit``)"""
+    return await _repository().in_network(parse_network(cidr), limit)
+
+async def resolve_network_addresses(
+    ip_addresses: List[str], mac_addresses: List[str]
+) -> Dict[str, Any]:
+    """Resolve many IP/MAC addresses at once (e.g. every address in an alarm storm).
+
+    Returns the matched customers per input address, plus the inputs that
+    are not valid addresses and those that matched nobody.
+    """
+    ips = {value: normalize_ip(value) for value in ip_addresses}
+    macs = {value: normalize_mac(value) for value in mac_addresses}
+    repository = _repository()
+    by_ip = await repository.by_ip_addresses(distinct(ips.values()))
+    by_mac = await repository.by_mac_addresses(distinct(macs.values()))
+
+    result = {"ip_addresses": {}, "mac_addresses": {}, "invalid": [], "unmatched": []}
+    for inputs, found, key in ((ips, by_ip, "ip_addresses"), (macs, by_mac, "mac_addresses")):
+        for value, normalized in inputs.items():
+            if normalized is None:
+                result["invalid"].append(value)
+            elif normalized in found:
+                result[key][value] = found[normalized]
+            else:
+                result["unmatched"].append(value)
+    return result
+
+async def get_customer_changes(since: int = 0, limit: int = 1000) -> ChangePage:
+    """Customer changes from offset ``since`` on (see customer_changes).
+
+    Raises ChangeLogTruncated when ``since`` is older than the retained
+    history and RuntimeError when the change feed is disabled.
+    """
+    change_log = get_change_log()
+    if change_log is None:
+        raise RuntimeError("The customer change feed is disabled")
+    return change_log.read(since, limit)
+
+def iter_customer_batches(
+    filters: Optional[CustomerFilter] = None,
+    batch_size: int = 1000
+) -> AsyncIterator[List[Customer]]:
+    """Iterate customers in id order, one batch at a time (for exports)"""
+    return _repository().iter_batches(filters, batch_size)
+
+async def get_customers_by_router(router_name: str) -> List[Customer]:
+    """Get customers attached to a router (case-insensitive)"""
+    return await _repository().by_router(router_name)
 
 # Initialize with demo data
-def init_customer_service():
+async def init_customer_service():
     """Initialize customer service with demo data"""
-    if not fake_customers_db:  # Only create if empty
-        return create_demo_customers()
-    return len(fake_customers_db)
\ No newline at end of file
+    repository = _repository()
+    await repository.initialize()
+    # The in-memory store reloads its snapshot and write-ahead log; the SQL
+    # store is durable by itself
+    if PERSISTENCE_ENABLED and isinstance(repository, InMemoryCustomerRepository):
+        persistence = CustomerStorePersistence(repository)
+        await persistence.open()
+        set_store_persistence(persistence)
+    if CHANGE_LOG_ENABLED:
+        change_log = CustomerChangeLog()
+        change_log.open()
+        set_change_log(change_log)
+        repository.add_change_listener(change_log.append)
+    count = await repository.count()
+    if not count:  # Only create if empty
+        return await create_demo_customers()
+    return count
+
+async def close_customer_service():
+    """Release the customer repository"""
+    persistence = get_store_persistence()
+    if persistence is not None:
+        await persistence.close()
+        set_store_persistence(None)
+    await _repository().close()
+    change_log = get_change_log()
+    if change_log is not None:
+        change_log.close()
+        set_change_log(None)
\ No newline at end of file
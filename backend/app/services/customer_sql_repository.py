@@ -0,0 +1,673 @@
+"""
+SQL customer repository (SQLite locally, PostgreSQL in production).
+
+Filterable and sortable fields are stored as indexed columns; the full
+Customer is kept as JSON in ``data`` so the model can grow without
+schema changes for fields that are never queried. Columns added later are
+created on startup and backfilled from ``data``.
+"""
+
+import asyncio
+import itertools
+import math
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    BigInteger, Column, Float, Index, Integer, MetaData, String, Table, Text,
+    and_, bindparam, case, func, insert, inspect, select, text, tuple_, update
+)
+
+from app.core.database import Database
+from app.models.customer import (
+    Customer, CustomerStats, CustomerFilter, CustomerStatus, PaymentStatus
+)
+from app.services.customer_index import city_key, normalize_key
+from app.services.customer_repository import (
+    CustomerChange, CustomerRepository, PageEntry, GROUP_FIELDS, apply_changes,
+    customer_number_sequence
+)
+from app.services.customer_geo import EARTH_RADIUS_KM, haversine_km, radius_bbox
+from app.services.customer_network import (
+    IPNetwork, ip_key, network_key_range, normalize_mac, parse_ip
+)
+from app.services.customer_search import WEIGHTS, query_terms, score_document, search_document, tier_patterns
+
+metadata = MetaData()
+
+customers_table = Table(
+    "customers", metadata,
+    # Store order; ids are opaque strings
+    Column("seq", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column("id", String(32), nullable=False, unique=True),
+    Column("customer_number", String(32), nullable=False),
+    Column("name", String(255), nullable=False),
+    Column("name_key", String(255), nullable=False),
+    Column("status", String(20), nullable=False),
+    Column("service_type", String(20), nullable=False),
+    Column("payment_status", String(20), nullable=False),
+    Column("city", String(120)),
+    Column("city_key", String(120)),
+    Column("plan_name", String(120)),
+    Column("plan_key", String(120)),
+    Column("router_name", String(120)),
+    Column("router_key", String(120)),
+    Column("monthly_fee", Float, nullable=False, default=0.0),
+    Column("balance_due", Float, nullable=False, default=0.0),
+    Column("created_at", Float, nullable=False),  # epoch seconds
+    Column("latitude", Float),
+    Column("longitude", Float),
+    Column("ip_key", String(33)),  # see customer_network.ip_key
+    Column("mac_key", String(12)),
+    Column("search_text", Text, nullable=False),
+    Column("data", Text, nullable=False),
+    Index("ix_customers_status", "status"),
+    Index("ix_customers_service_type", "service_type"),
+    Index("ix_customers_payment_status", "payment_status"),
+    Index("ix_customers_city_key", "city_key"),
+    Index("ix_customers_router_key", "router_key"),
+    Index("ix_customers_created_at_seq", "created_at", "seq"),
+    Index("ix_customers_name_key_seq", "name_key", "seq"),
+    Index("ix_customers_lat_lon", "latitude", "longitude"),
+    Index("ix_customers_ip_key_seq", "ip_key", "seq"),
+    Index("ix_customers_mac_key", "mac_key"),
+    sqlite_autoincrement=True,  # seq values of deleted rows are not reused
+)
+
+sequences_table = Table(
+    "customer_sequences", metadata,
+    Column("name", String(32), primary_key=True),
+    Column("value", BigInteger, nullable=False),
+)
+
+# Every column but the keys, rewritten when a customer changes
+UPDATABLE_COLUMNS = [column.name for column in customers_table.columns if column.name not in ("id", "seq")]
+
+SORT_COLUMNS = {
+    "id": customers_table.c.seq,
+    "created_at": customers_table.c.created_at,
+    "name": customers_table.c.name_key,
+}
+
+# Statements are built once; SQLAlchemy caches their compiled form and the
+# driver reuses the prepared statement on each pooled connection
+c = customers_table.c
+INSERT_CUSTOMER = insert(customers_table)
+COUNT_CUSTOMERS = select(func.count()).select_from(customers_table)
+SELECT_BY_ID = select(c.data).where(c.id == bindparam("customer_id"))
+
+# Group commit: concurrent single inserts are flushed together
+MAX_WRITE_BATCH = 500
+
+# Keys bound per IN (...) lookup, well under SQLite's parameter limit
+MAX_LOOKUP_KEYS = 500
+
+# Ids and customer numbers are reserved from the shared sequences in blocks
+# and handed out locally
+ID_BLOCK_SIZE = 100
+ID_SEQUENCE = "customers"
+NUMBER_SEQUENCE = "customer_numbers"
+
+
+def _value(enum_or_str) -> Optional[str]:
+    return getattr(enum_or_str, "value", enum_or_str)
+
+
+def _row(customer: Customer) -> Dict[str, Any]:
+    """Column values for a customer"""
+    address = parse_ip(customer.ip_address)
+    return {
+        "id": customer.id,
+        "customer_number": customer.customer_number,
+        "name": customer.name,
+        "name_key": normalize_key(customer.name) or "",
+        "status": _value(customer.status),
+        "service_type": _value(customer.service_type),
+        "payment_status": _value(customer.payment_status),
+        "city": customer.city,
+        "city_key": city_key(customer.city),
+        "plan_name": customer.plan_name,
+        "plan_key": (customer.plan_name or "").lower(),
+        "router_name": customer.router_name,
+        "router_key": normalize_key(customer.router_name),
+        "monthly_fee": customer.monthly_fee or 0.0,
+        "balance_due": customer.balance_due or 0.0,
+        "created_at": customer.created_at.timestamp(),
+        "latitude": customer.latitude,
+        "longitude": customer.longitude,
+        "ip_key": ip_key(address) if address is not None else None,
+        "mac_key": normalize_mac(customer.mac_address),
+        "search_text": "".join(search_document(customer)),
+        "data": customer.json(),
+    }
+
+
+def _customer(data: str) -> Customer:
+    return Customer.parse_raw(data)
+
+
+def _month_bounds(now: datetime):
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start.timestamp(), end.timestamp()
+
+
+def _rekey_on_seq(sync_conn):
+    """Move the rows of a store keyed on id (seq was int(id)) to a table
+    keyed on an autoincrement seq, keeping their order. Every column is
+    rewritten from ``data``."""
+    name = customers_table.name
+    for index in inspect(sync_conn).get_indexes(name):
+        sync_conn.execute(text(f"DROP INDEX {index['name']}"))
+    rekeyed = customers_table.to_metadata(MetaData(), name=f"{name}_rekeyed")
+    rekeyed.create(sync_conn)
+    after = None
+    while True:
+        query = f"SELECT seq, data FROM {name}" + (" WHERE seq > :after" if after is not None else "")
+        rows = sync_conn.execute(text(query + f" ORDER BY seq LIMIT {MAX_WRITE_BATCH}"), {"after": after}).all()
+        if not rows:
+            break
+        sync_conn.execute(insert(rekeyed), [{**_row(_customer(data)), "seq": seq} for seq, data in rows])
+        after = rows[-1][0]
+    sync_conn.execute(text(f"DROP TABLE {name}"))
+    sync_conn.execute(text(f"ALTER TABLE {rekeyed.name} RENAME TO {name}"))
+    if sync_conn.dialect.name == "postgresql":
+        # Rows were copied with their seq; continue the serial after them
+        sync_conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{name}', 'seq'), "
+            f"(SELECT coalesce(max(seq), 0) + 1 FROM {name}), false)"
+        ))
+
+
+def _upgrade_schema(sync_conn) -> List[str]:
+    """Add columns and indexes introduced after a store was created.
+
+    Returns the names of the added columns, which still need a backfill.
+    """
+    if inspect(sync_conn).get_pk_constraint(customers_table.name)["constrained_columns"] == ["id"]:
+        _rekey_on_seq(sync_conn)
+        return []
+    existing = {column["name"] for column in inspect(sync_conn).get_columns(customers_table.name)}
+    added = []
+    for column in customers_table.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(sync_conn.dialect)
+            sync_conn.execute(text(f"ALTER TABLE {customers_table.name} ADD COLUMN {column.name} {column_type}"))
+            added.append(column.name)
+    for index in customers_table.indexes:
+        index.create(sync_conn, checkfirst=True)
+    return added
+
+
+def _conditions(filters: CustomerFilter) -> List:
+    """WHERE clauses for the given CustomerFilter criteria"""
+    conditions = []
+    if filters.status:
+        conditions.append(c.status == _value(filters.status))
+    if filters.service_type:
+        conditions.append(c.service_type == _value(filters.service_type))
+    if filters.payment_status:
+        conditions.append(c.payment_status == _value(filters.payment_status))
+    if filters.overdue_only:
+        conditions.append(c.payment_status == _value(PaymentStatus.OVERDUE))
+    if filters.city:
+        conditions.append(c.city_key == city_key(filters.city))
+    if filters.plan_name:
+        conditions.append(c.plan_key.contains(filters.plan_name.lower(), autoescape=True))
+    return conditions
+
+
+class SQLCustomerRepository(CustomerRepository):
+    """Customer store on an async SQL database with pooled connections"""
+
+    def __init__(self, url: Optional[str] = None, database: Optional[Database] = None, **pool_options):
+        self.database = database or Database(url, **pool_options)
+        self._pending: List = []
+        self._flush_scheduled = False
+        # sequence name -> [next value, end of reserved block (exclusive)]
+        self._blocks: Dict[str, List[int]] = {ID_SEQUENCE: [0, 0], NUMBER_SEQUENCE: [0, 0]}
+        self._sequence_lock = asyncio.Lock()
+
+    async def initialize(self):
+        engine = await self.database.connect()
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+            added = await conn.run_sync(_upgrade_schema)
+            if added:
+                await self._backfill(conn, added)
+            await self._rekey_cities(conn)
+            seeded = set(await conn.scalars(select(sequences_table.c.name)))
+            if ID_SEQUENCE not in seeded:
+                ids = await conn.scalars(select(c.id))
+                highest = max((int(customer_id) for customer_id in ids if customer_id.isdigit()), default=0)
+                await conn.execute(insert(sequences_table).values(name=ID_SEQUENCE, value=highest))
+            if NUMBER_SEQUENCE not in seeded:
+                # One-off scan for stores created before the number sequence existed
+                numbers = await conn.scalars(select(c.customer_number))
+                highest = max((customer_number_sequence(n) or 0 for n in numbers), default=0)
+                await conn.execute(insert(sequences_table).values(name=NUMBER_SEQUENCE, value=highest))
+
+    async def _backfill(self, conn, columns: List[str]):
+        """Fill newly added columns from the stored customer JSON"""
+        rows = (await conn.execute(select(c.id, c.data))).all()
+        await self._write_columns(conn, [_customer(data) for _, data in rows], columns)
+
+    async def _rekey_cities(self, conn):
+        """Re-derive city_key for cities stored under an older key format
+        (one statement per distinct city that needs it)"""
+        pairs = (await conn.execute(select(c.city, c.city_key).distinct())).all()
+        for city, key in pairs:
+            if key != city_key(city):
+                await conn.execute(
+                    update(customers_table).where(c.city == city).values(city_key=city_key(city))
+                )
+
+    async def _write_columns(self, conn, customers: List[Customer], columns: List[str]):
+        """Rewrite some columns of existing rows, MAX_WRITE_BATCH rows per executemany"""
+        values = {name: bindparam(f"new_{name}") for name in columns}
+        statement = update(customers_table).where(c.id == bindparam("row_id")).values(**values)
+        for start in range(0, len(customers), MAX_WRITE_BATCH):
+            params = []
+            for customer in customers[start:start + MAX_WRITE_BATCH]:
+                row = _row(customer)
+                params.append({"row_id": customer.id, **{f"new_{name}": row[name] for name in columns}})
+            await conn.execute(statement, params)
+
+    async def close(self):
+        await self.database.dispose()
+
+    async def count(self) -> int:
+        async with self.database.connection() as conn:
+            return await conn.scalar(COUNT_CUSTOMERS)
+
+    async def allocate_ids(self, count: int) -> List[str]:
+        first = await self._allocate(ID_SEQUENCE, count)
+        return [str(i) for i in range(first, first + count)]
+
+    async def allocate_customer_numbers(self, count: int) -> List[int]:
+        first = await self._allocate(NUMBER_SEQUENCE, count)
+        return list(range(first, first + count))
+
+    async def _allocate(self, sequence: str, count: int) -> int:
+        """First of ``count`` consecutive values from a sequence"""
+        async with self._sequence_lock:
+            block = self._blocks[sequence]
+            if block[1] - block[0] < count:
+                # Unused values left in the old block are skipped (gaps are fine)
+                size = max(count, ID_BLOCK_SIZE)
+                first = await self._reserve_block(sequence, size)
+                block[:] = [first, first + size]
+            first = block[0]
+            block[0] += count
+        return first
+
+    async def _reserve_block(self, sequence: str, size: int) -> int:
+        """Reserve ``size`` values from a shared sequence; returns the first one"""
+        # The UPDATE takes the row (or database) write lock, so concurrent
+        # workers always receive disjoint blocks
+        async with self.database.begin() as conn:
+            await conn.execute(
+                update(sequences_table)
+                .where(sequences_table.c.name == sequence)
+                .values(value=sequences_table.c.value + size)
+            )
+            last = await conn.scalar(select(sequences_table.c.value).where(sequences_table.c.name == sequence))
+        return last - size + 1
+
+    async def get(self, customer_id: str) -> Optional[Customer]:
+        async with self.database.connection() as conn:
+            data = await conn.scalar(SELECT_BY_ID, {"customer_id": customer_id})
+        return _customer(data) if data is not None else None
+
+    async def get_many(self, customer_ids: List[str]) -> List[Customer]:
+        found = {}
+        async with self.database.connection() as conn:
+            for start in range(0, len(customer_ids), MAX_LOOKUP_KEYS):
+                query = select(c.data).where(c.id.in_(customer_ids[start:start + MAX_LOOKUP_KEYS]))
+                for data in (await conn.scalars(query)).all():
+                    customer = _customer(data)
+                    found[customer.id] = customer
+        return [found[customer_id] for customer_id in customer_ids if customer_id in found]
+
+    async def list_all(self) -> List[Customer]:
+        return await self._select(select(c.data).order_by(c.seq))
+
+    async def page(self, sort: str, limit: int, after: Optional[Any] = None,
+                   descending: bool = False, skip: int = 0) -> List[PageEntry]:
+        column = SORT_COLUMNS[sort]
+        query = select(column, c.seq, c.data)
+        if after is not None:
+            try:
+                key, seq = after
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+            position = tuple_(column, c.seq)
+            query = query.where(position < tuple_(key, seq) if descending else position > tuple_(key, seq))
+        if descending:
+            query = query.order_by(column.desc(), c.seq.desc())
+        else:
+            query = query.order_by(column, c.seq)
+        query = query.offset(skip).limit(limit)
+
+        async with self.database.connection() as conn:
+            rows = (await conn.execute(query)).all()
+        return [([key, seq], _customer(data)) for key, seq, data in rows]
+
+    async def insert(self, customer: Customer):
+        # Queue the row and let one flush write every row queued in the same
+        # event-loop tick in a single transaction
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((_row(customer), future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(lambda: asyncio.ensure_future(self._flush()))
+        await future
+        if self.change_listeners:
+            self._notify([("create", customer.id, customer)])
+
+    async def _flush(self):
+        self._flush_scheduled = False
+        while self._pending:
+            batch, self._pending = self._pending[:MAX_WRITE_BATCH], self._pending[MAX_WRITE_BATCH:]
+            try:
+                async with self.database.begin() as conn:
+                    await conn.execute(INSERT_CUSTOMER, [row for row, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    async def insert_many(self, customers: List[Customer]):
+        if not customers:
+            return
+        rows = [_row(customer) for customer in customers]
+        async with self.database.begin() as conn:
+            for start in range(0, len(rows), MAX_WRITE_BATCH):
+                await conn.execute(INSERT_CUSTOMER, rows[start:start + MAX_WRITE_BATCH])
+        if self.change_listeners:
+            self._notify([("create", customer.id, customer) for customer in customers])
+
+    async def update(self, customer_id: str, changes: Dict[str, Any]) -> Optional[Customer]:
+        async with self.database.begin() as conn:
+            data = await conn.scalar(select(c.data).where(c.id == customer_id).with_for_update())
+            if data is None:
+                return None
+            customer = _customer(data)
+            change = apply_changes(customer, changes)
+            row = _row(customer)
+            del row["id"]
+            await conn.execute(update(customers_table).where(c.id == customer_id).values(**row))
+        self._notify([change])
+        return customer
+
+    async def update_many(self, customer_ids: List[str], changes: Dict[str, Any]) -> Tuple[int, List[str]]:
+        ids = list(dict.fromkeys(customer_ids))
+        found = set()
+        updates = []
+        async with self.database.begin() as conn:
+            for start in range(0, len(ids), MAX_LOOKUP_KEYS):
+                query = select(c.data).where(c.id.in_(ids[start:start + MAX_LOOKUP_KEYS])).with_for_update()
+                customers = [_customer(data) for data in (await conn.scalars(query)).all()]
+                updates += await self._apply_changes(conn, customers, changes)
+                found.update(customer.id for customer in customers)
+        self._notify(updates)
+        return len(found), [customer_id for customer_id in ids if customer_id not in found]
+
+    async def update_each(self, changes: Dict[str, Dict[str, Any]]) -> Tuple[int, List[str]]:
+        ids = list(changes)
+        found = set()
+        updates = []
+        async with self.database.begin() as conn:
+            for start in range(0, len(ids), MAX_LOOKUP_KEYS):
+                query = select(c.data).where(c.id.in_(ids[start:start + MAX_LOOKUP_KEYS])).with_for_update()
+                customers = [_customer(data) for data in (await conn.scalars(query)).all()]
+                updates += [apply_changes(customer, changes[customer.id]) for customer in customers]
+                await self._write_columns(conn, customers, UPDATABLE_COLUMNS)
+                found.update(customer.id for customer in customers)
+        self._notify(updates)
+        return len(found), [customer_id for customer_id in ids if customer_id not in found]
+
+    async def update_matching(self, filters: CustomerFilter, changes: Dict[str, Any]) -> int:
+        query = select(c.data).where(and_(True, *_conditions(filters))).with_for_update()
+        async with self.database.begin() as conn:
+            customers = [_customer(data) for data in (await conn.scalars(query)).all()]
+            updates = await self._apply_changes(conn, customers, changes)
+        self._notify(updates)
+        return len(customers)
+
+    async def _apply_changes(self, conn, customers: List[Customer],
+                             changes: Dict[str, Any]) -> List[CustomerChange]:
+        updates = [apply_changes(customer, changes) for customer in customers]
+        await self._write_columns(conn, customers, UPDATABLE_COLUMNS)
+        return updates
+
+    async def delete(self, customer_id: str) -> bool:
+        async with self.database.begin() as conn:
+            result = await conn.execute(customers_table.delete().where(c.id == customer_id))
+        if result.rowcount > 0:
+            self._notify([("delete", customer_id, None)])
+        return result.rowcount > 0
+
+    async def filter(self, filters: CustomerFilter) -> List[Customer]:
+        return await self._select(select(c.data).where(and_(True, *_conditions(filters))).order_by(c.seq))
+
+    async def iter_batches(self, filters: Optional[CustomerFilter] = None,
+                           batch_size: int = 1000) -> AsyncIterator[List[Customer]]:
+        conditions = _conditions(filters) if filters else []
+        after = 0
+        while True:
+            # Keyset on seq; the connection goes back to the pool between batches
+            query = select(c.seq, c.data).where(c.seq > after, *conditions).order_by(c.seq).limit(batch_size)
+            async with self.database.connection() as conn:
+                rows = (await conn.execute(query)).all()
+            if not rows:
+                return
+            after = rows[-1][0]
+            yield [_customer(data) for _, data in rows]
+            if len(rows) < batch_size:
+                return
+
+    async def search(self, query: str, limit: int) -> List[Customer]:
+        terms = query_terms(query)
+        if not terms or limit <= 0:
+            return []
+        # Rows come in pages ordered by an upper bound of their score (each
+        # term's best match quality anywhere in the row, at the heaviest
+        # field weight) and are ranked with the in-memory scorer, until no
+        # unread row can beat the last result
+        heaviest = max(WEIGHTS)
+        conditions, bound = [], 0.0
+        for term in terms:
+            *better, (loosest, anywhere) = tier_patterns(term)
+            conditions.append(c.search_text.contains(anywhere, autoescape=True))
+            bound = bound + case(
+                *((c.search_text.contains(pattern, autoescape=True), quality * heaviest) for quality, pattern in better),
+                else_=loosest * heaviest,
+            )
+        statement = select(bound, c.seq, c.data).where(and_(*conditions)).order_by(bound.desc(), c.seq)
+        page_size = limit * 4
+        ranked = []
+        async with self.database.connection() as conn:
+            for offset in itertools.count(0, page_size):
+                rows = (await conn.execute(statement.offset(offset).limit(page_size))).all()
+                for _, seq, data in rows:
+                    customer = _customer(data)
+                    score = score_document(search_document(customer), terms)
+                    if score:
+                        ranked.append((-score, seq, customer))
+                ranked.sort(key=lambda item: item[:2])
+                del ranked[limit:]
+                if len(rows) < page_size or (len(ranked) == limit and -ranked[-1][0] > rows[-1][0]):
+                    break
+        return [customer for _, _, customer in ranked]
+
+    async def by_router(self, router_name: str) -> List[Customer]:
+        return await self._select(
+            select(c.data).where(c.router_key == normalize_key(router_name)).order_by(c.seq)
+        )
+
+    async def in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                      limit: int) -> Tuple[int, List[Customer]]:
+        condition = and_(c.latitude.between(min_lat, max_lat), c.longitude.between(min_lon, max_lon))
+        async with self.database.connection() as conn:
+            total = await conn.scalar(select(func.count()).select_from(customers_table).where(condition))
+            data = (await conn.scalars(select(c.data).where(condition).order_by(c.seq).limit(limit))).all()
+        return total, [_customer(item) for item in data]
+
+    async def _distances(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, str]]:
+        """(distance_km, id) within a radius, nearest first; the bounding box
+        is answered by the lat/lon index, the circle is checked here"""
+        min_lat, min_lon, max_lat, max_lon = radius_bbox(lat, lon, radius_km)
+        query = select(c.id, c.latitude, c.longitude).where(
+            c.latitude.between(min_lat, max_lat), c.longitude.between(min_lon, max_lon)
+        )
+        async with self.database.connection() as conn:
+            rows = (await conn.execute(query)).all()
+        found = []
+        for customer_id, point_lat, point_lon in rows:
+            distance = haversine_km(lat, lon, point_lat, point_lon)
+            if distance <= radius_km:
+                found.append((distance, customer_id))
+        found.sort()
+        return found
+
+    async def _with_customers(self, found: List[Tuple[float, str]]) -> List[Tuple[float, Customer]]:
+        if not found:
+            return []
+        async with self.database.connection() as conn:
+            rows = (await conn.execute(
+                select(c.id, c.data).where(c.id.in_([customer_id for _, customer_id in found]))
+            )).all()
+        by_id = dict(rows)
+        return [(distance, _customer(by_id[customer_id])) for distance, customer_id in found if customer_id in by_id]
+
+    async def within_radius(self, lat: float, lon: float, radius_km: float,
+                            limit: int) -> Tuple[int, List[Tuple[float, Customer]]]:
+        found = await self._distances(lat, lon, radius_km)
+        return len(found), await self._with_customers(found[:limit])
+
+    async def nearest(self, lat: float, lon: float, k: int,
+                      max_km: Optional[float] = None) -> List[Tuple[float, Customer]]:
+        if k <= 0:
+            return []
+        # Grow the search radius until it holds k customers (or covers the
+        # whole globe / max_km); the k nearest inside it are the k nearest
+        radius_km = 1.0 if max_km is None else min(1.0, max_km)
+        while True:
+            found = await self._distances(lat, lon, radius_km)
+            limit_reached = radius_km >= (max_km if max_km is not None else math.pi * EARTH_RADIUS_KM)
+            if len(found) >= k or limit_reached:
+                return await self._with_customers(found[:k])
+            radius_km *= 4
+            if max_km is not None:
+                radius_km = min(radius_km, max_km)
+
+    async def by_ip_addresses(self, addresses: List[str]) -> Dict[str, List[Customer]]:
+        by_key = {}
+        for address in addresses:
+            parsed = parse_ip(address)
+            if parsed is not None:
+                by_key[ip_key(parsed)] = address
+        rows = await self._select_keyed(c.ip_key, list(by_key))
+        return {by_key[key]: customers for key, customers in rows.items()}
+
+    async def by_mac_addresses(self, macs: List[str]) -> Dict[str, List[Customer]]:
+        return await self._select_keyed(c.mac_key, macs)
+
+    async def _select_keyed(self, column, keys: List[str]) -> Dict[str, List[Customer]]:
+        """Customers per key for an IN lookup on an indexed column, in store order"""
+        found: Dict[str, List[Customer]] = {}
+        async with self.database.connection() as conn:
+            for start in range(0, len(keys), MAX_LOOKUP_KEYS):
+                query = (select(column, c.data)
+                         .where(column.in_(keys[start:start + MAX_LOOKUP_KEYS]))
+                         .order_by(c.seq))
+                for key, data in (await conn.execute(query)).all():
+                    found.setdefault(key, []).append(_customer(data))
+        return found
+
+    async def in_network(self, network: IPNetwork, limit: int) -> Tuple[int, List[Customer]]:
+        low, high = network_key_range(network)
+        condition = c.ip_key.between(low, high)
+        async with self.database.connection() as conn:
+            total = await conn.scalar(select(func.count()).select_from(customers_table).where(condition))
+            data = (await conn.scalars(
+                select(c.data).where(condition).order_by(c.ip_key, c.seq).limit(limit)
+            )).all()
+        return total, [_customer(item) for item in data]
+
+    async def stats(self) -> CustomerStats:
+        month_start, month_end = _month_bounds(datetime.now())
+        active = c.status == _value(CustomerStatus.ACTIVE)
+        query = select(
+            func.count(),
+            func.sum(case((active, 1), else_=0)),
+            func.sum(case((c.status == _value(CustomerStatus.SUSPENDED), 1), else_=0)),
+            func.sum(case((c.status == _value(CustomerStatus.PENDING), 1), else_=0)),
+            func.sum(case((active, c.monthly_fee), else_=0.0)),
+            func.sum(case((c.payment_status == _value(PaymentStatus.OVERDUE), 1), else_=0)),
+            func.sum(case((and_(c.created_at >= month_start, c.created_at < month_end), 1), else_=0)),
+        )
+        async with self.database.connection() as conn:
+            row = (await conn.execute(query)).one()
+        total, active_count, suspended, pending, revenue, overdue, new = (value or 0 for value in row)
+        return CustomerStats(
+            total_customers=total,
+            active_customers=active_count,
+            suspended_customers=suspended,
+            pending_customers=pending,
+            monthly_revenue=round(revenue, 2),
+            overdue_payments=overdue,
+            new_customers_this_month=new
+        )
+
+    async def revenue_summary(self) -> Dict[str, Any]:
+        active = c.status == _value(CustomerStatus.ACTIVE)
+        query = select(
+            func.sum(case((active, 1), else_=0)),
+            func.sum(case((active, c.monthly_fee), else_=0.0)),
+            func.sum(case((c.balance_due > 0, c.balance_due), else_=0.0)),
+            func.sum(case((c.payment_status == _value(PaymentStatus.OVERDUE), 1), else_=0)),
+        )
+        async with self.database.connection() as conn:
+            row = (await conn.execute(query)).one()
+        active_customers, revenue, overdue_amount, overdue_accounts = (value or 0 for value in row)
+        return {
+            "active_customers": active_customers,
+            "monthly_revenue": float(revenue),
+            "average_revenue_per_user": revenue / active_customers if active_customers else 0,
+            "overdue_amount": float(overdue_amount),
+            "overdue_accounts": overdue_accounts,
+        }
+
+    async def revenue_breakdown(self, group_by: str) -> List[Dict[str, Any]]:
+        if group_by not in GROUP_FIELDS:
+            raise ValueError(f"Cannot group by {group_by!r}; expected one of {', '.join(GROUP_FIELDS)}")
+        column = customers_table.c[group_by]
+        revenue = func.sum(c.monthly_fee)
+        query = (
+            select(column, func.count(), revenue, func.sum(c.balance_due))
+            .where(c.status == _value(CustomerStatus.ACTIVE), column.is_not(None))
+            .group_by(column)
+            .order_by(revenue.desc())
+        )
+        async with self.database.connection() as conn:
+            rows = (await conn.execute(query)).all()
+        return [
+            {
+                group_by: key,
+                "customers": count,
+                "monthly_revenue": float(total),
+                "average_revenue_per_user": float(total) / count,
+                "balance_due": float(balance),
+            }
+            for key, count, total, balance in rows
+        ]
+
+    async def _select(self, query) -> List[Customer]:
+        async with self.database.connection() as conn:
+            return [_customer(data) for data in (await conn.scalars(query)).all()]
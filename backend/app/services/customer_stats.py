@@ -0,0 +1,116 @@
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.models.customer import Customer, CustomerStats, CustomerStatus, PaymentStatus
+
+
+def _month_key(moment: datetime) -> Tuple[int, int]:
+    return moment.year, moment.month
+
+
+def _to_cents(amount: Optional[float]) -> int:
+    return round((amount or 0.0) * 100)
+
+
+class CustomerStatsAccumulator:
+    """Running CustomerStats aggregates, updated by deltas on every mutation.
+
+    Revenue is accumulated in integer cents so repeated add/remove cycles
+    never drift. New customers are counted per calendar month, so the
+    "this month" figure rolls over by itself when the month changes.
+    """
+
+    SOURCE_FIELDS = frozenset({"status", "payment_status", "monthly_fee", "created_at"})
+
+    def __init__(self):
+        self._status_counts: Counter = Counter()
+        self._overdue = 0
+        self._active_revenue_cents = 0
+        self._created_by_month: Counter = Counter()
+        # customer_id -> (status, payment_status, fee_cents, created month)
+        self._contributions: Dict[str, Tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self._contributions)
+
+    def add(self, customer: Customer):
+        """Account for a new or changed customer"""
+        self.remove(customer.id)
+        contribution = (
+            customer.status,
+            customer.payment_status,
+            _to_cents(customer.monthly_fee),
+            _month_key(customer.created_at),
+        )
+        self._apply(contribution, 1)
+        self._contributions[customer.id] = contribution
+
+    def remove(self, customer_id: str):
+        """Stop accounting for a customer"""
+        contribution = self._contributions.pop(customer_id, None)
+        if contribution is not None:
+            self._apply(contribution, -1)
+
+    def clear(self):
+        """Drop every contribution"""
+        self._status_counts.clear()
+        self._overdue = 0
+        self._active_revenue_cents = 0
+        self._created_by_month.clear()
+        self._contributions.clear()
+
+    def rebuild(self, customers: Iterable[Customer]):
+        """Recompute every aggregate from scratch"""
+        self.clear()
+        for customer in customers:
+            self.add(customer)
+
+    def snapshot(self, now: Optional[datetime] = None) -> CustomerStats:
+        """Current statistics, O(1) regardless of store size"""
+        now = now or datetime.now()
+        return CustomerStats(
+            total_customers=len(self._contributions),
+            active_customers=self._status_counts[CustomerStatus.ACTIVE],
+            suspended_customers=self._status_counts[CustomerStatus.SUSPENDED],
+            pending_customers=self._status_counts[CustomerStatus.PENDING],
+            monthly_revenue=self._active_revenue_cents / 100,
+            overdue_payments=self._overdue,
+            new_customers_this_month=self._created_by_month[_month_key(now)]
+        )
+
+    def _apply(self, contribution: Tuple, sign: int):
+        status, payment_status, fee_cents, month = contribution
+        self._status_counts[status] += sign
+        if status == CustomerStatus.ACTIVE:
+            self._active_revenue_cents += sign * fee_cents
+        if payment_status == PaymentStatus.OVERDUE:
+            self._overdue += sign
+        self._created_by_month[month] += sign
+
+
+def compute_customer_stats(customers: Iterable[Customer], now: Optional[datetime] = None) -> CustomerStats:
+    """Full recompute of CustomerStats, used to verify the accumulator"""
+    current_month = _month_key(now or datetime.now())
+    status_counts: Counter = Counter()
+    monthly_revenue_cents = 0
+    overdue_payments = 0
+    new_customers_this_month = 0
+    for customer in customers:
+        status_counts[customer.status] += 1
+        if customer.status == CustomerStatus.ACTIVE:
+            monthly_revenue_cents += _to_cents(customer.monthly_fee)
+        if customer.payment_status == PaymentStatus.OVERDUE:
+            overdue_payments += 1
+        if _month_key(customer.created_at) == current_month:
+            new_customers_this_month += 1
+
+    return CustomerStats(
+        total_customers=sum(status_counts.values()),
+        active_customers=status_counts[CustomerStatus.ACTIVE],
+        suspended_customers=status_counts[CustomerStatus.SUSPENDED],
+        pending_customers=status_counts[CustomerStatus.PENDING],
+        monthly_revenue=monthly_revenue_cents / 100,
+        overdue_payments=overdue_payments,
+        new_customers_this_month=new_customers_this_month
+    )
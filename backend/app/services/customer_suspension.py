@@ -0,0 +1,289 @@
+"""
+Automatic suspension of overdue customers (AUTO_SUSPEND_*).
+
+An active customer whose payment status is overdue is suspended
+AUTO_SUSPEND_DAYS after the end of the billing cycle their last payment
+covered (their creation date when they never paid), and is sent a notice
+AUTO_SUSPEND_NOTIFICATION_DAYS days before that. Notices whose time has
+already passed when a customer is scheduled are skipped.
+
+Deadlines live in a min-heap, so a tick only touches the entries that are
+due. The scheduler listens to repository changes: a payment, a status
+change or a deletion re-keys the customer by bumping its version, and the
+outdated heap entries are dropped when they surface. Suspensions go
+through update_customer like any other edit.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import (
+    AUTO_SUSPEND_DAYS, AUTO_SUSPEND_ENABLED, AUTO_SUSPEND_NOTIFICATION_DAYS, BILLING_CYCLE_DAYS
+)
+from app.models.customer import Customer, CustomerStatus, CustomerUpdate, PaymentStatus
+from app.services.customer_repository import CustomerChange, CustomerRepository, get_customer_repository
+from app.services.customer_service import get_customer_by_id, update_customer
+
+logger = logging.getLogger(__name__)
+
+# Fields a suspension deadline is derived from
+SOURCE_FIELDS = ("status", "payment_status", "last_payment", "created_at")
+
+# Longest the scheduler sleeps without checking the heap (clock changes)
+MAX_SLEEP_SECONDS = 60.0
+# Suspensions issued concurrently, so their WAL writes share fsyncs
+SUSPEND_CONCURRENCY = 100
+
+SUSPEND = "suspend"
+NOTICE = "notice"
+
+Notifier = Callable[[Customer, int], Awaitable[None]]
+
+
+def suspension_deadline(status: CustomerStatus, payment_status: PaymentStatus,
+                        last_payment: Optional[datetime], created_at: Optional[datetime],
+                        cycle_days: int = BILLING_CYCLE_DAYS,
+                        grace_days: int = AUTO_SUSPEND_DAYS) -> Optional[datetime]:
+    """When a customer is due for suspension; None when they are not on track for one"""
+    if status != CustomerStatus.ACTIVE or payment_status != PaymentStatus.OVERDUE:
+        return None
+    paid_from = last_payment or created_at
+    if paid_from is None:
+        return None
+    return paid_from + timedelta(days=cycle_days + grace_days)
+
+
+async def log_notice(customer: Customer, days_left: int):
+    """Default notifier (the messaging integrations plug in here)"""
+    logger.info(
+        f"Suspension notice: customer {customer.id} ({customer.customer_number}) "
+        f"will be suspended in {days_left} day(s)"
+    )
+
+
+@dataclass(order=True)
+class _Entry:
+    due: float  # epoch seconds
+    seq: int  # tie-break: first scheduled, first fired
+    customer_id: str
+    version: int
+    kind: str
+    days_left: int = 0
+
+
+class SuspensionScheduler:
+    """Min-heap of suspension and notice deadlines, kept current by the
+    repository's change notifications"""
+
+    def __init__(self, suspend_days: int = AUTO_SUSPEND_DAYS,
+                 notification_days: Iterable[int] = AUTO_SUSPEND_NOTIFICATION_DAYS,
+                 cycle_days: int = BILLING_CYCLE_DAYS, notifier: Notifier = log_notice,
+                 clock: Callable[[], float] = time.time):
+        self.suspend_days = suspend_days
+        self.notification_days = sorted(set(notification_days), reverse=True)
+        self.cycle_days = cycle_days
+        self.notifier = notifier
+        self.clock = clock
+        self._heap: List[_Entry] = []
+        self._seq = itertools.count()
+        # customer_id -> SOURCE_FIELDS values (updates only carry what changed)
+        self._fields: Dict[str, tuple] = {}
+        # customer_id -> (version, deadline) of scheduled customers; heap
+        # entries of any other version are stale
+        self._scheduled: Dict[str, Tuple[int, float]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.suspended = 0
+        self.notices = 0
+
+    def __len__(self) -> int:
+        return len(self._scheduled)
+
+    # -- keying ----------------------------------------------------------
+
+    def load(self, customers: Iterable[Customer]):
+        """Schedule existing customers (one heapify instead of a push each)"""
+        for customer in customers:
+            self._fields[customer.id] = tuple(getattr(customer, field) for field in SOURCE_FIELDS)
+            self._key(customer.id, push=False)
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def on_changes(self, changes: List[CustomerChange]):
+        """Change listener: re-key customers whose deadline inputs changed"""
+        earliest = self._heap[0].due if self._heap else None
+        for operation, customer_id, details in changes:
+            if operation == "create":
+                self._fields[customer_id] = tuple(getattr(details, field) for field in SOURCE_FIELDS)
+            elif operation == "delete":
+                self._fields.pop(customer_id, None)
+            else:
+                fields = self._fields.get(customer_id)
+                if fields is None or not any(field in details for field in SOURCE_FIELDS):
+                    continue
+                self._fields[customer_id] = tuple(
+                    details[field][1] if field in details else value
+                    for field, value in zip(SOURCE_FIELDS, fields)
+                )
+            self._key(customer_id)
+        self._compact()
+        if self._heap and (earliest is None or self._heap[0].due < earliest):
+            self._wakeup.set()  # something is due sooner than the loop expects
+
+    def _key(self, customer_id: str, push: bool = True):
+        """(Re)compute a customer's deadline; older heap entries go stale"""
+        self._scheduled.pop(customer_id, None)
+        fields = self._fields.get(customer_id)
+        deadline = suspension_deadline(*fields, self.cycle_days, self.suspend_days) if fields else None
+        if deadline is None:
+            return
+        version = next(self._seq)
+        due = deadline.timestamp()
+        self._scheduled[customer_id] = (version, due)
+        now = self.clock()
+        entries = [_Entry(due, next(self._seq), customer_id, version, SUSPEND)]
+        for days in self.notification_days:
+            notice = due - days * 86400
+            if notice > now:
+                entries.append(_Entry(notice, next(self._seq), customer_id, version, NOTICE, days))
+        if push:
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+        else:
+            self._heap.extend(entries)
+
+    def _compact(self):
+        """Rebuild the heap once stale entries outnumber live ones"""
+        live = len(self._scheduled) * (1 + len(self.notification_days))  # at most
+        if len(self._heap) > max(64, 2 * live):
+            self._heap = [entry for entry in self._heap if self._is_current(entry)]
+            heapq.heapify(self._heap)
+
+    def _is_current(self, entry: _Entry) -> bool:
+        scheduled = self._scheduled.get(entry.customer_id)
+        return scheduled is not None and scheduled[0] == entry.version
+
+    # -- firing ----------------------------------------------------------
+
+    def pop_due(self, now: Optional[float] = None) -> List[_Entry]:
+        """Remove and return the current entries due at ``now``"""
+        now = self.clock() if now is None else now
+        due = []
+        while self._heap and self._heap[0].due <= now:
+            entry = heapq.heappop(self._heap)
+            if self._is_current(entry):
+                due.append(entry)
+        return due
+
+    async def tick(self) -> int:
+        """Fire every due notice and suspension; returns how many fired"""
+        due = self.pop_due()
+        notices = [entry for entry in due if entry.kind == NOTICE]
+        suspensions = [entry for entry in due if entry.kind == SUSPEND]
+        for entry in notices:
+            customer = await get_customer_by_id(entry.customer_id)
+            if customer is not None:
+                try:
+                    await self.notifier(customer, entry.days_left)
+                    self.notices += 1
+                except Exception:
+                    logger.exception(f"Suspension notice for customer {entry.customer_id} failed")
+        for start in range(0, len(suspensions), SUSPEND_CONCURRENCY):
+            batch = suspensions[start:start + SUSPEND_CONCURRENCY]
+            results = await asyncio.gather(
+                *(self._suspend(entry.customer_id) for entry in batch), return_exceptions=True
+            )
+            for entry, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Automatic suspension of customer {entry.customer_id} failed: {result}")
+        return len(due)
+
+    async def _suspend(self, customer_id: str):
+        customer = await update_customer(customer_id, CustomerUpdate(
+            status=CustomerStatus.SUSPENDED, payment_status=PaymentStatus.SUSPENDED
+        ))
+        if customer is not None:
+            self.suspended += 1
+            logger.info(f"Customer {customer_id} suspended for non-payment")
+
+    async def run(self):
+        """Fire entries as they come due, sleeping until the next one"""
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Automatic suspension tick failed")
+            delay = MAX_SLEEP_SECONDS
+            if self._heap:
+                delay = min(delay, max(self._heap[0].due - self.clock(), 0.0))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    # -- lifecycle -------------------------------------------------------
+
+    async def start(self, repository: CustomerRepository):
+        """Load every customer, follow the repository's changes and start firing"""
+        async for batch in repository.iter_batches():
+            self.load(batch)
+        repository.add_change_listener(self.on_changes)
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def upcoming(self, limit: int = 100) -> List[Dict[str, object]]:
+        """The next ``limit`` scheduled suspensions"""
+        nearest = heapq.nsmallest(limit, self._scheduled.items(), key=lambda item: item[1][1])
+        return [
+            {"customer_id": customer_id, "suspend_at": datetime.fromtimestamp(due).isoformat()}
+            for customer_id, (_, due) in nearest
+        ]
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "scheduled": len(self._scheduled),
+            "heap_entries": len(self._heap),
+            "notices_sent": self.notices,
+            "suspended": self.suspended,
+            "suspend_days": self.suspend_days,
+            "notification_days": self.notification_days,
+        }
+
+
+_scheduler: Optional[SuspensionScheduler] = None
+
+
+def get_suspension_scheduler() -> Optional[SuspensionScheduler]:
+    """The process-wide scheduler (None when AUTO_SUSPEND_ENABLED is off)"""
+    return _scheduler
+
+
+async def start_auto_suspension() -> Optional[SuspensionScheduler]:
+    """Start the scheduler when AUTO_SUSPEND_ENABLED is set"""
+    global _scheduler
+    if AUTO_SUSPEND_ENABLED and _scheduler is None:
+        _scheduler = SuspensionScheduler()
+        await _scheduler.start(get_customer_repository())
+    return _scheduler
+
+
+async def stop_auto_suspension():
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.stop()
+        _scheduler = None
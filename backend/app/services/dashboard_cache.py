@@ -0,0 +1,307 @@
+"""
+Response cache for the dashboard router.
+
+Dashboards poll the same few sections (customer stats, revenue, network,
+activities, metrics) every few seconds, while their inputs change far
+less often. Each section is cached per role as its rendered JSON body and
+a strong ETag (a digest of those bytes), so a hit costs neither the
+recompute nor the encoding, and a poller repeating the ETag gets a 304.
+
+An entry is fresh for ``ttl`` seconds after it was computed. After that
+it is still served, for up to ``stale_ttl`` seconds, while one background
+task recomputes it (stale-while-revalidate); past that window, callers
+wait for the recompute, and concurrent callers share it. A customer
+change marks every section computed from customer data stale, so the
+next poll starts its refresh.
+
+gather() fetches several sections concurrently with a deadline each; a
+section missing its deadline is answered from its previous entry (or
+not at all) while its compute goes on and fills the cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import DASHBOARD_CACHE_STALE_SECONDS, DASHBOARD_CACHE_TTL_SECONDS
+from app.services.customer_repository import CustomerChange, get_customer_repository
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str]  # (section, role)
+
+
+def render_json(value: Any) -> bytes:
+    """JSON body bytes, encoded like FastAPI's JSONResponse"""
+    return json.dumps(
+        jsonable_encoder(value), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag of a response body"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class CacheEntry:
+    __slots__ = ("value", "body", "etag", "computed_at", "expires_at", "stale_until", "customer_data")
+
+    def __init__(self, value: Any, computed_at: datetime, expires_at: float, stale_until: float,
+                 customer_data: bool):
+        self.value = jsonable_encoder(value)
+        self.body = render_json(self.value)
+        self.etag = make_etag(self.body)
+        self.computed_at = computed_at
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.customer_data = customer_data
+
+
+class SectionStats:
+    __slots__ = ("hits", "stale_hits", "misses", "refreshes", "errors", "computes", "compute_seconds",
+                 "last_compute_seconds", "max_compute_seconds")
+
+    def __init__(self):
+        self.hits = self.stale_hits = self.misses = self.refreshes = self.errors = self.computes = 0
+        self.compute_seconds = self.last_compute_seconds = self.max_compute_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "background_refreshes": self.refreshes,
+            "errors": self.errors,
+            "recompute_ms": {
+                "count": self.computes,
+                "mean": round(self.compute_seconds / self.computes * 1000, 2) if self.computes else 0.0,
+                "last": round(self.last_compute_seconds * 1000, 2),
+                "max": round(self.max_compute_seconds * 1000, 2),
+            },
+        }
+
+
+class SectionResult:
+    """One section of a gather(): its entry (None when there was none in
+    time) and how it was obtained"""
+    __slots__ = ("entry", "status", "seconds")
+
+    def __init__(self, entry: Optional[CacheEntry], status: str, seconds: float):
+        self.entry = entry
+        self.status = status  # "fresh", "stale", "late" (served stale), "missing" or "error"
+        self.seconds = seconds
+
+
+class DashboardCache:
+    """Rendered dashboard sections per (section, role), served stale while
+    they are recomputed in the background"""
+
+    def __init__(self, ttl: float = DASHBOARD_CACHE_TTL_SECONDS, stale_ttl: float = DASHBOARD_CACHE_STALE_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self._entries: Dict[Key, CacheEntry] = {}
+        self._inflight: Dict[Key, asyncio.Future] = {}
+        self._stats: Dict[str, SectionStats] = {}
+        # Bumped by every customer change, so a recompute that raced with
+        # one is stored already stale
+        self.generation = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _section_stats(self, section: str) -> SectionStats:
+        stats = self._stats.get(section)
+        if stats is None:
+            stats = self._stats[section] = SectionStats()
+        return stats
+
+    async def get(self, section: str, role: str, compute: Callable[[], Awaitable[Any]],
+                  customer_data: bool = False) -> CacheEntry:
+        """The cached entry of a section, computing it when there is none
+        (or it is past its stale window) and refreshing it in the
+        background when it is stale. ``customer_data`` sections are marked
+        stale by customer changes."""
+        key = (section, role)
+        stats = self._section_stats(section)
+        entry = self._entries.get(key)
+        now = self.clock()
+        if entry is not None and now < entry.expires_at:
+            stats.hits += 1
+            return entry
+        if entry is not None and now < entry.stale_until:
+            stats.stale_hits += 1
+            if key not in self._inflight:
+                stats.refreshes += 1
+                self._start(key, compute, customer_data, background=True)
+            return entry
+        stats.misses += 1
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._start(key, compute, customer_data)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            if not stats.computes:
+                self._stats.pop(section, None)  # never computed (e.g. invalid parameters): not reported
+            raise
+
+    def peek(self, section: str, role: str) -> Optional[CacheEntry]:
+        """The stored entry of a section, however old"""
+        return self._entries.get((section, role))
+
+    async def gather(self, sources: Dict[str, Tuple[Callable[[], Awaitable[Any]], bool]], role: str,
+                     timeouts: Dict[str, float]) -> Dict[str, SectionResult]:
+        """get() several sections concurrently, each within its timeout in
+        seconds. A section still computing at its deadline keeps computing
+        (and is cached when done); it is answered with its last entry if
+        there is one ("late"), else without one ("missing"). A section
+        whose compute failed is answered the same way ("error")."""
+        start = time.perf_counter()
+
+        async def one(section: str, compute: Callable[[], Awaitable[Any]], customer_data: bool) -> SectionResult:
+            try:
+                entry = await asyncio.wait_for(self.get(section, role, compute, customer_data), timeouts[section])
+                status = "fresh" if self.clock() < entry.expires_at or not self.enabled else "stale"
+            except asyncio.TimeoutError:
+                entry = self.peek(section, role)
+                status = "late" if entry is not None else "missing"
+            except Exception as e:
+                logger.warning(f"Dashboard section {section!r} failed: {e!r}")
+                entry = self.peek(section, role)
+                status = "error"
+            return SectionResult(entry, status, time.perf_counter() - start)
+
+        results = await asyncio.gather(*(
+            one(section, compute, customer_data) for section, (compute, customer_data) in sources.items()
+        ))
+        return dict(zip(sources, results))
+
+    def _start(self, key: Key, compute: Callable[[], Awaitable[Any]], customer_data: bool,
+               background: bool = False) -> asyncio.Future:
+        future = asyncio.ensure_future(self._compute(key, compute, customer_data))
+        self._inflight[key] = future
+        future.add_done_callback(lambda done: self._done(key, done, background))
+        return future
+
+    def _done(self, key: Key, future: asyncio.Future, background: bool):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled() and future.exception() is not None:
+            self._section_stats(key[0]).errors += 1
+            if background:
+                # No caller to raise to; the stale entry stays until the next attempt
+                logger.warning(f"Dashboard section {key[0]!r} failed to refresh: {future.exception()!r}")
+
+    async def _compute(self, key: Key, compute: Callable[[], Awaitable[Any]], customer_data: bool) -> CacheEntry:
+        generation = self.generation
+        start = time.perf_counter()
+        value = await compute()
+        elapsed = time.perf_counter() - start
+        stats = self._section_stats(key[0])
+        stats.computes += 1
+        stats.compute_seconds += elapsed
+        stats.last_compute_seconds = elapsed
+        stats.max_compute_seconds = max(stats.max_compute_seconds, elapsed)
+
+        now = self.clock()
+        entry = CacheEntry(value, datetime.now(), now + self.ttl, now + self.ttl + self.stale_ttl, customer_data)
+        if customer_data and generation != self.generation:
+            entry.expires_at = now  # customers changed while computing
+        if self.enabled:
+            self._entries[key] = entry
+        return entry
+
+    def invalidate(self, customer_data_only: bool = True):
+        """Mark entries stale: their next lookup serves them and refreshes them"""
+        self.generation += 1
+        self.invalidations += 1
+        now = self.clock()
+        for entry in self._entries.values():
+            if entry.customer_data or not customer_data_only:
+                entry.expires_at = min(entry.expires_at, now)
+
+    def expire(self, section: str):
+        """Mark one section stale, for every role"""
+        now = self.clock()
+        for (name, _), entry in self._entries.items():
+            if name == section:
+                entry.expires_at = min(entry.expires_at, now)
+
+    def on_changes(self, changes: List[CustomerChange]):
+        """Change listener: customer data sections are outdated"""
+        self.invalidate()
+
+    def clear(self):
+        self._entries.clear()
+
+    async def close(self):
+        """Cancel recomputes still running"""
+        for future in list(self._inflight.values()):
+            future.cancel()
+        await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        sections = {section: stats.as_dict() for section, stats in sorted(self._stats.items())}
+        hits = sum(stats.hits + stats.stale_hits for stats in self._stats.values())
+        lookups = hits + sum(stats.misses for stats in self._stats.values())
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl,
+            "stale_seconds": self.stale_ttl,
+            "entries": len(self._entries),
+            "refreshing": len(self._inflight),
+            "invalidations": self.invalidations,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "sections": sections,
+        }
+
+
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches ``etag`` (weak comparison,
+    as RFC 9110 prescribes for If-None-Match)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+_cache: Optional[DashboardCache] = None
+
+
+def get_dashboard_cache() -> DashboardCache:
+    """The process-wide dashboard cache, created on first use"""
+    global _cache
+    if _cache is None:
+        _cache = DashboardCache()
+    return _cache
+
+
+def set_dashboard_cache(cache: Optional[DashboardCache]):
+    global _cache
+    _cache = cache
+
+
+def start_dashboard_cache() -> DashboardCache:
+    """Invalidate the dashboard cache on customer changes from now on"""
+    cache = get_dashboard_cache()
+    get_customer_repository().add_change_listener(cache.on_changes)
+    return cache
+
+
+async def stop_dashboard_cache():
+    if _cache is not None:
+        await _cache.close()
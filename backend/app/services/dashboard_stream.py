@@ -0,0 +1,319 @@
+"""
+Dashboard updates pushed over Server-Sent Events.
+
+Instead of polling every section, a dashboard opens one stream naming the
+sections it shows and gets a "snapshot" event per section, then "delta"
+events only when a section changes:
+
+    event: delta
+    id: 7
+    data: {"section":"customers","version":7,"patch":{"active_customers":812}}
+
+Objects change by JSON merge patch (RFC 7386); lists of items with an
+"id" (activities) by the items added and changed and the ids removed.
+
+Fan-out is done once per change, not once per subscriber: every
+``interval`` one task reads each subscribed (section, role) from the
+dashboard cache, which recomputes sections after customer changes and
+their TTL. When a section's ETag moved, its snapshot and delta events are
+rendered once and the subscribers are woken; each stream then writes the
+shared bytes. A stream keeps only the version it last sent per section,
+so a slow client never queues anything: when it falls more than one
+version behind, the next write coalesces the missed deltas into the
+current snapshot. Writes wait for the client to take them (the server's
+flow control), which is the backpressure; the publisher never waits for
+a stream.
+
+A stream lives no longer than the access token it was opened with: the
+subscriber keeps the token's expiry and ids, re-checked on every poll and
+keep-alive, and once the token has expired or been revoked the stream
+sends a final event and closes:
+
+    event: end
+    data: {"reason":"expired"}
+
+The client then opens a new stream with a fresh token (or ticket).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import (
+    DASHBOARD_STREAM_INTERVAL_SECONDS, DASHBOARD_STREAM_KEEPALIVE_SECONDS, DASHBOARD_STREAM_MAX_SUBSCRIBERS
+)
+from app.services.auth_service import TokenGrant, grant_end_reason
+from app.services.dashboard_cache import CacheEntry, get_dashboard_cache, render_json
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str]  # (section, role)
+Source = Tuple[Callable[[], Awaitable[Any]], bool]  # (compute, customer_data), as cached
+
+KEEPALIVE = b": keep-alive\n\n"
+
+
+def merge_patch(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON merge patch turning ``old`` into ``new``"""
+    patch = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif old[key] != value:
+            previous = old[key]
+            both_objects = isinstance(previous, dict) and isinstance(value, dict)
+            patch[key] = merge_patch(previous, value) if both_objects else value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def _has_ids(items: List[Any]) -> bool:
+    return all(isinstance(item, dict) and "id" in item for item in items)
+
+
+def diff_section(old: Any, new: Any) -> Optional[Dict[str, Any]]:
+    """Fields of the delta event from one value of a section to the next,
+    None when nothing changed"""
+    if old == new:
+        return None
+    if isinstance(old, dict) and isinstance(new, dict):
+        return {"patch": merge_patch(old, new)}
+    if isinstance(old, list) and isinstance(new, list) and _has_ids(old) and _has_ids(new):
+        previous = {item["id"]: item for item in old}
+        current = {item["id"] for item in new}
+        return {
+            "added": [item for item in new if item["id"] not in previous],
+            "changed": [item for item in new if item["id"] in previous and previous[item["id"]] != item],
+            "removed": [item["id"] for item in old if item["id"] not in current],
+        }
+    return {"value": new}
+
+
+def format_event(event: str, version: int, data: bytes) -> bytes:
+    return b"event: " + event.encode() + b"\nid: " + str(version).encode() + b"\ndata: " + data + b"\n\n"
+
+
+class Channel:
+    """One (section, role): its latest value and rendered events"""
+    __slots__ = ("key", "compute", "customer_data", "version", "etag", "value", "snapshot", "delta",
+                 "subscribers")
+
+    def __init__(self, key: Key, source: Source):
+        self.key = key
+        self.compute, self.customer_data = source
+        self.version = 0  # 0: not read yet
+        self.etag: Optional[str] = None
+        self.value: Any = None
+        self.snapshot = b""
+        self.delta: Optional[bytes] = None  # from version - 1 to version
+        self.subscribers: Set["Subscriber"] = set()
+
+    def publish(self, entry: CacheEntry):
+        section = self.key[0]
+        changes = diff_section(self.value, entry.value) if self.version else None
+        self.version += 1
+        self.etag = entry.etag
+        self.value = entry.value
+        header = b'{"section":' + render_json(section) + b',"version":' + str(self.version).encode()
+        self.snapshot = format_event("snapshot", self.version, header + b',"data":' + entry.body + b"}")
+        self.delta = None
+        if changes is not None:
+            self.delta = format_event("delta", self.version, header + b"," + render_json(changes)[1:])
+
+
+class Subscriber:
+    """One open stream: the version of each of its channels it last sent,
+    and the token it was opened with"""
+    __slots__ = ("channels", "sent", "wake", "coalesced", "grant", "ended")
+
+    def __init__(self, channels: List[Channel], grant: Optional[TokenGrant] = None):
+        self.channels = channels
+        self.sent = [0] * len(channels)
+        self.wake = asyncio.Event()
+        self.coalesced = 0  # deltas replaced by a later snapshot
+        self.grant = grant  # expiry and ids of the token; None: not checked
+        self.ended: Optional[str] = None  # why the token stopped holding
+
+    def check(self, now: float) -> Optional[str]:
+        """Why the stream must end ("expired", "revoked"), None while its
+        token holds"""
+        if self.ended is None and self.grant is not None:
+            self.ended = grant_end_reason(self.grant, now)
+        return self.ended
+
+    def pending(self) -> List[bytes]:
+        """Events bringing the client up to date with every channel"""
+        events = []
+        for i, channel in enumerate(self.channels):
+            sent = self.sent[i]
+            if channel.version == sent:
+                continue
+            if sent and channel.version == sent + 1 and channel.delta is not None:
+                events.append(channel.delta)
+            else:
+                events.append(channel.snapshot)
+                if sent:
+                    self.coalesced += channel.version - sent
+            self.sent[i] = channel.version
+        return events
+
+
+class DashboardStream:
+    """Dashboard sections followed by open streams, checked every ``interval``"""
+
+    def __init__(self, interval: float = DASHBOARD_STREAM_INTERVAL_SECONDS,
+                 keepalive: float = DASHBOARD_STREAM_KEEPALIVE_SECONDS,
+                 max_subscribers: int = DASHBOARD_STREAM_MAX_SUBSCRIBERS,
+                 clock: Callable[[], float] = time.time):
+        self.interval = interval
+        self.keepalive = keepalive
+        self.max_subscribers = max_subscribers
+        self.clock = clock  # epoch seconds, compared with token expiries
+        self._channels: Dict[Key, Channel] = {}
+        self._subscribers: Set[Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.polls = 0
+        self.publishes = 0
+        self.events_sent = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.ended: Dict[str, int] = {"expired": 0, "revoked": 0}
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    def subscribe(self, sources: Dict[str, Source], role: str, grant: Optional[TokenGrant] = None) -> Subscriber:
+        channels = []
+        for section, source in sources.items():
+            key = (section, role)
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = self._channels[key] = Channel(key, source)
+            channels.append(channel)
+        subscriber = Subscriber(channels, grant)
+        for channel in channels:
+            channel.subscribers.add(subscriber)
+        self._subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        else:
+            subscriber.wake.set()  # channels already read: send their snapshots now
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        self.coalesced += subscriber.coalesced
+        for channel in subscriber.channels:
+            channel.subscribers.discard(subscriber)
+            if not channel.subscribers:
+                self._channels.pop(channel.key, None)
+
+    async def events(self, sources: Dict[str, Source], role: str,
+                     grant: Optional[TokenGrant] = None) -> AsyncIterator[bytes]:
+        """The body of one stream. Subscribes when iteration starts and
+        unsubscribes when it stops (client gone, close(), or ``grant``'s
+        token expired or revoked)."""
+        subscriber = self.subscribe(sources, role, grant)
+        try:
+            yield b"retry: 5000\n\n"
+            while not self.closed:
+                subscriber.wake.clear()
+                reason = subscriber.check(self.clock())
+                if reason is not None:
+                    self.ended[reason] += 1
+                    yield b"event: end\ndata: " + render_json({"reason": reason}) + b"\n\n"
+                    return
+                events = subscriber.pending()
+                if events:
+                    self.events_sent += len(events)
+                    yield b"".join(events)
+                    continue
+                try:
+                    await asyncio.wait_for(subscriber.wake.wait(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def _run(self):
+        while self._subscribers and not self.closed:
+            await self.poll()
+            await asyncio.sleep(self.interval)
+
+    async def poll(self):
+        """Read every followed section; publish and wake its subscribers
+        when it changed"""
+        self.polls += 1
+        cache = get_dashboard_cache()
+        for channel in list(self._channels.values()):
+            section, role = channel.key
+            try:
+                entry = await cache.get(section, role, channel.compute, channel.customer_data)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Dashboard stream could not read {section!r}: {e!r}")
+                continue
+            if entry.etag == channel.etag:
+                continue
+            channel.publish(entry)
+            self.publishes += 1
+            for subscriber in channel.subscribers:
+                subscriber.wake.set()
+        now = self.clock()
+        for subscriber in self._subscribers:
+            if subscriber.check(now) is not None:
+                subscriber.wake.set()
+
+    async def close(self):
+        """End every stream and stop polling"""
+        self.closed = True
+        for subscriber in self._subscribers:
+            subscriber.wake.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "max_subscribers": self.max_subscribers,
+            "interval_seconds": self.interval,
+            "channels": {f"{section}:{role}": {"version": channel.version, "subscribers": len(channel.subscribers)}
+                         for (section, role), channel in sorted(self._channels.items())},
+            "polls": self.polls,
+            "publishes": self.publishes,
+            "events_sent": self.events_sent,
+            "coalesced_deltas": self.coalesced + sum(s.coalesced for s in self._subscribers),
+            "errors": self.errors,
+            "ended": dict(self.ended),
+        }
+
+
+_stream: Optional[DashboardStream] = None
+
+
+def get_dashboard_stream() -> DashboardStream:
+    """The process-wide dashboard stream, created on first use"""
+    global _stream
+    if _stream is None:
+        _stream = DashboardStream()
+    return _stream
+
+
+def set_dashboard_stream(stream: Optional[DashboardStream]):
+    global _stream
+    _stream = stream
+
+
+async def stop_dashboard_stream():
+    if _stream is not None:
+        await _stream.close()
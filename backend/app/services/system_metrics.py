@@ -0,0 +1,296 @@
+"""
+System and request metrics behind GET /dashboard/metrics.
+
+A background task samples every METRICS_SAMPLE_SECONDS and keeps the last
+METRICS_HISTORY samples in a ring, so requests only read what was already
+measured and never make a syscall. A sample holds:
+
+- system: CPU and memory usage, disk usage of METRICS_DISK_PATH, network
+  throughput (all interfaces but loopback) and load average, from /proc,
+  statvfs and getloadavg;
+- process: CPU usage (100 is one core busy), resident memory, threads;
+- requests: count, rate, 5xx errors and latency percentiles of the
+  requests since the previous sample, recorded by RequestMetricsMiddleware.
+  Percentiles are taken over the last METRICS_LATENCY_SAMPLES of them.
+
+Rates are deltas between consecutive samples; the first sample gives the
+averages since boot (since start for the process). Reading /proc costs
+well under a millisecond; each sample's wall and CPU time are kept and
+reported with the metrics. Without /proc (not Linux) the system and
+process values are None.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import METRICS_DISK_PATH, METRICS_HISTORY, METRICS_LATENCY_SAMPLES, METRICS_SAMPLE_SECONDS
+from app.services.dashboard_cache import get_dashboard_cache, render_json
+
+logger = logging.getLogger(__name__)
+
+PROC = "/proc"
+HAS_PROC = os.path.exists(os.path.join(PROC, "stat"))
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if HAS_PROC else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if HAS_PROC else 4096
+MB = 1024 * 1024
+SYSTEM_FIELDS = ("cpu_usage", "memory_usage", "disk_usage", "network_throughput", "load_average")
+PROCESS_FIELDS = ("cpu_usage", "rss_mb", "threads", "uptime_seconds")
+
+SampleListener = Callable[[Dict[str, Any]], None]
+
+
+def _read(name: str) -> str:
+    with open(os.path.join(PROC, name)) as file:
+        return file.read()
+
+
+class ProcReading:
+    """Cumulative counters read from /proc at one moment"""
+    __slots__ = ("uptime", "cpu_total", "cpu_idle", "net_bytes", "memory_total", "memory_available",
+                 "process_ticks", "process_start", "rss", "threads")
+
+    @classmethod
+    def since_boot(cls, process_start: float) -> "ProcReading":
+        """Zero counters: rates against it are averages since boot/start"""
+        reading = cls()
+        reading.uptime = reading.cpu_total = reading.cpu_idle = reading.net_bytes = 0.0
+        reading.process_ticks = 0.0
+        reading.process_start = process_start
+        return reading
+
+    @classmethod
+    def read(cls) -> "ProcReading":
+        reading = cls()
+        reading.uptime = float(_read("uptime").split()[0])
+        # cpu  user nice system idle iowait irq softirq steal (guest is part of user)
+        cpu = [float(value) for value in _read("stat").split("\n", 1)[0].split()[1:9]]
+        reading.cpu_total = sum(cpu)
+        reading.cpu_idle = cpu[3] + cpu[4]
+        net = 0.0
+        for line in _read("net/dev").splitlines()[2:]:
+            interface, _, counters = line.partition(":")
+            if interface.strip() != "lo":
+                values = counters.split()
+                net += float(values[0]) + float(values[8])  # received + transmitted bytes
+        reading.net_bytes = net
+        memory = {}
+        for line in _read("meminfo").splitlines():
+            key, _, value = line.partition(":")
+            if key in ("MemTotal", "MemAvailable"):
+                memory[key] = float(value.split()[0]) * 1024
+        reading.memory_total = memory.get("MemTotal", 0.0)
+        reading.memory_available = memory.get("MemAvailable", 0.0)
+        # Fields after "(comm)": 3 state ... 14 utime, 15 stime, 20 threads, 22 starttime, 24 rss
+        fields = _read("self/stat").rsplit(")", 1)[1].split()
+        reading.process_ticks = float(fields[11]) + float(fields[12])
+        reading.threads = int(fields[17])
+        reading.process_start = float(fields[19]) / CLOCK_TICKS
+        reading.rss = float(fields[21]) * PAGE_SIZE
+        return reading
+
+
+class LatencyRecorder:
+    """Durations of the requests since the last sample. Recording is a few
+    list and integer operations; the last ``capacity`` durations are kept
+    for percentiles, count, total and maximum cover every request."""
+
+    def __init__(self, capacity: int = METRICS_LATENCY_SAMPLES):
+        self.capacity = capacity
+        self._durations = [0.0] * capacity
+        self.count = self.errors = 0
+        self.total = self.max = 0.0
+
+    def record(self, seconds: float, status: int):
+        count = self.count
+        self._durations[count % self.capacity] = seconds
+        self.count = count + 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if status >= 500:
+            self.errors += 1
+
+    def drain(self, elapsed: float) -> Dict[str, Any]:
+        """Statistics of the requests recorded so far, then start over"""
+        count, errors, total, longest = self.count, self.errors, self.total, self.max
+        durations = np.array(self._durations[:min(count, self.capacity)])
+        self.count = self.errors = 0
+        self.total = self.max = 0.0
+        p50, p95, p99 = np.percentile(durations, (50, 95, 99)) * 1000 if count else (0.0, 0.0, 0.0)
+        return {
+            "count": count,
+            "per_second": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+            "errors": errors,
+            "mean_ms": round(total / count * 1000, 2) if count else 0.0,
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(longest * 1000, 2),
+        }
+
+
+def _percent(part: float, whole: float) -> Optional[float]:
+    return round(100.0 * part / whole, 1) if whole > 0 else None
+
+
+class SystemMetrics:
+    """Background sampler and the ring of its last ``history`` samples"""
+
+    def __init__(self, interval: float = METRICS_SAMPLE_SECONDS, history: int = METRICS_HISTORY,
+                 latency_samples: int = METRICS_LATENCY_SAMPLES, disk_path: str = METRICS_DISK_PATH):
+        self.interval = interval
+        self.started_at = time.time()  # uptime counts from here
+        self.disk_path = disk_path
+        self.requests = LatencyRecorder(latency_samples)
+        self.samples: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._points: Deque[bytes] = deque(maxlen=history)  # each sample's history point, rendered
+        self.history_body = b"[]"
+        self.listeners: List[SampleListener] = []
+        self._previous: Optional[ProcReading] = None
+        self._previous_at = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        # Sampler overhead
+        self.sample_count = 0
+        self.sample_seconds = self.sample_cpu_seconds = 0.0
+        self.last_sample_seconds = self.max_sample_seconds = 0.0
+
+    def add_sample_listener(self, listener: SampleListener):
+        self.listeners.append(listener)
+
+    def _system(self, reading: Optional[ProcReading]) -> Dict[str, Any]:
+        if reading is None:
+            return {"system_health": dict.fromkeys(SYSTEM_FIELDS), "process": dict.fromkeys(PROCESS_FIELDS)}
+        previous = self._previous or ProcReading.since_boot(reading.process_start)
+        elapsed = reading.uptime - previous.uptime
+        process_elapsed = reading.uptime - max(previous.uptime, reading.process_start)
+        try:
+            disk = os.statvfs(self.disk_path)
+            used = disk.f_blocks - disk.f_bfree
+            disk_usage = _percent(used, used + disk.f_bavail)  # as df reports it
+        except OSError:
+            disk_usage = None
+        cpu_busy = (reading.cpu_total - previous.cpu_total) - (reading.cpu_idle - previous.cpu_idle)
+        return {
+            "system_health": {
+                "cpu_usage": _percent(cpu_busy, reading.cpu_total - previous.cpu_total),
+                "memory_usage": _percent(reading.memory_total - reading.memory_available, reading.memory_total),
+                "disk_usage": disk_usage,
+                "network_throughput": round((reading.net_bytes - previous.net_bytes) * 8 / 1e6 / elapsed, 3)
+                if elapsed > 0 else None,  # Mbps
+                "load_average": [round(load, 2) for load in os.getloadavg()],
+            },
+            "process": {
+                "cpu_usage": _percent((reading.process_ticks - previous.process_ticks) / CLOCK_TICKS, process_elapsed),
+                "rss_mb": round(reading.rss / MB, 1),
+                "threads": reading.threads,
+                "uptime_seconds": round(reading.uptime - reading.process_start),
+            },
+        }
+
+    def sample(self) -> Dict[str, Any]:
+        """Take a sample now, add it to the ring and tell the listeners"""
+        started, cpu_started = time.perf_counter(), time.process_time()
+        now = time.monotonic()
+        reading = ProcReading.read() if HAS_PROC else None
+        sample = {
+            "timestamp": datetime.now(),
+            **self._system(reading),
+            "requests": self.requests.drain(now - self._previous_at),
+        }
+        self._previous, self._previous_at = reading, now
+        self.samples.append(sample)
+        self._points.append(render_json({
+            "timestamp": sample["timestamp"],
+            "cpu_usage": sample["system_health"]["cpu_usage"],
+            "memory_usage": sample["system_health"]["memory_usage"],
+            "network_throughput": sample["system_health"]["network_throughput"],
+            "process_cpu_usage": sample["process"]["cpu_usage"],
+            "rss_mb": sample["process"]["rss_mb"],
+            "requests_per_second": sample["requests"]["per_second"],
+            "p95_ms": sample["requests"]["p95_ms"],
+        }))
+        self.history_body = b"[" + b",".join(self._points) + b"]"
+
+        elapsed = time.perf_counter() - started
+        self.sample_count += 1
+        self.sample_seconds += elapsed
+        self.sample_cpu_seconds += time.process_time() - cpu_started
+        self.last_sample_seconds = elapsed
+        self.max_sample_seconds = max(self.max_sample_seconds, elapsed)
+        for listener in self.listeners:
+            listener(sample)
+        return sample
+
+    def latest(self) -> Dict[str, Any]:
+        """The latest sample. Without the background task (not started, or
+        METRICS_ENABLED off) one is taken now if the last is over an
+        interval old."""
+        if not self.samples or (self._task is None and time.monotonic() - self._previous_at >= self.interval):
+            return self.sample()
+        return self.samples[-1]
+
+    def overhead(self) -> Dict[str, Any]:
+        count = self.sample_count
+        return {
+            "interval_seconds": self.interval,
+            "samples": count,
+            "last_ms": round(self.last_sample_seconds * 1000, 3),
+            "mean_ms": round(self.sample_seconds / count * 1000, 3) if count else 0.0,
+            "max_ms": round(self.max_sample_seconds * 1000, 3),
+            # Share of one core the sampler takes at this interval
+            "cpu_percent": round(self.sample_cpu_seconds / count / self.interval * 100, 4) if count else 0.0,
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"System metrics sample failed: {e!r}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+_metrics: Optional[SystemMetrics] = None
+
+
+def get_system_metrics() -> SystemMetrics:
+    """The process-wide sampler, created (not started) on first use"""
+    global _metrics
+    if _metrics is None:
+        _metrics = SystemMetrics()
+    return _metrics
+
+
+def set_system_metrics(metrics: Optional[SystemMetrics]):
+    global _metrics
+    _metrics = metrics
+
+
+def start_system_metrics() -> SystemMetrics:
+    """Sample in the background; every sample outdates the cached metrics section"""
+    metrics = get_system_metrics()
+    metrics.add_sample_listener(lambda sample: get_dashboard_cache().expire("performance"))
+    metrics.start()
+    return metrics
+
+
+async def stop_system_metrics():
+    if _metrics is not None:
+        await _metrics.stop()
@@ -0,0 +1,89 @@
+"""
+Microbenchmark: resolving the current user from a bearer token, without
+and with the verified-token cache, then the per-request cost of the shared
+``current_user`` / ``manager_user`` dependencies through the ASGI stack.
+
+    python -m benchmarks.bench_auth_dependency --calls 20000 --requests 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+
+from app.core.security import TokenCache, set_token_cache
+from app.dependencies import current_user, manager_user
+from app.services.auth_service import create_access_token, get_current_user
+from benchmarks.common import best_of, print_table
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/open")
+    async def open_endpoint():
+        return {"ok": True}
+
+    @app.get("/user")
+    async def user_endpoint(user=Depends(current_user)):
+        return {"ok": True}
+
+    @app.get("/manager")
+    async def manager_endpoint(user=Depends(manager_user)):
+        return {"ok": True}
+
+    return app
+
+
+async def per_request(token: str, requests: int, repeat: int):
+    """Best mean milliseconds per request of each endpoint"""
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=build_app())
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        for path in ("/open", "/user", "/manager"):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for _ in range(requests):
+                    response = await client.get(path)
+                assert response.status_code == 200, response.text
+                best = min(best, (time.perf_counter() - start) * 1000 / requests)
+            results[path] = best
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    token = create_access_token({"sub": "admin"})
+
+    def resolve():
+        for _ in range(args.calls):
+            get_current_user(token)
+
+    set_token_cache(TokenCache(maxsize=0))  # disabled: every call verifies and rebuilds
+    uncached = best_of(resolve, args.repeat)
+    cache = TokenCache()
+    set_token_cache(cache)
+    cached = best_of(resolve, args.repeat)
+
+    print_table(f"get_current_user, {args.calls} calls", {"uncached vs cache hit": (uncached, cached)})
+    print(f"per call: {uncached * 1000 / args.calls:.1f} us -> {cached * 1000 / args.calls:.2f} us; "
+          f"cache {cache.stats()}")
+
+    timings = asyncio.run(per_request(token, args.requests, args.repeat))
+    print(f"\nper request through ASGI, {args.requests} requests (cached token)")
+    for path, ms in timings.items():
+        overhead = ms - timings["/open"]
+        print(f"  {path:<10} {ms * 1000:>8.1f} us   auth overhead {overhead * 1000:>6.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark: one auto-suspension tick with the due-date heap vs. scanning
+every customer for due deadlines, plus the cost of re-keying on a change.
+
+    python -m benchmarks.bench_auto_suspend --customers 200000
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from app.models.customer import PaymentStatus
+from app.services.customer_suspension import SuspensionScheduler, suspension_deadline
+from benchmarks.common import best_of, load_customers, print_table
+
+
+def scan_due(customers, now: float):
+    """Baseline: what a cron job over the whole store does every tick"""
+    due = []
+    for customer in customers:
+        deadline = suspension_deadline(customer.status, customer.payment_status,
+                                       customer.last_payment, customer.created_at)
+        if deadline is not None and deadline.timestamp() <= now:
+            due.append(customer.id)
+    return due
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    repository = load_customers(args.customers, index=False)
+    customers = list(repository.customers.values())
+    clock = [0.0]
+    scheduler = SuspensionScheduler(notification_days=(), clock=lambda: clock[0])
+    start = time.perf_counter()
+    scheduler.load(customers)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # Tick from the median deadline so every tick finds a few due entries
+    deadlines = sorted(due for _, due in scheduler._scheduled.values())
+    rows = {}
+    for label, window in (("tick, 1 minute of deadlines", 60), ("tick, 1 hour of deadlines", 3600)):
+        now = deadlines[len(deadlines) // 2]
+        expected = set(scan_due(customers, now + window)) - set(scan_due(customers, now))
+
+        def heap_tick():
+            # Fresh copy each run so every run pops the same entries
+            heap_scheduler._heap = list(base_heap)
+            return heap_scheduler.pop_due(now + window)
+
+        heap_scheduler = SuspensionScheduler(notification_days=(), clock=lambda: clock[0])
+        heap_scheduler.load(customers)
+        heap_scheduler.pop_due(now)
+        base_heap = list(heap_scheduler._heap)
+        assert {entry.customer_id for entry in heap_tick()} == expected, label
+        copy_ms = best_of(lambda: list(base_heap), args.repeat)
+        rows[f"{label} ({len(expected)} due)"] = (
+            best_of(lambda: scan_due(customers, now + window), args.repeat),
+            max(best_of(heap_tick, args.repeat) - copy_ms, 0.001),
+        )
+
+    overdue = [customer for customer in customers if customer.payment_status == PaymentStatus.OVERDUE]
+    changes = [
+        ("update", customer.id, {"last_payment": (customer.last_payment, datetime.now())})
+        for customer in overdue[:10_000]
+    ]
+    start = time.perf_counter()
+    for change in changes:
+        scheduler.on_changes([change])
+    rekey_us = (time.perf_counter() - start) / len(changes) * 1e6
+
+    print_table(f"auto-suspension over {args.customers} customers ({len(scheduler)} scheduled)", rows)
+    print(f"initial load: {load_ms:.0f} ms; re-key on a payment: {rekey_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: a full monthly billing run (compute, post, render) with its
+per-stage timings, and the vectorized charge computation vs. a
+per-customer loop.
+
+    python -m benchmarks.bench_billing_run --customers 200000 --workers 4
+"""
+
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+
+from app.models.customer import CustomerStatus
+from app.services.customer_billing import CHARGE_COLUMNS, BillingRun, billing_period, compute_charges
+from benchmarks.common import best_of, load_customers, print_table
+
+
+def charges_loop(customers, start, end, tax_rate):
+    """Baseline: the same charges, one customer at a time"""
+    days = (end - start).days
+    invoices = []
+    for customer in customers:
+        if customer.status != CustomerStatus.ACTIVE:
+            continue
+        first_day = (customer.installation_date - start).days if customer.installation_date else 0
+        subtotal = round(customer.monthly_fee * (days - min(max(first_day, 0), days)) / days, 2)
+        if subtotal <= 0:
+            continue
+        tax = round(subtotal * tax_rate, 2)
+        total = round(subtotal + tax, 2)
+        invoices.append((customer.id, subtotal, tax, total, round(customer.balance_due + total, 2)))
+    return invoices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--formats", default="xml,pdf")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # The run reads the columnar mirror only; skip the other indexes
+    repository = load_customers(args.customers, index=False)
+    customers = list(repository.customers.values())
+    repository.columns.add_many(customers)
+
+    period, start, end = billing_period()
+
+    def vectorized():
+        _, columns = repository.columns.active_rows(CHARGE_COLUMNS)
+        return compute_charges(columns, start, end, 0.16)
+
+    assert len(charges_loop(customers, start, end, 0.16)) == len(vectorized()["rows"])
+    print_table(f"charge computation, {args.customers} customers", {
+        "per-customer loop vs column arrays": (
+            best_of(lambda: charges_loop(customers, start, end, 0.16), args.repeat),
+            best_of(vectorized, args.repeat),
+        ),
+    })
+
+    directory = tempfile.mkdtemp()
+    run = BillingRun(period, directory, formats=[f for f in args.formats.split(",") if f], workers=args.workers)
+    started = time.perf_counter()
+    state = asyncio.run(run.run())
+    elapsed = time.perf_counter() - started
+    shutil.rmtree(directory)
+
+    print(f"\nbilling run {period}: {state['invoices']} invoices, {state['documents']} rendered "
+          f"({args.workers} workers, {args.formats}) in {elapsed:.1f} s")
+    for stage, ms in state["timings_ms"].items():
+        print(f"  {stage:<8} {ms / 1000:>8.2f} s")
+    print(f"  totals   {state['totals']}")
+
+
+if __name__ == "__main__":
+    main()
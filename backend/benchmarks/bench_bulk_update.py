@@ -0,0 +1,60 @@
+"""
+Benchmark: one bulk update vs. one update_customer call per account (what
+a client looping over PUT /customers/{id} runs, minus HTTP and auth).
+
+    python -m benchmarks.bench_bulk_update --customers 50000 --accounts 10000
+"""
+
+import argparse
+import time
+
+from app.models.customer import CustomerFilter, CustomerStatus, CustomerUpdate
+from app.services import customer_service
+from app.services.customer_bulk import CustomerBulkUpdate, bulk_update_customers
+from app.services.customer_stats import compute_customer_stats
+from benchmarks.common import load_customers, print_table, run_sync
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def per_account(ids, changes: CustomerUpdate):
+    for customer_id in ids:
+        run_sync(customer_service.update_customer(customer_id, changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=50_000)
+    parser.add_argument("--accounts", type=int, default=10_000)
+    args = parser.parse_args()
+
+    repository = load_customers(args.customers)
+    ids = [str(i) for i in range(1, args.accounts + 1)]
+    suspend = CustomerUpdate(status=CustomerStatus.SUSPENDED)
+    reactivate = CustomerUpdate(status=CustomerStatus.ACTIVE)
+    reprice = CustomerUpdate(monthly_fee=949.0)
+    plan = CustomerFilter(plan_name="Fibra Premium 100 Mbps")
+    plan_ids = [customer.id for customer in repository.filter_sync(plan)]
+
+    rows = {
+        f"suspend {args.accounts} accounts": (
+            timed(lambda: per_account(ids, suspend)),
+            timed(lambda: run_sync(bulk_update_customers(
+                CustomerBulkUpdate(customer_ids=ids, changes=reactivate)))),
+        ),
+        f"reprice a plan ({len(plan_ids)} accounts)": (
+            timed(lambda: per_account(plan_ids, reprice)),
+            timed(lambda: run_sync(bulk_update_customers(
+                CustomerBulkUpdate(filter=plan, changes=CustomerUpdate(monthly_fee=999.0))))),
+        ),
+    }
+    assert run_sync(repository.stats()) == compute_customer_stats(repository.customers.values())
+    print_table(f"bulk updates over {args.customers} customers", rows)
+
+
+if __name__ == "__main__":
+    main()
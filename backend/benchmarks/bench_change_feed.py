@@ -0,0 +1,77 @@
+"""
+Benchmark: an incremental consumer reading the change feed vs. re-reading
+every customer, plus the cost the feed adds to writes.
+
+    python -m benchmarks.bench_change_feed --customers 50000 --changes 1000
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from app.models.customer import CustomerStatus, CustomerUpdate
+from app.services import customer_service
+from app.services.customer_bulk import CustomerBulkUpdate, bulk_update_customers
+from app.services.customer_changes import CustomerChangeLog, set_change_log
+from app.services.customer_export import export_customers
+from benchmarks.common import load_customers, print_table
+
+
+async def full_reread():
+    """Baseline: what a consumer without a feed does (read everything)"""
+    async for _ in export_customers(format="ndjson"):
+        pass
+
+
+async def catch_up(since: int):
+    """Read every change after ``since`` page by page"""
+    while True:
+        page = await customer_service.get_customer_changes(since, 1000)
+        if not page.lines:
+            return
+        page.to_json()  # the response body the endpoint sends
+        since = page.next_offset
+
+
+async def timed(coroutine) -> float:
+    start = time.perf_counter()
+    await coroutine
+    return (time.perf_counter() - start) * 1000
+
+
+async def run(args):
+    repository = load_customers(args.customers)
+    ids = [str(i) for i in range(1, args.changes + 1)]
+
+    def bulk(status):
+        return bulk_update_customers(CustomerBulkUpdate(customer_ids=ids, changes=CustomerUpdate(status=status)))
+
+    without_feed = await timed(bulk(CustomerStatus.SUSPENDED))
+    with tempfile.TemporaryDirectory() as directory:
+        change_log = CustomerChangeLog(directory)
+        change_log.open()
+        set_change_log(change_log)
+        repository.add_change_listener(change_log.append)
+        since = change_log.next_offset
+        with_feed = await timed(bulk(CustomerStatus.ACTIVE))
+        single = await timed(customer_service.update_customer("1", CustomerUpdate(notes="checked")))
+
+        rows = {
+            f"sync after {args.changes} changes": (await timed(full_reread()), await timed(catch_up(since))),
+            f"bulk update {args.changes} (no feed -> feed)": (without_feed, with_feed),
+        }
+        change_log.close()
+    print_table(f"change feed over {args.customers} customers", rows)
+    print(f"single update_customer with the feed: {single:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=50_000)
+    parser.add_argument("--changes", type=int, default=1000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
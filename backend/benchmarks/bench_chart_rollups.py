@@ -0,0 +1,100 @@
+"""
+Benchmark: dashboard chart queries answered from the rollup rings vs. a
+scan of every customer per request, and the cost the rollups add to each
+write.
+
+    python -m benchmarks.bench_chart_rollups --customers 100000
+
+The scan baseline is what the charts would cost without rollups: group
+the customers by the day (or month) of their creation date and of their
+last payment, then cumulate, for the requested window. It can only
+approximate the history the rollups record (nothing in a customer row
+says when it was billed or cancelled), so it is a lower bound on the
+work a per-request recompute needs.
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app.models.customer import CustomerStatus
+from app.services.customer_rollups import CustomerRollups, day_number, month_number
+from benchmarks.common import best_of, load_customers, print_table
+
+
+def scan_series(customers, number, periods: int):
+    """New customers, running totals and fees paid per period, from a scan"""
+    last = number(datetime.now())
+    first = last - periods + 1
+    created = []
+    paid_period = []
+    fees = []
+    for customer in customers:
+        if customer.status == CustomerStatus.CANCELLED:
+            continue
+        created.append(number(customer.created_at))
+        if customer.last_payment is not None:
+            paid_period.append(number(customer.last_payment))
+            fees.append(customer.monthly_fee)
+    created = np.asarray(created, dtype=np.int64)
+    new = np.bincount(np.clip(created - first, 0, None)[created >= first], minlength=periods)[:periods]
+    totals = np.count_nonzero(created < first) + np.cumsum(new)
+    paid_period = np.asarray(paid_period, dtype=np.int64)
+    window = (paid_period >= first) & (paid_period <= last)
+    revenue = np.bincount(paid_period[window] - first, weights=np.asarray(fees)[window], minlength=periods)
+    return new, totals, revenue
+
+
+def run(args):
+    repository = load_customers(args.customers, index=False)
+    customers = list(repository.customers.values())
+    rollups = CustomerRollups()
+    start = time.perf_counter()
+    rollups.backfill(customers)
+    backfill = (time.perf_counter() - start) * 1000
+
+    print_table(f"chart queries, {args.customers} customers", {
+        "revenue trend, 30 days": (
+            best_of(lambda: scan_series(customers, day_number, 30), args.repeat),
+            best_of(lambda: rollups.daily_series(30), args.repeat),
+        ),
+        "revenue trend, 365 days": (
+            best_of(lambda: scan_series(customers, day_number, 365), args.repeat),
+            best_of(lambda: rollups.daily_series(365), args.repeat),
+        ),
+        "customer growth, 12 months": (
+            best_of(lambda: scan_series(customers, month_number, 12), args.repeat),
+            best_of(lambda: rollups.monthly_series(12), args.repeat),
+        ),
+    })
+    print(f"\nbackfill from the customer records: {backfill:.1f} ms")
+
+    # Listener cost: single-customer updates, as the repository reports them
+    ids = list(repository.customers)[:args.changes]
+    batches = [
+        [("update", customer_id, {"balance_due": (0.0, 100.0), "total_paid": (0.0, 50.0)})]
+        for customer_id in ids
+    ]
+    start = time.perf_counter()
+    for batch in batches:
+        rollups.on_changes(batch)
+    per_change = (time.perf_counter() - start) * 1e6 / len(batches)
+    # A billing run's chunk: many updates reported as one batch
+    chunk = [change for batch in batches for change in batch]
+    chunked = best_of(lambda: rollups.on_changes(chunk), args.repeat) * 1000 / len(chunk)
+    print(f"listener: {per_change:.1f} us per single-change batch, "
+          f"{chunked:.2f} us per change in a batch of {len(chunk)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--changes", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: vectorized revenue aggregates on the columnar mirror vs. Python
+loops over the Customer objects.
+
+    python -m benchmarks.bench_customer_columns --customers 1000000
+"""
+
+import argparse
+from collections import defaultdict
+
+from app.models.customer import CustomerStatus, PaymentStatus
+from benchmarks.common import load_customers, best_of, print_table
+
+
+def loop_revenue_summary(customers_db):
+    """Revenue/ARPU/overdue the way dashboard.get_revenue_stats used to do it"""
+    customers = list(customers_db.values())
+    active_customers = [c for c in customers if c.status.value == "active"]
+    monthly_revenue = sum(c.monthly_fee for c in active_customers)
+    return {
+        "monthly_revenue": monthly_revenue,
+        "overdue_amount": sum(c.balance_due for c in customers if c.balance_due > 0),
+        "overdue_accounts": len([c for c in customers if c.payment_status == PaymentStatus.OVERDUE]),
+        "average_revenue_per_user": monthly_revenue / len(active_customers) if active_customers else 0,
+    }
+
+
+def loop_group_by(customers_db, key: str):
+    groups = defaultdict(lambda: [0, 0.0])
+    for c in customers_db.values():
+        if c.status == CustomerStatus.ACTIVE:
+            group = groups[getattr(c, key)]
+            group[0] += 1
+            group[1] += c.monthly_fee
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    repository = load_customers(args.customers, index=False)
+    db, columns = repository.customers, repository.columns
+    for customer in db.values():
+        columns.add(customer)
+
+    expected, actual = loop_revenue_summary(db), columns.revenue_summary()
+    for field in expected:
+        assert abs(expected[field] - actual[field]) < 1e-6 * max(1.0, abs(expected[field])), field
+
+    rows = {
+        "revenue summary": (
+            best_of(lambda: loop_revenue_summary(db), args.repeat),
+            best_of(columns.revenue_summary, args.repeat),
+        ),
+    }
+    for key in columns.GROUP_KEYS:
+        rows[f"group by {key}"] = (
+            best_of(lambda: loop_group_by(db, key), args.repeat),
+            best_of(lambda: columns.group_by(key), args.repeat),
+        )
+    print_table(f"revenue aggregates over {args.customers} customers", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Benchmark: get_customer_stats from running aggregates vs. a full recompute.
+
+    python -m benchmarks.bench_customer_stats --sizes 5 5000 500000
+"""
+
+import argparse
+
+from app.services import customer_service
+from app.services.customer_stats import compute_customer_stats
+from benchmarks.common import load_customers, best_of, print_table, run_sync
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 5_000, 500_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = {}
+    for size in args.sizes:
+        db = load_customers(size).customers
+        assert run_sync(customer_service.get_customer_stats()) == compute_customer_stats(db.values())
+        rows[f"{size} customers"] = (
+            best_of(lambda: compute_customer_stats(db.values()), args.repeat),
+            best_of(lambda: run_sync(customer_service.get_customer_stats()), args.repeat),
+        )
+    print_table("get_customer_stats: full recompute vs running aggregates", rows)
+
+
+if __name__ == "__main__":
+    main()
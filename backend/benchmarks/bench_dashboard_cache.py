@@ -0,0 +1,94 @@
+"""
+Benchmark: GET /dashboard/overview recomputed on every request vs. served
+from the dashboard cache, and revalidated with If-None-Match (304).
+
+    python -m benchmarks.bench_dashboard_cache --customers 100000 --requests 500
+
+Requests go through the ASGI stack of an app with only the dashboard
+router. A final run mixes polling with customer updates (one every
+``--update-every`` requests) and reports the cache's hit ratio and
+recompute latency.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.v1.dashboard import router as dashboard_router
+from app.models.customer import CustomerUpdate
+from app.services.auth_service import create_access_token
+from app.services.customer_service import update_customer
+from app.services.dashboard_cache import DashboardCache, set_dashboard_cache
+from benchmarks.common import load_customers, print_table
+
+
+async def timed_requests(client: httpx.AsyncClient, requests: int, headers: dict, expect: int) -> float:
+    """Milliseconds for ``requests`` sequential overview requests"""
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = await client.get("/dashboard/overview", headers=headers)
+        assert response.status_code == expect, response.status_code
+    return (time.perf_counter() - start) * 1000
+
+
+async def run(args):
+    repository = load_customers(args.customers)
+    app = FastAPI()
+    app.include_router(dashboard_router, prefix="/dashboard")
+    auth = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        set_dashboard_cache(DashboardCache(ttl=0))  # disabled: every request recomputes
+        await timed_requests(client, 10, auth, 200)  # warm up
+        uncached = await timed_requests(client, args.requests, auth, 200)
+
+        cache = DashboardCache(ttl=3600)
+        set_dashboard_cache(cache)
+        etag = (await client.get("/dashboard/overview", headers=auth)).headers["etag"]
+        cached = await timed_requests(client, args.requests, auth, 200)
+        not_modified = await timed_requests(client, args.requests, {**auth, "If-None-Match": etag}, 304)
+
+        print_table(f"GET /dashboard/overview, {args.customers} customers, {args.requests} requests", {
+            "recompute vs cache hit": (uncached, cached),
+            "recompute vs 304 Not Modified": (uncached, not_modified),
+        })
+
+        # Polling while customers change: every update marks the customer
+        # sections stale, and the next poll refreshes them in the background
+        cache = DashboardCache(ttl=3600)
+        set_dashboard_cache(cache)
+        repository.add_change_listener(cache.on_changes)
+        customer_ids = list(repository.customers)[:args.requests]
+        start = time.perf_counter()
+        for i in range(args.requests):
+            if i % args.update_every == 0:
+                await update_customer(customer_ids[i], CustomerUpdate(balance_due=float(i)))
+            await client.get("/dashboard/overview", headers=auth)
+            # In-process requests never suspend; let background refreshes run
+            # as they would between requests on a real server
+            await asyncio.sleep(0)
+        polling = (time.perf_counter() - start) * 1000
+        stats = cache.stats()
+        print(f"\npolling with an update every {args.update_every} requests: "
+              f"{polling / args.requests:.2f} ms/request, hit ratio {stats['hit_ratio']}")
+        for section, section_stats in stats["sections"].items():
+            print(f"  {section:<12} hit ratio {section_stats['hit_ratio']:<7} "
+                  f"stale hits {section_stats['stale_hits']:<5} "
+                  f"refreshes {section_stats['background_refreshes']:<5} "
+                  f"recompute ms {section_stats['recompute_ms']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--update-every", type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: assembling the dashboard overview sequentially vs. concurrently
+with per-section deadlines, and aggregating revenue on the event loop vs.
+on the analytics threads.
+
+    python -m benchmarks.bench_dashboard_overview --customers 100000
+
+The first part gives the five sections fixed latencies (``--latencies``,
+in ms, awaited as a remote database or router call would be) and times
+the overview with nothing cached. The sequential baseline awaits them one
+after another as the overview used to. The deadline case gives every
+section ``--budget`` ms, with an expired previous value of each section
+still cached, so late sections are served from it.
+
+The second part runs the real revenue aggregation over ``--customers``
+customers and reports how long it keeps the event loop from running
+anything else (the longest gap seen by a task yielding in a loop).
+"""
+
+import argparse
+import asyncio
+import gc
+import time
+
+from app.api.v1.dashboard import SECTIONS
+from app.services import customer_repository
+from app.services.customer_service import get_revenue_summary
+from app.services.dashboard_cache import DashboardCache
+from benchmarks.common import load_customers, print_table
+
+
+def delayed_sources(latencies):
+    def source(name: str, seconds: float):
+        async def compute():
+            await asyncio.sleep(seconds)
+            return {"section": name}
+        return compute, False
+
+    return {name: source(name, ms / 1000) for name, ms in zip(SECTIONS, latencies)}
+
+
+async def timed(coroutine_function, repeat: int) -> float:
+    """Best milliseconds of ``repeat`` awaits"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await coroutine_function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+async def loop_blocking(coroutine_function, calls: int) -> float:
+    """Longest milliseconds the event loop was held while ``calls`` awaits ran"""
+    longest = 0.0
+    running = True
+
+    async def heartbeat():
+        nonlocal longest
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0)
+            longest = max(longest, time.perf_counter() - start)
+
+    gc.collect()  # not the garbage left by loading the customers
+    task = asyncio.ensure_future(heartbeat())
+    await asyncio.sleep(0)
+    for _ in range(calls):
+        await coroutine_function()
+        await asyncio.sleep(0)  # one call at a time, as separate requests would be
+    running = False
+    await task
+    return longest * 1000
+
+
+async def run(args):
+    sources = delayed_sources(args.latencies)
+    generous = {name: 10.0 for name in sources}
+    budget = {name: args.budget / 1000 for name in sources}
+
+    async def sequential():
+        cache = DashboardCache(ttl=0)
+        for name, (compute, customer_data) in sources.items():
+            await cache.get(name, "admin", compute, customer_data)
+
+    async def concurrent():
+        await DashboardCache(ttl=0).gather(sources, "admin", generous)
+
+    statuses = {}
+
+    async def with_deadlines():
+        now = [0.0]
+        cache = DashboardCache(ttl=10, stale_ttl=10, clock=lambda: now[0])
+        await cache.gather(sources, "admin", generous)  # previous values...
+        now[0] = 60.0  # ...now past their stale window
+        start = time.perf_counter()
+        results = await cache.gather(sources, "admin", budget)
+        statuses.update({name: result.status for name, result in results.items()})
+        await cache.close()  # the late computes are not part of the overview
+        return time.perf_counter() - start
+
+    sequential_ms = await timed(sequential, args.repeat)
+    deadline_ms = min([await with_deadlines() for _ in range(args.repeat)]) * 1000
+    print_table(f"overview, section latencies {args.latencies} ms, nothing cached", {
+        "sequential vs concurrent": (sequential_ms, await timed(concurrent, args.repeat)),
+        f"sequential vs {args.budget:g} ms budget": (sequential_ms, deadline_ms),
+    })
+    print(f"section status with the budget: {statuses}")
+
+    load_customers(args.customers)
+    rows = {}
+    for workers in (0, 2):
+        customer_repository.ANALYTICS_WORKERS = workers
+        latency = await timed(get_revenue_summary, args.repeat * 4)
+        blocked = await loop_blocking(get_revenue_summary, args.repeat * 4)
+        rows[workers] = (latency, blocked)
+    (inline, inline_blocked), (offloaded, offloaded_blocked) = rows[0], rows[2]
+    print(f"\nrevenue summary over {args.customers} customers:")
+    print(f"  on the loop:       {inline:.2f} ms, loop held up to {inline_blocked:.2f} ms")
+    print(f"  analytics threads: {offloaded:.2f} ms, loop held up to {offloaded_blocked:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latencies", type=float, nargs=5, default=[20, 80, 40, 10, 5])
+    parser.add_argument("--budget", type=float, default=50)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark: server CPU for dashboards polling their sections vs. following
+them over the /dashboard/stream Server-Sent Events endpoint.
+
+    python -m benchmarks.bench_dashboard_stream --clients 1000 --seconds 60
+
+Both models run against an app with only the dashboard router, called
+through raw ASGI (no HTTP client in the measurement), for ``--seconds``
+of simulated time in which a customer changes every ``--change-every``
+seconds and the cache clock advances with the simulation:
+
+- polling: every client requests the five sections every ``--poll-every``
+  seconds with If-None-Match, so unchanged sections are 304s;
+- streaming: every client holds one open stream of the five sections,
+  and the stream checks them once a simulated second.
+
+CPU is process time for the whole simulated period (plus opening the
+streams, reported apart).
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+
+from app.api.v1.dashboard import router as dashboard_router
+from app.models.customer import CustomerStatus, CustomerUpdate
+from app.services.auth_service import create_access_token
+from app.services.customer_service import update_customer
+from app.services.dashboard_cache import DashboardCache, get_dashboard_cache, set_dashboard_cache
+from app.services.dashboard_stream import DashboardStream, set_dashboard_stream
+from benchmarks.common import load_customers
+
+SECTION_PATHS = {
+    "customers": "/dashboard/stats/customers",
+    "network": "/dashboard/stats/network",
+    "revenue": "/dashboard/stats/revenue",
+    "activities": "/dashboard/activities",
+    "performance": "/dashboard/metrics",
+}
+
+
+def make_scope(path: str, headers: list, query: bytes = b"") -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query, "root_path": "", "headers": headers,
+        "client": ("10.0.0.1", 5000), "server": ("bench", 80),
+    }
+
+
+async def request(app: FastAPI, path: str, headers: list):
+    """(status, etag) of one request"""
+    result = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            result["etag"] = dict(message["headers"]).get(b"etag")
+
+    await app(make_scope(path, headers), receive, send)
+    return result["status"], result["etag"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def change_customer(customer_ids: list, step: int):
+    """Suspend a customer, then reactivate it at the next step"""
+    status = CustomerStatus.SUSPENDED if step % 2 == 0 else CustomerStatus.ACTIVE
+    await update_customer(customer_ids[step // 2 % len(customer_ids)], CustomerUpdate(status=status))
+
+
+async def run_polling(app: FastAPI, args, auth: list, customer_ids: list, clock: Clock):
+    etags = [{} for _ in range(args.clients)]
+    requests = not_modified = 0
+    start = time.process_time()
+    for second in range(args.seconds):
+        clock.now = second
+        if second % args.change_every == 0:
+            await change_customer(customer_ids, second // args.change_every)
+        # Clients are spread evenly over the polling interval
+        for client in range(second % args.poll_every, args.clients, args.poll_every):
+            for section, path in SECTION_PATHS.items():
+                etag = etags[client].get(section)
+                headers = auth + [(b"if-none-match", etag)] if etag else auth
+                status, etags[client][section] = await request(app, path, headers)
+                requests += 1
+                not_modified += status == 304
+            await asyncio.sleep(0)  # background refreshes run between requests
+    return time.process_time() - start, requests, not_modified
+
+
+async def run_streaming(app: FastAPI, args, auth: list, customer_ids: list, clock: Clock, stream: DashboardStream):
+    done = asyncio.Event()
+    received = [0] * args.clients
+
+    async def follow(client: int):
+        async def receive():
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                received[client] += message.get("body", b"").count(b"event: ")
+
+        query = b"sections=" + ",".join(SECTION_PATHS).encode()
+        await app(make_scope("/dashboard/stream", auth, query), receive, send)
+
+    start = time.process_time()
+    tasks = [asyncio.ensure_future(follow(client)) for client in range(args.clients)]
+    while len(stream) < args.clients:
+        await asyncio.sleep(0)
+    await stream.poll()
+    for _ in range(10):
+        await asyncio.sleep(0)
+    opened = time.process_time() - start
+
+    start = time.process_time()
+    for second in range(args.seconds):
+        clock.now = second
+        if second % args.change_every == 0:
+            await change_customer(customer_ids, second // args.change_every)
+        await stream.poll()
+        for _ in range(3):
+            await asyncio.sleep(0)  # streams write; background refreshes run
+    cpu = time.process_time() - start
+    stats = stream.stats()
+    done.set()
+    await asyncio.gather(*tasks)
+    return opened, cpu, sum(received), stats
+
+
+async def run(args):
+    repository = load_customers(args.customers)
+    customer_ids = list(repository.customers)
+    app = FastAPI()
+    app.include_router(dashboard_router, prefix="/dashboard")
+    auth = [(b"authorization", f"Bearer {create_access_token({'sub': 'admin'})}".encode())]
+
+    clock = Clock()
+    set_dashboard_cache(DashboardCache(clock=clock))
+    repository.add_change_listener(lambda changes: get_dashboard_cache().on_changes(changes))
+    polling, requests, not_modified = await run_polling(app, args, auth, customer_ids, clock)
+
+    clock = Clock()
+    set_dashboard_cache(DashboardCache(clock=clock))
+    stream = DashboardStream(interval=3600)  # polled by hand, once a simulated second
+    set_dashboard_stream(stream)
+    opened, streaming, events, stats = await run_streaming(app, args, auth, customer_ids, clock, stream)
+
+    print(f"\n{args.clients} dashboards, {args.seconds} simulated seconds, "
+          f"a customer change every {args.change_every} s, {args.customers} customers")
+    print(f"{'model':<44} {'CPU s':>8} {'CPU ms/sim s':>13}")
+    print(f"{f'polling every {args.poll_every} s ({requests} requests, {not_modified} 304)':<44} "
+          f"{polling:>8.2f} {polling * 1000 / args.seconds:>13.1f}")
+    print(f"{f'streaming ({events} events)':<44} {streaming:>8.2f} {streaming * 1000 / args.seconds:>13.1f}")
+    print(f"opening {args.clients} streams: {opened:.2f} s CPU; stream stats: "
+          f"{stats['publishes']} publishes, {stats['coalesced_deltas']} coalesced deltas")
+    print(f"CPU ratio polling / streaming: {polling / streaming:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=1_000)
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--poll-every", type=int, default=5)
+    parser.add_argument("--change-every", type=int, default=2)
+    parser.add_argument("--customers", type=int, default=20_000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
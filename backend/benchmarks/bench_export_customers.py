@@ -0,0 +1,92 @@
+"""
+Benchmark: streaming customer export vs. building the whole response body
+at once (the shape of any non-streaming "return every customer" endpoint).
+
+    python -m benchmarks.bench_export_customers --customers 200000
+    python -m benchmarks.bench_export_customers --customers 1000000
+
+Timings and peak memory are measured in separate passes because memory
+tracing slows Python allocation down.
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app.models.customer import Customer, CustomerFilter
+from app.services import customer_service
+from app.services.customer_export import export_customers
+from app.services.customer_repository import InMemoryCustomerRepository, set_customer_repository
+from benchmarks.common import make_customers
+
+_dump_json = TypeAdapter(List[Customer]).dump_json
+
+
+def load(count: int) -> InMemoryCustomerRepository:
+    """Store with only the structures an export reads (dict + id ordering)"""
+    repository = InMemoryCustomerRepository()
+    for customer in make_customers(count):
+        repository.customers[customer.id] = customer
+    repository.sorted_index.add_many(repository.customers.values())
+    repository.sorted_index.page("id", 1)  # settle the bulk-loaded ordering
+    set_customer_repository(repository)
+    return repository
+
+
+async def whole_body():
+    """Baseline: every customer in one JSON body"""
+    customers = await customer_service.filter_customers(CustomerFilter())
+    yield _dump_json(customers)
+
+
+CASES = {
+    "whole JSON body": lambda: whole_body(),
+    "stream ndjson": lambda: export_customers(format="ndjson"),
+    "stream csv": lambda: export_customers(format="csv"),
+    "stream ndjson gzip": lambda: export_customers(format="ndjson", gzip=True),
+}
+
+
+async def consume(body) -> tuple:
+    """(seconds to first non-empty chunk, total seconds, bytes)"""
+    start = time.perf_counter()
+    first, size = None, 0
+    async for chunk in body:
+        if chunk and first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    return first, time.perf_counter() - start, size
+
+
+async def peak_memory(body) -> int:
+    tracemalloc.start()
+    async for _ in body:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+async def run(args):
+    load(args.customers)
+    print(f"\nExport {args.customers} customers")
+    print(f"{'case':<22} {'first byte s':>12} {'total s':>9} {'MiB sent':>9} {'peak MiB':>9}")
+    for label, body in CASES.items():
+        first, total, size = await consume(body())
+        peak = await peak_memory(body())
+        print(f"{label:<22} {first:>12.3f} {total:>9.2f} {size / 2**20:>9.1f} {peak / 2**20:>9.1f}")
+    print("peak MiB: traced allocations made while exporting (the stored customers are excluded)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=200_000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
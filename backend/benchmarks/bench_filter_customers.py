@@ -0,0 +1,69 @@
+"""
+Benchmark: indexed filter_customers vs. the previous full-scan implementation.
+
+    python -m benchmarks.bench_filter_customers --customers 80000
+"""
+
+import argparse
+
+from app.models.customer import (
+    CustomerFilter, CustomerStatus, ServiceType, PaymentStatus
+)
+from benchmarks.common import load_customers, best_of, print_table
+
+
+def scan_filter_customers(customers_db, filters: CustomerFilter):
+    """The pre-index implementation, kept here as the baseline"""
+    customers = list(customers_db.values())
+    if filters.status:
+        customers = [c for c in customers if c.status == filters.status]
+    if filters.service_type:
+        customers = [c for c in customers if c.service_type == filters.service_type]
+    if filters.payment_status:
+        customers = [c for c in customers if c.payment_status == filters.payment_status]
+    if filters.city:
+        customers = [c for c in customers if c.city.lower() == filters.city.lower()]
+    if filters.plan_name:
+        customers = [c for c in customers if filters.plan_name.lower() in c.plan_name.lower()]
+    if filters.overdue_only:
+        customers = [c for c in customers if c.payment_status == PaymentStatus.OVERDUE]
+    return customers
+
+
+CASES = {
+    "status=active": CustomerFilter(status=CustomerStatus.ACTIVE),
+    "city=cozumel": CustomerFilter(city="cozumel"),
+    "status+service+city": CustomerFilter(
+        status=CustomerStatus.ACTIVE, service_type=ServiceType.FIBER, city="Cancún"
+    ),
+    "overdue_only+city": CustomerFilter(overdue_only=True, city="Tulum"),
+    "all equality filters": CustomerFilter(
+        status=CustomerStatus.SUSPENDED, service_type=ServiceType.WIRELESS,
+        payment_status=PaymentStatus.OVERDUE, city="Chetumal",
+    ),
+    "city+plan substring": CustomerFilter(city="Mérida", plan_name="premium"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=80_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    repository = load_customers(args.customers)
+    db = repository.customers
+    rows = {}
+    for label, filters in CASES.items():
+        expected = [c.id for c in scan_filter_customers(db, filters)]
+        actual = [c.id for c in repository.filter_sync(filters)]
+        assert expected == actual, f"{label}: indexed result differs from scan"
+        rows[f"{label} ({len(actual)} rows)"] = (
+            best_of(lambda: scan_filter_customers(db, filters), args.repeat),
+            best_of(lambda: repository.filter_sync(filters), args.repeat),
+        )
+    print_table(f"filter_customers over {args.customers} customers", rows)
+
+
+if __name__ == "__main__":
+    main()
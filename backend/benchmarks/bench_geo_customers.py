@@ -0,0 +1,89 @@
+"""
+Benchmark: grid spatial index vs. scanning every customer for map viewport,
+radius and nearest-customer queries.
+
+    python -m benchmarks.bench_geo_customers --customers 200000
+"""
+
+import argparse
+import heapq
+
+from app.services.customer_geo import haversine_km
+from benchmarks.common import load_customers, best_of, print_table, run_sync
+
+
+def scan_bbox(customers, min_lat, min_lon, max_lat, max_lon):
+    return [
+        c for c in customers
+        if c.latitude is not None and c.longitude is not None
+        and min_lat <= c.latitude <= max_lat and min_lon <= c.longitude <= max_lon
+    ]
+
+
+def scan_radius(customers, lat, lon, radius_km):
+    found = [(haversine_km(lat, lon, c.latitude, c.longitude), c.id) for c in customers
+             if c.latitude is not None and c.longitude is not None]
+    return sorted(pair for pair in found if pair[0] <= radius_km)
+
+
+def scan_nearest(customers, lat, lon, k):
+    return heapq.nsmallest(k, ((haversine_km(lat, lon, c.latitude, c.longitude), c.id) for c in customers
+                               if c.latitude is not None and c.longitude is not None))
+
+
+# The synthetic customers are spread over lat 20..22, lon -88..-86.5
+VIEWPORTS = {
+    "bbox street view (0.02°)": (21.15, -86.86, 21.17, -86.84),
+    "bbox city view (0.2°)": (21.0, -87.0, 21.2, -86.8),
+    "bbox whole region": (19.5, -88.5, 22.5, -86.0),
+}
+RADII = {"radius 1 km": 1.0, "radius 10 km": 10.0}
+NEAREST = {"nearest k=1": 1, "nearest k=50": 50}
+POINT = (21.16, -86.85)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Only the geo index is populated: the others are irrelevant here and slow to build
+    repository = load_customers(args.customers, index=False)
+    for customer in repository.customers.values():
+        repository.geo_index.add(customer)
+    customers = list(repository.customers.values())
+    rows = {}
+
+    for label, box in VIEWPORTS.items():
+        expected = {c.id for c in scan_bbox(customers, *box)}
+        total, found = run_sync(repository.in_bbox(*box, len(customers)))
+        assert total == len(expected) and {c.id for c in found} == expected, label
+        rows[f"{label} ({total} rows)"] = (
+            best_of(lambda: scan_bbox(customers, *box), args.repeat),
+            best_of(lambda: run_sync(repository.in_bbox(*box, 1000)), args.repeat),
+        )
+
+    for label, radius in RADII.items():
+        expected = scan_radius(customers, *POINT, radius)
+        total, found = run_sync(repository.within_radius(*POINT, radius, len(customers)))
+        assert [c.id for _, c in found] == [customer_id for _, customer_id in expected], label
+        rows[f"{label} ({total} rows)"] = (
+            best_of(lambda: scan_radius(customers, *POINT, radius), args.repeat),
+            best_of(lambda: run_sync(repository.within_radius(*POINT, radius, 500)), args.repeat),
+        )
+
+    for label, k in NEAREST.items():
+        expected = scan_nearest(customers, *POINT, k)
+        found = run_sync(repository.nearest(*POINT, k))
+        assert [c.id for _, c in found] == [customer_id for _, customer_id in expected], label
+        rows[label] = (
+            best_of(lambda: scan_nearest(customers, *POINT, k), args.repeat),
+            best_of(lambda: run_sync(repository.nearest(*POINT, k)), args.repeat),
+        )
+
+    print_table(f"geo queries over {args.customers} customers", rows)
+
+
+if __name__ == "__main__":
+    main()
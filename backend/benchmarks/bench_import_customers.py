@@ -0,0 +1,130 @@
+"""
+Benchmark: bulk import of CSV/NDJSON uploads vs. one create_customer call
+per row (the only path before the import endpoint).
+
+    python -m benchmarks.bench_import_customers --rows 100000
+    python -m benchmarks.bench_import_customers --rows 100000 --store sql
+    python -m benchmarks.bench_import_customers --rows 20000 --trace-memory
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.models.customer import CustomerCreate
+from app.services import customer_service
+from app.services.customer_import import import_customers
+from app.services.customer_repository import create_customer_repository, set_customer_repository
+from benchmarks.common import make_customers
+
+CHUNK_SIZE = 64 * 1024
+FIELDS = list(CustomerCreate.model_fields)
+
+
+def make_rows(count: int):
+    for customer in make_customers(count):
+        row = customer.dict(include=set(FIELDS))
+        row["service_type"] = row["service_type"].value
+        row["installation_date"] = row["installation_date"].isoformat()
+        yield row
+
+
+def make_csv(count: int) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    writer.writerows(make_rows(count))
+    return buffer.getvalue().encode()
+
+
+def make_ndjson(count: int) -> bytes:
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in make_rows(count)).encode()
+
+
+async def chunked(payload: bytes):
+    for start in range(0, len(payload), CHUNK_SIZE):
+        yield payload[start:start + CHUNK_SIZE]
+
+
+async def fresh_repository(store: str, directory: str):
+    options = {}
+    if store == "sql":
+        path = os.path.join(directory, f"import-{time.perf_counter_ns()}.db")
+        options["url"] = f"sqlite:///{path}"
+    repository = create_customer_repository(store, **options)
+    await repository.initialize()
+    set_customer_repository(repository)
+    return repository
+
+
+async def per_row(payload: bytes) -> int:
+    """Baseline: validate and create every NDJSON row on its own"""
+    for line in payload.decode().splitlines():
+        await customer_service.create_customer(CustomerCreate(**json.loads(line)))
+    return await customer_service._repository().count()
+
+
+async def run(args):
+    rows = {}
+    with tempfile.TemporaryDirectory() as directory:
+        payloads = {"csv": make_csv(args.rows), "ndjson": make_ndjson(args.rows)}
+
+        repository = await fresh_repository(args.store, directory)
+        baseline_rows = min(args.rows, args.baseline_rows or args.rows)
+        baseline_payload = b"\n".join(payloads["ndjson"].splitlines()[:baseline_rows])
+        start = time.perf_counter()
+        await per_row(baseline_payload)
+        per_row_seconds = (time.perf_counter() - start) / baseline_rows
+        await repository.close()
+
+        for format, payload in payloads.items():
+            repository = await fresh_repository(args.store, directory)
+            if args.trace_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            report = await import_customers(chunked(payload), format)
+            elapsed = time.perf_counter() - start
+            peak = None
+            if args.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            assert report.imported == args.rows and not report.failed, report.errors[:3]
+            assert await repository.count() == args.rows
+            await repository.close()
+            rows[format] = (elapsed, peak, len(payload))
+
+    print(f"\nImport {args.rows} customers ({args.store} store)")
+    print(f"{'case':<28} {'seconds':>9} {'rows/s':>10} {'peak MiB':>9}")
+    label = "create_customer per row" + (" *" if baseline_rows < args.rows else "")
+    print(f"{label:<28} {per_row_seconds * args.rows:>9.2f} "
+          f"{1 / per_row_seconds:>10.0f} {'':>9}")
+    for format, (elapsed, peak, size) in rows.items():
+        label = f"import {format} ({size / 2**20:.1f} MiB)"
+        memory = f"{peak / 2**20:>9.1f}" if peak is not None else f"{'-':>9}"
+        print(f"{label:<28} {elapsed:>9.2f} {args.rows / elapsed:>10.0f} {memory}")
+    if baseline_rows < args.rows:
+        print(f"* extrapolated from {baseline_rows} rows (underestimates: per-row cost grows with the store)")
+    if args.trace_memory:
+        print("peak memory is traced Python allocations, including the stored "
+              "customers (tracing slows the import several times over)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--baseline-rows", type=int, default=None,
+                        help="rows for the per-row baseline (default: --rows; fewer is extrapolated)")
+    parser.add_argument("--store", choices=["memory", "sql"], default="memory")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="report peak traced memory (much slower)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Load test: latency of an unrelated endpoint during a login storm, with
+bcrypt run inline on the event loop (the old login) vs. on the hashing
+pool with admission control.
+
+    python -m benchmarks.bench_login_storm --logins 32 --seconds 5
+
+Everything runs in one process and event loop, like one server worker:
+``--logins`` clients log in back to back while a probe requests a cheap
+endpoint every 10 ms. Probe latencies are measured from when each probe
+was due, so stalls of the event loop show up in full.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from app.api.auth.router import router as auth_router
+from app.core.security import get_password_hasher
+from app.models.user import LoginRequest
+from app.services.auth_service import pwd_context, get_user
+
+PROBE_INTERVAL = 0.01
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/auth")
+
+    @app.post("/auth/login-inline")
+    async def login_inline(login_request: LoginRequest):
+        """Baseline: the previous login, bcrypt on the event loop thread"""
+        user = get_user(login_request.username)
+        if user is None or not pwd_context.verify(login_request.password, user.hashed_password):
+            raise HTTPException(status_code=401)
+        return {"ok": True}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000 if ordered else 0.0
+
+
+async def storm(client: httpx.AsyncClient, path: str, logins: int, seconds: float):
+    """(probe latencies, login status counts)"""
+    deadline = time.perf_counter() + seconds
+    statuses = {}
+
+    async def login_client():
+        while time.perf_counter() < deadline:
+            response = await client.post(path, json={"username": "admin", "password": "admin123"})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 503:
+                await asyncio.sleep(int(response.headers["Retry-After"]))
+
+    async def probe():
+        # Latency counts from when each probe was due, so time the loop
+        # spent blocked before sending it is not hidden
+        latencies = []
+        due = time.perf_counter()
+        while due < deadline:
+            await asyncio.sleep(max(due - time.perf_counter(), 0))
+            await client.get("/ping")
+            latencies.append(time.perf_counter() - due)
+            due += PROBE_INTERVAL
+        return latencies
+
+    clients = [asyncio.ensure_future(login_client()) for _ in range(logins if path else 0)]
+    latencies = await probe()
+    await asyncio.gather(*clients)
+    return latencies, statuses
+
+
+async def run(args):
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'case':<28} {'probes':>7} {'p50 ms':>8} {'p99 ms':>9} {'max ms':>9}  logins")
+        for label, path in (("no logins", None), ("bcrypt inline (before)", "/auth/login-inline"),
+                            ("bcrypt pool (after)", "/auth/login")):
+            latencies, statuses = await storm(client, path, args.logins, args.seconds)
+            print(f"{label:<28} {len(latencies):>7} {percentile(latencies, 0.5):>8.1f} "
+                  f"{percentile(latencies, 0.99):>9.1f} {max(latencies) * 1000:>9.1f}  {statuses}")
+    print(f"\nhashing pool: {get_password_hasher().stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=32, help="concurrent login clients")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: IP trie / MAC hash lookups vs. scanning every customer, for
+single alarms, CIDR blocks and a batch of alarm addresses.
+
+    python -m benchmarks.bench_network_customers --customers 200000
+"""
+
+import argparse
+import ipaddress
+import random
+
+from app.services import customer_service
+from app.services.customer_network import normalize_mac
+from benchmarks.common import load_customers, best_of, print_table, run_sync
+
+
+def scan_ip(customers, address):
+    return [c for c in customers if c.ip_address == address]
+
+
+def scan_network(customers, block):
+    network = ipaddress.ip_network(block)
+    return [c for c in customers if c.ip_address and ipaddress.ip_address(c.ip_address) in network]
+
+
+def scan_batch(customers, ips, macs):
+    """Best-case scan: one pass with hash sets of the wanted addresses"""
+    wanted_ips, wanted_macs = set(ips), {normalize_mac(mac) for mac in macs}
+    return [c for c in customers
+            if c.ip_address in wanted_ips or normalize_mac(c.mac_address) in wanted_macs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Only the network index (and the store ordering it reports in) is
+    # populated: the others are slow to build here
+    repository = load_customers(args.customers, index=False)
+    for customer in repository.customers.values():
+        repository.customer_index.add(customer)
+        repository.network_index.add(customer)
+    customers = list(repository.customers.values())
+    rng = random.Random(7)
+    sample = rng.sample(customers, args.batch)
+    ips = [c.ip_address for c in sample[: args.batch // 2]]
+    macs = [c.mac_address.lower().replace(":", "-") for c in sample[args.batch // 2:]]
+    address = sample[0].ip_address
+
+    rows = {}
+    assert [c.id for c in run_sync(customer_service.get_customers_by_ip(address))] == \
+        [c.id for c in scan_ip(customers, address)]
+    rows["exact IP"] = (
+        best_of(lambda: scan_ip(customers, address), args.repeat),
+        best_of(lambda: run_sync(customer_service.get_customers_by_ip(address)), args.repeat),
+    )
+    for block in ("10.1.2.0/24", "10.1.0.0/20", "10.0.0.0/8"):
+        expected = scan_network(customers, block)
+        total, _ = run_sync(customer_service.get_customers_in_network(block, 1000))
+        assert total == len(expected), block
+        rows[f"CIDR {block} ({total} rows)"] = (
+            best_of(lambda: scan_network(customers, block), args.repeat),
+            best_of(lambda: run_sync(customer_service.get_customers_in_network(block, 1000)), args.repeat),
+        )
+    resolved = run_sync(customer_service.resolve_network_addresses(ips, macs))
+    assert len(resolved["ip_addresses"]) + len(resolved["mac_addresses"]) == args.batch
+    rows[f"batch of {args.batch} IP/MAC"] = (
+        best_of(lambda: scan_batch(customers, ips, macs), args.repeat),
+        best_of(lambda: run_sync(customer_service.resolve_network_addresses(ips, macs)), args.repeat),
+    )
+    print_table(f"network lookups over {args.customers} customers", rows)
+
+
+if __name__ == "__main__":
+    main()
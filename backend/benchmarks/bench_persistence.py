@@ -0,0 +1,130 @@
+"""
+Benchmark: restarting the in-memory store from a snapshot vs. replaying
+its whole write-ahead log, and write throughput per WAL durability mode.
+
+    python -m benchmarks.bench_persistence --sizes 10000,50000,100000 --writes 2000
+
+Use --directory to measure on the disk the server will use (the default
+temporary directory may be memory-backed, which makes fsync free).
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import shutil
+import tempfile
+import time
+
+from app.models.customer import CustomerUpdate
+from app.services import customer_service
+from app.services.customer_persistence import (
+    DURABILITY_MODES, CustomerStorePersistence, read_snapshot, set_store_persistence
+)
+from app.services.customer_repository import InMemoryCustomerRepository, set_customer_repository
+from benchmarks.common import make_customers, print_table
+
+BATCH = 10_000
+
+
+async def boot(directory: str, durability: str = "group") -> float:
+    """Time to bring a fresh repository up from ``directory``, in ms"""
+    repository = InMemoryCustomerRepository()
+    set_customer_repository(repository)
+    persistence = CustomerStorePersistence(repository, directory, durability=durability)
+    start = time.perf_counter()
+    await persistence.open()
+    elapsed = (time.perf_counter() - start) * 1000
+    await persistence.wal.close()
+    return elapsed
+
+
+async def restart_times(size: int, root: str):
+    directory = tempfile.mkdtemp(dir=root)
+    repository = InMemoryCustomerRepository()
+    set_customer_repository(repository)
+    persistence = CustomerStorePersistence(repository, directory)
+    await persistence.open()
+    customers = list(make_customers(size))
+    for start in range(0, size, BATCH):
+        await repository.insert_many(customers[start:start + BATCH])
+    del customers
+    await persistence.wal.sync()
+
+    wal_only = await boot(directory)
+    snapshot = await persistence.snapshot()
+    from_snapshot = await boot(directory)
+    gc.disable()  # as during startup
+    start = time.perf_counter()
+    read_snapshot(os.path.join(directory, "snapshot.bin"))
+    read_ms = (time.perf_counter() - start) * 1000
+    gc.enable()
+    await persistence.snapshot(with_indexes=True)
+    from_shutdown_snapshot = await boot(directory)
+    await persistence.wal.close()
+    shutil.rmtree(directory)
+    gc.collect()
+    return wal_only, from_snapshot, from_shutdown_snapshot, read_ms, snapshot
+
+
+async def write_throughput(durability: str, concurrency: int, writes: int, root: str):
+    """(updates per second, fsyncs) with ``concurrency`` writers; durability
+    None runs without persistence"""
+    directory = tempfile.mkdtemp(dir=root)
+    repository = InMemoryCustomerRepository()
+    set_customer_repository(repository)
+    persistence = None
+    if durability is not None:
+        persistence = CustomerStorePersistence(repository, directory, durability=durability)
+        await persistence.open()
+        set_store_persistence(persistence)
+    repository.restore(list(make_customers(1000)))
+
+    async def writer(worker: int):
+        for i in range(worker, writes, concurrency):
+            await customer_service.update_customer(str(i % 1000 + 1), CustomerUpdate(notes=f"visit {i}"))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(worker) for worker in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    fsyncs = 0
+    if persistence is not None:
+        fsyncs = persistence.wal.fsyncs
+        await persistence.wal.close()
+        set_store_persistence(None)
+    shutil.rmtree(directory)
+    return writes / elapsed, fsyncs
+
+
+async def run(args):
+    root = args.directory or tempfile.gettempdir()
+    rows = {}
+    for size in args.sizes:
+        wal_only, from_snapshot, from_shutdown_snapshot, read_ms, snapshot = await restart_times(size, root)
+        rows[f"{size} customers, periodic snapshot"] = (wal_only, from_snapshot)
+        rows[f"{size} customers, shutdown snapshot"] = (wal_only, from_shutdown_snapshot)
+        print(f"{size} customers: snapshot {snapshot['bytes'] / 1e6:.1f} MB written in "
+              f"{snapshot['elapsed_ms']:.0f} ms, read back in {read_ms:.0f} ms (rest of restart: indexing)")
+    print_table("restart: full WAL replay (baseline) vs snapshot load", rows)
+
+    print(f"\nwrite throughput, {args.writes} update_customer calls")
+    print(f"{'durability':<12} {'writers':>8} {'updates/s':>12} {'fsyncs':>8}")
+    for durability in (None, *DURABILITY_MODES):
+        for concurrency in args.concurrency:
+            rate, fsyncs = await write_throughput(durability, concurrency, args.writes, root)
+            print(f"{durability or 'off':<12} {concurrency:>8} {rate:>12.0f} {fsyncs:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")],
+                        default=[10_000, 50_000, 100_000])
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=lambda value: [int(c) for c in value.split(",")],
+                        default=[1, 32])
+    parser.add_argument("--directory", default=None)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
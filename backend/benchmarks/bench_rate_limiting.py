@@ -0,0 +1,120 @@
+"""
+Microbenchmark: per-request overhead of the rate limiting middleware.
+
+    python -m benchmarks.bench_rate_limiting --requests 2000 --keys 100000
+
+RateLimiter.check is timed on its own for an unmatched path and for
+limited paths keyed by IP and by user (limits set high enough never to
+refuse), after filling the bucket store with ``--keys`` other clients.
+Whole requests through the ASGI stack to a trivial endpoint are timed
+too, with and without the middleware, though their run-to-run noise is
+larger than the middleware. With fakeredis installed, the Redis store
+is measured as well (in process, so without the network round trip a
+real Redis adds).
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.middleware.rate_limiting import (
+    InMemoryBucketStore, RateLimiter, RateLimitMiddleware, RateLimitRule, RedisBucketStore
+)
+from app.services.auth_service import create_access_token
+
+RULES = (
+    RateLimitRule("ip", "/limited/ip", 10 ** 9, 10 ** 9),
+    RateLimitRule("user", "/limited/user", 10 ** 9, 10 ** 9, per="user"),
+)
+
+
+def build_app(limiter=None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/open")
+    async def open_endpoint():
+        return {"ok": True}
+
+    @app.get("/limited/ip")
+    async def limited_ip():
+        return {"ok": True}
+
+    @app.get("/limited/user")
+    async def limited_user():
+        return {"ok": True}
+
+    if limiter is not None:
+        app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return app
+
+
+async def per_request(app: FastAPI, path: str, headers: dict, requests: int, repeat: int) -> float:
+    """Best mean microseconds per request"""
+    transport = httpx.ASGITransport(app=app)
+    best = float("inf")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(requests):
+                response = await client.get(path)
+            assert response.status_code == 200, response.text
+            best = min(best, (time.perf_counter() - start) * 1e6 / requests)
+    return best
+
+
+async def check_rate(limiter: RateLimiter, path: str, headers: dict, checks: int) -> float:
+    """Microseconds per RateLimiter.check"""
+    raw_headers = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    start = time.perf_counter()
+    for _ in range(checks):
+        scope = {"type": "http", "method": "GET", "path": path, "headers": raw_headers, "client": ("10.0.0.1", 5000)}
+        assert await limiter.check(scope) is None
+    return (time.perf_counter() - start) * 1e6 / checks
+
+
+async def take_rate(store, keys: int) -> float:
+    """Microseconds per BucketStore.take, cycling through ``keys`` clients"""
+    start = time.perf_counter()
+    for i in range(keys):
+        await store.take(f"ip:client-{i}", 1000.0, 1000)
+    return (time.perf_counter() - start) * 1e6 / keys
+
+
+async def run(args):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+    stores = {"memory": InMemoryBucketStore()}
+    try:
+        import fakeredis
+        stores["redis (fakeredis)"] = RedisBucketStore(client=fakeredis.FakeAsyncRedis())
+    except ImportError:
+        print("fakeredis not installed: skipping the Redis store")
+
+    cases = (("unmatched path", "/open"), ("per-IP bucket", "/limited/ip"), ("per-user bucket", "/limited/user"))
+    await per_request(build_app(), "/open", headers, args.requests, 1)  # warm up
+    baseline = await per_request(build_app(), "/open", headers, args.requests, args.repeat)
+    print(f"{'case':<40} {'check us':>9} {'us/request':>11}")
+    print(f"{'no middleware':<40} {'':>9} {baseline:>11.1f}")
+    for name, store in stores.items():
+        fill = await take_rate(store, args.keys if name == "memory" else args.keys // 10)
+        limiter = RateLimiter(store, RULES)
+        app = build_app(limiter)
+        for label, path in cases:
+            check = await check_rate(limiter, path, headers, args.requests)
+            timing = await per_request(app, path, headers, args.requests, args.repeat)
+            print(f"{name + ', ' + label:<40} {check:>9.1f} {timing:>11.1f}")
+        print(f"  {name}: take() on new keys {fill:.1f} us; {store.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
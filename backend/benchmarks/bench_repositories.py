@@ -0,0 +1,95 @@
+"""
+Benchmark: list/filter/create throughput of each customer repository under
+concurrent load.
+
+    python -m benchmarks.bench_repositories --customers 20000 --concurrency 32
+    python -m benchmarks.bench_repositories --database-url postgresql://...
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from app.models.customer import CustomerCreate, CustomerFilter, CustomerStatus, ServiceType
+from app.services import customer_service
+from app.services.customer_repository import create_customer_repository, set_customer_repository
+from benchmarks.common import make_customers
+
+
+def new_customer(rng: random.Random) -> CustomerCreate:
+    return CustomerCreate(
+        name=f"Cliente Nuevo {rng.randint(1, 10**6)}",
+        email=f"nuevo{rng.randint(1, 10**6)}@email.com",
+        phone="+52 998 555 0000",
+        address="Av. Tulum #1",
+        city="Cancún",
+        state="Quintana Roo",
+        zip_code="77500",
+        service_type=ServiceType.FIBER,
+        plan_name="Fibra Hogar 50 Mbps",
+        monthly_fee=549.0,
+    )
+
+
+OPERATIONS = {
+    "list page": lambda rng: customer_service.get_customers_page(limit=50, skip=rng.randint(0, 1000)),
+    "filter": lambda rng: customer_service.filter_customers(
+        CustomerFilter(status=CustomerStatus.SUSPENDED, city=rng.choice(["Tulum", "Bacalar"]))
+    ),
+    "create": lambda rng: customer_service.create_customer(new_customer(rng)),
+}
+
+
+async def measure(operation, seconds: float, concurrency: int) -> float:
+    """Operations per second with ``concurrency`` concurrent callers"""
+    deadline = time.perf_counter() + seconds
+    done = 0
+
+    async def worker(seed: int):
+        nonlocal done
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            await operation(rng)
+            done += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return done / (time.perf_counter() - start)
+
+
+async def bench_backend(label: str, store: str, args, **options):
+    repository = create_customer_repository(store, **options)
+    set_customer_repository(repository)
+    await repository.initialize()
+    if not await repository.count():
+        customers = list(make_customers(args.customers))
+        await repository.allocate_ids(len(customers))
+        await repository.insert_many(customers)
+
+    for name, operation in OPERATIONS.items():
+        rate = await measure(operation, args.seconds, args.concurrency)
+        print(f"{label:<10} {name:<12} {rate:>12,.0f} ops/s")
+    await repository.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--database-url", default=None, help="also benchmark this SQL database")
+    args = parser.parse_args()
+
+    print(f"{args.customers} customers, {args.concurrency} concurrent callers\n")
+    await bench_backend("memory", "memory", args)
+    with tempfile.TemporaryDirectory() as tmp:
+        await bench_backend("sqlite", "sql", args, url=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    if args.database_url:
+        await bench_backend("sql", "sql", args, url=args.database_url)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+Benchmark: trigram-indexed search_customers vs. the previous full scan.
+
+    python -m benchmarks.bench_search_customers --customers 100000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from app.services import customer_service
+from benchmarks.common import load_customers, best_of, print_table, run_sync
+
+
+def scan_search_customers(customers_db, query: str, limit: int = 50):
+    """The pre-index implementation (precedence bug included), as the baseline"""
+    query = query.lower()
+    results = []
+    for customer in list(customers_db.values()):
+        if (query in customer.name.lower() or
+            query in customer.email.lower() if customer.email else False or
+            query in customer.phone.lower() or
+            query in customer.address.lower() or
+            query in customer.city.lower() or
+            query in customer.customer_number.lower()):
+            results.append(customer)
+    return results[:limit]
+
+
+QUERIES = [
+    "lopez",
+    "López Ruiz",
+    "maria.123",
+    "998 123",
+    "N2P2024000077",
+    "calle 15",
+    "tulum",
+    "zz",
+    "no-such-customer",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    repository = load_customers(args.customers)
+    build_s = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"store + indexes built in {build_s:.1f}s, peak traced memory {peak / 2**20:.0f} MiB")
+
+    rows = {}
+    for query in QUERIES:
+        hits = len(run_sync(customer_service.search_customers(query)))
+        rows[f"{query!r} ({hits} hits)"] = (
+            best_of(lambda: scan_search_customers(repository.customers, query), args.repeat),
+            best_of(lambda: run_sync(customer_service.search_customers(query)), args.repeat),
+        )
+    print_table(f"search_customers over {args.customers} customers", rows)
+
+
+if __name__ == "__main__":
+    main()
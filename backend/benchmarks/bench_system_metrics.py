@@ -0,0 +1,113 @@
+"""
+Microbenchmark: cost of the system metrics sampler and of recording
+request latency.
+
+    python -m benchmarks.bench_system_metrics --requests 2000
+
+Reports:
+- serving the metrics from the latest sample vs. reading /proc on every
+  request (what the endpoint would cost without the background sampler);
+- one sample, split into its /proc reads and the latency percentiles,
+  with the share of a core the sampler takes at METRICS_SAMPLE_SECONDS;
+- whole requests through the ASGI stack to a trivial endpoint, with and
+  without RequestMetricsMiddleware.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.config import METRICS_SAMPLE_SECONDS
+from app.middleware.request_metrics import RequestMetricsMiddleware
+from app.services.system_metrics import LatencyRecorder, ProcReading, SystemMetrics, set_system_metrics
+from benchmarks.common import best_of, print_table
+
+
+def build_app(record: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if record:
+        app.add_middleware(RequestMetricsMiddleware)
+    return app
+
+
+async def per_request(app: FastAPI, requests: int, repeat: int) -> float:
+    """Best mean microseconds per request"""
+    transport = httpx.ASGITransport(app=app)
+    best = float("inf")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(requests):
+                response = await client.get("/ping")
+            assert response.status_code == 200
+            best = min(best, (time.perf_counter() - start) * 1e6 / requests)
+    return best
+
+
+def drain_cost(recorded: int, repeat: int) -> float:
+    """Milliseconds to drain ``recorded`` request durations"""
+    recorder = LatencyRecorder()
+
+    def fill_and_drain():
+        for i in range(recorded):
+            recorder.record(i * 1e-6, 200)
+        start = time.perf_counter()
+        recorder.drain(1.0)
+        return time.perf_counter() - start
+
+    return min(fill_and_drain() for _ in range(repeat)) * 1000
+
+
+async def run(args):
+    metrics = SystemMetrics()
+    set_system_metrics(metrics)
+    for _ in range(metrics.samples.maxlen):  # a full ring, as in steady state
+        metrics.sample()
+
+    calls = args.requests
+    print_table(f"metrics for one request ({calls} calls)", {
+        "read /proc per request vs latest sample": (
+            best_of(lambda: [metrics.sample() for _ in range(calls)], args.repeat) / calls,
+            best_of(lambda: [metrics.latest() for _ in range(calls)], args.repeat) / calls,
+        ),
+    })
+
+    metrics = SystemMetrics()
+    for _ in range(metrics.samples.maxlen):
+        metrics.sample()
+    metrics.sample_count = 0
+    metrics.sample_seconds = metrics.sample_cpu_seconds = metrics.max_sample_seconds = 0.0
+    for _ in range(args.samples):
+        metrics.sample()
+    overhead = metrics.overhead()
+    print(f"\none sample: mean {overhead['mean_ms']} ms, max {overhead['max_ms']} ms; "
+          f"/proc reads {best_of(ProcReading.read, args.repeat):.3f} ms")
+    for recorded in (0, 1_000, 10_000):
+        print(f"  latency percentiles over {recorded} requests: {drain_cost(recorded, args.repeat):.3f} ms")
+    print(f"sampler CPU at one sample every {METRICS_SAMPLE_SECONDS} s: {overhead['cpu_percent']}% of a core")
+
+    await per_request(build_app(False), args.requests, 1)  # warm up
+    baseline = await per_request(build_app(False), args.requests, args.repeat)
+    recorded = await per_request(build_app(True), args.requests, args.repeat)
+    print(f"\nASGI request: {baseline:.1f} us without the middleware, {recorded:.1f} us with it "
+          f"({recorded - baseline:+.1f} us)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Microbenchmark: the revocation check on the request path, and renewing a
+session with a refresh token instead of logging in again.
+
+    python -m benchmarks.bench_token_revocation --revoked 100000 --checks 100000
+
+The revocation list is filled with ``--revoked`` ids, then checked with ids
+that are not in it (the common case) and with revoked ones. A token cache
+miss checks two ids per request: the token's and its session's.
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.core.security import RevocationList, set_revocation_list, set_token_cache, TokenCache
+from app.models.user import LoginRequest
+from app.services.auth_service import get_current_user, login, refresh
+from benchmarks.common import best_of, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--revoked", type=int, default=100_000)
+    parser.add_argument("--checks", type=int, default=100_000)
+    parser.add_argument("--logins", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    expires_at = time.time() + 3600
+    revocations = RevocationList()
+    for i in range(args.revoked):
+        revocations.revoke(f"revoked-{i}", expires_at)
+    absent = [f"live-{i}" for i in range(args.checks)]
+    present = [f"revoked-{i % args.revoked}" for i in range(args.checks)]
+    exact = dict(revocations._revoked)
+
+    check = lambda ids: lambda: [revocations.is_revoked(token_id) for token_id in ids]
+    exact_only = lambda ids: lambda: [token_id in exact for token_id in ids]
+    results = {
+        "not revoked": (best_of(exact_only(absent), args.repeat), best_of(check(absent), args.repeat)),
+        "revoked": (best_of(exact_only(present), args.repeat), best_of(check(present), args.repeat)),
+    }
+    print_table(f"exact dict vs is_revoked, {args.checks} checks, {args.revoked} revoked ids", results)
+    per_check = results["not revoked"][1] * 1000 / args.checks
+    print(f"per check: {per_check:.2f} us; {revocations.stats()}")
+
+    # Full cache-miss verification, with and without the revocation list
+    set_token_cache(TokenCache(maxsize=0))
+    tokens = asyncio.run(login(LoginRequest(username="admin", password="admin123")))
+    resolve = lambda: [get_current_user(tokens.access_token) for _ in range(args.checks // 10)]
+    set_revocation_list(RevocationList())
+    empty = best_of(resolve, args.repeat)
+    set_revocation_list(revocations)
+    full = best_of(resolve, args.repeat)
+    print_table(f"get_current_user cache miss, {args.checks // 10} calls",
+                {"empty vs filled revocation list": (empty, full)})
+
+    # Renewing a session: a bcrypt login vs a refresh token rotation
+    def logins():
+        for _ in range(args.logins):
+            asyncio.run(login(LoginRequest(username="admin", password="admin123")))
+
+    session = [tokens]
+
+    def refreshes():
+        # Each refresh token works once: carry the chain across repeats
+        for _ in range(args.logins):
+            session[0] = refresh(session[0].refresh_token)
+
+    print_table(f"renewing a session, {args.logins} times",
+                {"login vs refresh": (best_of(logins, 1), best_of(refreshes, args.repeat))})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Shared helpers for the N2P-CRM01 benchmark scripts.
+
+Run any benchmark from the backend directory, e.g.:
+    python -m benchmarks.bench_filter_customers --customers 80000
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator
+
+from app.models.customer import (
+    Customer, CustomerStatus, ServiceType, PaymentStatus
+)
+from app.services.customer_repository import InMemoryCustomerRepository, set_customer_repository
+
+CITIES = ["Cancún", "Playa del Carmen", "Cozumel", "Tulum", "Chetumal", "Mérida", "Valladolid", "Bacalar"]
+PLANS = [
+    ("Fibra Hogar 50 Mbps", ServiceType.FIBER, 549.00),
+    ("Fibra Premium 100 Mbps", ServiceType.FIBER, 899.00),
+    ("Wireless Básico 25 Mbps", ServiceType.WIRELESS, 399.00),
+    ("Wireless Business 50 Mbps", ServiceType.WIRELESS, 1299.00),
+    ("Híbrido Empresarial 75 Mbps", ServiceType.HYBRID, 999.00),
+]
+FIRST_NAMES = ["María", "Carlos", "Ana", "Roberto", "Patricia", "José", "Lucía", "Jorge", "Sofía", "Andrés"]
+LAST_NAMES = ["González", "Mendoza", "Vargas", "Silva", "López", "Hernández", "Pérez", "Martínez", "Ruiz", "Jiménez"]
+
+
+def make_customer(i: int, rng: random.Random) -> Customer:
+    """Build one synthetic customer with a realistic field distribution"""
+    plan_name, service_type, fee = rng.choice(PLANS)
+    city = rng.choice(CITIES)
+    created = datetime.now() - timedelta(days=rng.randint(0, 900))
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return Customer(
+        id=str(i),
+        customer_number=f"N2P{created.year}{i:06d}",
+        name=f"{first} {last} {rng.choice(LAST_NAMES)}",
+        email=f"{first.lower()}.{i}@email.com",
+        phone=f"+52 998 {rng.randint(100, 999)} {i % 10000:04d}",
+        address=f"Calle {rng.randint(1, 200)} #{rng.randint(1, 999)}",
+        city=city,
+        state="Quintana Roo",
+        zip_code=f"77{rng.randint(100, 999)}",
+        service_type=service_type,
+        plan_name=plan_name,
+        monthly_fee=fee,
+        installation_date=created,
+        ip_address=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+        mac_address=":".join(f"{(i >> s) & 255:02X}" for s in (40, 32, 24, 16, 8, 0)),
+        router_name=f"RB4011-Sector{rng.randint(1, 40)}",
+        signal_strength=rng.randint(40, 100),
+        latitude=20.0 + rng.random() * 2,
+        longitude=-88.0 + rng.random() * 1.5,
+        status=rng.choices(list(CustomerStatus), k=1)[0],
+        payment_status=rng.choices(
+            [PaymentStatus.CURRENT, PaymentStatus.OVERDUE], weights=[85, 15]
+        )[0],
+        created_at=created,
+        updated_at=created,
+        last_payment=created + timedelta(days=rng.randint(0, 60)),
+        total_paid=fee * rng.randint(0, 24),
+        balance_due=fee if rng.random() < 0.15 else 0.0,
+    )
+
+
+def make_customers(count: int, seed: int = 42) -> Iterator[Customer]:
+    """Yield ``count`` synthetic customers with ids "1".."count" """
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        yield make_customer(i, rng)
+
+
+def load_customers(count: int, seed: int = 42, index: bool = True) -> InMemoryCustomerRepository:
+    """Install a fresh in-memory repository filled with synthetic customers.
+
+    With index=False only the raw dict is filled, for benchmarks that build
+    a single structure themselves at sizes where the full set of indexes
+    would take too long to populate.
+    """
+    repository = InMemoryCustomerRepository()
+    set_customer_repository(repository)
+    for customer in make_customers(count, seed):
+        if index:
+            repository.insert_sync(customer)
+        else:
+            repository.customers[customer.id] = customer
+    return repository
+
+
+def run_sync(coroutine):
+    """Drive a coroutine that never suspends (in-memory repository calls)
+    without the per-call overhead of an event loop"""
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("coroutine suspended; use asyncio.run instead")
+
+
+def best_of(fn: Callable, repeat: int = 5) -> float:
+    """Best wall time of ``repeat`` runs, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def print_table(title: str, rows: Dict[str, tuple]):
+    """Print a benchmark result table: label -> (baseline_ms, new_ms)"""
+    print(f"\n{title}")
+    print(f"{'case':<40} {'baseline ms':>12} {'new ms':>10} {'speedup':>9}")
+    for label, (baseline, new) in rows.items():
+        speedup = baseline / new if new else float("inf")
+        print(f"{label:<40} {baseline:>12.3f} {new:>10.3f} {speedup:>8.1f}x")
@@ -30,6 +30,18 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Rate limiting (added before CORS so that refusals still get CORS headers)
+from app.core.config import RATE_LIMIT_ENABLED
+if RATE_LIMIT_ENABLED:
+    from app.middleware.rate_limiting import RateLimitMiddleware
+    app.add_middleware(RateLimitMiddleware)
+
+# Request latency for the system metrics (outside rate limiting, so 429s count)
+from app.core.config import METRICS_ENABLED
+if METRICS_ENABLED:
+    from app.middleware.request_metrics import RequestMetricsMiddleware
+    app.add_middleware(RequestMetricsMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -43,15 +55,44 @@ app.add_middleware(
 try:
     from app.api.auth.router import router as auth_router
     from app.api.v1.router import router as api_router_v1
-    from app.services.customer_service import init_customer_service
+    from app.services.customer_service import init_customer_service, close_customer_service
+    from app.services.customer_suspension import start_auto_suspension, stop_auto_suspension
+    from app.services.customer_billing import cancel_billing_runs
+    from app.middleware.rate_limiting import close_rate_limiter
+    from app.services.dashboard_cache import start_dashboard_cache, stop_dashboard_cache
+    from app.services.dashboard_stream import stop_dashboard_stream
+    from app.services.system_metrics import start_system_metrics, stop_system_metrics
+    from app.services.customer_rollups import start_customer_rollups, stop_customer_rollups
     
     # Include routers
     app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
     app.include_router(api_router_v1, prefix="/api/v1", tags=["API v1"])
     
-    # Initialize demo data
-    customer_count = init_customer_service()
-    logger.info(f"✅ CRM modules loaded successfully - {customer_count} demo customers")
+    # Initialize customer store (and demo data) once the event loop is running
+    @app.on_event("startup")
+    async def startup_customer_service():
+        customer_count = await init_customer_service()
+        logger.info(f"✅ Customer store ready - {customer_count} customers")
+        start_dashboard_cache()
+        await start_customer_rollups()
+        if METRICS_ENABLED:
+            start_system_metrics()
+        scheduler = await start_auto_suspension()
+        if scheduler is not None:
+            logger.info(f"✅ Auto-suspension on - {len(scheduler)} overdue customers scheduled")
+    
+    @app.on_event("shutdown")
+    async def shutdown_customer_service():
+        await cancel_billing_runs()  # resumed from their checkpoints when started again
+        await stop_dashboard_stream()
+        await stop_system_metrics()
+        await stop_dashboard_cache()
+        await stop_auto_suspension()
+        stop_customer_rollups()  # after the last changes, so the saved rollups include them
+        await close_customer_service()
+        await close_rate_limiter()
+    
+    logger.info("✅ CRM modules loaded successfully")
     ADVANCED_MODE = True
     
 except ImportError as e:
@@ -273,5 +314,6 @@ if __name__ == "__main__":
         app,
         host="127.0.0.1",
         port=8000,
-        log_level="info"
+        log_level="info",
+        timeout_graceful_shutdown=5  # dashboard streams stay open until closed
     )
\ No newline at end of file
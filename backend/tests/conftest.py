@@ -0,0 +1,89 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.security import RevocationList, TokenCache, set_revocation_list, set_token_cache
+from app.models.customer import Customer, CustomerStatus, PaymentStatus, ServiceType
+from app.services import auth_service
+from app.services.customer_repository import (
+    InMemoryCustomerRepository, get_customer_repository, set_customer_repository
+)
+
+CITIES = ["Cancún", "Playa del Carmen", "Cozumel", "Tulum", "Mérida"]
+PLANS = [
+    ("Fibra Hogar 50 Mbps", ServiceType.FIBER, 549.00),
+    ("Fibra Premium 100 Mbps", ServiceType.FIBER, 899.00),
+    ("Wireless Básico 25 Mbps", ServiceType.WIRELESS, 399.00),
+    ("Híbrido Empresarial 75 Mbps", ServiceType.HYBRID, 999.00),
+]
+NAMES = ["María González", "Carlos Mendoza", "Ana Vargas", "Roberto Silva", "Patricia López", "José Pérez"]
+
+
+def make_customer(i: int, rng: random.Random = None, **overrides) -> Customer:
+    """One customer with id ``i``; fields are drawn from ``rng`` (seeded by
+    ``i`` when not given) and can be overridden"""
+    rng = rng or random.Random(i)
+    plan_name, service_type, fee = rng.choice(PLANS)
+    created = datetime(2025, 1, 1) + timedelta(days=rng.randint(0, 600), seconds=i)
+    fields = dict(
+        id=str(i),
+        customer_number=f"N2P{created.year}{i:04d}",
+        name=f"{rng.choice(NAMES)} {i}",
+        email=f"customer{i}@email.com",
+        phone=f"+52 998 {rng.randint(100, 999)} {i % 10000:04d}",
+        address=f"Calle {rng.randint(1, 200)} #{rng.randint(1, 999)}",
+        city=rng.choice(CITIES),
+        state="Quintana Roo",
+        zip_code="77500",
+        service_type=service_type,
+        plan_name=plan_name,
+        monthly_fee=fee,
+        ip_address=f"10.0.{(i >> 8) & 255}.{i & 255}",
+        mac_address=":".join(f"{(i >> s) & 255:02X}" for s in (40, 32, 24, 16, 8, 0)),
+        router_name=f"RB4011-Sector{rng.randint(1, 5)}",
+        latitude=20.0 + rng.random(),
+        longitude=-87.5 + rng.random(),
+        status=rng.choice(list(CustomerStatus)),
+        payment_status=rng.choice([PaymentStatus.CURRENT, PaymentStatus.OVERDUE]),
+        created_at=created,
+        updated_at=created,
+        total_paid=fee * rng.randint(0, 12),
+        balance_due=fee if rng.random() < 0.3 else 0.0,
+    )
+    fields.update(overrides)
+    return Customer(**fields)
+
+
+def make_customers(count: int, seed: int = 7, start: int = 1):
+    rng = random.Random(seed)
+    return [make_customer(i, rng) for i in range(start, start + count)]
+
+
+@pytest.fixture
+def repository():
+    """A fresh in-memory repository installed as the process-wide one"""
+    previous = get_customer_repository()
+    repository = InMemoryCustomerRepository()
+    set_customer_repository(repository)
+    yield repository
+    set_customer_repository(previous)
+
+
+@pytest.fixture
+def auth():
+    """Fresh token cache and revocation list; the demo users are restored
+    afterwards"""
+    users = {username: dict(fields) for username, fields in auth_service.fake_users_db.items()}
+    set_token_cache(TokenCache())
+    set_revocation_list(RevocationList())
+    yield
+    auth_service.fake_users_db.clear()
+    auth_service.fake_users_db.update(users)
+    set_token_cache(None)
+    set_revocation_list(None)
+
+
+def login_as(username: str, session_id: str = None) -> auth_service.TokenPair:
+    """The tokens a successful login of a demo user returns (without bcrypt)"""
+    return auth_service._issue_tokens(auth_service.get_user(username), session_id or auth_service._new_id())
@@ -0,0 +1,159 @@
+import os
+import random
+import zipfile
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytest
+
+from app.models.customer import CustomerStatus
+from app.services.customer_billing import (
+    CHARGE_COLUMNS, BillingRun, billing_period, compute_charges
+)
+from app.services.customer_invoices import read_chunk, render_chunk
+from app.services.customer_repository import create_customer_repository
+
+from conftest import make_customer
+
+PERIOD = "2026-02"
+TAX_RATE = 0.16
+
+
+def cents(value: float) -> float:
+    return float(Decimal(repr(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+
+
+def expected_charges(customers, period=PERIOD, tax_rate=TAX_RATE):
+    """Per-customer reference: {id: (subtotal, tax, total, amount_due)}"""
+    _, start, end = billing_period(period)
+    days = (end - start).days
+    charges = {}
+    for c in customers:
+        if c.status != CustomerStatus.ACTIVE:
+            continue
+        first_day = (c.installation_date.date() - start.date()).days if c.installation_date else 0
+        subtotal = cents(c.monthly_fee * (days - min(max(first_day, 0), days)) / days)
+        if subtotal <= 0:
+            continue
+        tax = cents(subtotal * tax_rate)
+        total = cents(subtotal + tax)
+        charges[c.id] = (subtotal, tax, total, cents(c.balance_due + total))
+    return charges
+
+
+def billing_customers(count, seed=8):
+    rng = random.Random(seed)
+    _, start, _ = billing_period(PERIOD)
+    customers = []
+    for i in range(1, count + 1):
+        installed = rng.choice([
+            None, start - timedelta(days=200), start + timedelta(days=rng.randint(0, 27), hours=rng.randint(0, 23)),
+            start - timedelta(hours=2), start + timedelta(days=40),
+        ])
+        customers.append(make_customer(
+            i, rng, installation_date=installed, monthly_fee=rng.choice([0.0, 399.0, 549.99, 1000.005]),
+            balance_due=rng.choice([0.0, 0.0, 120.5]),
+        ))
+    return customers
+
+
+async def test_vectorized_charges_match_the_per_customer_computation(repository):
+    customers = billing_customers(600)
+    await repository.insert_many(customers)
+    # Column arrays follow later edits
+    await repository.update("5", {"status": CustomerStatus.ACTIVE, "monthly_fee": 777.77, "installation_date": None})
+    await repository.delete("6")
+
+    ids, columns = await repository.active_columns(CHARGE_COLUMNS)
+    _, start, end = billing_period(PERIOD)
+    charges = compute_charges(columns, start, end, TAX_RATE)
+    found = {
+        ids[row]: (subtotal, tax, total, amount_due)
+        for row, subtotal, tax, total, amount_due in zip(
+            charges["rows"].tolist(), charges["subtotal"].tolist(), charges["tax"].tolist(),
+            charges["total"].tolist(), charges["amount_due"].tolist(),
+        )
+    }
+    assert found == expected_charges(repository.customers.values())
+    assert "5" in found
+
+
+async def test_a_run_posts_each_changed_balance_once(repository, tmp_path):
+    await repository.insert_many(billing_customers(400))
+    before = {c.id: c.model_copy() for c in repository.customers.values()}
+    expected = expected_charges(before.values())
+
+    run = BillingRun(PERIOD, str(tmp_path), tax_rate=TAX_RATE, chunk_size=64, formats=[])
+    state = await run.run()
+    assert state["status"] == "completed"
+    assert state["invoices"] == len(expected) and state["chunks"] == -(-len(expected) // 64)
+    assert state["totals"]["total"] == pytest.approx(sum(total for _, _, total, _ in expected.values()))
+
+    for customer_id, customer in repository.customers.items():
+        if customer_id in expected:
+            assert customer.balance_due == expected[customer_id][3]
+            assert customer.updated_at > before[customer_id].updated_at
+        else:
+            assert customer == before[customer_id]
+
+    # Starting a completed period again bills nobody twice
+    again = await BillingRun(PERIOD, str(tmp_path), tax_rate=TAX_RATE).run()
+    assert again["invoices"] == state["invoices"]
+    assert {i: c.balance_due for i, c in repository.customers.items()} == \
+        {i: expected[i][3] if i in expected else before[i].balance_due for i in before}
+
+
+async def test_a_resumed_post_stage_reposts_absolute_amounts(repository, tmp_path):
+    await repository.insert_many(billing_customers(200))
+    expected = expected_charges(repository.customers.values())
+
+    run = BillingRun(PERIOD, str(tmp_path), tax_rate=TAX_RATE, chunk_size=50, formats=[])
+    await run.run()
+    # As if the process died after posting the first chunk
+    run.state.update(status="interrupted", posted=1)
+    run._save()
+    await BillingRun(PERIOD, str(tmp_path)).run()
+    assert {i: repository.customers[i].balance_due for i in expected} == {i: v[3] for i, v in expected.items()}
+
+
+async def test_rendered_invoices_carry_the_computed_amounts(repository, tmp_path):
+    await repository.insert_many(billing_customers(30))
+    expected = expected_charges(repository.customers.values())
+    run = BillingRun(PERIOD, str(tmp_path), tax_rate=TAX_RATE, chunk_size=100, formats=[])
+    await run.run()
+
+    chunk_path = os.path.join(run.directory, "charges-00000.pkl")
+    chunk = read_chunk(chunk_path)
+    assert chunk["id"] == sorted(expected, key=int)
+    archive = os.path.join(tmp_path, "invoices.zip")
+    issuer = {"period": PERIOD, "issued_at": datetime(2026, 2, 1).isoformat(), "currency": "MXN",
+              "tax_rate": TAX_RATE, "company": "N2P", "rfc": "NDP000101AAA"}
+    assert render_chunk(chunk_path, archive, ["xml"], issuer) == len(expected)
+    customer_id = chunk["id"][0]
+    customer = repository.customers[customer_id]
+    with zipfile.ZipFile(archive) as files:
+        xml = files.read(f"{customer.customer_number}.xml").decode()
+    assert f'Total="{expected[customer_id][2]:.2f}"' in xml
+
+
+async def test_sql_store_provides_the_same_charge_columns(tmp_path):
+    pytest.importorskip("aiosqlite")
+    customers = billing_customers(150)
+    memory = create_customer_repository("memory")
+    sql = create_customer_repository("sql", url=f"sqlite:///{tmp_path / 'customers.db'}")
+    for repository in (memory, sql):
+        await repository.initialize()
+        await repository.insert_many([c.model_copy() for c in customers])
+    try:
+        answers = []
+        for repository in (memory, sql):
+            ids, columns = await repository.active_columns(CHARGE_COLUMNS)
+            answers.append({
+                customer_id: tuple(columns[name][row].item() for name in CHARGE_COLUMNS)
+                for row, customer_id in enumerate(ids)
+            })
+        assert answers[0] == answers[1]
+        assert [c.id for c in await sql.get_many(["3", "999", "1"])] == ["3", "1"]
+    finally:
+        for repository in (memory, sql):
+            await repository.close()
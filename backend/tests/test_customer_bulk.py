@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from app.models.customer import CustomerFilter, CustomerStatus, CustomerUpdate, PaymentStatus, ServiceType
+from app.services.customer_bulk import CustomerBulkUpdate, bulk_update_customers
+from app.services.customer_network import parse_network
+from app.services.customer_repository import InMemoryCustomerRepository
+from app.services.customer_stats import compute_customer_stats
+
+from conftest import make_customers
+
+FILTERS = [
+    CustomerFilter(status=CustomerStatus.SUSPENDED),
+    CustomerFilter(city="cancun", service_type=ServiceType.FIBER),
+    CustomerFilter(plan_name="premium", payment_status=PaymentStatus.OVERDUE),
+]
+
+
+async def assert_indexes_match_a_rebuild(repository):
+    """Every secondary index answers like one built from scratch"""
+    rebuilt = InMemoryCustomerRepository()
+    await rebuilt.insert_many([c.model_copy() for c in repository.customers.values()])
+    for filters in FILTERS:
+        assert {c.id for c in await repository.filter(filters)} == {c.id for c in await rebuilt.filter(filters)}
+    for query in ("premium", "suspended", "cancun 12", "Wireless"):
+        assert [c.id for c in await repository.search(query, 30)] == [c.id for c in await rebuilt.search(query, 30)]
+    assert await repository.stats() == compute_customer_stats(repository.customers.values())
+    assert await repository.revenue_summary() == await rebuilt.revenue_summary()
+    network = parse_network("10.0.1.0/24")
+    assert [c.id for c in (await repository.in_network(network, 50))[1]] == \
+        [c.id for c in (await rebuilt.in_network(network, 50))[1]]
+
+
+async def test_bulk_update_by_ids_reports_missing_and_keeps_indexes_consistent(repository):
+    await repository.insert_many(make_customers(600))
+    targets = random.Random(5).sample(list(repository.customers), 150)
+    report = await bulk_update_customers(CustomerBulkUpdate(
+        customer_ids=targets + ["9999", targets[0]],
+        changes=CustomerUpdate(status=CustomerStatus.SUSPENDED, plan_name="Fibra Premium 200 Mbps", monthly_fee=1199.0),
+    ))
+    assert (report.matched, report.updated, report.failed) == (150, 150, 1)
+    assert [f.id for f in report.failures] == ["9999"]
+    assert sorted(report.changed_fields) == ["monthly_fee", "plan_name", "status"]
+
+    for customer_id in targets:
+        customer = repository.customers[customer_id]
+        assert (customer.status, customer.monthly_fee) == (CustomerStatus.SUSPENDED, 1199.0)
+    untouched = set(repository.customers) - set(targets)
+    assert all(repository.customers[i].plan_name != "Fibra Premium 200 Mbps" for i in untouched)
+    await assert_indexes_match_a_rebuild(repository)
+
+
+async def test_bulk_update_by_filter_changes_exactly_the_matching_rows(repository):
+    await repository.insert_many(make_customers(600))
+    before = {c.id: c.model_copy() for c in repository.customers.values()}
+    filters = CustomerFilter(city="Cancun", payment_status=PaymentStatus.OVERDUE)
+    expected = {c.id for c in await repository.filter(filters)}
+
+    report = await bulk_update_customers(CustomerBulkUpdate(
+        filter=filters, changes=CustomerUpdate(status=CustomerStatus.SUSPENDED, city="Cancún Centro"),
+    ))
+    assert report.matched == report.updated == len(expected) > 0
+    changed = {i for i, c in repository.customers.items() if c != before[i]}
+    assert changed == expected
+    assert all(repository.customers[i].updated_at > before[i].updated_at for i in expected)
+    assert not await repository.filter(filters)
+    await assert_indexes_match_a_rebuild(repository)
+
+
+@pytest.mark.parametrize("request_fields, message", [
+    (dict(changes=CustomerUpdate(status=CustomerStatus.SUSPENDED)), "either"),
+    (dict(customer_ids=["1"], filter=CustomerFilter(city="Tulum"),
+          changes=CustomerUpdate(status=CustomerStatus.SUSPENDED)), "either"),
+    (dict(filter=CustomerFilter(), changes=CustomerUpdate(status=CustomerStatus.SUSPENDED)), "every customer"),
+    (dict(customer_ids=["1"], changes=CustomerUpdate()), "No fields"),
+])
+async def test_bulk_update_rejects_ambiguous_or_empty_requests(repository, request_fields, message):
+    await repository.insert_many(make_customers(5))
+    with pytest.raises(ValueError, match=message):
+        await bulk_update_customers(CustomerBulkUpdate(**request_fields))
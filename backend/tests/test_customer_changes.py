@@ -0,0 +1,104 @@
+import json
+import random
+
+import pytest
+
+from app.models.customer import CustomerStatus, PaymentStatus
+from app.services.customer_changes import ChangeLogTruncated, CustomerChangeLog
+
+from conftest import make_customer, make_customers
+
+
+@pytest.fixture
+def change_log(tmp_path, repository):
+    change_log = CustomerChangeLog(str(tmp_path), segment_events=50, max_segments=1000)
+    change_log.open()
+    repository.add_change_listener(change_log.append)
+    yield change_log
+    change_log.close()
+
+
+def follow(change_log, state, since=0, page_size=37):
+    """Apply every event after ``since`` to ``state`` the way a consumer would"""
+    while True:
+        page = change_log.read(since, page_size)
+        assert json.loads(page.to_json()) == {
+            "events": page.events(), "next_offset": page.next_offset,
+            "earliest_offset": page.earliest_offset, "end_offset": page.end_offset,
+        }
+        for offset, event in enumerate(page.events(), since):
+            assert event["offset"] == offset
+            if event["op"] == "create":
+                state[event["id"]] = event["customer"]
+            elif event["op"] == "update":
+                for field, (_, new) in event["changes"].items():
+                    state[event["id"]][field] = new
+            else:
+                del state[event["id"]]
+        if not page.lines:
+            return since
+        since = page.next_offset
+
+
+async def test_a_consumer_following_the_feed_ends_up_with_the_store(repository, change_log):
+    rng = random.Random(4)
+    await repository.insert_many(make_customers(120))
+    state = {}
+    since = follow(change_log, state)
+
+    for step in range(400):
+        customer_id = rng.choice(list(repository.customers))
+        roll = rng.random()
+        if roll < 0.1:
+            await repository.delete(customer_id)
+        elif roll < 0.2:
+            await repository.insert_many([make_customer(1000 + step)])
+        elif roll < 0.3:
+            await repository.update_many(rng.sample(list(repository.customers), 20), {"status": CustomerStatus.SUSPENDED})
+        else:
+            await repository.update(customer_id, {
+                "payment_status": rng.choice(list(PaymentStatus)), "monthly_fee": rng.choice([399.0, 549.5]),
+                "notes": rng.choice([None, 'says "hi"\nñ']),
+            })
+        if step % 97 == 0:
+            since = follow(change_log, state, since)
+    follow(change_log, state, since)
+
+    expected = {c.id: json.loads(c.model_dump_json(exclude_none=True)) for c in repository.customers.values()}
+    assert {i: {k: v for k, v in fields.items() if v is not None} for i, fields in state.items()} == expected
+
+
+async def test_reads_stop_at_the_end_and_report_truncation(tmp_path, repository):
+    change_log = CustomerChangeLog(str(tmp_path), segment_events=10, max_segments=3)
+    change_log.open()
+    repository.add_change_listener(change_log.append)
+    await repository.insert_many(make_customers(45))
+    assert (change_log.earliest_offset, change_log.next_offset) == (20, 45)
+
+    with pytest.raises(ChangeLogTruncated) as truncated:
+        change_log.read(19)
+    assert truncated.value.earliest_offset == 20
+    page = change_log.read(23, 15)
+    assert [event["id"] for event in page.events()] == [str(i) for i in range(24, 39)]
+    assert page.next_offset == 38
+    end = change_log.read(45)
+    assert (end.lines, end.next_offset, end.end_offset) == ([], 45, 45)
+    assert change_log.read(1000).next_offset == 45
+    change_log.close()
+
+
+async def test_reopening_drops_a_torn_last_line(tmp_path, repository):
+    change_log = CustomerChangeLog(str(tmp_path), segment_events=100)
+    change_log.open()
+    repository.add_change_listener(change_log.append)
+    await repository.insert_many(make_customers(5))
+    change_log.close()
+    with open(change_log._segments[-1].path, "ab") as file:
+        file.write(b'{"offset":5,"ts":"2026-')
+
+    reopened = CustomerChangeLog(str(tmp_path), segment_events=100)
+    reopened.open()
+    assert reopened.next_offset == 5
+    reopened.append([("delete", "3", None)])
+    assert reopened.read(4).events()[1] == {"offset": 5, "ts": reopened.read(5).events()[0]["ts"], "op": "delete", "id": "3"}
+    reopened.close()
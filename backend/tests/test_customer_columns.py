@@ -0,0 +1,116 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+from app.models.customer import CustomerStatus, PaymentStatus
+from app.services import customer_repository
+from app.services.customer_columns import CustomerColumns
+from app.services.customer_service import get_revenue_breakdown, get_revenue_summary
+
+from conftest import CITIES, make_customer, make_customers
+
+
+def expected_summary(customers):
+    active = [c for c in customers if c.status == CustomerStatus.ACTIVE]
+    revenue = sum(c.monthly_fee for c in active)
+    return {
+        "active_customers": len(active),
+        "monthly_revenue": revenue,
+        "average_revenue_per_user": revenue / len(active) if active else 0,
+        "overdue_amount": sum(c.balance_due for c in customers if c.balance_due > 0),
+        "overdue_accounts": sum(1 for c in customers if c.payment_status == PaymentStatus.OVERDUE),
+    }
+
+
+def expected_groups(customers, key):
+    groups = defaultdict(lambda: [0, 0.0, 0.0])
+    for c in customers:
+        if c.status == CustomerStatus.ACTIVE and getattr(c, key) is not None:
+            group = groups[getattr(c, key)]
+            group[0] += 1
+            group[1] += c.monthly_fee
+            group[2] += c.balance_due
+    return {value: (count, revenue, balance) for value, (count, revenue, balance) in groups.items()}
+
+
+def assert_columns_match(summary, groups_by_key, customers):
+    expected = expected_summary(customers)
+    assert summary.keys() == expected.keys()
+    for name, value in expected.items():
+        assert summary[name] == pytest.approx(value)
+    for key, groups in groups_by_key.items():
+        found = {g[key]: (g["customers"], g["monthly_revenue"], g["balance_due"]) for g in groups}
+        assert found.keys() == expected_groups(customers, key).keys()
+        for value, (count, revenue, balance) in expected_groups(customers, key).items():
+            assert found[value][0] == count
+            assert found[value][1:] == pytest.approx((revenue, balance))
+        revenues = [g["monthly_revenue"] for g in groups]
+        assert revenues == sorted(revenues, reverse=True)
+
+
+async def check(repository):
+    customers = list(repository.customers.values())
+    summary = await get_revenue_summary()
+    groups = {key: await get_revenue_breakdown(key) for key in CustomerColumns.GROUP_KEYS}
+    assert_columns_match(summary, groups, customers)
+
+
+async def test_column_analytics_match_the_store_through_writes(repository):
+    rng = random.Random(4)
+    # More rows than the initial capacity, so the arrays grow
+    await repository.insert_many(make_customers(1500))
+    await check(repository)
+
+    for _ in range(400):
+        customer_id = rng.choice(list(repository.customers))
+        action = rng.random()
+        if action < 0.5:
+            await repository.update(customer_id, {
+                "status": rng.choice(list(CustomerStatus)),
+                "monthly_fee": rng.choice([0.0, 399.0, 1299.5]),
+                "city": rng.choice(CITIES + ["Bacalar"]),
+                "router_name": rng.choice([None, "RB-New"]),
+            })
+        elif action < 0.8:
+            await repository.delete(customer_id)
+        else:
+            # Reuses a freed slot
+            await repository.insert(make_customer(int(max(repository.customers, key=int)) + 1))
+    await check(repository)
+
+
+async def test_column_analytics_on_worker_threads_match_the_loop(repository, monkeypatch):
+    await repository.insert_many(make_customers(600))
+    on_loop = (await get_revenue_summary(), await get_revenue_breakdown("city"))
+
+    monkeypatch.setattr(customer_repository, "ANALYTICS_OFFLOAD_ROWS", 100)
+    monkeypatch.setattr(customer_repository, "ANALYTICS_WORKERS", 2)
+    try:
+        assert (await get_revenue_summary(), await get_revenue_breakdown("city")) == on_loop
+        assert repository._analytics_pool is not None
+        with pytest.raises(ValueError):
+            await get_revenue_breakdown("zip_code")
+    finally:
+        await repository.close()
+
+
+def test_detached_columns_are_unaffected_by_later_writes():
+    columns = CustomerColumns()
+    columns.add_many(make_customers(50))
+    copy = columns.detached(("monthly_fee", "status", "balance_due", "city"))
+    before = copy.group_by("city")
+    columns.add(make_customer(1, city="Nueva Ciudad", status=CustomerStatus.ACTIVE, monthly_fee=5000.0))
+    columns.remove("2")
+    assert copy.group_by("city") == before
+
+
+def test_signal_strength_beyond_int16_is_kept_and_beyond_int32_clamped():
+    columns = CustomerColumns()
+    columns.add_many([make_customer(1, signal_strength=40000), make_customer(2, signal_strength=-70),
+                      make_customer(3, signal_strength=2**40), make_customer(4, signal_strength=None)])
+    columns.add(make_customer(5, signal_strength=-2**40))
+    expected = [40000, -70, 2**31 - 1, -1, -2**31]
+    assert columns.columns["signal_strength"][:5].tolist() == expected
+    restored = CustomerColumns.from_arrays(*columns.to_arrays())
+    assert restored.columns["signal_strength"][:5].tolist() == expected
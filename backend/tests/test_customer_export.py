@@ -0,0 +1,59 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from app.models.customer import Customer, CustomerFilter, CustomerStatus
+from app.services.customer_export import export_customers, export_fields
+
+from conftest import make_customers
+
+
+async def collect(**options) -> bytes:
+    return b"".join([chunk async for chunk in export_customers(**options)])
+
+
+async def test_ndjson_export_round_trips_every_customer_in_id_order(repository):
+    await repository.insert_many(make_customers(250))
+    body = await collect(format="ndjson", batch_size=40)
+    exported = [Customer(**json.loads(line)) for line in body.decode().splitlines()]
+    assert exported == sorted(repository.customers.values(), key=lambda c: int(c.id))
+
+
+async def test_csv_export_with_filter_and_projection(repository):
+    await repository.insert_many(make_customers(120))
+    await repository.update("7", {"name": 'Ana "La Jefa", Pérez\nSegunda línea'})
+    filters = CustomerFilter(status=CustomerStatus.ACTIVE)
+    fields = export_fields("name, id,status,name")
+
+    rows = list(csv.reader(io.StringIO((await collect(filters=filters, format="csv", fields=fields, batch_size=16)).decode())))
+
+    assert rows[0] == ["name", "id", "status"]
+    expected = [c for c in repository.customers.values() if c.status == CustomerStatus.ACTIVE]
+    assert rows[1:] == [[c.name, c.id, c.status.value] for c in sorted(expected, key=lambda c: int(c.id))]
+
+
+async def test_gzip_export_decompresses_to_the_plain_export(repository):
+    await repository.insert_many(make_customers(90))
+    plain = await collect(format="csv", batch_size=25)
+    assert gzip.decompress(await collect(format="csv", gzip=True, batch_size=25)) == plain
+
+
+async def test_export_sees_rows_written_during_the_walk_at_most_once(repository):
+    await repository.insert_many(make_customers(100))
+    seen = []
+    async for chunk in export_customers(format="ndjson", batch_size=10):
+        seen.extend(json.loads(line)["id"] for line in chunk.decode().splitlines())
+        if len(seen) == 30:
+            await repository.delete("5")   # already sent
+            await repository.delete("80")  # not sent yet
+            await repository.insert_many(make_customers(5, start=101))
+    assert len(seen) == len(set(seen))
+    assert "80" not in seen and "105" in seen
+
+
+def test_unknown_export_fields_are_rejected():
+    with pytest.raises(ValueError):
+        export_fields("name,password")
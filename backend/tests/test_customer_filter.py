@@ -0,0 +1,84 @@
+import itertools
+import random
+
+from app.models.customer import CustomerFilter, CustomerStatus, PaymentStatus, ServiceType
+from app.services.customer_search import fold_text
+from app.services.customer_service import filter_customers
+
+from conftest import CITIES, make_customer, make_customers
+
+FILTERS = [
+    CustomerFilter(),
+    CustomerFilter(status=CustomerStatus.ACTIVE),
+    CustomerFilter(service_type=ServiceType.FIBER, payment_status=PaymentStatus.OVERDUE),
+    CustomerFilter(overdue_only=True, status=CustomerStatus.SUSPENDED),
+    CustomerFilter(city="cancun"),
+    CustomerFilter(city="  MÉRIDA ", status=CustomerStatus.PENDING),
+    CustomerFilter(plan_name="fibra"),
+    CustomerFilter(city="Tulum", plan_name="wireless", service_type=ServiceType.WIRELESS),
+]
+
+
+def linear_scan(customers, filters: CustomerFilter):
+    """What filter_customers returned before the indexes: a scan in store order"""
+    found = []
+    for c in customers:
+        if filters.status and c.status != filters.status:
+            continue
+        if filters.service_type and c.service_type != filters.service_type:
+            continue
+        if filters.payment_status and c.payment_status != filters.payment_status:
+            continue
+        if filters.overdue_only and c.payment_status != PaymentStatus.OVERDUE:
+            continue
+        if filters.city and fold_text(c.city) != fold_text(filters.city.strip()):
+            continue
+        if filters.plan_name and filters.plan_name.lower() not in c.plan_name.lower():
+            continue
+        found.append(c)
+    return found
+
+
+async def assert_matches_scan(repository):
+    for filters in FILTERS:
+        expected = [c.id for c in linear_scan(repository.customers.values(), filters)]
+        assert [c.id for c in await filter_customers(filters)] == expected, filters
+
+
+async def test_filter_matches_linear_scan_through_writes(repository):
+    rng = random.Random(1)
+    await repository.insert_many(make_customers(300))
+    await assert_matches_scan(repository)
+
+    ids = itertools.count(301)
+    for _ in range(200):
+        action = rng.random()
+        existing = list(repository.customers)
+        if action < 0.3:
+            await repository.insert(make_customer(next(ids)))
+        elif action < 0.8:
+            await repository.update(rng.choice(existing), {
+                "status": rng.choice(list(CustomerStatus)),
+                "city": rng.choice(CITIES + ["CANCÚN", "tulum "]),
+                "payment_status": rng.choice(list(PaymentStatus)),
+            })
+        else:
+            await repository.delete(rng.choice(existing))
+    await assert_matches_scan(repository)
+
+    await repository.update_many(list(repository.customers)[:50], {"status": CustomerStatus.SUSPENDED})
+    await assert_matches_scan(repository)
+
+
+async def test_city_filter_ignores_case_and_accents(repository):
+    await repository.insert_many([
+        make_customer(1, city="Cancún"),
+        make_customer(2, city="cancun"),
+        make_customer(3, city="Mérida"),
+    ])
+    for query in ("cancun", "Cancún", "CANCUN", " cancún "):
+        assert [c.id for c in await filter_customers(CustomerFilter(city=query))] == ["1", "2"]
+
+    await repository.update("1", {"city": "Mérida"})
+    assert [c.id for c in await filter_customers(CustomerFilter(city="merida"))] == ["1", "3"]
+    assert [c.id for c in await filter_customers(CustomerFilter(city="cancun"))] == ["2"]
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from app.services.customer_geo import GeoGridIndex, haversine_km
+from app.services.customer_service import (
+    get_customers_in_bbox, get_customers_within_radius, get_nearest_customers
+)
+
+from conftest import make_customer, make_customers
+
+POINTS = [(20.5, -87.0), (20.0, -87.5), (21.2, -86.8), (19.0, -89.0)]
+
+
+def located(repository):
+    return [c for c in repository.customers.values() if c.latitude is not None and c.longitude is not None]
+
+
+async def assert_matches_brute_force(repository):
+    customers = located(repository)
+    for min_lat, min_lon, max_lat, max_lon in [(20.2, -87.3, 20.6, -86.9), (19, -89, 22, -86), (20.9, -87.0, 20.91, -86.99)]:
+        total, found = await get_customers_in_bbox(min_lat, min_lon, max_lat, max_lon, limit=10_000)
+        expected = {c.id for c in customers if min_lat <= c.latitude <= max_lat and min_lon <= c.longitude <= max_lon}
+        assert total == len(expected) and {c.id for c in found} == expected
+
+    for lat, lon in POINTS:
+        distances = sorted((haversine_km(lat, lon, c.latitude, c.longitude), c.id) for c in customers)
+        total, found = await get_customers_within_radius(lat, lon, 25.0, limit=10_000)
+        expected = [(d, i) for d, i in distances if d <= 25.0]
+        assert total == len(expected)
+        assert [(pytest.approx(d), c.id) for d, c in found] == expected
+
+        nearest = await get_nearest_customers(lat, lon, k=7)
+        assert [c.id for _, c in nearest] == [i for _, i in distances[:7]]
+        capped = await get_nearest_customers(lat, lon, k=7, max_km=10.0)
+        assert [c.id for _, c in capped] == [i for d, i in distances[:7] if d <= 10.0]
+
+
+async def test_geo_queries_match_brute_force_through_moves(repository):
+    rng = random.Random(9)
+    await repository.insert_many(make_customers(400))
+    await repository.insert_many([make_customer(i, latitude=None, longitude=None) for i in range(401, 411)])
+    await assert_matches_brute_force(repository)
+
+    for _ in range(150):
+        customer_id = rng.choice(list(repository.customers))
+        if rng.random() < 0.2:
+            await repository.delete(customer_id)
+        elif rng.random() < 0.1:
+            await repository.update(customer_id, {"latitude": None})
+        else:
+            await repository.update(customer_id, {"latitude": 20 + rng.random(), "longitude": -87.5 + rng.random()})
+    await assert_matches_brute_force(repository)
+
+
+def test_nearest_reaches_far_away_customers():
+    index = GeoGridIndex()
+    index.add(make_customer(1, latitude=-33.45, longitude=-70.66))
+    index.add(make_customer(2, latitude=40.41, longitude=-3.70))
+    assert [i for _, i in index.nearest(21.16, -86.85, k=1)] == ["1"]
+    assert [i for _, i in index.nearest(21.16, -86.85, k=5)] == ["1", "2"]
+    assert index.nearest(21.16, -86.85, k=1, max_km=100) == []
+
+
+async def test_inverted_bbox_is_rejected(repository):
+    with pytest.raises(ValueError):
+        await get_customers_in_bbox(21, -86, 20, -87)
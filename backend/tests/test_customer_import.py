@@ -0,0 +1,78 @@
+import json
+import random
+
+from app.models.customer import CustomerStatus
+from app.services.customer_import import import_customers
+from app.services.customer_search import query_terms, score_document, search_document
+from app.services.customer_service import search_customers
+
+from conftest import make_customer, make_customers
+
+HEADER = "name,email,phone,address,city,state,zip_code,service_type,plan_name,monthly_fee,router_name,extra"
+
+
+async def chunks(payload: bytes, size: int = 7):
+    for start in range(0, len(payload), size):
+        yield payload[start:start + size]
+
+
+def csv_row(i: int, **overrides) -> str:
+    row = {
+        "name": f"Cliente {i}", "email": f"c{i}@email.com", "phone": f"998 555 {i:04d}",
+        "address": f"Calle {i}", "city": "Cancún", "state": "Quintana Roo", "zip_code": "77500",
+        "service_type": "fiber", "plan_name": "Fibra Hogar 50 Mbps", "monthly_fee": "549.0",
+        "router_name": "RB-1", "extra": "ignored",
+    }
+    row.update(overrides)
+    return ",".join(row.values())
+
+
+async def test_csv_import_creates_valid_rows_and_reports_invalid_ones(repository):
+    lines = [HEADER, csv_row(1), csv_row(2, monthly_fee="lots"), "", csv_row(3, address='"Calle 3\nInterior B"'),
+             csv_row(4, service_type="dsl"), "a,b,c,d,e,f,g,h,i,j,k,l,m"]
+    payload = "\n".join(lines).encode()
+
+    report = await import_customers(chunks(payload), "csv", batch_size=2)
+
+    assert (report.total_rows, report.imported, report.failed) == (5, 2, 3)
+    assert [error.row for error in report.errors] == [3, 7, 8]
+    assert report.errors[0].errors[0]["field"] == "monthly_fee"
+    assert report.ignored_columns == ["extra"]
+    customers = await repository.list_all()
+    assert [c.name for c in customers] == ["Cliente 1", "Cliente 3"]
+    assert customers[1].address == "Calle 3\nInterior B"
+    assert all(c.status == CustomerStatus.PENDING for c in customers)
+    assert len({c.customer_number for c in customers}) == 2
+
+
+async def test_ndjson_import_and_utf8_abort(repository):
+    rows = [json.dumps({"name": "Ana", "phone": "1", "address": "x", "city": "Tulum", "state": "QR",
+                        "zip_code": "1", "service_type": "wireless", "plan_name": "W", "monthly_fee": 399})]
+    payload = ("\n".join(rows + ["[1, 2]", "{not json"]) + "\n").encode() + b"\xff\xfe broken\n"
+
+    report = await import_customers(chunks(payload, size=1), "ndjson")
+
+    assert report.imported == 1 and report.failed == 2
+    assert report.aborted and "UTF-8" in report.aborted
+    assert [c.city for c in await repository.list_all()] == ["Tulum"]
+
+
+async def test_imported_customers_are_searchable_like_created_ones(repository):
+    rng = random.Random(7)
+    await repository.insert(make_customer(1, name="María López"))
+    # Bulk inserts defer their search postings; reads and later writes must
+    # see the same index as one built customer by customer
+    await repository.insert_many(make_customers(300, start=2))
+    await repository.update("5", {"name": "María Zapata"})
+    await repository.insert_many(make_customers(100, start=302))
+    await repository.delete("303")
+    await repository.finish_bulk_load()
+    for i in rng.sample(range(310, 400), 10):
+        await repository.update(str(i), {"city": "Bacalar"})
+
+    for query in ("maria", "zapata", "bacalar", "n2p", "calle 1"):
+        terms = query_terms(query)
+        expected = [
+            c.id for c in repository.customers.values() if score_document(search_document(c), terms)
+        ]
+        assert sorted(c.id for c in await search_customers(query, 1000)) == sorted(expected), query
@@ -0,0 +1,86 @@
+import ipaddress
+import random
+
+import pytest
+
+from app.services.customer_network import normalize_mac, parse_ip
+from app.services.customer_service import (
+    get_customers_by_ip, get_customers_by_mac, get_customers_in_network, resolve_network_addresses
+)
+
+from conftest import make_customer, make_customers
+
+BLOCKS = ["10.0.0.0/8", "10.0.1.0/24", "10.0.0.128/25", "10.0.2.64/27", "10.0.0.5/32", "192.168.0.0/16", "2001:db8::/32"]
+
+
+def address_order(repository, network):
+    inside = [
+        (parse_ip(c.ip_address).packed, int(c.id)) for c in repository.customers.values()
+        if parse_ip(c.ip_address) is not None and parse_ip(c.ip_address) in network
+    ]
+    return [str(customer_id) for _, customer_id in sorted(inside)]
+
+
+async def assert_matches_brute_force(repository):
+    customers = list(repository.customers.values())
+    for customer in random.Random(3).sample(customers, 20):
+        if parse_ip(customer.ip_address) is not None:
+            expected = {c.id for c in customers if parse_ip(c.ip_address) == parse_ip(customer.ip_address)}
+            assert {c.id for c in await get_customers_by_ip(customer.ip_address)} == expected
+        mac = normalize_mac(customer.mac_address)
+        if mac is not None:
+            expected = {c.id for c in customers if normalize_mac(c.mac_address) == mac}
+            assert {c.id for c in await get_customers_by_mac(mac.upper())} == expected
+
+    for block in BLOCKS:
+        network = ipaddress.ip_network(block)
+        expected = address_order(repository, network)
+        total, found = await get_customers_in_network(block, limit=10_000)
+        assert total == len(expected) and [c.id for c in found] == expected
+        total, found = await get_customers_in_network(block, limit=5)
+        assert total == len(expected) and [c.id for c in found] == expected[:5]
+
+
+async def test_network_lookups_match_brute_force_through_updates(repository):
+    rng = random.Random(11)
+    customers = make_customers(700)
+    # A few shared addresses, IPv6 and unparseable values
+    customers += [make_customer(701, ip_address="10.0.1.7", mac_address="00-00-00-00-01-07")]
+    customers += [make_customer(702, ip_address="2001:db8::1"), make_customer(703, ip_address="not-an-ip", mac_address="zz")]
+    await repository.insert_many(customers)
+    await assert_matches_brute_force(repository)
+
+    for _ in range(200):
+        customer_id = rng.choice(list(repository.customers))
+        roll = rng.random()
+        if roll < 0.2:
+            await repository.delete(customer_id)
+        elif roll < 0.6:
+            await repository.update(customer_id, {"ip_address": f"10.0.{rng.randint(0, 3)}.{rng.randint(0, 255)}"})
+        elif roll < 0.8:
+            await repository.update(customer_id, {"mac_address": f"aabb.ccdd.{rng.randint(0, 0xFFFF):04x}"})
+        else:
+            await repository.update(customer_id, {"ip_address": None, "plan_name": "Fibra Hogar 50 Mbps"})
+    await assert_matches_brute_force(repository)
+
+
+async def test_mac_lookup_ignores_separators_and_case(repository):
+    await repository.insert_many([make_customer(1, mac_address="AA:BB:CC:DD:EE:01")])
+    for spelling in ("aa-bb-cc-dd-ee-01", "aabb.ccdd.ee01", "AABBCCDDEE01"):
+        assert [c.id for c in await get_customers_by_mac(spelling)] == ["1"]
+    with pytest.raises(ValueError):
+        await get_customers_by_mac("AA:BB:CC")
+    with pytest.raises(ValueError):
+        await get_customers_by_ip("10.0.0.300")
+
+
+async def test_resolve_reports_invalid_and_unmatched(repository):
+    await repository.insert_many(make_customers(10))
+    result = await resolve_network_addresses(
+        ["10.0.0.1", " 10.0.0.2", "10.9.9.9", "bogus"], ["00:00:00:00:00:03", "00:00:00:00:00:63", "xx"]
+    )
+    assert [c.id for c in result["ip_addresses"]["10.0.0.1"]] == ["1"]
+    assert [c.id for c in result["ip_addresses"][" 10.0.0.2"]] == ["2"]
+    assert [c.id for c in result["mac_addresses"]["00:00:00:00:00:03"]] == ["3"]
+    assert result["invalid"] == ["bogus", "xx"]
+    assert result["unmatched"] == ["10.9.9.9", "00:00:00:00:00:63"]
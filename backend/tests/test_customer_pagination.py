@@ -0,0 +1,83 @@
+import itertools
+import random
+
+import pytest
+
+from app.models.customer import CustomerStatus
+from app.services.customer_index import normalize_key
+from app.services.customer_service import get_customers_page
+
+from conftest import make_customer, make_customers
+
+SORT_KEYS = {
+    "id": lambda c: int(c.id),
+    "created_at": lambda c: (c.created_at, int(c.id)),
+    "name": lambda c: (normalize_key(c.name), int(c.id)),
+}
+
+
+async def walk(sort, descending, limit, between_pages=None):
+    seen, cursor = [], None
+    while True:
+        page, cursor = await get_customers_page(limit=limit, cursor=cursor, sort=sort, descending=descending)
+        seen.extend(c.id for c in page)
+        if cursor is None:
+            return seen
+        if between_pages is not None:
+            await between_pages()
+
+
+@pytest.mark.parametrize("sort", list(SORT_KEYS))
+@pytest.mark.parametrize("descending", [False, True])
+async def test_pages_cover_every_row_once_in_order(repository, sort, descending):
+    await repository.insert_many(make_customers(257))
+    expected = sorted(repository.customers.values(), key=SORT_KEYS[sort], reverse=descending)
+    assert await walk(sort, descending, limit=25) == [c.id for c in expected]
+
+
+@pytest.mark.parametrize("sort", list(SORT_KEYS))
+@pytest.mark.parametrize("descending", [False, True])
+async def test_pages_neither_skip_nor_repeat_rows_while_the_data_changes(repository, sort, descending):
+    rng = random.Random(5)
+    await repository.insert_many(make_customers(300))
+    original = set(repository.customers)
+    deleted, new_ids = set(), itertools.count(1000)
+
+    async def churn():
+        for _ in range(5):
+            action = rng.random()
+            candidates = sorted(set(repository.customers) - deleted)
+            if action < 0.4:
+                await repository.insert(make_customer(next(new_ids)))
+            elif action < 0.7:
+                customer_id = rng.choice(candidates)
+                deleted.add(customer_id)
+                await repository.delete(customer_id)
+            else:
+                # Fields outside the sort key must not move a row
+                await repository.update(rng.choice(candidates), {"status": CustomerStatus.SUSPENDED})
+
+    seen = await walk(sort, descending, limit=20, between_pages=churn)
+    assert len(seen) == len(set(seen)), "a row was returned twice"
+    survivors = original - deleted
+    assert survivors <= set(seen), "a row present for the whole walk was skipped"
+    keys = [SORT_KEYS[sort](repository.customers[i]) for i in seen if i in repository.customers]
+    assert keys == sorted(keys, reverse=descending)
+
+
+async def test_skip_applies_after_the_cursor(repository):
+    await repository.insert_many(make_customers(30))
+    first, cursor = await get_customers_page(limit=10)
+    skipped, _ = await get_customers_page(limit=5, cursor=cursor, skip=3)
+    assert [c.id for c in skipped] == [str(i) for i in range(14, 19)]
+
+
+async def test_cursor_is_tied_to_its_sort_order(repository):
+    await repository.insert_many(make_customers(30))
+    _, cursor = await get_customers_page(limit=10, sort="name")
+    with pytest.raises(ValueError):
+        await get_customers_page(limit=10, cursor=cursor, sort="id")
+    with pytest.raises(ValueError):
+        await get_customers_page(limit=10, cursor=cursor, sort="name", descending=True)
+    with pytest.raises(ValueError):
+        await get_customers_page(limit=10, cursor="not-a-cursor", sort="name")
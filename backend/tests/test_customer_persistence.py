@@ -0,0 +1,128 @@
+import os
+import random
+
+import pytest
+
+from app.models.customer import CustomerFilter, CustomerStatus, PaymentStatus
+from app.services.customer_network import parse_network
+from app.services.customer_persistence import CustomerStorePersistence, read_snapshot
+from app.services.customer_repository import InMemoryCustomerRepository
+from app.services.customer_stats import compute_customer_stats
+
+from conftest import make_customer, make_customers
+
+
+async def open_store(directory):
+    repository = InMemoryCustomerRepository()
+    persistence = CustomerStorePersistence(repository, str(directory), durability="always")
+    await persistence.open()
+    return repository, persistence
+
+
+async def crash(persistence):
+    """Stop without the shutdown snapshot, as a killed process would"""
+    persistence._snapshot_task.cancel()
+    await persistence.wal.close()
+
+
+async def write_some(repository, rng, steps=200, start=1000):
+    for step in range(steps):
+        customer_id = rng.choice(list(repository.customers))
+        roll = rng.random()
+        if roll < 0.15:
+            await repository.delete(customer_id)
+        elif roll < 0.3:
+            await repository.insert(make_customer(start + step))
+        elif roll < 0.4:
+            await repository.update_many(rng.sample(list(repository.customers), 10), {
+                "payment_status": PaymentStatus.OVERDUE, "balance_due": 120.5,
+            })
+        else:
+            await repository.update(customer_id, {
+                "status": rng.choice(list(CustomerStatus)), "monthly_fee": rng.choice([399.0, 899.0]),
+                "city": rng.choice(["Tulum", "Bacalar"]), "name": f"Renamed {step}",
+            })
+
+
+async def assert_same_store(restored, expected):
+    assert {i: c.model_dump() for i, c in restored.customers.items()} == \
+        {i: c.model_dump() for i, c in expected.customers.items()}
+    assert restored.last_allocated == expected.last_allocated
+    for query in ("renamed", "tulum", "N2P2025", "998"):
+        assert await restored.search(query, 25) == await expected.search(query, 25)
+    for filters in (CustomerFilter(city="bacalar"), CustomerFilter(status=CustomerStatus.ACTIVE, overdue_only=True)):
+        assert {c.id for c in await restored.filter(filters)} == {c.id for c in await expected.filter(filters)}
+    assert await restored.stats() == compute_customer_stats(expected.customers.values())
+    assert await restored.revenue_summary() == await expected.revenue_summary()
+    assert await restored.revenue_breakdown("city") == await expected.revenue_breakdown("city")
+    network = parse_network("10.0.0.0/16")
+    assert [c.id for c in (await restored.in_network(network, 30))[1]] == \
+        [c.id for c in (await expected.in_network(network, 30))[1]]
+
+
+async def rebuilt(repository):
+    """What the indexes should hold: built from scratch over the same customers"""
+    fresh = InMemoryCustomerRepository()
+    fresh.restore([c.model_copy() for c in repository.customers.values()], *repository.last_allocated)
+    return fresh
+
+
+async def test_replaying_the_wal_gives_back_the_same_store(tmp_path):
+    repository, persistence = await open_store(tmp_path)
+    await repository.insert_many(make_customers(300))
+    await write_some(repository, random.Random(1))
+    await crash(persistence)
+
+    restored, reopened = await open_store(tmp_path)
+    await assert_same_store(restored, await rebuilt(repository))
+    await reopened.close()
+
+
+@pytest.mark.parametrize("with_indexes", [False, True])
+async def test_snapshot_plus_newer_wal_gives_back_the_same_store(tmp_path, with_indexes):
+    rng = random.Random(2)
+    repository, persistence = await open_store(tmp_path)
+    await repository.insert_many(make_customers(300))
+    await write_some(repository, rng, start=1000)
+    await persistence.snapshot(with_indexes=with_indexes)
+    await write_some(repository, rng, start=2000)
+    await crash(persistence)
+
+    footer, _, indexes = read_snapshot(os.path.join(tmp_path, "snapshot.bin"))
+    assert "columns" in footer and "columns" in indexes
+    assert ("indexes" in footer) == with_indexes
+
+    restored, reopened = await open_store(tmp_path)
+    await assert_same_store(restored, await rebuilt(repository))
+    # The restored indexes keep working for later writes
+    await write_some(restored, rng, steps=50, start=3000)
+    await assert_same_store(restored, await rebuilt(restored))
+    await reopened.close()
+
+
+async def test_columns_with_unstorable_text_are_rebuilt(tmp_path):
+    repository, persistence = await open_store(tmp_path)
+    await repository.insert_many(make_customers(20) + [make_customer(21, city="Null\0City")])
+    await persistence.snapshot()
+    await crash(persistence)
+
+    footer, _, indexes = read_snapshot(os.path.join(tmp_path, "snapshot.bin"))
+    assert "columns" not in footer and indexes is None
+    restored, reopened = await open_store(tmp_path)
+    await assert_same_store(restored, await rebuilt(repository))
+    await reopened.close()
+
+
+async def test_a_torn_wal_tail_is_dropped(tmp_path):
+    repository, persistence = await open_store(tmp_path)
+    await repository.insert_many(make_customers(10))
+    await repository.update("3", {"status": CustomerStatus.SUSPENDED})
+    await crash(persistence)
+    segment = persistence.wal.segment_path(persistence.wal.segment)
+    with open(segment, "ab") as file:
+        file.write(b"\x40\x00\x00\x00\x00\x00")
+
+    restored, reopened = await open_store(tmp_path)
+    assert restored.customers["3"].status == CustomerStatus.SUSPENDED
+    assert len(restored.customers) == 10
+    await reopened.close()
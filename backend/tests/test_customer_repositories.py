@@ -0,0 +1,145 @@
+import random
+import sqlite3
+
+import pytest
+
+from app.models.customer import CustomerFilter, CustomerStatus, PaymentStatus, ServiceType
+from app.services.customer_repository import create_customer_repository
+from app.services.customer_network import parse_network
+
+from conftest import make_customer, make_customers
+
+pytest.importorskip("aiosqlite")
+
+FILTERS = [
+    CustomerFilter(),
+    CustomerFilter(status=CustomerStatus.ACTIVE, service_type=ServiceType.FIBER),
+    CustomerFilter(city="cancun", overdue_only=True),
+    CustomerFilter(plan_name="50 mbps", payment_status=PaymentStatus.CURRENT),
+]
+
+
+@pytest.fixture
+async def repositories(tmp_path):
+    memory = create_customer_repository("memory")
+    sql = create_customer_repository("sql", url=f"sqlite:///{tmp_path / 'customers.db'}")
+    for repository in (memory, sql):
+        await repository.initialize()
+    yield memory, sql
+    for repository in (memory, sql):
+        await repository.close()
+
+
+async def apply_to_both(repositories, method, *args):
+    return [await getattr(repository, method)(*args) for repository in repositories]
+
+
+def ids(customers):
+    return [c.id for c in customers]
+
+
+async def test_sql_and_memory_stores_answer_alike(repositories):
+    rng = random.Random(6)
+    await apply_to_both(repositories, "insert_many", make_customers(120))
+    await apply_to_both(repositories, "insert", make_customer(121, city="Cancún"))
+    for _ in range(40):
+        customer_id = str(rng.randint(1, 121))
+        if rng.random() < 0.25:
+            await apply_to_both(repositories, "delete", customer_id)
+        else:
+            await apply_to_both(repositories, "update", customer_id, {
+                "status": rng.choice(list(CustomerStatus)), "monthly_fee": rng.choice([399.0, 899.0]),
+            })
+    await apply_to_both(repositories, "update_many", ["1", "2", "3", "nope"], {"status": CustomerStatus.SUSPENDED})
+    await apply_to_both(repositories, "update_matching", CustomerFilter(city="tulum"), {"notes": "bulk"})
+
+    memory, sql = repositories
+    assert await memory.count() == await sql.count()
+    assert sorted(ids(await memory.list_all()), key=int) == ids(await sql.list_all())
+    for filters in FILTERS:
+        assert ids(await memory.filter(filters)) == ids(await sql.filter(filters)), filters
+    for query in ("maria", "cancun", "998", "N2P2025"):
+        assert set(ids(await memory.search(query, 500))) == set(ids(await sql.search(query, 500))), query
+    for sort in ("id", "created_at", "name"):
+        memory_page, sql_page = await apply_to_both(repositories, "page", sort, 15, None, True, 5)
+        assert ids(c for _, c in memory_page) == ids(c for _, c in sql_page), sort
+    assert await memory.stats() == await sql.stats()
+    memory_summary, sql_summary = await apply_to_both(repositories, "revenue_summary")
+    assert memory_summary == pytest.approx(sql_summary)
+    assert ids(await memory.by_router("rb4011-sector2")) == ids(await sql.by_router("RB4011-SECTOR2"))
+    memory_box, sql_box = await apply_to_both(repositories, "in_bbox", 20.2, -87.3, 20.8, -86.8, 1000)
+    assert memory_box[0] == sql_box[0] and set(ids(memory_box[1])) == set(ids(sql_box[1]))
+    memory_net, sql_net = await apply_to_both(repositories, "in_network", parse_network("10.0.0.0/26"), 100)
+    assert memory_net[0] == sql_net[0] and ids(memory_net[1]) == ids(sql_net[1])
+
+    assert (await memory.get("5")) == (await sql.get("5"))
+    assert await sql.get("nope") is None
+    assert await sql.update("nope", {"notes": "x"}) is None
+    assert await sql.delete("nope") is False
+
+
+async def test_sql_store_never_reissues_ids(tmp_path):
+    url = f"sqlite:///{tmp_path / 'customers.db'}"
+    sql = create_customer_repository("sql", url=url)
+    await sql.initialize()
+    first = await sql.allocate_ids(3)
+    await sql.close()
+
+    reopened = create_customer_repository("sql", url=url)
+    await reopened.initialize()
+    try:
+        assert not set(first) & set(await reopened.allocate_ids(3))
+    finally:
+        await reopened.close()
+
+
+async def test_sql_search_ranks_beyond_the_first_rows(repositories):
+    # More weaker matches ahead of the best one than a few pages hold
+    customers = [make_customer(i, name="Susana Ruiz", city="Tulum", email=f"c{i}@x.mx") for i in range(1, 31)]
+    customers.append(make_customer(31, name="Ana Vargas", city="Tulum", email="c31@x.mx"))
+    customers += make_customers(60, start=32)
+    await apply_to_both(repositories, "insert_many", customers)
+    memory, sql = repositories
+    assert ids(await sql.search("ana", 5))[0] == "31"
+    for query in ("ana", "ruiz", "susana tulum", "ro", "maria 5", "N2P2025"):
+        for limit in (1, 5, 40):
+            assert ids(await memory.search(query, limit)) == ids(await sql.search(query, limit)), (query, limit)
+
+
+async def test_sql_store_accepts_any_id_and_keeps_store_order(repositories):
+    customers = [make_customer(1, id="legacy-b"), make_customer(2, id="2"), make_customer(3, id="legacy-a")]
+    await apply_to_both(repositories, "insert_many", customers)
+    memory, sql = repositories
+    assert ids(await sql.list_all()) == ids(await memory.list_all()) == ["legacy-b", "2", "legacy-a"]
+    assert (await sql.get("legacy-a")) == (await memory.get("legacy-a"))
+    assert ids(await sql.search(customers[0].name.split()[0], 10)) == ids(await memory.search(customers[0].name.split()[0], 10))
+
+
+def memory_store(customers):
+    memory = create_customer_repository("memory")
+    memory.restore([c.model_copy() for c in customers])
+    return memory
+
+
+async def test_a_store_keyed_on_id_is_rekeyed_in_order(tmp_path):
+    path = tmp_path / "customers.db"
+    customers = make_customers(30)
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE customers (id VARCHAR(32) PRIMARY KEY, seq BIGINT NOT NULL UNIQUE, "
+                   "status VARCHAR(20) NOT NULL, data TEXT NOT NULL)")
+        db.execute("CREATE INDEX ix_customers_status ON customers (status)")
+        db.executemany("INSERT INTO customers VALUES (?, ?, ?, ?)", [
+            (c.id, int(c.id), c.status.value, c.model_dump_json()) for c in reversed(customers)
+        ])
+    sql = create_customer_repository("sql", url=f"sqlite:///{path}")
+    await sql.initialize()
+    try:
+        assert ids(await sql.list_all()) == ids(customers)
+        assert await sql.stats() == await memory_store(customers).stats()
+        new_id, = await sql.allocate_ids(1)
+        assert new_id == "31"
+        await sql.insert(make_customer(31))
+        assert ids(await sql.list_all())[-1] == "31"
+        assert [entry[0] for entry, _ in await sql.page("id", 2, after=[30, 30])] == [31]
+    finally:
+        await sql.close()
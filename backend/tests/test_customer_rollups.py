@@ -0,0 +1,133 @@
+import math
+import random
+from datetime import datetime, timedelta
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+
+from app.api.v1 import dashboard
+from app.models.customer import CustomerStatus
+from app.services.customer_rollups import CustomerRollups, month_label, month_number, set_customer_rollups
+
+from conftest import login_as, make_customer
+
+NOW = datetime(2026, 9, 15, 12, 0)
+
+
+def history(count=400, seed=5):
+    """Customers created over the last two years, some cancelled since"""
+    rng = random.Random(seed)
+    customers = []
+    for i in range(1, count + 1):
+        created = NOW - timedelta(days=rng.randint(0, 700), hours=rng.randint(0, 23))
+        status = rng.choice(list(CustomerStatus))
+        updated = created + (NOW - created) * rng.random() if rng.random() < 0.9 else created
+        customers.append(make_customer(i, rng, created_at=created, updated_at=updated, status=status))
+    return customers
+
+
+def expected_month(customers, month):
+    """(new, churned, total at month end) by brute force"""
+    counted = [c for c in customers if c.status != CustomerStatus.CANCELLED or c.updated_at > c.created_at]
+    new = sum(1 for c in counted if month_number(c.created_at) == month)
+    cancelled = [c for c in counted if c.status == CustomerStatus.CANCELLED]
+    churned = sum(1 for c in cancelled if month_number(c.updated_at) == month)
+    total = sum(1 for c in counted if month_number(c.created_at) <= month) - \
+        sum(1 for c in cancelled if month_number(c.updated_at) <= month)
+    return new, churned, total
+
+
+def test_backfill_rebuilds_counts_and_leaves_unknown_amounts_nan():
+    customers = history()
+    rollups = CustomerRollups(days=60, months=24, clock=lambda: NOW)
+    rollups.backfill(customers)
+
+    series = rollups.monthly_series(24)
+    months = range(month_number(NOW) - 23, month_number(NOW) + 1)
+    assert series["period"] == [month_label(month) for month in months]
+    assert [(int(n), int(c), int(t)) for n, c, t in zip(
+        series["new_customers"], series["churned_customers"], series["total_customers"]
+    )] == [expected_month(customers, month) for month in months]
+    assert series["total_customers"][-1] == sum(1 for c in customers if c.status != CustomerStatus.CANCELLED)
+
+    for metric in ("billed", "collected", "active_customers"):
+        assert np.isnan(series[metric][:-1]).all()
+    assert (series["billed"][-1], series["collected"][-1]) == (0.0, 0.0)
+    assert series["active_customers"][-1] == sum(1 for c in customers if c.status == CustomerStatus.ACTIVE)
+
+    daily = rollups.daily_series(60)
+    assert np.isnan(daily["collected"][:-1]).all() and daily["collected"][-1] == 0.0
+    first_day = (NOW - timedelta(days=59)).date()
+    assert daily["new_customers"].sum() == sum(
+        1 for c in customers if c.created_at.date() >= first_day
+        and (c.status != CustomerStatus.CANCELLED or c.updated_at > c.created_at)
+    )
+
+
+async def test_changes_after_the_backfill_are_counted_today(repository):
+    customers = history(100)
+    await repository.insert_many(customers)
+    clock = [NOW]
+    rollups = CustomerRollups(days=30, months=12, clock=lambda: clock[0])
+    await rollups.start(repository, path=None)
+    before = rollups.daily_series(2)
+
+    active = next(c for c in repository.customers.values() if c.status == CustomerStatus.ACTIVE)
+    await repository.update(active.id, {"total_paid": active.total_paid + 500.0, "balance_due": active.balance_due + 80.0})
+    await repository.update(active.id, {"status": CustomerStatus.CANCELLED})
+    suspended = next(c for c in repository.customers.values() if c.status == CustomerStatus.SUSPENDED)
+    await repository.delete(suspended.id)
+
+    today = rollups.daily_series(2)
+    assert (today["collected"][-1], today["billed"][-1]) == (500.0, 80.0)
+    assert today["churned_customers"][-1] - before["churned_customers"][-1] == 2
+    assert today["total_customers"][-1] == before["total_customers"][-1] - 2
+    assert today["active_customers"][-1] == before["active_customers"][-1] - 1
+    assert math.isnan(today["collected"][0])
+
+    # The next day starts from zero, its gauges carried over
+    clock[0] += timedelta(days=1)
+    await repository.update(active.id, {"notes": "called"})
+    assert rollups.daily_series(1)["collected"][0] == 0.0
+    assert rollups.daily_series(1)["total_customers"][0] == today["total_customers"][-1]
+
+
+def test_saved_rollups_keep_unknown_periods_unknown(tmp_path):
+    rollups = CustomerRollups(days=30, months=12, clock=lambda: NOW)
+    rollups.backfill(history(50))
+    path = str(tmp_path / "rollups.npz")
+    rollups.save(path)
+
+    loaded = CustomerRollups(days=30, months=12, clock=lambda: NOW)
+    assert loaded.load(path)
+    for name in ("daily_series", "monthly_series"):
+        saved, restored = getattr(rollups, name)(12), getattr(loaded, name)(12)
+        for metric in ("billed", "collected", "new_customers", "total_customers", "active_customers"):
+            np.testing.assert_array_equal(saved[metric], restored[metric])
+    assert not CustomerRollups(days=31, months=12).load(path)
+
+
+async def test_charts_serve_null_for_periods_without_data(auth, repository):
+    await repository.insert_many(history(80))
+    rollups = CustomerRollups(days=30, months=12)
+    await rollups.start(repository, path=None)
+    set_customer_rollups(rollups)
+    paying = next(iter(repository.customers.values()))
+    await repository.update(paying.id, {"total_paid": paying.total_paid + 250.0})
+
+    app = FastAPI()
+    app.include_router(dashboard.router, prefix="/api/v1/dashboard")
+    headers = {"Authorization": f"Bearer {login_as('tech').access_token}"}
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            trend = (await client.get("/api/v1/dashboard/charts/revenue-trend?days=7", headers=headers)).json()
+            assert [day["revenue"] for day in trend["data"]] == [None] * 6 + [250.0]
+            assert [day["billed"] for day in trend["data"]][:6] == [None] * 6
+            assert (trend["total_revenue"], trend["average_daily"], trend["days_with_data"]) == (250.0, 250.0, 1)
+
+            growth = (await client.get("/api/v1/dashboard/charts/customer-growth?months=12", headers=headers)).json()
+            assert sum(month["new_customers"] for month in growth["data"]) > 0
+            assert all(isinstance(month["churned_customers"], int) for month in growth["data"])
+    finally:
+        set_customer_rollups(None)
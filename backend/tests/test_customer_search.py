@@ -0,0 +1,89 @@
+import random
+
+from app.services.customer_search import query_terms, score_document, search_document
+from app.services.customer_service import search_customers
+
+from conftest import make_customer, make_customers
+
+QUERIES = [
+    "maria", "María González", "gonz", "lopez", "cancun", "playa carmen", "N2P2025", "998",
+    "customer12@email.com", "calle 1", "m", "ro", "zzz", "mérida 5",
+]
+
+
+def brute_force(customers, query: str, limit: int):
+    """Score every customer and keep the best, ties in store order"""
+    terms = query_terms(query)
+    scored = []
+    for position, customer in enumerate(customers):
+        score = score_document(search_document(customer), terms)
+        if score:
+            scored.append((-score, position, customer.id))
+    scored.sort()
+    return [customer_id for _, _, customer_id in scored[:limit]]
+
+
+async def assert_matches_brute_force(repository, limit=20):
+    for query in QUERIES:
+        expected = brute_force(repository.customers.values(), query, limit)
+        assert [c.id for c in await search_customers(query, limit)] == expected, query
+
+
+async def test_search_matches_brute_force_through_writes(repository):
+    rng = random.Random(2)
+    await repository.insert_many(make_customers(400))
+    await assert_matches_brute_force(repository)
+
+    for _ in range(150):
+        customer_id = rng.choice(list(repository.customers))
+        if rng.random() < 0.2:
+            await repository.delete(customer_id)
+        else:
+            await repository.update(customer_id, {"name": f"María López {rng.randint(1, 50)}", "city": "Cancún"})
+    await assert_matches_brute_force(repository)
+    await assert_matches_brute_force(repository, limit=3)
+
+
+async def test_search_ignores_case_and_accents_and_ranks_whole_words_first(repository):
+    await repository.insert_many([
+        make_customer(1, name="Rosalía Pérez", city="Tulum"),
+        make_customer(2, name="Rosa Pérez", city="Tulum"),
+        make_customer(3, name="Ana Vargas", city="Cancún", address="Av. Rosas 12"),
+    ])
+    assert [c.id for c in await search_customers("ROSA perez")] == ["2", "1"]
+    assert [c.id for c in await search_customers("rosa")][:2] == ["2", "1"]
+    assert [c.id for c in await search_customers("CANCUN")] == ["3"]
+    assert await search_customers("") == []
+
+
+async def test_search_by_phone_ignores_formatting(repository):
+    await repository.insert(make_customer(1, phone="+52 (998) 555-0101"))
+    await repository.insert(make_customer(2, phone="+52 998 555 0202"))
+    assert [c.id for c in await search_customers("998-555-0101")] == ["1"]
+
+
+async def test_false_positives_in_a_better_class_do_not_hide_the_best_match(repository):
+    # " ana " grams all occur in "anabel susana": more false whole-word
+    # matches than twice the limit, ahead of the one real one
+    await repository.insert_many(
+        [make_customer(i, name="Anabel Susana Ruiz", city="Tulum", email=f"c{i}@x.mx") for i in range(1, 7)]
+        + [make_customer(7, name="Ana Vargas", city="Tulum", email="c7@x.mx")]
+    )
+    for limit in (1, 2, 3, 10):
+        assert [c.id for c in await search_customers("ana", limit)] == \
+            brute_force(repository.customers.values(), "ana", limit)
+    assert [c.id for c in await search_customers("ana", 1)] == ["7"]
+
+
+async def test_short_repeated_words_match_brute_force(repository):
+    rng = random.Random(9)
+    words = ["abc", "abcabc", "xabc", "bcab", "cab", "ab", "abca", "zz"]
+    await repository.insert_many([
+        make_customer(i, rng, name=" ".join(rng.choices(words, k=rng.randint(1, 3))),
+                      address=" ".join(rng.choices(words, k=2)), city=rng.choice(words), email=f"c{i}@x.mx")
+        for i in range(1, 301)
+    ])
+    for query in ("abc", "ab", "bca", "cab", "a", "abcab", "abc cab"):
+        for limit in (1, 2, 5, 20):
+            assert [c.id for c in await search_customers(query, limit)] == \
+                brute_force(repository.customers.values(), query, limit), (query, limit)
@@ -0,0 +1,59 @@
+import random
+from datetime import datetime
+
+from app.models.customer import CustomerFilter, CustomerStatus, PaymentStatus
+from app.services.customer_stats import CustomerStatsAccumulator, compute_customer_stats
+
+from conftest import make_customer, make_customers
+
+
+async def test_running_stats_match_a_full_recompute_through_writes(repository):
+    rng = random.Random(3)
+    now = datetime.now()
+    await repository.insert_many(make_customers(200))
+    await repository.insert_many([make_customer(i, created_at=now) for i in range(201, 211)])
+    assert repository.stats_accumulator.snapshot() == compute_customer_stats(repository.customers.values())
+
+    for _ in range(300):
+        customer_id = rng.choice(list(repository.customers))
+        action = rng.random()
+        if action < 0.6:
+            await repository.update(customer_id, {
+                "status": rng.choice(list(CustomerStatus)),
+                "monthly_fee": rng.choice([399.0, 549.99, 0.1, 0.2]),
+                "payment_status": rng.choice(list(PaymentStatus)),
+            })
+        elif action < 0.8:
+            await repository.update_each({customer_id: {"monthly_fee": 0.3, "status": CustomerStatus.ACTIVE}})
+        else:
+            await repository.delete(customer_id)
+    await repository.update_matching(CustomerFilter(status=CustomerStatus.PENDING), {"status": CustomerStatus.ACTIVE})
+
+    stats = await repository.stats()
+    assert stats == compute_customer_stats(repository.customers.values())
+    active = [c for c in repository.customers.values() if c.status == CustomerStatus.ACTIVE]
+    assert stats.active_customers == len(active)
+    assert stats.monthly_revenue == round(sum(c.monthly_fee for c in active), 2)
+    assert stats.new_customers_this_month == sum(
+        1 for c in repository.customers.values() if (c.created_at.year, c.created_at.month) == (now.year, now.month)
+    )
+
+
+def test_new_customers_this_month_rolls_over_with_the_calendar():
+    accumulator = CustomerStatsAccumulator()
+    accumulator.add(make_customer(1, created_at=datetime(2026, 1, 31, 23, 59)))
+    accumulator.add(make_customer(2, created_at=datetime(2026, 2, 1)))
+    assert accumulator.snapshot(now=datetime(2026, 1, 15)).new_customers_this_month == 1
+    assert accumulator.snapshot(now=datetime(2026, 2, 28)).new_customers_this_month == 1
+    assert accumulator.snapshot(now=datetime(2026, 3, 1)).new_customers_this_month == 0
+
+
+def test_revenue_does_not_drift_over_add_remove_cycles():
+    accumulator = CustomerStatsAccumulator()
+    for i in range(1000):
+        accumulator.add(make_customer(1, status=CustomerStatus.ACTIVE, monthly_fee=0.1 * (i % 7)))
+    accumulator.add(make_customer(1, status=CustomerStatus.ACTIVE, monthly_fee=0.1))
+    assert accumulator.snapshot().monthly_revenue == 0.1
+    accumulator.remove("1")
+    assert accumulator.snapshot().monthly_revenue == 0.0
+    assert accumulator.snapshot().total_customers == 0
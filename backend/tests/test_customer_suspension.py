@@ -0,0 +1,132 @@
+import random
+from datetime import datetime, timedelta
+
+from app.models.customer import CustomerStatus, PaymentStatus
+from app.services.customer_suspension import SuspensionScheduler, suspension_deadline
+
+from conftest import make_customer, make_customers
+
+START = datetime(2026, 3, 1)
+DAY = 86400
+
+
+class Clock:
+    def __init__(self, now: datetime):
+        self.now = now.timestamp()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, days: float):
+        self.now += days * DAY
+
+
+def scheduler_for(repository, clock, notices=None):
+    async def notify(customer, days_left):
+        notices.append((customer.id, days_left))
+
+    scheduler = SuspensionScheduler(suspend_days=5, notification_days=[3, 1], cycle_days=30,
+                                    notifier=notify, clock=clock)
+    scheduler.load(repository.customers.values())
+    repository.add_change_listener(scheduler.on_changes)
+    return scheduler
+
+
+def deadline(customer):
+    due = suspension_deadline(customer.status, customer.payment_status, customer.last_payment,
+                              customer.created_at, cycle_days=30, grace_days=5)
+    return due.timestamp() if due is not None else None
+
+
+async def test_ticks_suspend_exactly_the_overdue_customers_past_their_deadline(repository):
+    rng = random.Random(6)
+    await repository.insert_many([
+        make_customer(i, rng, last_payment=START - timedelta(days=rng.randint(0, 60)) if rng.random() < 0.7 else None,
+                      created_at=START - timedelta(days=rng.randint(0, 90)))
+        for i in range(1, 501)
+    ])
+    clock = Clock(START)
+    scheduler = scheduler_for(repository, clock, notices=[])
+
+    for _ in range(40):
+        for _ in range(10):
+            customer_id = rng.choice(list(repository.customers))
+            roll = rng.random()
+            if roll < 0.3:  # a payment
+                await repository.update(customer_id, {
+                    "last_payment": datetime.fromtimestamp(clock.now), "payment_status": PaymentStatus.CURRENT,
+                })
+            elif roll < 0.6:
+                await repository.update(customer_id, {"payment_status": PaymentStatus.OVERDUE})
+            elif roll < 0.8:
+                await repository.update(customer_id, {"status": rng.choice(list(CustomerStatus))})
+            elif roll < 0.9:
+                await repository.delete(customer_id)
+            else:
+                await repository.update(customer_id, {"notes": "called"})
+        clock.advance(rng.uniform(0, 3))
+
+        before = {c.id: c.status for c in repository.customers.values()}
+        due = {c.id for c in repository.customers.values() if (deadline(c) or float("inf")) <= clock.now}
+        await scheduler.tick()
+        changed = {i for i, c in repository.customers.items() if c.status != before[i]}
+        assert changed == due
+        assert all(repository.customers[i].status == CustomerStatus.SUSPENDED for i in due)
+
+    expected = sorted((deadline(c), c.id) for c in repository.customers.values() if deadline(c) is not None)
+    upcoming = scheduler.upcoming(20)
+    assert [entry["customer_id"] for entry in upcoming] == [customer_id for _, customer_id in expected[:20]]
+    assert len(scheduler) == len(expected)
+    assert scheduler.status()["heap_entries"] <= max(64, 2 * 3 * len(expected))
+
+
+async def test_notices_come_before_the_suspension_and_a_payment_cancels_both(repository):
+    # Due for suspension on START + 10 days
+    paid = START - timedelta(days=25)
+    await repository.insert_many([
+        make_customer(1, status=CustomerStatus.ACTIVE, payment_status=PaymentStatus.OVERDUE, last_payment=paid),
+        make_customer(2, status=CustomerStatus.ACTIVE, payment_status=PaymentStatus.OVERDUE, last_payment=paid),
+        make_customer(3, status=CustomerStatus.ACTIVE, payment_status=PaymentStatus.CURRENT, last_payment=paid),
+    ])
+    clock, notices = Clock(START), []
+    scheduler = scheduler_for(repository, clock, notices)
+    assert len(scheduler) == 2
+
+    clock.advance(7)
+    await scheduler.tick()
+    assert sorted(notices) == [("1", 3), ("2", 3)]
+
+    await repository.update("2", {"last_payment": datetime.fromtimestamp(clock.now),
+                                  "payment_status": PaymentStatus.CURRENT})
+    clock.advance(2)
+    await scheduler.tick()
+    assert sorted(notices) == [("1", 1), ("1", 3), ("2", 3)]
+
+    clock.advance(1)
+    assert await scheduler.tick() == 1
+    assert [c.status for c in (repository.customers[i] for i in "123")] == \
+        [CustomerStatus.SUSPENDED, CustomerStatus.ACTIVE, CustomerStatus.ACTIVE]
+    assert repository.customers["1"].payment_status == PaymentStatus.SUSPENDED
+    assert scheduler.status()["suspended"] == 1 and len(scheduler) == 0
+
+    # Past-due notices are skipped when a customer is scheduled late
+    await repository.update("3", {"payment_status": PaymentStatus.OVERDUE})
+    clock.advance(0.01)
+    await scheduler.tick()
+    assert repository.customers["3"].status == CustomerStatus.SUSPENDED
+    assert ("3", 3) not in notices and ("3", 1) not in notices
+
+
+async def test_reactivating_a_suspended_overdue_customer_reschedules_them(repository):
+    await repository.insert_many(make_customers(3))
+    for customer in repository.customers.values():
+        customer.status, customer.payment_status = CustomerStatus.SUSPENDED, PaymentStatus.OVERDUE
+        customer.last_payment = START - timedelta(days=60)
+    clock = Clock(START)
+    scheduler = scheduler_for(repository, clock, notices=[])
+    assert len(scheduler) == 0
+
+    await repository.update("2", {"status": CustomerStatus.ACTIVE})
+    assert [entry["customer_id"] for entry in scheduler.upcoming()] == ["2"]
+    assert await scheduler.tick() == 1
+    assert repository.customers["2"].status == CustomerStatus.SUSPENDED
@@ -0,0 +1,179 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.v1 import dashboard
+from app.models.customer import CustomerStatus
+from app.services.dashboard_cache import DashboardCache, if_none_match, make_etag, set_dashboard_cache
+
+from conftest import login_as, make_customers
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Counter:
+    """A section compute returning 1, 2, 3, ... and optionally waiting to be
+    let through"""
+
+    def __init__(self, gate: asyncio.Event = None):
+        self.calls = 0
+        self.gate = gate
+
+    async def __call__(self):
+        self.calls += 1
+        value = self.calls
+        if self.gate is not None:
+            await self.gate.wait()
+        return {"value": value}
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_fresh_then_stale_while_revalidating_then_recomputed():
+    clock = Clock()
+    cache = DashboardCache(ttl=10, stale_ttl=30, clock=clock)
+    compute = Counter()
+
+    first = await cache.get("s", "admin", compute)
+    assert first.value == {"value": 1} and first.etag == make_etag(first.body)
+    clock.now += 9
+    assert await cache.get("s", "admin", compute) is first
+
+    # Stale: served at once, one refresh in the background for any number of callers
+    clock.now += 2
+    assert [(await cache.get("s", "admin", compute)).value for _ in range(3)] == [{"value": 1}] * 3
+    await settle()
+    assert compute.calls == 2
+    assert (await cache.get("s", "admin", compute)).value == {"value": 2}
+
+    # Past the stale window callers wait for the recompute
+    clock.now += 41
+    assert (await cache.get("s", "admin", compute)).value == {"value": 3}
+    stats = cache.stats()["sections"]["s"]
+    assert (stats["hits"], stats["stale_hits"], stats["misses"], stats["background_refreshes"]) == (2, 3, 2, 1)
+
+
+async def test_concurrent_misses_share_one_compute_and_roles_are_separate():
+    cache = DashboardCache(ttl=10, stale_ttl=30, clock=Clock())
+    gate = asyncio.Event()
+    compute = Counter(gate)
+    waiting = [asyncio.ensure_future(cache.get("s", "admin", compute)) for _ in range(5)]
+    await settle()
+    gate.set()
+    entries = await asyncio.gather(*waiting)
+    assert compute.calls == 1 and all(entry is entries[0] for entry in entries)
+
+    other = await cache.get("s", "technician", compute)
+    assert other.value == {"value": 2} and compute.calls == 2
+
+
+async def test_customer_changes_outdate_only_customer_data_sections(repository):
+    clock = Clock()
+    cache = DashboardCache(ttl=10, stale_ttl=30, clock=clock)
+    repository.add_change_listener(cache.on_changes)
+    customers, network = Counter(), Counter()
+    await cache.get("customers", "admin", customers, customer_data=True)
+    await cache.get("network", "admin", network)
+
+    await repository.insert_many(make_customers(3))
+    await cache.get("customers", "admin", customers, customer_data=True)
+    await cache.get("network", "admin", network)
+    await settle()
+    assert (customers.calls, network.calls) == (2, 1)
+    assert (await cache.get("customers", "admin", customers, customer_data=True)).value == {"value": 2}
+
+
+async def test_a_compute_racing_with_a_change_is_stored_already_stale():
+    clock = Clock()
+    cache = DashboardCache(ttl=10, stale_ttl=30, clock=clock)
+    gate = asyncio.Event()
+    compute = Counter(gate)
+    pending = asyncio.ensure_future(cache.get("customers", "admin", compute, customer_data=True))
+    await settle()
+    cache.on_changes([])
+    gate.set()
+    assert (await pending).value == {"value": 1}
+
+    # The next lookup serves it but refreshes it straight away
+    assert (await cache.get("customers", "admin", compute, customer_data=True)).value == {"value": 1}
+    await settle()
+    assert compute.calls == 2
+
+
+async def test_failures_keep_the_stale_entry_and_unknown_sections_unreported():
+    clock = Clock()
+    cache = DashboardCache(ttl=10, stale_ttl=30, clock=clock)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("database down")
+        return {"ok": True}
+
+    entry = await cache.get("s", "admin", flaky)
+    clock.now += 11
+    assert await cache.get("s", "admin", flaky) is entry
+    await settle()
+    assert cache.peek("s", "admin") is entry and cache.stats()["sections"]["s"]["errors"] == 1
+
+    async def invalid():
+        raise ValueError("bad group")
+
+    with pytest.raises(ValueError):
+        await cache.get("breakdown:bogus", "admin", invalid)
+    assert "breakdown:bogus" not in cache.stats()["sections"]
+
+
+async def test_a_zero_ttl_computes_every_time():
+    cache = DashboardCache(ttl=0, stale_ttl=30, clock=Clock())
+    compute = Counter()
+    assert [(await cache.get("s", "admin", compute)).value["value"] for _ in range(3)] == [1, 2, 3]
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False), ("", False), ('"abc"', True), ('W/"abc"', True), ('"x", "abc"', True), ("*", True), ('"abd"', False),
+])
+def test_if_none_match(header, matches):
+    assert if_none_match(header, '"abc"') == matches
+
+
+async def test_polling_with_the_etag_gets_304_until_customers_change(auth, repository):
+    cache = DashboardCache(ttl=60, stale_ttl=60)
+    repository.add_change_listener(cache.on_changes)
+    set_dashboard_cache(cache)
+    app = FastAPI()
+    app.include_router(dashboard.router, prefix="/api/v1/dashboard")
+    await repository.insert_many(make_customers(20))
+    headers = {"Authorization": f"Bearer {login_as('manager').access_token}"}
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            path = "/api/v1/dashboard/stats/customers"
+            first = await client.get(path, headers=headers)
+            assert first.status_code == 200 and first.json()["total_customers"] == 20
+            etag = first.headers["ETag"]
+            again = await client.get(path, headers={**headers, "If-None-Match": etag})
+            assert again.status_code == 304 and again.content == b"" and again.headers["ETag"] == etag
+
+            await repository.update("1", {"status": CustomerStatus.CANCELLED})
+            await repository.delete("2")
+            await client.get(path, headers={**headers, "If-None-Match": etag})  # stale, starts the refresh
+            await settle()
+            changed = await client.get(path, headers={**headers, "If-None-Match": etag})
+            assert changed.status_code == 200 and changed.headers["ETag"] != etag
+            assert changed.json()["total_customers"] == 19
+    finally:
+        await cache.close()
+        set_dashboard_cache(None)
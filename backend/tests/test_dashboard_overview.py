@@ -0,0 +1,167 @@
+import asyncio
+import re
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.v1 import dashboard
+from app.services.customer_rollups import CustomerRollups, set_customer_rollups
+from app.services.dashboard_cache import DashboardCache, set_dashboard_cache
+from app.services.system_metrics import SystemMetrics, set_system_metrics
+
+from conftest import login_as, make_customers
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Gated:
+    """A section compute returning 1, 2, 3, ... that waits for its gate
+    while it is closed, or fails while ``error`` is set"""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.error = None
+
+    async def __call__(self):
+        self.calls += 1
+        value = self.calls
+        await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return {"value": value}
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_gather_answers_each_section_within_its_deadline():
+    clock = Clock()
+    cache = DashboardCache(ttl=10, stale_ttl=10, clock=clock)
+    fresh, stale, late, missing, failing = (Gated() for _ in range(5))
+    sources = {"fresh": (fresh, False), "stale": (stale, False), "late": (late, False),
+               "missing": (missing, False), "failing": (failing, False)}
+    timeouts = dict.fromkeys(sources, 0.05)
+    await cache.get("late", "admin", late)
+    clock.now = 115
+    await cache.get("stale", "admin", stale)
+    # "stale" is past its ttl but within its stale window, "late" past both
+    clock.now = 127
+    late.gate.clear()
+    missing.gate.clear()
+    failing.error = RuntimeError("down")
+    results = await cache.gather(sources, "admin", timeouts)
+
+    assert {name: result.status for name, result in results.items()} == {
+        "fresh": "fresh", "stale": "stale", "late": "late", "missing": "missing", "failing": "error",
+    }
+    assert results["fresh"].entry.value == {"value": 1}
+    assert results["late"].entry.value == {"value": 1}  # the previous entry
+    assert results["missing"].entry is None and results["failing"].entry is None
+    assert all(0 <= result.seconds < 1 for result in results.values())
+
+    # The late computes go on and fill the cache
+    late.gate.set()
+    missing.gate.set()
+    await settle()
+    assert cache.peek("late", "admin").value == {"value": 2}
+    assert cache.peek("missing", "admin").value == {"value": 1}
+    again = await cache.gather(sources, "admin", timeouts)
+    assert (again["late"].status, again["missing"].status) == ("fresh", "fresh")
+    assert (again["late"].entry.value, again["missing"].entry.value) == ({"value": 2}, {"value": 1})
+    await cache.close()
+
+
+@pytest.fixture
+async def app(auth, repository, monkeypatch):
+    """The dashboard router over 30 customers, with the network section
+    gated and a 50 ms budget for it"""
+    await repository.insert_many(make_customers(30))
+    clock = Clock()
+    cache = DashboardCache(ttl=60, stale_ttl=60, clock=clock)
+    repository.add_change_listener(cache.on_changes)
+    set_dashboard_cache(cache)
+    rollups = CustomerRollups(days=30, months=12)
+    await rollups.start(repository, path=None)
+    set_customer_rollups(rollups)
+    set_system_metrics(SystemMetrics(interval=60))
+    network = Gated()
+    monkeypatch.setitem(dashboard.SECTIONS, "network", (network, False))
+    monkeypatch.setitem(dashboard.SECTION_TIMEOUTS, "network", 0.05)
+    app = FastAPI()
+    app.include_router(dashboard.router, prefix="/api/v1/dashboard")
+    app.state.network, app.state.clock = network, clock
+    yield app
+    await cache.close()
+    set_dashboard_cache(None)
+    set_customer_rollups(None)
+    set_system_metrics(None)
+
+
+def server_timing(response):
+    return {
+        name: (float(duration), status)
+        for name, duration, status in re.findall(r'(\w+);dur=([\d.]+);desc="(\w+)"', response.headers["Server-Timing"])
+    }
+
+
+async def test_overview_serves_the_sections_in_time_and_names_the_missing_ones(app):
+    network = app.state.network
+    network.gate.clear()
+    headers = {"Authorization": f"Bearer {login_as('manager').access_token}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        partial = await client.get("/api/v1/dashboard/overview", headers=headers)
+        assert partial.status_code == 200
+        body = partial.json()
+        assert (body["partial"], body["missing_sections"], body["network"]) == (True, ["network"], None)
+        assert body["customers"]["total_customers"] == 30
+        assert body["performance"]["growth_metrics"]["new_customers_this_month"] >= 0
+        assert len(body["activities"]) <= 10
+        assert body["user"]["role"] == "manager"
+        timing = server_timing(partial)
+        assert set(timing) == set(dashboard.SECTIONS)
+        assert timing["network"][1] == "missing" and timing["network"][0] >= 50
+        assert {status for name, (_, status) in timing.items() if name != "network"} == {"fresh"}
+
+        # The network compute finished after the response and was cached
+        network.gate.set()
+        await settle()
+        complete = await client.get("/api/v1/dashboard/overview", headers=headers)
+        body = complete.json()
+        assert (body["partial"], body["missing_sections"], body["network"]) == (False, [], {"value": 1})
+        assert network.calls == 1
+        assert set(status for _, status in server_timing(complete).values()) == {"fresh"}
+
+        etag = complete.headers["ETag"]
+        unchanged = await client.get("/api/v1/dashboard/overview", headers={**headers, "If-None-Match": etag})
+        assert unchanged.status_code == 304 and unchanged.content == b""
+        assert "Server-Timing" in unchanged.headers
+
+
+async def test_overview_keeps_the_previous_value_of_a_late_section(app):
+    network = app.state.network
+    headers = {"Authorization": f"Bearer {login_as('tech').access_token}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        first = (await client.get("/api/v1/dashboard/overview", headers=headers)).json()
+        assert first["network"] == {"value": 1} and not first["partial"]
+
+        # Past its stale window, a slow recompute is answered from the old entry
+        app.state.clock.now += 200
+        network.gate.clear()
+        late = await client.get("/api/v1/dashboard/overview", headers=headers)
+        body = late.json()
+        assert (body["network"], body["partial"], body["missing_sections"]) == ({"value": 1}, False, [])
+        assert server_timing(late)["network"][1] == "late"
+        network.gate.set()
+        await settle()
+        assert (await client.get("/api/v1/dashboard/overview", headers=headers)).json()["network"] == {"value": 2}
@@ -0,0 +1,177 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.v1 import dashboard
+from app.core.security import TicketStore, get_ticket_store, set_ticket_store
+from app.services.auth_service import get_token_grant, logout
+from app.services.dashboard_cache import DashboardCache, set_dashboard_cache
+from app.services.dashboard_stream import DashboardStream, diff_section, set_dashboard_stream
+
+from conftest import login_as
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def cache():
+    cache = DashboardCache(ttl=0.01, stale_ttl=0)
+    set_dashboard_cache(cache)
+    yield cache
+    set_dashboard_cache(None)
+
+
+def counter_source():
+    state = {"value": 0}
+
+    async def compute():
+        return {"value": state["value"], "unchanged": True}
+
+    return state, (compute, False)
+
+
+async def next_events(stream_body, count=1):
+    return [await asyncio.wait_for(stream_body.__anext__(), 1) for _ in range(count)]
+
+
+def test_section_diffs():
+    assert diff_section({"a": 1, "b": {"c": 2, "d": 3}}, {"a": 1, "b": {"c": 2, "d": 4}, "e": 5}) == \
+        {"patch": {"b": {"d": 4}, "e": 5}}
+    assert diff_section({"a": 1, "x": 2}, {"a": 1}) == {"patch": {"x": None}}
+    assert diff_section([{"id": 1, "v": 1}, {"id": 2}], [{"id": 1, "v": 2}, {"id": 3}]) == \
+        {"added": [{"id": 3}], "changed": [{"id": 1, "v": 2}], "removed": [2]}
+    assert diff_section([1, 2], [1, 2]) is None
+
+
+async def test_streams_send_a_snapshot_then_deltas(auth, cache):
+    stream = DashboardStream(interval=3600, keepalive=3600)
+    state, source = counter_source()
+    grant = get_token_grant(login_as("tech").access_token)
+    body = stream.events({"network": source}, "technician", grant)
+    retry, snapshot = await next_events(body, 2)
+    assert retry == b"retry: 5000\n\n"
+    assert snapshot == b'event: snapshot\nid: 1\ndata: {"section":"network","version":1,' \
+                       b'"data":{"value":0,"unchanged":true}}\n\n'
+
+    state["value"] = 1
+    await asyncio.sleep(0.02)
+    await stream.poll()
+    assert await next_events(body) == [b'event: delta\nid: 2\ndata: {"section":"network","version":2,'
+                                       b'"patch":{"value":1}}\n\n']
+    await body.aclose()
+    assert len(stream) == 0 and stream.stats()["channels"] == {}
+    await stream.close()
+
+
+async def test_a_poll_ends_streams_whose_token_expired(auth, cache):
+    clock = Clock()
+    stream = DashboardStream(interval=3600, keepalive=3600, clock=clock)
+    _, source = counter_source()
+    grant = get_token_grant(login_as("tech").access_token)
+    assert grant.expires_at > clock.now and len(grant.token_ids) == 2
+    body = stream.events({"network": source}, "technician", grant)
+    await next_events(body, 2)
+
+    clock.now = grant.expires_at
+    await stream.poll()
+    assert await next_events(body) == [b'event: end\ndata: {"reason":"expired"}\n\n']
+    with pytest.raises(StopAsyncIteration):
+        await next_events(body)
+    assert len(stream) == 0 and stream.stats()["ended"] == {"expired": 1, "revoked": 0}
+    await stream.close()
+
+
+async def test_a_keepalive_ends_streams_whose_session_was_revoked(auth, cache):
+    stream = DashboardStream(interval=3600, keepalive=0.01)
+    _, source = counter_source()
+    tokens = login_as("manager")
+    other = get_token_grant(login_as("manager").access_token)
+    body = stream.events({"network": source}, "manager", get_token_grant(tokens.access_token))
+    still_open = stream.events({"network": source}, "manager", other)
+    await next_events(body, 2)
+    await next_events(still_open, 2)
+    assert await next_events(body) == [b": keep-alive\n\n"]
+
+    logout(refresh_token=tokens.refresh_token)
+    assert await next_events(body) == [b'event: end\ndata: {"reason":"revoked"}\n\n']
+    assert await next_events(still_open) == [b": keep-alive\n\n"]
+    await still_open.aclose()
+    await stream.close()
+
+
+def test_tickets_work_once_and_only_for_a_while():
+    clock = Clock()
+    tickets = TicketStore(ttl=30, maxsize=3, clock=clock)
+    first = tickets.issue("a")
+    assert tickets.redeem(first) == "a"
+    assert tickets.redeem(first) is None
+
+    late = tickets.issue("b")
+    clock.now += 30
+    assert tickets.redeem(late) is None
+
+    issued = [tickets.issue(value) for value in "cdef"]
+    assert len(tickets) == 3 and tickets.redeem(issued[0]) is None
+    assert [tickets.redeem(ticket) for ticket in issued[1:]] == ["d", "e", "f"]
+    # Only digests are kept
+    assert all(isinstance(key, bytes) and len(key) == 32 for key in tickets._tickets)
+    assert tickets.stats()["rejected"] == 3
+
+
+@pytest.fixture
+async def client(auth, cache):
+    stream = DashboardStream(interval=0.01, keepalive=0.05)
+    set_dashboard_stream(stream)
+    set_ticket_store(TicketStore())
+    app = FastAPI()
+    app.include_router(dashboard.router, prefix="/api/v1/dashboard")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    await stream.close()
+    set_dashboard_stream(None)
+    set_ticket_store(None)
+
+
+async def test_event_source_clients_connect_with_a_single_use_ticket(client):
+    tokens = login_as("tech")
+    bearer = {"Authorization": f"Bearer {tokens.access_token}"}
+    assert (await client.post("/api/v1/dashboard/stream/ticket")).status_code == 401
+    issued = (await client.post("/api/v1/dashboard/stream/ticket", headers=bearer)).json()
+    assert issued["expires_in"] == 30 and tokens.access_token not in issued["ticket"]
+
+    # A ticket cannot mint another ticket, and tokens are not taken from the URL
+    ticket = issued["ticket"]
+    assert (await client.post(f"/api/v1/dashboard/stream/ticket?ticket={ticket}")).status_code == 401
+    refused = await client.get(f"/api/v1/dashboard/stream?sections=network&access_token={tokens.access_token}")
+    assert refused.status_code == 401
+
+    # The stream runs until the session is revoked, then ends
+    opened = asyncio.ensure_future(client.get(f"/api/v1/dashboard/stream?sections=network&ticket={ticket}"))
+    await asyncio.sleep(0.1)
+    logout(access_token=tokens.access_token)
+    response = await asyncio.wait_for(opened, 2)
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/event-stream")
+    assert b"event: snapshot" in response.content
+    assert response.content.endswith(b'event: end\ndata: {"reason":"revoked"}\n\n')
+
+    again = await client.get(f"/api/v1/dashboard/stream?sections=network&ticket={ticket}")
+    assert again.status_code == 401 and "request a new one" in again.json()["detail"]
+    assert get_ticket_store().stats()["redeemed"] == 1
+
+
+async def test_tickets_of_revoked_sessions_are_refused(client):
+    tokens = login_as("tech")
+    bearer = {"Authorization": f"Bearer {tokens.access_token}"}
+    ticket = (await client.post("/api/v1/dashboard/stream/ticket", headers=bearer)).json()["ticket"]
+    logout(refresh_token=tokens.refresh_token)
+    response = await client.get(f"/api/v1/dashboard/stream?sections=network&ticket={ticket}")
+    assert response.status_code == 401 and response.json()["detail"].startswith("Stream ticket is revoked")
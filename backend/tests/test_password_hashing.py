@@ -0,0 +1,76 @@
+import asyncio
+import os
+import threading
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.core.security import HashingOverloaded, PasswordHasher, set_password_hasher
+from app.models.user import LoginRequest
+from app.services import auth_service
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=2, nice=5)
+    yield hasher
+    hasher.close()
+
+
+async def test_checks_match_only_the_right_password(hasher):
+    hashed = await hasher.hash("s3cret")
+    assert await hasher.verify("s3cret", hashed) == (True, None)
+    assert await hasher.verify("wrong", hashed) == (False, None)
+
+    # A hash with other settings is upgraded on a successful check only
+    older = CryptContext(schemes=["bcrypt"], bcrypt__rounds=5).hash("s3cret")
+    assert (await hasher.verify("wrong", older))[1] is None
+    matches, upgraded = await hasher.verify("s3cret", older)
+    assert matches and upgraded.startswith("$2b$04$")
+    assert await hasher.verify("s3cret", upgraded) == (True, None)
+    assert hasher.stats()["completed"] == 6 and hasher.pending == 0
+
+
+async def test_checks_past_max_pending_are_shed_at_once(hasher):
+    release = threading.Event()
+    held = [asyncio.ensure_future(hasher._run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert hasher.pending == 2
+
+    with pytest.raises(HashingOverloaded) as overloaded:
+        await hasher.verify("s3cret", "$2b$04$" + "a" * 53)
+    assert 1 <= overloaded.value.retry_after <= 2
+    assert hasher.shed == 1
+
+    release.set()
+    await asyncio.gather(*held)
+    assert hasher.pending == 0
+    assert (await hasher.verify("s3cret", await hasher.hash("s3cret")))[0]
+
+
+@pytest.mark.skipif(not hasattr(os, "setpriority"), reason="no per-thread priorities")
+async def test_pool_threads_run_niced(hasher):
+    own = os.getpriority(os.PRIO_PROCESS, threading.get_native_id())
+    pool = await hasher._run(lambda: os.getpriority(os.PRIO_PROCESS, threading.get_native_id()))
+    assert pool == min(own + 5, 19)
+
+
+async def test_login_answers_503_with_retry_after_when_overloaded():
+    class Overloaded(PasswordHasher):
+        async def verify(self, password, hashed):
+            raise HashingOverloaded(3)
+
+    set_password_hasher(Overloaded(rounds=4))
+    try:
+        with pytest.raises(HTTPException) as refused:
+            await auth_service.login(LoginRequest(username="admin", password="admin123"))
+        assert refused.value.status_code == 503
+        assert refused.value.headers["Retry-After"] == "3"
+
+        # Unknown users are answered without a check
+        with pytest.raises(HTTPException) as unknown:
+            await auth_service.login(LoginRequest(username="nobody", password="x"))
+        assert unknown.value.status_code == 401
+    finally:
+        set_password_hasher(None)
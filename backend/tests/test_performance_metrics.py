@@ -0,0 +1,94 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.v1 import dashboard
+from app.models.customer import CustomerStatus
+from app.services.customer_rollups import CustomerRollups, set_customer_rollups
+from app.services.dashboard_cache import DashboardCache, set_dashboard_cache
+from app.services.system_metrics import SystemMetrics, set_system_metrics
+
+from conftest import login_as, make_customer
+
+
+@pytest.fixture
+async def sources(repository):
+    """Ten customers from before last month and three from now, with
+    rollups, a sampler started an hour ago and a cache all installed"""
+    long_ago = datetime.now() - timedelta(days=70)
+    await repository.insert_many(
+        [make_customer(i, created_at=long_ago, updated_at=long_ago, status=CustomerStatus.ACTIVE) for i in range(1, 11)]
+        + [make_customer(i, created_at=datetime.now(), status=CustomerStatus.PENDING) for i in range(11, 14)]
+    )
+    rollups = CustomerRollups(days=30, months=12)
+    await rollups.start(repository, path=None)
+    set_customer_rollups(rollups)
+    metrics = SystemMetrics(interval=60)
+    metrics.started_at = time.time() - 3600
+    set_system_metrics(metrics)
+    cache = DashboardCache(ttl=60)
+    repository.add_change_listener(cache.on_changes)
+    set_dashboard_cache(cache)
+    yield metrics
+    set_customer_rollups(None)
+    set_system_metrics(None)
+    set_dashboard_cache(None)
+
+
+async def test_growth_and_quality_come_from_the_data(repository, sources):
+    for _ in range(3):
+        sources.requests.record(0.01, 200)
+    sources.requests.record(0.05, 503)
+    await repository.update("1", {"status": CustomerStatus.CANCELLED})
+    await repository.update("2", {"status": CustomerStatus.CANCELLED})
+
+    metrics = await dashboard.get_performance_metrics()
+    assert metrics["growth_metrics"] == {
+        "new_customers_this_month": 3, "churned_customers_this_month": 2, "churn_rate": 20.0,
+    }
+    quality = metrics["service_quality"]
+    assert 3600 <= quality["uptime_seconds"] <= 3660
+    assert quality["up_since"] == datetime.fromtimestamp(sources.started_at)
+    assert (quality["average_response_time"], quality["error_rate"]) == (20.0, 25.0)
+    # Figures without a source are left out rather than made up
+    for made_up in ("uptime_percentage", "customer_satisfaction", "resolution_time"):
+        assert made_up not in quality
+    for made_up in ("upgrade_rate", "referral_rate"):
+        assert made_up not in metrics["growth_metrics"]
+
+
+async def test_churn_is_null_without_customers_last_month(repository):
+    rollups = CustomerRollups(days=30, months=12)
+    await rollups.start(repository, path=None)
+    set_customer_rollups(rollups)
+    set_system_metrics(SystemMetrics(interval=60))
+    try:
+        metrics = await dashboard.get_performance_metrics()
+    finally:
+        set_customer_rollups(None)
+        set_system_metrics(None)
+    assert metrics["growth_metrics"] == {
+        "new_customers_this_month": 0, "churned_customers_this_month": 0, "churn_rate": None,
+    }
+    assert metrics["service_quality"]["error_rate"] is None
+
+
+async def test_customer_changes_outdate_the_cached_section(auth, repository, sources):
+    app = FastAPI()
+    app.include_router(dashboard.router, prefix="/api/v1/dashboard")
+    headers = {"Authorization": f"Bearer {login_as('tech').access_token}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        before = (await client.get("/api/v1/dashboard/metrics", headers=headers)).json()
+        assert before["growth_metrics"]["churned_customers_this_month"] == 0
+        await repository.update("3", {"status": CustomerStatus.CANCELLED})
+        # Served stale once while it is recomputed
+        stale = (await client.get("/api/v1/dashboard/metrics", headers=headers)).json()
+        assert stale["growth_metrics"] == before["growth_metrics"]
+        await asyncio.sleep(0.05)
+        after = (await client.get("/api/v1/dashboard/metrics", headers=headers)).json()
+    assert (after["growth_metrics"]["churned_customers_this_month"], after["growth_metrics"]["churn_rate"]) == (1, 10.0)
+    assert after["service_quality"]["uptime_seconds"] >= 3600
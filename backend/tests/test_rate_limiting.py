@@ -0,0 +1,123 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.middleware.rate_limiting import (
+    DEFAULT_RULES, InMemoryBucketStore, RateLimiter, RateLimitMiddleware, RateLimitRule
+)
+
+from conftest import login_as
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.parametrize("method, path, rule", [
+    ("POST", "/auth/login", "login"),
+    ("POST", "/auth/refresh", "refresh"),
+    ("GET", "/api/v1/customers/search", "search"),
+    ("GET", "/api/v1/customers/filter/", "filter"),
+    ("GET", "/api/v1/customers/export", "export"),
+    ("POST", "/api/v1/customers/import", "import"),
+    ("POST", "/api/v1/customers/bulk-update", "bulk-update"),
+    ("GET", "/auth/login", None),
+    ("GET", "/api/v1/dashboard/overview", None),
+    ("GET", "/api/v1/dashboard/stream", None),
+    ("GET", "/api/v1/dashboard/charts/revenue", None),
+    ("GET", "/api/v1/customers/", None),
+    ("GET", "/api/v1/customers/42", None),
+    ("GET", "/api/v1/customers/changes", None),
+    ("GET", "/health", None),
+])
+def test_only_the_expensive_routes_are_limited(method, path, rule):
+    limiter = RateLimiter(InMemoryBucketStore(), DEFAULT_RULES)
+    found = limiter.rule_for(method, path)
+    assert (found.name if found else None) == rule
+
+
+async def test_a_bucket_allows_its_burst_then_refills_at_its_rate():
+    clock = Clock()
+    store = InMemoryBucketStore(clock=clock)
+    results = [await store.take("k", rate=1.0, capacity=3) for _ in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert results[-1][1] == pytest.approx(1.0)
+
+    clock.now += 0.5
+    allowed, retry_after = await store.take("k", rate=1.0, capacity=3)
+    assert not allowed and retry_after == pytest.approx(0.5)
+    clock.now += 2.5
+    assert [(await store.take("k", 1.0, 3))[0] for _ in range(4)] == [True, True, True, False]
+
+
+async def test_idle_and_excess_buckets_are_dropped_coldest_first():
+    clock = Clock()
+    store = InMemoryBucketStore(idle_seconds=60, max_keys=3, clock=clock)
+    for key in "abc":
+        await store.take(key, 1.0, 5)
+        clock.now += 10
+    await store.take("a", 1.0, 5)
+    await store.take("d", 1.0, 5)
+    assert list(store._buckets) == ["c", "a", "d"] and store.evicted == 1
+
+    clock.now += 61
+    await store.take("e", 1.0, 5)
+    assert list(store._buckets) == ["e"]
+
+
+RULES = (
+    RateLimitRule("search", "/api/v1/customers/search", 60, 2, methods=("GET",), per="user"),
+    RateLimitRule("login", "/auth/login", 60, 1, methods=("POST",)),
+)
+
+
+def build_app(limiter: RateLimiter) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/customers/search")
+    async def search():
+        return {"ok": True}
+
+    @app.post("/auth/login")
+    async def login():
+        return {"ok": True}
+
+    @app.get("/api/v1/dashboard/overview")
+    async def overview():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return app
+
+
+async def test_the_middleware_refuses_over_limit_requests_per_user_and_per_ip(auth):
+    limiter = RateLimiter(InMemoryBucketStore(), RULES)
+    transport = httpx.ASGITransport(app=build_app(limiter))
+    manager = {"Authorization": f"Bearer {login_as('manager').access_token}"}
+    tech = {"Authorization": f"Bearer {login_as('tech').access_token}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        statuses = [(await client.get("/api/v1/customers/search", headers=manager)).status_code for _ in range(3)]
+        assert statuses == [200, 200, 429]
+        refused = await client.get("/api/v1/customers/search", headers=manager)
+        assert refused.headers["Retry-After"] == "1"
+        assert refused.headers["X-RateLimit-Limit"] == "60/minute; burst=2"
+        assert refused.json() == {"detail": "Too many requests; retry later"}
+
+        # Another user has their own bucket; bad tokens share the IP's
+        assert (await client.get("/api/v1/customers/search", headers=tech)).status_code == 200
+        bad = {"Authorization": "Bearer nope"}
+        assert [(await client.get("/api/v1/customers/search", headers=bad)).status_code for _ in range(3)] == \
+            [200, 200, 429]
+
+        assert [(await client.post("/auth/login")).status_code for _ in range(2)] == [200, 429]
+        # Unlisted routes are never limited
+        for _ in range(20):
+            assert (await client.get("/api/v1/dashboard/overview", headers=manager)).status_code == 200
+
+    stats = limiter.stats()["rules"]
+    assert (stats["search"]["allowed"], stats["search"]["limited"]) == (5, 3)
+    assert (stats["login"]["allowed"], stats["login"]["limited"]) == (1, 1)
@@ -0,0 +1,74 @@
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+
+from app import dependencies
+from app.api.auth.router import router as auth_router
+from app.dependencies import admin_user, current_user, manager_user, technician_user
+from app.models.user import User
+
+from conftest import login_as
+
+ROUTES = {"/technician": technician_user, "/manager": manager_user, "/admin": admin_user}
+
+# Who may use each route
+ALLOWED = {
+    "/technician": {"tech", "manager", "admin"},
+    "/manager": {"manager", "admin"},
+    "/admin": {"admin"},
+    "/auth/me": {"tech", "manager", "admin"},
+    "/auth/hashing": {"manager", "admin"},
+}
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/auth")
+    for path, dependency in ROUTES.items():
+        async def endpoint(user: User = Depends(dependency)):
+            return {"username": user.username}
+        app.get(path)(endpoint)
+
+    @app.get("/both")
+    async def both(user: User = Depends(current_user), manager: User = Depends(manager_user)):
+        return {"same": user is manager}
+
+    return app
+
+
+@pytest.fixture
+async def client(auth):
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.parametrize("path", sorted(ALLOWED))
+async def test_each_role_gets_its_own_routes_and_those_below(client, path):
+    for username in ("tech", "manager", "admin"):
+        token = login_as(username).access_token
+        response = await client.get(path, headers={"Authorization": f"Bearer {token}"})
+        if username in ALLOWED[path]:
+            assert response.status_code == 200
+        else:
+            assert response.status_code == 403
+            assert "role or higher" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Bearer not-a-token"}, {"Authorization": "Basic abc"}])
+async def test_missing_or_bad_credentials_get_401(client, headers):
+    for path in ALLOWED:
+        response = await client.get(path, headers=headers)
+        assert response.status_code == 401
+        assert response.headers["WWW-Authenticate"] == "Bearer"
+
+
+async def test_the_token_is_resolved_once_per_request(client, monkeypatch):
+    calls = []
+    resolve = dependencies.get_current_user
+    monkeypatch.setattr(dependencies, "get_current_user", lambda token: calls.append(token) or resolve(token))
+    token = login_as("manager").access_token
+
+    response = await client.get("/both", headers={"Authorization": f"Bearer {token}"})
+    assert response.json() == {"same": True}
+    assert calls == [token]
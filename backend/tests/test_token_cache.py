@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.security import TokenCache, get_token_cache
+from app.services import auth_service
+from app.services.auth_service import create_access_token, get_current_user, revoke_session
+
+from conftest import login_as
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entries_live_until_exp_or_ttl_whichever_comes_first():
+    clock = Clock()
+    cache = TokenCache(maxsize=10, ttl=60, clock=clock)
+    cache.put("short", "alice", "alice", expires_at=clock.now + 30)
+    cache.put("long", "bob", "bob", expires_at=clock.now + 3600)
+
+    clock.now += 29
+    assert (cache.get("short"), cache.get("long")) == ("alice", "bob")
+    clock.now += 1
+    assert cache.get("short") is None
+    clock.now += 30
+    assert cache.get("long") is None
+    assert len(cache) == 0 and cache.stats()["expired"] == 2
+    assert cache._by_user == {}
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = TokenCache(maxsize=3, ttl=60)
+    for token in "abc":
+        cache.put(token, token.upper(), token, expires_at=float("inf"))
+    cache.get("a")
+    cache.put("d", "D", "d", expires_at=float("inf"))
+    assert [cache.get(token) for token in "abcd"] == ["A", None, "C", "D"]
+    assert cache.stats()["evicted"] == 1 and "b" not in cache._by_user
+    # Raw tokens are never kept
+    assert all(isinstance(key, bytes) and len(key) == 32 for key in cache._entries)
+
+
+def test_invalidate_user_drops_every_token_of_that_user_only():
+    cache = TokenCache(maxsize=10, ttl=60)
+    for token, user in (("a1", "alice"), ("a2", "alice"), ("b1", "bob")):
+        cache.put(token, user, user, expires_at=float("inf"))
+    cache.invalidate_user("alice")
+    assert [cache.get(token) for token in ("a1", "a2", "b1")] == [None, None, "bob"]
+    assert cache.stats()["invalidated"] == 2
+
+
+@pytest.mark.parametrize("maxsize, ttl", [(0, 60), (10, 0)])
+def test_a_zero_size_or_ttl_disables_caching(maxsize, ttl):
+    cache = TokenCache(maxsize=maxsize, ttl=ttl)
+    cache.put("a", "A", "a", expires_at=float("inf"))
+    assert cache.get("a") is None and len(cache) == 0
+
+
+def test_repeat_requests_are_served_from_the_cache(auth):
+    token = login_as("manager").access_token
+    first = get_current_user(token)
+    assert first.username == "manager"
+    assert get_current_user(token) is first
+    assert get_token_cache().stats()["hits"] == 1
+
+
+def test_cached_tokens_stop_working_once_their_session_is_revoked(auth):
+    tokens = login_as("tech")
+    other = login_as("tech")
+    get_current_user(tokens.access_token)
+    get_current_user(other.access_token)
+
+    revoke_session(auth_service._decode_token(tokens.access_token)["sid"], "tech")
+    with pytest.raises(HTTPException) as revoked:
+        get_current_user(tokens.access_token)
+    assert revoked.value.status_code == 401
+    # The user's other sessions are checked again and still accepted
+    assert get_current_user(other.access_token).username == "tech"
+
+
+def test_deactivated_users_are_refused_after_their_entries_are_dropped(auth):
+    token = login_as("tech").access_token
+    get_current_user(token)
+    auth_service.fake_users_db["tech"]["is_active"] = False
+    get_token_cache().invalidate_user("tech")
+    with pytest.raises(HTTPException) as inactive:
+        get_current_user(token)
+    assert inactive.value.detail == "Inactive user"
+
+
+@pytest.mark.parametrize("token", [
+    lambda: create_access_token({"sub": "admin", "typ": "access"}, expires_delta=timedelta(seconds=-1)),
+    lambda: login_as("admin").refresh_token,
+    lambda: login_as("admin").access_token[:-2] + "xx",
+])
+def test_invalid_tokens_are_refused_and_not_cached(auth, token):
+    token = token()
+    for _ in range(2):
+        with pytest.raises(HTTPException) as refused:
+            get_current_user(token)
+        assert refused.value.status_code == 401
+    assert len(get_token_cache()) == 0
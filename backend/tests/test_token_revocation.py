@@ -0,0 +1,101 @@
+import random
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.security import RevocationList
+from app.services.auth_service import create_access_token, get_current_user, logout, refresh
+
+from conftest import login_as
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ids_are_refused_exactly_until_their_expiry():
+    rng = random.Random(3)
+    clock = Clock()
+    revocations = RevocationList(clock=clock)
+    expected = {}
+    ids = [f"id-{i}" for i in range(300)]
+    for _ in range(3000):
+        token_id = rng.choice(ids)
+        expires_at = clock.now + rng.uniform(-5, 60)
+        revocations.revoke(token_id, expires_at)
+        expected[token_id] = max(expected.get(token_id, 0.0), expires_at)
+        clock.now += rng.uniform(0, 0.5)
+        probe = rng.choice(ids)
+        assert revocations.is_revoked(probe) == (expected.get(probe, 0.0) > clock.now)
+
+    assert all(revocations.is_revoked(i) == (expected.get(i, 0.0) > clock.now) for i in ids)
+    # Expired ids are let go of as later ones are revoked
+    revocations.prune()
+    assert len(revocations) == sum(1 for expires_at in expected.values() if expires_at > clock.now)
+    assert revocations.stats()["heap_entries"] >= len(revocations)
+
+    clock.now += 61
+    revocations.prune()
+    assert len(revocations) == 0 and revocations.stats()["heap_entries"] == 0
+
+
+def test_a_later_expiry_wins_and_expired_ids_are_not_stored():
+    clock = Clock()
+    revocations = RevocationList(clock=clock)
+    revocations.revoke("a", clock.now + 10)
+    revocations.revoke("a", clock.now + 30)
+    revocations.revoke("a", clock.now + 20)
+    revocations.revoke("gone", clock.now - 1)
+    assert len(revocations) == 1
+    clock.now += 25
+    revocations.prune()
+    assert revocations.is_revoked("a") and not revocations.is_revoked("gone")
+
+
+def refused(call, *args) -> str:
+    with pytest.raises(HTTPException) as error:
+        call(*args)
+    assert error.value.status_code == 401
+    return error.value.detail
+
+
+def test_each_refresh_token_works_once(auth):
+    first = login_as("manager")
+    second = refresh(first.refresh_token)
+    assert get_current_user(second.access_token).username == "manager"
+    third = refresh(second.refresh_token)
+    assert get_current_user(third.access_token).username == "manager"
+
+    # A copied refresh token shows up again: the whole session goes
+    assert "already used" in refused(refresh, first.refresh_token)
+    assert "revoked" in refused(get_current_user, third.access_token)
+    assert "revoked" in refused(refresh, third.refresh_token)
+    # Other sessions of the user are untouched
+    other = login_as("manager")
+    assert refresh(other.refresh_token).user.username == "manager"
+
+
+def test_logging_out_revokes_the_session_of_either_token(auth):
+    by_access, by_refresh = login_as("tech"), login_as("tech")
+    get_current_user(by_access.access_token)
+    assert logout(access_token=by_access.access_token) == 1
+    assert logout(refresh_token=by_refresh.refresh_token) == 1
+    for tokens in (by_access, by_refresh):
+        refused(get_current_user, tokens.access_token)
+        refused(refresh, tokens.refresh_token)
+
+    # Expired tokens still log out; unsigned ones are ignored
+    expired = create_access_token({"sub": "tech", "typ": "access", "sid": "old-session", "jti": "x"},
+                                  expires_delta=timedelta(seconds=-5))
+    assert logout(access_token=expired, refresh_token="garbage") == 1
+
+
+def test_access_tokens_cannot_be_used_to_refresh(auth):
+    tokens = login_as("admin")
+    assert refused(refresh, tokens.access_token) == "Invalid refresh token"
+    assert get_current_user(tokens.access_token).username == "admin"